@@ -2,4 +2,5 @@ from GridCal.Engine.Core.csc_graph import Graph
 
 from GridCal.Engine.Core.numerical_circuit import NumericalCircuit
 from GridCal.Engine.Core.multi_circuit import MultiCircuit
-from GridCal.Engine.Core.calculation_inputs import CalculationInputs
\ No newline at end of file
+from GridCal.Engine.Core.calculation_inputs import CalculationInputs
+from GridCal.Engine.Core.topology_cache import TopologyCache
@@ -13,6 +13,7 @@
 # You should have received a copy of the GNU General Public License
 # along with GridCal.  If not, see <http://www.gnu.org/licenses/>.
 
+import copy
 import numpy as np
 import pandas as pd
 from scipy.sparse import diags, hstack as hstack_s, vstack as vstack_s
@@ -56,6 +57,11 @@ class CalculationInputs:
         self.Yt = csc_matrix((nbr, nbus), dtype=complex)
         self.Ybus = csc_matrix((nbus, nbus), dtype=complex)
         self.Yseries = csc_matrix((nbus, nbus), dtype=complex)
+
+        # zero-sequence admittance matrices (the negative sequence is Ybus)
+        self.Yf0 = csc_matrix((nbr, nbus), dtype=complex)
+        self.Yt0 = csc_matrix((nbr, nbus), dtype=complex)
+        self.Ybus0 = csc_matrix((nbus, nbus), dtype=complex)
         self.B1 = csc_matrix((nbus, nbus), dtype=float)
         self.B2 = csc_matrix((nbus, nbus), dtype=float)
         self.Bpqpv = None
@@ -161,6 +167,25 @@ class CalculationInputs:
         self.Bpqpv = self.Ybus.imag[np.ix_(self.pqpv, self.pqpv)]
         self.Bref = self.Ybus.imag[np.ix_(self.pqpv, self.ref)]
 
+    def copy(self):
+        """
+        Get a copy of the island that can be simulated without altering this one: the solvers replace the
+        matrices (tap control) and the bus types (reactive power control) instead of modifying them, so those are
+        shared while the vectors that may be modified in place are copied
+        :return: CalculationInputs instance
+        """
+        cpy = copy.copy(self)
+
+        for name in ['Vbus', 'Sbus', 'Ibus', 'types', 'tap_mod', 'tap_position']:
+            setattr(cpy, name, getattr(self, name).copy())
+
+        cpy.pq = self.pq.copy()
+        cpy.pv = self.pv.copy()
+        cpy.ref = self.ref.copy()
+        cpy.pqpv = self.pqpv.copy()
+
+        return cpy
+
     def trim_profiles(self, time_idx):
         """
         Trims the profiles with the passed time indices and stores those time indices for later
@@ -189,6 +214,9 @@ class CalculationInputs:
         obj.Yt = self.Yt[np.ix_(branch_idx, bus_idx)]
         obj.Ybus = self.Ybus[np.ix_(bus_idx, bus_idx)]
         obj.Yseries = self.Yseries[np.ix_(bus_idx, bus_idx)]
+        obj.Yf0 = self.Yf0[np.ix_(branch_idx, bus_idx)]
+        obj.Yt0 = self.Yt0[np.ix_(branch_idx, bus_idx)]
+        obj.Ybus0 = self.Ybus0[np.ix_(bus_idx, bus_idx)]
         obj.B1 = self.B1[np.ix_(bus_idx, bus_idx)]
         obj.B2 = self.B2[np.ix_(bus_idx, bus_idx)]
 
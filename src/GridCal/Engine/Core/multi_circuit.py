@@ -817,6 +817,12 @@ class MultiCircuit:
             circuit.X[i] = branch.X
             circuit.G[i] = branch.G
             circuit.B[i] = branch.B
+            circuit.R0[i] = branch.R0
+            circuit.X0[i] = branch.X0
+            circuit.G0[i] = branch.G0
+            circuit.B0[i] = branch.B0
+            if branch.branch_type == BranchType.Transformer:
+                circuit.branch_conn[i] = branch.conn
             circuit.impedance_tolerance[i] = branch.tolerance
             circuit.br_rates[i] = branch.rate
             circuit.tap_mod[i] = branch.tap_module
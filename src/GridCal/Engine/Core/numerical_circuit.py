@@ -20,6 +20,7 @@ import scipy.sparse as sp
 import pandas as pd
 from GridCal.Engine.Core.csc_graph import Graph
 from GridCal.Engine.basic_structures import BranchImpedanceMode
+from GridCal.Engine.Devices.types import WindingsConnection
 from GridCal.Engine.Core.calculation_inputs import CalculationInputs
 
 from GridCal.Engine.Simulations.sparse_solve import get_sparse_type
@@ -76,9 +77,9 @@ def calc_connectivity(branch_active, bus_active, C_branch_bus_f, C_branch_bus_t,
 
     # modify the branches impedance with the lower, upper tolerance values
     if branch_tolerance_mode == BranchImpedanceMode.Lower:
-        R *= (1 - impedance_tolerance / 100.0)
+        R = R * (1 - impedance_tolerance / 100.0)
     elif branch_tolerance_mode == BranchImpedanceMode.Upper:
-        R *= (1 + impedance_tolerance / 100.0)
+        R = R * (1 + impedance_tolerance / 100.0)
     else:
         pass
 
@@ -150,6 +151,87 @@ def calc_connectivity(branch_active, bus_active, C_branch_bus_f, C_branch_bus_t,
     return Ybus, Yf, Yt, B1, B2, Yseries, Ys, GBc, Cf, Ct, C_bus_bus, C_branch_bus
 
 
+def calc_zero_sequence_admittance(Cf, Ct, R, X, G, B, R0, X0, G0, B0, conn, branch_tolerance_mode: BranchImpedanceMode,
+                                  impedance_tolerance, tap_mod, tap_ang, tap_t, tap_f, Ysh):
+    """
+    Build the zero-sequence admittance matrices.
+    The negative-sequence network of the passive elements is the positive-sequence one (Ybus), so only the
+    zero-sequence network needs to be built. The branches without zero-sequence data (R0 = X0 = 0) use their
+    positive-sequence values. The bus shunt admittances are shared with the positive sequence.
+    The zero-sequence currents only flow through a transformer between grounded star windings; a grounded star
+    facing a delta winding connects its bus to the ground, and any other connection is open.
+    :param Cf: branch-bus from connectivity matrix (with the branch states applied)
+    :param Ct: branch-bus to connectivity matrix (with the branch states applied)
+    :param R: array of positive-sequence resistance
+    :param X: array of positive-sequence reactance
+    :param G: array of positive-sequence conductance
+    :param B: array of positive-sequence susceptance
+    :param R0: array of zero-sequence resistance
+    :param X0: array of zero-sequence reactance
+    :param G0: array of zero-sequence conductance
+    :param B0: array of zero-sequence susceptance
+    :param conn: array of WindingsConnection (Yg-Yg for the branches that are not transformers)
+    :param branch_tolerance_mode: branch tolerance mode (enum: BranchImpedanceMode)
+    :param impedance_tolerance: impedance tolerance
+    :param tap_mod: tap modules array
+    :param tap_ang: tap angles array
+    :param tap_t: virtual tap to array
+    :param tap_f: virtual tap from array
+    :param Ysh: shunt admittance injections
+    :return: Ybus0: zero-sequence admittance matrix
+             Yf0: zero-sequence admittance matrix of the from buses
+             Yt0: zero-sequence admittance matrix of the to buses
+    """
+    # use the positive sequence where there is no zero-sequence data
+    no_data = (R0 == 0) & (X0 == 0)
+    R0 = np.where(no_data, R, R0)
+    X0 = np.where(no_data, X, X0)
+    G0 = np.where(no_data, G, G0)
+    B0 = np.where(no_data, B, B0)
+
+    # modify the branches impedance with the lower, upper tolerance values
+    if branch_tolerance_mode == BranchImpedanceMode.Lower:
+        R0 = R0 * (1 - impedance_tolerance / 100.0)
+    elif branch_tolerance_mode == BranchImpedanceMode.Upper:
+        R0 = R0 * (1 + impedance_tolerance / 100.0)
+    else:
+        pass
+
+    # zero-sequence paths of the windings connections
+    grounded_f = np.array([c in (WindingsConnection.GG, WindingsConnection.GS, WindingsConnection.GD)
+                           for c in conn], dtype=bool)
+    grounded_t = np.array([c in (WindingsConnection.GG, WindingsConnection.SG, WindingsConnection.DG)
+                           for c in conn], dtype=bool)
+    delta_f = np.array([c in (WindingsConnection.DG, WindingsConnection.DS, WindingsConnection.DD)
+                        for c in conn], dtype=bool)
+    delta_t = np.array([c in (WindingsConnection.GD, WindingsConnection.SD, WindingsConnection.DD)
+                        for c in conn], dtype=bool)
+    series = grounded_f & grounded_t
+    ground_f = grounded_f & delta_t
+    ground_t = delta_f & grounded_t
+
+    Ys0 = 1.0 / (R0 + 1.0j * X0)
+    GBc0 = G0 + 1.0j * B0
+    tap = tap_mod * np.exp(1.0j * tap_ang)
+
+    # branch primitives in vector form
+    Ytt = np.where(series, (Ys0 + GBc0 / 2.0), ground_t * Ys0) / (tap_t * tap_t)
+    Yff = np.where(series, (Ys0 + GBc0 / 2.0), ground_f * Ys0) / (tap_f * tap_f * tap * np.conj(tap))
+    Yft = - Ys0 * series / (tap_f * tap_t * np.conj(tap))
+    Ytf = - Ys0 * series / (tap_t * tap_f * tap)
+
+    # form the admittance matrices
+    Yf0 = sp.diags(Yff) * Cf + sp.diags(Yft) * Ct
+    Yt0 = sp.diags(Ytf) * Cf + sp.diags(Ytt) * Ct
+    Ybus0 = Cf.T * Yf0 + Ct.T * Yt0 + sp.diags(Ysh)
+
+    # the buses behind delta or ungrounded windings float in the zero sequence: a negligible admittance to the
+    # ground keeps Ybus0 invertible (their zero-sequence impedance is practically infinite)
+    Ybus0 = sparse(Ybus0 + sp.diags(np.full(Ybus0.shape[0], 1e-9)))
+
+    return Ybus0, Yf0, Yt0
+
+
 def calc_islands(circuit: CalculationInputs, bus_active, C_bus_bus, C_branch_bus, C_gen_bus, C_batt_bus,
                  nbus, nbr, time_idx=None, ignore_single_node_islands=False) -> List[CalculationInputs]:
     """
@@ -178,6 +260,10 @@ def calc_islands(circuit: CalculationInputs, bus_active, C_bus_bus, C_branch_bus
 
     if len(islands) > 1:
 
+        # column slicing is much faster in CSC format
+        C_gen_bus = sp.csc_matrix(C_gen_bus)
+        C_batt_bus = sp.csc_matrix(C_batt_bus)
+
         # there are islands, pack the islands into sub circuits
         for island_bus_idx in islands:
 
@@ -288,6 +374,11 @@ class NumericalCircuit:
         self.X = np.zeros(n_br, dtype=float)
         self.G = np.zeros(n_br, dtype=float)
         self.B = np.zeros(n_br, dtype=float)
+        self.R0 = np.zeros(n_br, dtype=float)
+        self.X0 = np.zeros(n_br, dtype=float)
+        self.G0 = np.zeros(n_br, dtype=float)
+        self.B0 = np.zeros(n_br, dtype=float)
+        self.branch_conn = np.full(n_br, WindingsConnection.GG, dtype=object)  # windings connection (zero sequence)
         self.impedance_tolerance = np.zeros(n_br, dtype=float)
         self.tap_f = np.ones(n_br, dtype=float)  # tap generated by the difference in nominal voltage at the form side
         self.tap_t = np.ones(n_br, dtype=float)  # tap generated by the difference in nominal voltage at the to side
@@ -576,12 +667,12 @@ class NumericalCircuit:
         circuit.bus_names = self.bus_names
         circuit.branch_names = self.branch_names
 
-        # connectivity matrices
-        circuit.C_load_bus = self.C_load_bus
-        circuit.C_batt_bus = self.C_batt_bus
-        circuit.C_sta_gen_bus = self.C_sta_gen_bus
-        circuit.C_ctrl_gen_bus = self.C_gen_bus
-        circuit.C_shunt_bus = self.C_shunt_bus
+        # connectivity matrices (in CSC format, since they are sliced by columns when splitting the islands)
+        circuit.C_load_bus = sp.csc_matrix(self.C_load_bus)
+        circuit.C_batt_bus = sp.csc_matrix(self.C_batt_bus)
+        circuit.C_sta_gen_bus = sp.csc_matrix(self.C_sta_gen_bus)
+        circuit.C_ctrl_gen_bus = sp.csc_matrix(self.C_gen_bus)
+        circuit.C_shunt_bus = sp.csc_matrix(self.C_shunt_bus)
 
         # needed for the tap changer
         circuit.is_bus_to_regulated = self.is_bus_to_regulated
@@ -654,7 +745,7 @@ class NumericalCircuit:
         circuit.Ibus = I
         circuit.Vbus = self.V0
         circuit.Sbase = self.Sbase
-        circuit.types = self.bus_types
+        circuit.types = self.bus_types.copy()
         circuit.Qmax = q_max
         circuit.Qmin = q_min
         circuit.Sinstalled = installed_generation_per_bus
@@ -697,7 +788,7 @@ class NumericalCircuit:
 
     def compute(self, add_storage=True, add_generation=True, apply_temperature=False,
                 branch_tolerance_mode=BranchImpedanceMode.Specified,
-                ignore_single_node_islands=False) -> List[CalculationInputs]:
+                ignore_single_node_islands=False, branch_active=None) -> List[CalculationInputs]:
         """
         Compute the cross connectivity matrices to determine the circuit connectivity
         towards the calculation. Additionally, compute the calculation matrices.
@@ -706,9 +797,13 @@ class NumericalCircuit:
         :param apply_temperature:
         :param branch_tolerance_mode:
         :param ignore_single_node_islands: If True, the single node islands are omitted
+        :param branch_active: array of branch states to use instead of self.branch_active (optional)
         :return: list of CalculationInputs instances where each one is a circuit island
         """
 
+        if branch_active is None:
+            branch_active = self.branch_active
+
         # get the raw circuit with the inner arrays computed
         circuit = self.get_raw_circuit(add_generation=add_generation, add_storage=add_storage)
 
@@ -724,7 +819,7 @@ class NumericalCircuit:
         circuit.C_branch_bus_f, \
         circuit.C_branch_bus_t, \
         C_bus_bus, \
-        C_branch_bus = calc_connectivity(branch_active=self.branch_active,
+        C_branch_bus = calc_connectivity(branch_active=branch_active,
                                          bus_active=self.bus_active,
                                          C_branch_bus_f=self.C_branch_bus_f,
                                          C_branch_bus_t=self.C_branch_bus_t,
@@ -742,6 +837,26 @@ class NumericalCircuit:
                                          tap_f=self.tap_f,
                                          Ysh=circuit.Ysh)
 
+        # zero-sequence admittances (for the unbalanced faults)
+        circuit.Ybus0, circuit.Yf0, circuit.Yt0 = calc_zero_sequence_admittance(Cf=circuit.C_branch_bus_f,
+                                                                                Ct=circuit.C_branch_bus_t,
+                                                                                R=self.R,
+                                                                                X=self.X,
+                                                                                G=self.G,
+                                                                                B=self.B,
+                                                                                R0=self.R0,
+                                                                                X0=self.X0,
+                                                                                G0=self.G0,
+                                                                                B0=self.B0,
+                                                                                conn=self.branch_conn,
+                                                                                branch_tolerance_mode=branch_tolerance_mode,
+                                                                                impedance_tolerance=self.impedance_tolerance,
+                                                                                tap_mod=self.tap_mod,
+                                                                                tap_ang=self.tap_ang,
+                                                                                tap_t=self.tap_t,
+                                                                                tap_f=self.tap_f,
+                                                                                Ysh=circuit.Ysh)
+
         #  split the circuit object into the individual circuits that may arise from the topological islands
         calculation_islands = calc_islands(circuit=circuit,
                                            bus_active=self.bus_active,
@@ -754,8 +869,10 @@ class NumericalCircuit:
                                            time_idx=None,
                                            ignore_single_node_islands=ignore_single_node_islands)
 
-        for island in calculation_islands:
-            self.bus_types[island.original_bus_idx] = island.types
+        if branch_active is self.branch_active:
+            # the bus types of the circuit are only updated for its own branch states
+            for island in calculation_islands:
+                self.bus_types[island.original_bus_idx] = island.types
 
         # return the list of islands
         return calculation_islands
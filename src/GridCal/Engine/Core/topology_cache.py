@@ -0,0 +1,148 @@
+# This file is part of GridCal.
+#
+# GridCal is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# GridCal is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with GridCal.  If not, see <http://www.gnu.org/licenses/>.
+
+from collections import OrderedDict
+from typing import Dict, List
+
+import numpy as np
+
+from GridCal.Engine.basic_structures import BranchImpedanceMode
+from GridCal.Engine.Core.calculation_inputs import CalculationInputs
+from GridCal.Engine.Core.numerical_circuit import NumericalCircuit
+
+
+class TopologyCache:
+
+    def __init__(self, numerical_circuit: NumericalCircuit, add_storage=True, add_generation=True,
+                 apply_temperature=False, branch_tolerance_mode=BranchImpedanceMode.Specified,
+                 ignore_single_node_islands=False, max_size=128):
+        """
+        Cache of the calculation islands of a NumericalCircuit indexed by the branch states.
+        The islands are computed once per different branch states vector and then re-used, so the simulations
+        that visit the same topology several times (cascades, contingencies, repeated OPF runs) do not pay the
+        admittance and island computation again.
+        The returned CalculationInputs are shared between the callers: treat them as read-only and simulate
+        copies of them (CalculationInputs.copy) when the solver controls may modify them.
+        :param numerical_circuit: NumericalCircuit instance
+        :param add_storage: add the storage to the injections?
+        :param add_generation: add the generation to the injections?
+        :param apply_temperature: apply the temperature correction?
+        :param branch_tolerance_mode: BranchImpedanceMode
+        :param ignore_single_node_islands: If True, the single node islands are omitted
+        :param max_size: maximum number of topologies to keep (the least recently used are dropped first)
+        """
+        self.numerical_circuit = numerical_circuit
+
+        self.add_storage = add_storage
+
+        self.add_generation = add_generation
+
+        self.apply_temperature = apply_temperature
+
+        self.branch_tolerance_mode = branch_tolerance_mode
+
+        self.ignore_single_node_islands = ignore_single_node_islands
+
+        self.max_size = max_size
+
+        self.data = OrderedDict()
+
+        # islands of every topological state of the time series (numerical_circuit.compute_ts())
+        self.ts_data = None
+
+        self.hits = 0
+
+        self.misses = 0
+
+    def __len__(self):
+        return len(self.data)
+
+    def is_compatible(self, apply_temperature, branch_tolerance_mode, ignore_single_node_islands):
+        """
+        Were the stored islands computed with these settings?
+        :param apply_temperature: apply the temperature correction?
+        :param branch_tolerance_mode: BranchImpedanceMode
+        :param ignore_single_node_islands: If True, the single node islands are omitted
+        :return: bool
+        """
+        return (self.apply_temperature == apply_temperature and
+                self.branch_tolerance_mode == branch_tolerance_mode and
+                self.ignore_single_node_islands == ignore_single_node_islands)
+
+    @staticmethod
+    def get_key(branch_active):
+        """
+        Get the cache key of a branch states vector
+        :param branch_active: array of branch states
+        :return: hashable key
+        """
+        return np.packbits(np.array(branch_active, dtype=bool)).tobytes()
+
+    def get_islands(self, branch_active=None) -> List[CalculationInputs]:
+        """
+        Get the calculation islands for the given branch states
+        :param branch_active: array of branch states (if None, the numerical circuit branch states are used)
+        :return: list of CalculationInputs instances where each one is a circuit island
+        """
+        if branch_active is None:
+            branch_active = self.numerical_circuit.branch_active
+
+        key = self.get_key(branch_active)
+
+        if key in self.data:
+            self.hits += 1
+            self.data.move_to_end(key)
+            return self.data[key]
+
+        self.misses += 1
+        islands = self.numerical_circuit.compute(add_storage=self.add_storage,
+                                                 add_generation=self.add_generation,
+                                                 apply_temperature=self.apply_temperature,
+                                                 branch_tolerance_mode=self.branch_tolerance_mode,
+                                                 ignore_single_node_islands=self.ignore_single_node_islands,
+                                                 branch_active=branch_active)
+
+        if self.max_size > 0:
+            self.data[key] = islands
+            if len(self.data) > self.max_size:
+                self.data.popitem(last=False)
+
+        return islands
+
+    def get_islands_ts(self) -> Dict[int, List[CalculationInputs]]:
+        """
+        Get the calculation islands of all the time series states; they are computed only once
+        :return: dictionary of lists of CalculationInputs instances (see NumericalCircuit.compute_ts)
+        """
+        if self.ts_data is not None:
+            self.hits += 1
+            return self.ts_data
+
+        self.misses += 1
+        self.ts_data = self.numerical_circuit.compute_ts(add_storage=self.add_storage,
+                                                         add_generation=self.add_generation,
+                                                         apply_temperature=self.apply_temperature,
+                                                         branch_tolerance_mode=self.branch_tolerance_mode,
+                                                         ignore_single_node_islands=self.ignore_single_node_islands)
+        return self.ts_data
+
+    def clear(self):
+        """
+        Drop all the stored topologies
+        """
+        self.data.clear()
+        self.ts_data = None
+        self.hits = 0
+        self.misses = 0
@@ -20,7 +20,7 @@ from matplotlib import pyplot as plt
 
 from GridCal.Engine.basic_structures import Logger
 from GridCal.Engine.Devices.bus import Bus
-from GridCal.Engine.Devices.types import BranchType
+from GridCal.Engine.Devices.types import BranchType, WindingsConnection
 from GridCal.Engine.Devices.transformer import TransformerType
 from GridCal.Engine.Devices.sequence_line import SequenceLineType
 from GridCal.Engine.Devices.underground_line import UndergroundLineType
@@ -289,6 +289,17 @@ class Branch(EditableDevice):
 
         **b** (float, 1e-20): Branch shunt susceptance in per unit
 
+        **r0** (float, 0.0): Zero-sequence resistance in per unit (if r0 and x0 are 0, the positive sequence is used)
+
+        **x0** (float, 0.0): Zero-sequence reactance in per unit
+
+        **g0** (float, 0.0): Zero-sequence shunt conductance in per unit
+
+        **b0** (float, 0.0): Zero-sequence shunt susceptance in per unit
+
+        **conn** (WindingsConnection, WindingsConnection.GG): Windings connection of the transformers, used to build
+        their zero-sequence circuit (only the grounded star to grounded star connection has a series path)
+
         **rate** (float, 1.0): Branch rate in MVA
 
         **tap** (float, 1.0): Branch tap module
@@ -331,7 +342,8 @@ class Branch(EditableDevice):
                  mttf=0, mttr=0, r_fault=0.0, x_fault=0.0, fault_pos=0.5,
                  branch_type: BranchType = BranchType.Line, length=1, vset=1.0,
                  temp_base=20, temp_oper=20, alpha=0.00330,
-                 bus_to_regulated=False, template=BranchTemplate(), ):
+                 bus_to_regulated=False, template=BranchTemplate(), r0=0.0, x0=0.0, g0=0.0, b0=0.0,
+                 conn=WindingsConnection.GG):
 
         EditableDevice.__init__(self,
                                 name=name,
@@ -352,6 +364,16 @@ class Branch(EditableDevice):
                                                   'X': GCProp('p.u.', float, 'Total reactance.'),
                                                   'G': GCProp('p.u.', float, 'Total shunt conductance.'),
                                                   'B': GCProp('p.u.', float, 'Total shunt susceptance.'),
+                                                  'R0': GCProp('p.u.', float, 'Total zero-sequence resistance.\n'
+                                                               'If R0 and X0 are 0, the positive sequence\n'
+                                                               'values are used.'),
+                                                  'X0': GCProp('p.u.', float, 'Total zero-sequence reactance.'),
+                                                  'G0': GCProp('p.u.', float, 'Total zero-sequence shunt conductance.'),
+                                                  'B0': GCProp('p.u.', float, 'Total zero-sequence shunt susceptance.'),
+                                                  'conn': GCProp('', WindingsConnection,
+                                                                 'Windings connection (from, to) of the transformers:\n'
+                                                                 'G: grounded star, S: star, D: delta.\n'
+                                                                 'Used in the zero sequence of the transformers.'),
                                                   'tolerance': GCProp('%', float,
                                                                       'Tolerance expected for the impedance values\n'
                                                                       '7% is expected for transformers\n'
@@ -418,6 +440,15 @@ class Branch(EditableDevice):
         self.G = g
         self.B = b
 
+        # total zero-sequence impedance and admittance in p.u.
+        self.R0 = r0
+        self.X0 = x0
+        self.G0 = g0
+        self.B0 = b0
+
+        # windings connection (zero-sequence circuit of the transformers)
+        self.conn = conn
+
         self.mttf = mttf
 
         self.mttr = mttr
@@ -524,11 +555,17 @@ class Branch(EditableDevice):
                    temp_oper=self.temp_oper,
                    alpha=self.alpha,
                    branch_type=self.branch_type,
-                   template=self.template)
+                   template=self.template,
+                   r0=self.R0,
+                   x0=self.X0,
+                   g0=self.G0,
+                   b0=self.B0,
+                   conn=self.conn)
 
         b.measurements = self.measurements
 
-        b.active_prof = self.active_prof.copy()
+        if self.active_prof is not None:
+            b.active_prof = self.active_prof.copy()
 
         return b
 
@@ -659,6 +696,15 @@ class Branch(EditableDevice):
                 self.G = np.round(y.real, 6)
                 self.B = np.round(y.imag, 6)
 
+                # zero sequence from the tower matrices
+                z0 = (obj.R0 + 1j * obj.X0) * self.length / Zbase
+                y0 = (obj.Gsh0 + 1j * obj.Bsh0) * self.length / Ybase
+
+                self.R0 = np.round(z0.real, 6)
+                self.X0 = np.round(z0.imag, 6)
+                self.G0 = np.round(y0.real, 6)
+                self.B0 = np.round(y0.imag, 6)
+
                 # get the rating in MVA = kA * kV
                 self.rate = obj.rating * Vn * SQRT3
 
@@ -699,6 +745,11 @@ class Branch(EditableDevice):
             self.G = np.round(obj.G * self.length / Ybase, 6)
             self.B = np.round(obj.B * self.length / Ybase, 6)
 
+            self.R0 = np.round(obj.R0 * self.length / Zbase, 6)
+            self.X0 = np.round(obj.X0 * self.length / Zbase, 6)
+            self.G0 = np.round(obj.G0 * self.length / Ybase, 6)
+            self.B0 = np.round(obj.B0 * self.length / Ybase, 6)
+
             # get the rating in MVA = kA * kV
             self.rate = obj.rating * Vn * SQRT3
 
@@ -16,7 +16,7 @@
 import pandas as pd
 from matplotlib import pyplot as plt
 from GridCal.Engine.Devices.meta_devices import EditableDevice, GCProp
-from GridCal.Engine.Devices.types import DeviceType, GeneratorTechnologyType
+from GridCal.Engine.Devices.types import DeviceType, GeneratorTechnologyType, DynamicModels
 
 
 class Generator(EditableDevice):
@@ -67,12 +67,47 @@ class Generator(EditableDevice):
 
         **mttr** (float, 0.0): Mean time to recovery in hours
 
+        **technology** (GeneratorTechnologyType, CombinedCycle): Generator technology
+
+        **machine_model** (DynamicModels, NoModel): Dynamic model used in the transient stability simulations
+
+        **H** (float, 4.0): Inertia constant in seconds
+
+        **Ra** (float, 0.0): Armature resistance in per unit of the machine base
+
+        **Xa** (float, 0.0): Armature leakage reactance in per unit of the machine base
+
+        **Xd** (float, 1.68): d-axis synchronous reactance in per unit of the machine base
+
+        **Xdp** (float, 0.32): d-axis transient reactance in per unit of the machine base
+
+        **Xdpp** (float, 0.2): d-axis sub-transient reactance in per unit of the machine base
+
+        **Xq** (float, 1.61): q-axis synchronous reactance in per unit of the machine base
+
+        **Xqp** (float, 0.32): q-axis transient reactance in per unit of the machine base
+
+        **Xqpp** (float, 0.2): q-axis sub-transient reactance in per unit of the machine base
+
+        **Td0p** (float, 5.5): d-axis transient open circuit time constant in seconds
+
+        **Tq0p** (float, 4.6): q-axis transient open circuit time constant in seconds
+
+        **Td0pp** (float, 0.0575): d-axis sub-transient open circuit time constant in seconds
+
+        **Tq0pp** (float, 0.0575): q-axis sub-transient open circuit time constant in seconds
+
+        **speed_volt** (bool, False): Include the speed in the stator voltage equations?
+
     """
 
     def __init__(self, name='gen', active_power=0.0, power_factor=0.8, voltage_module=1.0, is_controlled=True,
                  Qmin=-9999, Qmax=9999, Snom=9999, power_prof=None, power_factor_prof=None, vset_prof=None,
                  Cost_prof=None, active=True,  p_min=0.0, p_max=9999.0, op_cost=1.0, Sbase=100, enabled_dispatch=True,
-                 mttf=0.0, mttr=0.0, technology: GeneratorTechnologyType = GeneratorTechnologyType.CombinedCycle):
+                 mttf=0.0, mttr=0.0, technology: GeneratorTechnologyType = GeneratorTechnologyType.CombinedCycle,
+                 machine_model: DynamicModels = DynamicModels.NoModel, H=4.0, Ra=0.0, Xa=0.0, Xd=1.68, Xdp=0.32,
+                 Xdpp=0.2, Xq=1.61, Xqp=0.32, Xqpp=0.2, Td0p=5.5, Tq0p=4.6, Td0pp=0.0575, Tq0pp=0.0575,
+                 speed_volt=False):
 
         EditableDevice.__init__(self,
                                 name=name,
@@ -100,7 +135,36 @@ class Generator(EditableDevice):
                                                                              'Enabled for dispatch? Used in OPF.'),
                                                   'mttf': GCProp('h', float, 'Mean time to failure'),
                                                   'mttr': GCProp('h', float, 'Mean time to recovery'),
-                                                  'technology': GCProp('', GeneratorTechnologyType, 'Generator technology')},
+                                                  'technology': GCProp('', GeneratorTechnologyType, 'Generator technology'),
+                                                  'machine_model': GCProp('', DynamicModels,
+                                                                          'Dynamic model. '
+                                                                          'Used in transient stability.'),
+                                                  'H': GCProp('s', float, 'Inertia constant.'),
+                                                  'Ra': GCProp('p.u.', float, 'Armature resistance (machine base).'),
+                                                  'Xa': GCProp('p.u.', float,
+                                                               'Armature leakage reactance (machine base).'),
+                                                  'Xd': GCProp('p.u.', float,
+                                                               'd-axis synchronous reactance (machine base).'),
+                                                  'Xdp': GCProp('p.u.', float,
+                                                                'd-axis transient reactance (machine base).'),
+                                                  'Xdpp': GCProp('p.u.', float,
+                                                                 'd-axis sub-transient reactance (machine base).'),
+                                                  'Xq': GCProp('p.u.', float,
+                                                               'q-axis synchronous reactance (machine base).'),
+                                                  'Xqp': GCProp('p.u.', float,
+                                                                'q-axis transient reactance (machine base).'),
+                                                  'Xqpp': GCProp('p.u.', float,
+                                                                 'q-axis sub-transient reactance (machine base).'),
+                                                  'Td0p': GCProp('s', float,
+                                                                 'd-axis transient open circuit time constant.'),
+                                                  'Tq0p': GCProp('s', float,
+                                                                 'q-axis transient open circuit time constant.'),
+                                                  'Td0pp': GCProp('s', float,
+                                                                  'd-axis sub-transient open circuit time constant.'),
+                                                  'Tq0pp': GCProp('s', float,
+                                                                  'q-axis sub-transient open circuit time constant.'),
+                                                  'speed_volt': GCProp('', bool,
+                                                                       'Include the speed in the stator voltages?')},
                                 non_editable_attributes=list(),
                                 properties_with_profile={'active': 'active_prof',
                                                          'P': 'P_prof',
@@ -162,22 +226,22 @@ class Generator(EditableDevice):
 
         self.Cost_prof = Cost_prof
 
-        # Dynamic vars
-        # self.Ra = Ra
-        # self.Xa = Xa
-        # self.Xd = Xd
-        # self.Xq = Xq
-        # self.Xdp = Xdp
-        # self.Xqp = Xqp
-        # self.Xdpp = Xdpp
-        # self.Xqpp = Xqpp
-        # self.Td0p = Td0p
-        # self.Tq0p = Tq0p
-        # self.Td0pp = Td0pp
-        # self.Tq0pp = Tq0pp
-        # self.H = H
-        # self.speed_volt = speed_volt
-        # self.base_mva = base_mva  # machine base MVA
+        # Dynamic vars (the reactances are in per unit of the machine base, Snom)
+        self.machine_model = machine_model
+        self.H = H
+        self.Ra = Ra
+        self.Xa = Xa
+        self.Xd = Xd
+        self.Xdp = Xdp
+        self.Xdpp = Xdpp
+        self.Xq = Xq
+        self.Xqp = Xqp
+        self.Xqpp = Xqpp
+        self.Td0p = Td0p
+        self.Tq0p = Tq0p
+        self.Td0pp = Td0pp
+        self.Tq0pp = Tq0pp
+        self.speed_volt = speed_volt
 
         # system base power MVA
         self.Sbase = Sbase
@@ -229,6 +293,23 @@ class Generator(EditableDevice):
 
         gen.technology = self.technology
 
+        # dynamic vars
+        gen.machine_model = self.machine_model
+        gen.H = self.H
+        gen.Ra = self.Ra
+        gen.Xa = self.Xa
+        gen.Xd = self.Xd
+        gen.Xdp = self.Xdp
+        gen.Xdpp = self.Xdpp
+        gen.Xq = self.Xq
+        gen.Xqp = self.Xqp
+        gen.Xqpp = self.Xqpp
+        gen.Td0p = self.Td0p
+        gen.Tq0p = self.Tq0p
+        gen.Td0pp = self.Td0pp
+        gen.Tq0pp = self.Tq0pp
+        gen.speed_volt = self.speed_volt
+
         return gen
 
     def get_json_dict(self, id, bus_dict):
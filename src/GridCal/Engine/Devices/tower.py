@@ -335,19 +335,20 @@ class Tower(EditableDevice):
         all_ok = self.check()
 
         if all_ok:
-            # Impedances
+            # Impedances and admittances (cached per geometry)
+            z, y = get_line_constants(self.wires_in_tower, f=self.frequency, rho=self.earth_resistivity)
+
             self.z_abcn, \
              self.z_phases_abcn, \
              self.z_abc, \
              self.z_phases_abc, \
-             self.z_seq = calc_z_matrix(self.wires_in_tower, f=self.frequency, rho=self.earth_resistivity)
+             self.z_seq = z
 
-            # Admittances
             self.y_abcn, \
              self.y_phases_abcn, \
              self.y_abc, \
              self.y_phases_abc, \
-             self.y_seq = calc_y_matrix(self.wires_in_tower, f=self.frequency, rho=self.earth_resistivity)
+             self.y_seq = y
 
             # compute the tower rating in kA
             self.rating = self.compute_rating()
@@ -459,42 +460,46 @@ def abc_2_seq(mat):
     """
     Convert to sequence components
     Args:
-        mat:
+        mat: 3x3 matrix (or stack of 3x3 matrices along the leading dimensions)
 
     Returns:
 
     """
-    if mat.shape == (3, 3):
+    if mat.shape[-2:] == (3, 3):
         a = np.exp(2j * np.pi / 3)
         a2 = a * a
         A = np.array([[1, 1, 1], [1, a2, a], [1, a, a2]])
         Ainv = (1.0 / 3.0) * np.array([[1, 1, 1], [1, a, a2], [1, a2, a]])
-        return Ainv.dot(mat).dot(A)
+        return Ainv @ mat @ A
     else:
-        return np.zeros((3, 3))
+        return np.zeros(mat.shape[:-2] + (3, 3))
 
 
 def kron_reduction(mat, keep, embed):
     """
     Perform the Kron reduction
-    :param mat: primitive matrix
+    :param mat: primitive matrix (or stack of matrices along the leading dimensions)
     :param keep: indices to keep
     :param embed: indices to remove / embed
     :return:
     """
-    Zaa = mat[np.ix_(keep, keep)]
-    Zag = mat[np.ix_(keep, embed)]
-    Zga = mat[np.ix_(embed, keep)]
-    Zgg = mat[np.ix_(embed, embed)]
+    Zaa = mat[..., keep, :][..., :, keep]
+
+    if len(embed) == 0:
+        return Zaa
+
+    Zag = mat[..., keep, :][..., :, embed]
+    Zga = mat[..., embed, :][..., :, keep]
+    Zgg = mat[..., embed, :][..., :, embed]
 
-    return Zaa - Zag.dot(np.linalg.inv(Zgg)).dot(Zga)
+    return Zaa - Zag @ np.linalg.solve(Zgg, Zga)
 
 
 def wire_bundling(phases_set, primitive, phases_vector):
     """
     Algorithm to bundle wires per phase
     :param phases_set: set of phases (list with unique occurrences of each phase values, i.e. [0, 1, 2, 3])
-    :param primitive: Primitive matrix to reduce by bundling wires
+    :param primitive: Primitive matrix to reduce by bundling wires (or stack of matrices along the leading dimensions)
     :param phases_vector: Vector that contains the phase of each wire
     :return: reduced primitive matrix, corresponding phases
     """
@@ -515,12 +520,10 @@ def wire_bundling(phases_set, primitive, phases_vector):
             g = wires_indices[1:]
 
             # column subtraction
-            for k in g:
-                primitive[:, k] -= primitive[:, i]
+            primitive[..., :, g] -= primitive[..., :, i:i + 1]
 
             # row subtraction
-            for k in g:
-                primitive[k, :] -= primitive[i, :]
+            primitive[..., g, :] -= primitive[..., i:i + 1, :]
 
             # kron - reduction to Zabcn
             primitive = kron_reduction(mat=primitive, keep=a, embed=g)
@@ -535,147 +538,283 @@ def wire_bundling(phases_set, primitive, phases_vector):
     return primitive, phases_vector
 
 
-def calc_z_matrix(wires: list, f=50, rho=100):
+def get_wires_arrays(wires: list):
     """
-    Impedance matrix
-    :param wires: list of wire objects
-    :param f: system frequency (Hz)
+    Arrays of the wires geometry and properties
+    :param wires: list of WireInTower objects
+    :return: x positions, y positions, phases, resistances, reactances, GMR
+    """
+    xpos = np.array([w.xpos for w in wires], dtype=float)
+    ypos = np.array([w.ypos for w in wires], dtype=float)
+    phases = np.array([w.phase for w in wires], dtype=int)
+    r = np.array([w.wire.r for w in wires], dtype=float)
+    x = np.array([w.wire.x for w in wires], dtype=float)
+    gmr = np.array([w.wire.gmr for w in wires], dtype=float)
+
+    return xpos, ypos, phases, r, x, gmr
+
+
+def _expand_geometry(arr, f):
+    """
+    Insert the frequency dimensions in a geometry array of shape (..., n wires)
+    """
+    arr = np.asarray(arr, dtype=float)
+    return arr.reshape(arr.shape[:-1] + (1,) * f.ndim + arr.shape[-1:])
+
+
+def calc_z_primitive(xpos, ypos, r, x, gmr, f=50, rho=100):
+    """
+    Primitive impedance matrix of all the wire pairs at once (Carson's formulas 4.3 and 4.4)
+    :param xpos: wires horizontal position (m), shape (..., n)
+    :param ypos: wires vertical position (m), shape (..., n)
+    :param r: wires resistance (Ohm/km), shape (..., n)
+    :param x: wires reactance (Ohm/km), shape (..., n)
+    :param gmr: wires geometric mean radius (m), shape (..., n)
+    :param f: system frequency (Hz), scalar or array of frequencies
     :param rho: earth resistivity
-    :return: 4 by 4 impedance matrix where the order of the phases is: N, A, B, C
+    :return: primitive impedance matrix (Ohm/km) of shape (..., [frequencies], n, n)
     """
+    f = np.asarray(f, dtype=float)
+    xpos, ypos, r, x, gmr = [_expand_geometry(arr, f) for arr in (xpos, ypos, r, x, gmr)]
+    f_vec = f[..., np.newaxis]
+    n = xpos.shape[-1]
 
-    n = len(wires)
-    z_prim = np.zeros((n, n), dtype=complex)
+    xi, xj = xpos[..., :, np.newaxis], xpos[..., np.newaxis, :]
+    yi, yj = ypos[..., :, np.newaxis], ypos[..., np.newaxis, :]
 
-    # dictionary with the wire indices per phase
-    phases_set = set()
+    # mutual impedances (the diagonal is meaningless and it is replaced by the self impedances)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        d_ij = get_d_ij(xi, yi, xj, yj)
+        z_prim = z_ij(x_i=xi, x_j=xj, h_i=yi + 1e-12, h_j=yj + 1e-12, d_ij=d_ij, f=f_vec[..., np.newaxis], rho=rho)
 
-    phases_abcn = np.zeros(n, dtype=int)
+    diag = np.arange(n)
+    z_prim[..., diag, diag] = z_ii(r_i=r, x_i=x, h_i=ypos, gmr_i=gmr, f=f_vec, rho=rho)
 
-    for i, wire_i in enumerate(wires):
+    return z_prim
 
-        # self impedance
-        z_prim[i, i] = z_ii(r_i=wire_i.wire.r, x_i=wire_i.wire.x, h_i=wire_i.ypos, gmr_i=wire_i.wire.gmr, f=f, rho=rho)
 
-        # mutual impedances
-        for j, wire_j in enumerate(wires):
+def calc_p_primitive(xpos, ypos, gmr):
+    """
+    Maxwell's potential matrix of all the wire pairs at once
+    :param xpos: wires horizontal position (m), shape (..., n)
+    :param ypos: wires vertical position (m), shape (..., n)
+    :param gmr: wires geometric mean radius (m), shape (..., n)
+    :return: potential matrix (km/F) of shape (..., n, n)
+    """
+    xpos = np.asarray(xpos, dtype=float)
+    ypos = np.asarray(ypos, dtype=float)
+    gmr = np.asarray(gmr, dtype=float)
+    n = xpos.shape[-1]
 
-            if i != j:
-                #  mutual impedance
-                d_ij = get_d_ij(wire_i.xpos, wire_i.ypos, wire_j.xpos, wire_j.ypos)
+    # 1 / (2 * pi * e0) in km/F
+    e_air = 1.00058986
+    e_0 = 8.854187817e-9  # F/km
+    e = e_0 * e_air
+    one_two_pi_e0 = 1 / (2 * pi * e)  # km/F
 
-                z_prim[i, j] = z_ij(x_i=wire_i.xpos, x_j=wire_j.xpos,
-                                    h_i=wire_i.ypos + 1e-12, h_j=wire_j.ypos + 1e-12,
-                                    d_ij=d_ij, f=f, rho=rho)
-            else:
-                # they are the same wire and it is already accounted in the self impedance
-                pass
+    xi, xj = xpos[..., :, np.newaxis], xpos[..., np.newaxis, :]
+    yi, yj = ypos[..., :, np.newaxis] + 1e-12, ypos[..., np.newaxis, :] + 1e-12
+
+    # mutual potentials (the diagonal is replaced by the self potentials)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        d_ij = get_d_ij(xi, yi, xj, yj)
+        D_ij = get_D_ij(xi, yi, xj, yj)
+        p_prim = (one_two_pi_e0 * log(D_ij / d_ij)).astype(complex)
+        p_self = np.where(ypos > 0, one_two_pi_e0 * log(2 * ypos / (gmr + 1e-12)), 0.0)
 
-        # account for the phase
-        phases_set.add(wire_i.phase)
-        phases_abcn[i] = wire_i.phase
+    diag = np.arange(n)
+    p_prim[..., diag, diag] = p_self
 
-    # bundle the phases
-    z_abcn = z_prim.copy()
+    return p_prim
 
+
+def reduce_primitive(primitive, phases_abcn):
+    """
+    Bundle the wires of each phase and eliminate the neutral
+    :param primitive: primitive matrix (or stack of matrices along the leading dimensions)
+    :param phases_abcn: phase of each wire
+    :return: matrix with the phases and neutral, its phases, matrix of the phases, its phases
+    """
     # sort the phases vector
-    phases_set = list(phases_set)
+    phases_set = list(set(phases_abcn))
     phases_set.sort(reverse=True)
 
     # wire bundling
-    z_abcn, phases_abcn = wire_bundling(phases_set=phases_set, primitive=z_abcn, phases_vector=phases_abcn)
+    mat_abcn, phases_abcn = wire_bundling(phases_set=phases_set, primitive=primitive.copy(),
+                                          phases_vector=phases_abcn)
 
-    # kron - reduction to Zabc
+    # kron - reduction to the phases
     a = np.where(phases_abcn != 0)[0]
     g = np.where(phases_abcn == 0)[0]
-    z_abc = kron_reduction(mat=z_abcn, keep=a, embed=g)
+    mat_abc = kron_reduction(mat=mat_abcn, keep=a, embed=g)
 
     # reduce the phases too
     phases_abc = phases_abcn[a]
 
+    return mat_abcn, phases_abcn, mat_abc, phases_abc
+
+
+def calc_z_matrices(xpos, ypos, r, x, gmr, phases, f=50, rho=100):
+    """
+    Impedance matrices of many towers with the same wire phases and of many frequencies at once
+    :param xpos: wires horizontal position (m), shape (..., n)
+    :param ypos: wires vertical position (m), shape (..., n)
+    :param r: wires resistance (Ohm/km), shape (..., n)
+    :param x: wires reactance (Ohm/km), shape (..., n)
+    :param gmr: wires geometric mean radius (m), shape (..., n)
+    :param phases: phase of each wire (n)
+    :param f: system frequency (Hz), scalar or array of frequencies
+    :param rho: earth resistivity
+    :return: z_abcn, phases_abcn, z_abc, phases_abc, z_seq (the matrices with shape (..., [frequencies], m, m))
+    """
+    z_prim = calc_z_primitive(xpos, ypos, r, x, gmr, f=f, rho=rho)
+
+    z_abcn, phases_abcn, z_abc, phases_abc = reduce_primitive(z_prim, np.asarray(phases, dtype=int))
+
     # compute the sequence components
     z_seq = abc_2_seq(z_abc)
 
     return z_abcn, phases_abcn, z_abc, phases_abc, z_seq
 
 
-def calc_y_matrix(wires: list, f=50, rho=100):
+def calc_y_matrices(xpos, ypos, gmr, phases, f=50):
+    """
+    Admittance matrices of many towers with the same wire phases and of many frequencies at once
+    :param xpos: wires horizontal position (m), shape (..., n)
+    :param ypos: wires vertical position (m), shape (..., n)
+    :param gmr: wires geometric mean radius (m), shape (..., n)
+    :param phases: phase of each wire (n)
+    :param f: system frequency (Hz), scalar or array of frequencies
+    :return: y_abcn, phases_abcn, y_abc, phases_abc, y_seq (the matrices with shape (..., [frequencies], m, m))
+    """
+    p_prim = calc_p_primitive(xpos, ypos, gmr)
+
+    p_abcn, phases_abcn, p_abc, phases_abc = reduce_primitive(p_prim, np.asarray(phases, dtype=int))
+
+    # compute the admittance matrices: the potentials do not depend on the frequency
+    f = np.asarray(f, dtype=float)
+    p_abcn_inv = np.linalg.inv(p_abcn).reshape(p_abcn.shape[:-2] + (1,) * f.ndim + p_abcn.shape[-2:])
+    p_abc_inv = np.linalg.inv(p_abc).reshape(p_abc.shape[:-2] + (1,) * f.ndim + p_abc.shape[-2:])
+    w = (2 * pi * f)[..., np.newaxis, np.newaxis]
+    y_abcn = 1j * w * p_abcn_inv
+    y_abc = 1j * w * p_abc_inv
+
+    # compute the sequence components
+    y_seq = abc_2_seq(y_abc)
+
+    return y_abcn, phases_abcn, y_abc, phases_abc, y_seq
+
+
+def calc_z_matrix(wires: list, f=50, rho=100):
     """
     Impedance matrix
     :param wires: list of wire objects
-    :param f: system frequency (Hz)
+    :param f: system frequency (Hz), scalar or array of frequencies
     :param rho: earth resistivity
     :return: 4 by 4 impedance matrix where the order of the phases is: N, A, B, C
     """
+    xpos, ypos, phases, r, x, gmr = get_wires_arrays(wires)
 
-    n = len(wires)
+    return calc_z_matrices(xpos, ypos, r, x, gmr, phases, f=f, rho=rho)
 
-    # Maxwell's potential matrix
-    p_prim = np.zeros((n, n), dtype=complex)
 
-    # dictionary with the wire indices per phase
-    phases_set = set()
-
-    # 1 / (2 * pi * e0) in km/F
-    e_air = 1.00058986
-    e_0 = 8.854187817e-9  # F/km
-    e = e_0 * e_air
-    one_two_pi_e0 = 1 / (2 * pi * e)  # km/F
+def calc_y_matrix(wires: list, f=50, rho=100):
+    """
+    Admittance matrix
+    :param wires: list of wire objects
+    :param f: system frequency (Hz), scalar or array of frequencies
+    :param rho: earth resistivity (not used: the earth is a perfect conductor for the potentials)
+    :return: 4 by 4 admittance matrix where the order of the phases is: N, A, B, C
+    """
+    xpos, ypos, phases, r, x, gmr = get_wires_arrays(wires)
 
-    phases_abcn = np.zeros(n, dtype=int)
+    for wire in wires:
+        if wire.ypos <= 0:
+            print(wire.name, 'has y=0 !')
 
-    for i, wire_i in enumerate(wires):
+    return calc_y_matrices(xpos, ypos, gmr, phases, f=f)
 
-        # self impedance
-        if wire_i.ypos > 0:
-            p_prim[i, i] = one_two_pi_e0 * log(2 * wire_i.ypos / (wire_i.wire.gmr + 1e-12))
-        else:
-            p_prim[i, i] = 0
-            print(wire_i.name, 'has y=0 !')
 
-            # mutual impedances
-        for j, wire_j in enumerate(wires):
+# line constants per tower geometry at a single frequency: key -> (impedance matrices, admittance matrices)
+# (the results of frequency vectors are not cached: each of them takes 32 complex values per frequency)
+_line_constants_cache = dict()
 
-            if i != j:
-                #  mutual impedance
-                d_ij = get_d_ij(wire_i.xpos, wire_i.ypos + 1e-12, wire_j.xpos, wire_j.ypos + 1e-12)
+_line_constants_cache_size = 1024
 
-                D_ij = get_D_ij(wire_i.xpos, wire_i.ypos + 1e-12, wire_j.xpos, wire_j.ypos + 1e-12)
 
-                p_prim[i, j] = one_two_pi_e0 * log(D_ij / d_ij)
+def get_tower_key(wires: list, f=50, rho=100):
+    """
+    Hashable key of a tower geometry and its calculation parameters
+    :param wires: list of WireInTower objects
+    :param f: system frequency (Hz), scalar or array of frequencies
+    :param rho: earth resistivity
+    :return: tuple
+    """
+    geometry = tuple((w.xpos, w.ypos, w.phase, w.wire.r, w.wire.x, w.wire.gmr) for w in wires)
+    return geometry, tuple(np.atleast_1d(f).tolist()), np.ndim(f), rho
 
-            else:
-                # they are the same wire and it is already accounted in the self impedance
-                pass
 
-        # account for the phase
-        phases_set.add(wire_i.phase)
-        phases_abcn[i] = wire_i.phase
+def _store_line_constants(key, z, y):
+    """
+    Store the line constants of a geometry
+    """
+    if len(_line_constants_cache) >= _line_constants_cache_size:
+        _line_constants_cache.clear()
+    _line_constants_cache[key] = (z, y)
 
-    # bundle the phases
-    p_abcn = p_prim.copy()
 
-    # sort the phases vector
-    phases_set = list(phases_set)
-    phases_set.sort(reverse=True)
+def get_line_constants(wires: list, f=50, rho=100):
+    """
+    Impedance and admittance matrices of a tower, cached per geometry when f is a single frequency
+    :param wires: list of WireInTower objects
+    :param f: system frequency (Hz), scalar or array of frequencies
+    :param rho: earth resistivity
+    :return: (z_abcn, phases_abcn, z_abc, phases_abc, z_seq), (y_abcn, phases_abcn, y_abc, phases_abc, y_seq)
+    """
+    if np.ndim(f):
+        return calc_z_matrix(wires, f=f, rho=rho), calc_y_matrix(wires, f=f, rho=rho)
 
-    # wire bundling
-    p_abcn, phases_abcn = wire_bundling(phases_set=phases_set, primitive=p_abcn, phases_vector=phases_abcn)
+    key = get_tower_key(wires, f, rho)
 
-    # kron - reduction to Zabc
-    a = np.where(phases_abcn != 0)[0]
-    g = np.where(phases_abcn == 0)[0]
-    p_abc = kron_reduction(mat=p_abcn, keep=a, embed=g)
+    if key not in _line_constants_cache:
+        _store_line_constants(key, calc_z_matrix(wires, f=f, rho=rho), calc_y_matrix(wires, f=f, rho=rho))
 
-    # reduce the phases too
-    phases_abc = phases_abcn[a]
+    z, y = _line_constants_cache[key]
 
-    # compute the admittance matrices
-    w = 2 * pi * f
-    y_abcn = 1j * w * np.linalg.inv(p_abcn)
-    y_abc = 1j * w * np.linalg.inv(p_abc)
+    return tuple(a.copy() for a in z), tuple(a.copy() for a in y)
 
-    # compute the sequence components
-    y_seq = abc_2_seq(y_abc)
 
-    return y_abcn, phases_abcn, y_abc, phases_abc, y_seq
+def compute_towers(towers: list, logger=Logger()):
+    """
+    Compute many towers at once: the distinct geometries with the same wire phases, frequency and earth resistivity
+    are computed as a single batch, and the rest of the towers take their values from the cache
+    :param towers: list of Tower objects
+    :param logger: Logger instance
+    """
+    groups = dict()
+    valid = list()
+    for tower in towers:
+        if tower.check(logger):
+            valid.append(tower)
+            key = get_tower_key(tower.wires_in_tower, tower.frequency, tower.earth_resistivity)
+            if key[2] == 0 and key not in _line_constants_cache:
+                group_key = (tuple(w.phase for w in tower.wires_in_tower), key[1], key[2], key[3])
+                groups.setdefault(group_key, dict())[key] = tower
+
+    for group_key, group in groups.items():
+        phases, f, f_ndim, rho = group_key
+        f = np.array(f) if f_ndim else f[0]
+        keys = list(group.keys())
+        arrays = [get_wires_arrays(group[key].wires_in_tower) for key in keys]
+        xpos, ypos, _, r, x, gmr = [np.array([arr[k] for arr in arrays]) for k in range(6)]
+
+        z = calc_z_matrices(xpos, ypos, r, x, gmr, phases, f=f, rho=rho)
+        y = calc_y_matrices(xpos, ypos, gmr, phases, f=f)
+
+        for t, key in enumerate(keys):
+            _store_line_constants(key,
+                                  (z[0][t], z[1], z[2][t], z[3], z[4][t]),
+                                  (y[0][t], y[1], y[2][t], y[3], y[4][t]))
+
+    for tower in valid:
+        tower.compute()
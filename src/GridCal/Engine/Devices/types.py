@@ -36,6 +36,34 @@ class BranchType(Enum):
             return s
 
 
+class WindingsConnection(Enum):
+    # G: grounded star
+    # S: ungrounded star
+    # D: delta
+    GG = 'Yg-Yg'
+    GS = 'Yg-Y'
+    GD = 'Yg-D'
+    SG = 'Y-Yg'
+    SS = 'Y-Y'
+    SD = 'Y-D'
+    DG = 'D-Yg'
+    DS = 'D-Y'
+    DD = 'D-D'
+
+    def __str__(self):
+        return self.value
+
+    def __repr__(self):
+        return str(self)
+
+    @staticmethod
+    def argparse(s):
+        try:
+            return WindingsConnection[s]
+        except KeyError:
+            return s
+
+
 class TimeFrame(Enum):
     Continuous = 'Continuous'
 
@@ -92,3 +120,26 @@ class GeneratorTechnologyType(Enum):
             return GeneratorTechnologyType[s]
         except KeyError:
             return s
+
+
+class DynamicModels(Enum):
+    NoModel = 'No model'
+    SynchronousGeneratorOrder4 = '4th order synchronous machine'
+    SynchronousGeneratorOrder6 = '6th order synchronous machine'
+    VoltageSourceConverter = 'Voltage source converter'
+    ExternalGrid = 'External grid'
+    AsynchronousSingleCageMotor = 'Single cage asynchronous motor'
+    AsynchronousDoubleCageMotor = 'Double cage asynchronous motor'
+
+    def __str__(self):
+        return self.value
+
+    def __repr__(self):
+        return str(self)
+
+    @staticmethod
+    def argparse(s):
+        try:
+            return DynamicModels[s]
+        except KeyError:
+            return s
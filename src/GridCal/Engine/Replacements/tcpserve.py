@@ -6,21 +6,110 @@
 
 import time
 import socket
+import struct
 import threading
+import multiprocessing
 import pickle
 import logging
+import numpy as np
 
 try:
     import socketserver
 except ImportError:
     import SocketServer as socketserver
 
+try:
+    import Queue
+except ImportError:
+    import queue as Queue
+
 from poap.controller import ThreadController
 
 
 logger = logging.getLogger(__name__)
 
 
+def send_frame(sock, data):
+    """Send a message prefixed with its length.
+
+    Args:
+        sock: connected socket
+        data: message bytes
+    """
+    sock.sendall(struct.pack('!I', len(data)) + data)
+
+
+def _recv_exactly(sock, n):
+    "Receive exactly n bytes; None if the connection is closed before."
+    chunks = []
+    while n > 0:
+        chunk = sock.recv(min(n, 65536))
+        if not chunk:
+            return None
+        chunks.append(chunk)
+        n -= len(chunk)
+    return b''.join(chunks)
+
+
+def recv_frame(sock):
+    """Receive a message sent with send_frame.
+
+    Args:
+        sock: connected socket
+
+    Returns:
+        message bytes, or None if the connection is closed
+    """
+    header = _recv_exactly(sock, 4)
+    if header is None:
+        return None
+    return _recv_exactly(sock, struct.unpack('!I', header)[0])
+
+
+def marshall_message(*args):
+    """Convert a message to wire format.
+
+    The evaluation requests of a single float vector and the completions
+    with a float value are packed in binary (the bulk of the traffic);
+    any other message is pickled.
+
+    Args:
+        args: message tuple, i.e. ('eval', record_id, params)
+
+    Returns:
+        message bytes
+    """
+    if len(args) == 3 and args[0] == 'eval' and len(args[2]) == 1 \
+            and isinstance(args[2][0], np.ndarray) and args[2][0].dtype == np.float64:
+        x = args[2][0]
+        header = struct.pack('!QB' + 'I' * x.ndim, args[1], x.ndim, *x.shape)
+        return b'e' + header + x.astype('>f8').tobytes()
+    if len(args) == 3 and args[0] == 'complete' and isinstance(args[2], float):
+        return b'c' + struct.pack('!Qd', args[1], args[2])
+    return b'p' + pickle.dumps(args)
+
+
+def unmarshall_message(data):
+    """Convert a message from wire format back to a tuple.
+
+    Args:
+        data: message bytes (from marshall_message)
+
+    Returns:
+        message tuple
+    """
+    kind, data = data[:1], data[1:]
+    if kind == b'e':
+        record_id, ndim = struct.unpack('!QB', data[:9])
+        shape = struct.unpack('!' + 'I' * ndim, data[9:9 + 4 * ndim])
+        x = np.frombuffer(data[9 + 4 * ndim:], dtype='>f8').astype(np.float64).reshape(shape)
+        return 'eval', record_id, (x,)
+    if kind == b'c':
+        record_id, value = struct.unpack('!Qd', data)
+        return 'complete', record_id, value
+    return pickle.loads(data)
+
+
 class SocketWorkerHandler(socketserver.BaseRequestHandler):
     """Manage a remote worker for a thread controller.
 
@@ -38,7 +127,7 @@ class SocketWorkerHandler(socketserver.BaseRequestHandler):
                 m = ('eval', id(record), record.params)
             else:
                 m = ('eval', id(record), record.params, record.extra_args)
-            self.request.send(self.server.marshall(*m))
+            send_frame(self.request, self.server.marshall(*m))
         except Exception as e:
             logger.warning("In eval: {0}".format(e))
             self._cleanup(record)
@@ -47,11 +136,10 @@ class SocketWorkerHandler(socketserver.BaseRequestHandler):
         "Send a kill request to a remote worker"
         logger.debug("Send kill to worker")
         try:
-            self.request.send(
-                self.server.marshall('kill', id(record)))
+            send_frame(self.request, self.server.marshall('kill', id(record)))
         except socket.error as e:
             logger.warning("In kill: {0}".format(e))
-            self._cleanup(record)
+            self._cleanup(record, retry=False)
 
     def terminate(self):
         "Send a termination request to a remote worker"
@@ -60,7 +148,7 @@ class SocketWorkerHandler(socketserver.BaseRequestHandler):
         logger.debug("Send terminate to worker")
         try:
             self.running = False
-            self.request.send(self.server.marshall('terminate'))
+            send_frame(self.request, self.server.marshall('terminate'))
             self.request.close()
         except socket.error as e:
             logger.warning("In terminate: {0}".format(e))
@@ -69,6 +157,8 @@ class SocketWorkerHandler(socketserver.BaseRequestHandler):
         "Receive a record status message"
         mname = args[0]
         record = self.records[args[1]]
+        if mname in ('complete', 'cancel', 'kill'):
+            del self.records[args[1]]
         controller = self.server.controller
         if mname in self.server.message_handlers:
             handler = self.server.message_handlers[mname]
@@ -78,10 +168,14 @@ class SocketWorkerHandler(socketserver.BaseRequestHandler):
             controller.add_message(lambda: method(*args[2:]))
         if mname == 'complete' or mname == 'cancel' or mname == 'kill':
             logger.debug("Re-queueing worker")
-            controller.add_worker(self)
+            self.server.release_worker(self)
 
-    def _cleanup(self, record):
+    def _cleanup(self, record, retry=True):
         "Clean up an incomplete record assigned to this worker."
+        self.records.pop(id(record), None)
+        if retry and self.server.retry_record(record):
+            return
+
         def killrec():
             if not record.is_done:
                 logger.debug("Kill {0}".format(record.params))
@@ -93,19 +187,23 @@ class SocketWorkerHandler(socketserver.BaseRequestHandler):
         self.records = {}
         self.running = True
         self.server.controller.add_term_callback(self.terminate)
+        if self.server.finished:
+            self.terminate()
+            return
         try:
-            self.server.controller.add_worker(self)
+            self.server.release_worker(self)
             while self.running:
                 logger.debug("Waiting for worker input")
-                data = self.request.recv(4096)
-                if not data:
+                data = recv_frame(self.request)
+                if data is None:
                     return
                 args = self.server.unmarshall(data)
                 self._handle_message(args)
         except socket.error as e:
             logger.debug("Exiting worker: {0}".format(e))
         finally:
-            for rec_id, record in self.records.items():
+            self.running = False
+            for rec_id, record in list(self.records.items()):
                 self._cleanup(record)
             logger.debug("Leaving worker thread")
 
@@ -131,6 +229,14 @@ class ThreadedTCPServer(socketserver.ThreadingMixIn,
         ('cancel', record_id)
         ('complete', record_id, value)
 
+    The messages are framed with their length, and the evaluation requests
+    of a float vector and the completions are packed in binary (see
+    marshall_message), so the parameter vectors are not limited in size.
+
+    The evaluations of a worker whose connection is lost are sent to the
+    next available worker, up to max_retries times per evaluation, before
+    being killed.
+
     The set of handlers can also be extended with a dictionary of
     named callbacks to be invoked whenever a record update comes in.
     For example, to set a lower bound field, we might use the handler
@@ -148,27 +254,94 @@ class ThreadedTCPServer(socketserver.ThreadingMixIn,
         strategy: redirects to the controller strategy
     """
 
-    def __init__(self, sockname=("localhost", 0), strategy=None, handlers={}):
+    def __init__(self, sockname=("localhost", 0), strategy=None, handlers={}, max_retries=0):
         """Initialize the controller on the given (host,port) address
 
         Args:
             sockname: Socket on which to serve workers
             strategy: Strategy object to connect to controllers
             handlers: Dictionary of specialized message handlers
+            max_retries: Times an evaluation is resent after losing its worker
         """
         super(ThreadedTCPServer, self).__init__(sockname, SocketWorkerHandler)
         self.message_handlers = handlers
         self.controller = ThreadController()
         self.controller.strategy = strategy
+        self.finished = False
+        self.controller.add_term_callback(self._finish)
         self.controller.add_term_callback(self.shutdown)
+        self.max_retries = max_retries
+        self.retries = {}
+        self.orphans = Queue.Queue()
+        self.lock = threading.Lock()
 
     def marshall(self, *args):
         "Convert an argument list to wire format."
-        return pickle.dumps(args)
+        return marshall_message(*args)
 
     def unmarshall(self, data):
         "Convert wire format back to Python arg list."
-        return pickle.loads(data)
+        return unmarshall_message(data)
+
+    def _finish(self):
+        "Mark the optimization as finished (the workers that connect later are terminated)."
+        self.finished = True
+
+    def retry_record(self, record):
+        """Queue an evaluation that lost its worker to be sent to another one.
+
+        Args:
+            record: EvalRecord that lost its worker
+
+        Returns:
+            True if the record is queued, False if it should be killed
+        """
+        with self.lock:
+            n = self.retries.get(id(record), 0)
+            if record.is_done or n >= self.max_retries:
+                return False
+            self.retries[id(record)] = n + 1
+        logger.debug("Retry {0}".format(record.params))
+        self.orphans.put(record)
+        return True
+
+    def release_worker(self, worker):
+        """Give an available worker the next orphan evaluation, or give it to the controller.
+
+        Args:
+            worker: SocketWorkerHandler that is available
+        """
+        while True:
+            try:
+                record = self.orphans.get_nowait()
+            except Queue.Empty:
+                self.controller.add_worker(worker)
+                return
+            if not record.is_done:
+                record.worker = worker
+                worker.eval(record)
+                return
+
+    def kill_orphans(self):
+        "Kill the evaluations waiting for a worker (when there are no workers left)."
+        while True:
+            try:
+                record = self.orphans.get_nowait()
+            except Queue.Empty:
+                return
+            self.controller.add_message(lambda r=record: r.is_done or r.kill())
+
+    def abort(self, message):
+        """Stop the optimization with an error (i.e. all the workers died).
+
+        Args:
+            message: error message, raised from run()
+        """
+        self.kill_orphans()
+
+        def fail():
+            raise Exception(message)
+        self.controller.add_message(fail)
 
     @property
     def strategy(self):
@@ -183,10 +356,20 @@ class ThreadedTCPServer(socketserver.ThreadingMixIn,
         return self.socket.getsockname()
 
     def run(self, merit=lambda r: r.value, filter=None):
-        thread = threading.Thread(target=self.controller.run)
+        errors = []
+
+        def run_controller():
+            try:
+                self.controller.run()
+            except Exception as e:
+                errors.append(e)
+
+        thread = threading.Thread(target=run_controller)
         thread.start()
         self.serve_forever()
         thread.join()
+        if errors:
+            raise errors[0]
         return self.controller.best_point(merit=merit, filter=filter)
 
 
@@ -226,21 +409,25 @@ class SocketWorker(object):
 
     def marshall(self, *args):
         "Marshall data to wire format"
-        return pickle.dumps(args)
+        return marshall_message(*args)
 
     def unmarshall(self, data):
         "Convert data from wire format back to Python tuple"
-        return pickle.loads(data)
+        return unmarshall_message(data)
 
     def send(self, *args):
         "Send a message to the controller"
-        self.sock.send(self.marshall(*args))
+        send_frame(self.sock, self.marshall(*args))
 
     def _run(self):
         "Run a message from the controller"
         if not self.running:
             return
-        data = self.unmarshall(self.sock.recv(4096))
+        data = recv_frame(self.sock)
+        if data is None:
+            self.running = False
+            return
+        data = self.unmarshall(data)
         method = getattr(self, data[0])
         method(*data[1:])
 
@@ -346,3 +533,105 @@ class ProcessSocketWorker(SocketWorker):
     def terminate(self):
         self.kill_process()
         SocketWorker.terminate(self)
+
+
+class LocalSocketWorkers(object):
+    """Launcher of socket workers in local processes.
+
+    Every process runs target(sockname, *args), which is expected to build
+    a SocketWorker connected to the server and run it.  The arguments (i.e.
+    the pre-compiled problem data) are sent once, when the process starts,
+    so the evaluation messages carry only the parameter vectors.
+
+    A monitor thread checks the processes periodically: the ones that died
+    with an error are restarted up to max_restarts times in total (their evaluations are
+    retried by the server).  If every process is dead and no restarts are
+    left, the server optimization is aborted.
+
+    Attributes:
+        server: ThreadedTCPServer to which the workers connect
+        processes: list of worker processes
+        restarts: number of restarted workers
+    """
+
+    def __init__(self, server, target, args=(), n_workers=None, max_restarts=3, check_interval=0.5):
+        """Initialize the launcher (the workers are started with start()).
+
+        Args:
+            server: ThreadedTCPServer to which the workers connect
+            target: module level function target(sockname, *args) to run in every process
+            args: rest of the arguments of the target
+            n_workers: number of worker processes (if None, the number of cores)
+            max_restarts: number of dead workers that may be restarted
+            check_interval: time between health checks (s)
+        """
+        self.server = server
+        self.target = target
+        self.args = args
+        self.n_workers = multiprocessing.cpu_count() if n_workers is None else n_workers
+        self.max_restarts = max_restarts
+        self.check_interval = check_interval
+        self.processes = []
+        self.restarts = 0
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+        self._monitor_thread = None
+
+    def _spawn(self):
+        "Start a worker process"
+        p = multiprocessing.Process(target=self.target, args=(self.server.sockname,) + tuple(self.args))
+        p.daemon = True
+        p.start()
+        return p
+
+    def check(self):
+        """Health check: restart the dead workers.
+
+        Returns:
+            number of workers alive
+        """
+        with self._lock:
+            for i, p in enumerate(self.processes):
+                if self._stop.is_set():
+                    break
+                if not p.is_alive() and p.exitcode != 0 and self.restarts < self.max_restarts:
+                    logger.warning("Restarting dead worker (exit code {0})".format(p.exitcode))
+                    self.restarts += 1
+                    self.processes[i] = self._spawn()
+            return sum(p.is_alive() for p in self.processes)
+
+    def _set_stop(self):
+        "Stop the health checks (no worker is started after this)"
+        with self._lock:
+            self._stop.set()
+
+    def _monitor(self):
+        "Health checks loop"
+        while not self._stop.wait(self.check_interval):
+            if self.check() == 0 and not self._stop.is_set():
+                self.server.abort("All the socket workers died")
+                return
+
+    def start(self):
+        "Start the worker processes and their monitor"
+        # the workers exit when the optimization terminates: stop checking them before
+        self.server.controller.add_term_callback(self._set_stop)
+        self.processes = [self._spawn() for _ in range(self.n_workers)]
+        self._monitor_thread = threading.Thread(target=self._monitor)
+        self._monitor_thread.daemon = True
+        self._monitor_thread.start()
+
+    def stop(self, timeout=5):
+        """Stop the monitor and wait for the workers (terminate them if they do not finish).
+        Close the server first, so that the workers that did not connect in time exit.
+
+        Args:
+            timeout: time to wait for every worker (s)
+        """
+        self._set_stop()
+        if self._monitor_thread is not None:
+            self._monitor_thread.join()
+        for p in self.processes:
+            p.join(timeout=timeout)
+            if p.is_alive():
+                p.terminate()
@@ -3,11 +3,12 @@
 
 import numpy as np
 from numpy import angle, exp, r_, linalg, Inf, dot, zeros, conj
-from scipy.sparse import hstack, vstack
-from scipy.sparse.linalg import spsolve
+from scipy.sparse import hstack, vstack, csc_matrix
+from scipy.sparse.linalg import spsolve, splu
 from enum import Enum
 
 from GridCal.Engine.Simulations.PowerFlow.jacobian_based_power_flow import Jacobian
+from GridCal.Engine.Simulations.sparse_solve import ReusableSuperLU
 
 
 class VCStopAt(Enum):
@@ -186,7 +187,44 @@ def cpf_p_jac(parametrization: VCParametrization, z, V, lam, Vprv, lamprv, pv, p
     return dP_dV, dP_dlam
 
 
-def corrector(Ybus, Ibus, Sbus, V0, pv, pq, lam0, Sxfr, Vprv, lamprv, z, step, parametrization, tol, max_it, verbose):
+def augmented_jacobian(Ybus, V, Ibus, pv, pq, Sxfr, z, lam, Vprv, lamprv, parametrization: VCParametrization):
+    """
+    Computes the Jacobian of the power flow equations augmented with the continuation parameter
+    and the parametrization function:
+
+        J2 = [   J   dF_dlam
+               dP_dV dP_dlam ]
+
+    :param Ybus: complex bus admittance matrix
+    :param V: complex bus voltage vector at current solution
+    :param Ibus: bus current injections
+    :param pv: vector of indices of PV buses
+    :param pq: vector of indices of PQ buses
+    :param Sxfr: complex vector of scheduled transfers
+    :param z: normalized tangent prediction vector from previous step
+    :param lam: scalar lambda value at current solution
+    :param Vprv: complex bus voltage vector at previous solution
+    :param lamprv: scalar lambda value at previous solution
+    :param parametrization: Value of cpf parametrization option.
+    :return: CSC sparse matrix
+    """
+    npv = len(pv)
+    npq = len(pq)
+    pvpq = r_[pv, pq]
+    nj = npv + npq * 2
+
+    J = Jacobian(Ybus, V, Ibus, pq, pvpq)
+
+    dF_dlam = -r_[Sxfr[pvpq].real, Sxfr[pq].imag]
+
+    dP_dV, dP_dlam = cpf_p_jac(parametrization, z, V, lam, Vprv, lamprv, pv, pq, pvpq)
+
+    return vstack([hstack([J, dF_dlam.reshape(nj, 1)]),
+                   hstack([dP_dV, dP_dlam])], format="csc")
+
+
+def corrector(Ybus, Ibus, Sbus, V0, pv, pq, lam0, Sxfr, Vprv, lamprv, z, step, parametrization, tol, max_it, verbose,
+              linear_solver: ReusableSuperLU = None):
     """
     Solves the corrector step of a continuation power flow using a full Newton method
     with selected parametrization scheme.
@@ -220,6 +258,8 @@ def corrector(Ybus, Ibus, Sbus, V0, pv, pq, lam0, Sxfr, Vprv, lamprv, z, step, p
     :param tol:
     :param max_it:
     :param verbose:
+    :param linear_solver: ReusableSuperLU instance to factorize the augmented Jacobian re-using the ordering,
+                          if None every system is solved from scratch
     :return: V, CONVERGED, I, LAM
     """
 
@@ -333,23 +373,14 @@ def corrector(Ybus, Ibus, Sbus, V0, pv, pq, lam0, Sxfr, Vprv, lamprv, z, step, p
         # update iteration counter
         i += 1
         
-        # evaluate Jacobian
-        J = Jacobian(Ybus, V, Ibus, pq, pvpq)
-    
-        dF_dlam = -r_[Sxfr[pvpq].real, Sxfr[pq].imag]
-
-        dP_dV, dP_dlam = cpf_p_jac(parametrization, z, V, lam, Vprv, lamprv, pv, pq, pvpq)
-    
-        # augment J with real/imag - Sxfr and z^T
-        '''
-        J = [   J   dF_dlam 
-              dP_dV dP_dlam ]
-        '''
-        J = vstack([hstack([J, dF_dlam.reshape(nj, 1)]),
-                    hstack([dP_dV, dP_dlam])], format="csc")
+        # evaluate Jacobian augmented with real/imag - Sxfr and z^T
+        J = augmented_jacobian(Ybus, V, Ibus, pv, pq, Sxfr, z, lam, Vprv, lamprv, parametrization)
     
         # compute update step
-        dx = -spsolve(J, F)
+        if linear_solver is None:
+            dx = -spsolve(J, F)
+        else:
+            dx = -linear_solver.factorize(J).solve(F)
     
         # update voltage
         if npv:
@@ -669,7 +700,8 @@ def corrector_new(Ybus, Ibus, Sbus, V0, pv, pq, lam0, Sxfr, Vprv, lamprv, z, ste
     return V, converged, i, lam, error
 
 
-def predictor(V, Ibus, lam, Ybus, Sxfr, pv, pq, step, z, Vprv, lamprv, parametrization: VCParametrization):
+def predictor(V, Ibus, lam, Ybus, Sxfr, pv, pq, step, z, Vprv, lamprv, parametrization: VCParametrization,
+              linear_solver: ReusableSuperLU = None, reuse_factorization=False):
     """
     Computes a prediction (approximation) to the next solution of the
     continuation power flow using a normalized tangent predictor.
@@ -685,6 +717,10 @@ def predictor(V, Ibus, lam, Ybus, Sxfr, pv, pq, step, z, Vprv, lamprv, parametri
     :param Vprv: complex bus voltage vector at previous solution
     :param lamprv: scalar lambda value at previous solution
     :param parametrization: Value of cpf parametrization option.
+    :param linear_solver: ReusableSuperLU instance to factorize the augmented Jacobian re-using the ordering,
+                          if None the system is solved from scratch
+    :param reuse_factorization: use the last factorization of the linear solver (the one of the last corrector
+                                iteration) instead of computing the augmented Jacobian at V
     :return: V0 : predicted complex bus voltage vector
              LAM0 : predicted lambda continuation parameter
              Z : the normalized tangent prediction vector
@@ -708,22 +744,6 @@ def predictor(V, Ibus, lam, Ybus, Sxfr, pv, pq, step, z, Vprv, lamprv, parametri
     npv = len(pv)
     npq = len(pq)
     pvpq = r_[pv, pq]
-    nj = npv+npq*2
-
-    # compute Jacobian for the power flow equations
-    J = Jacobian(Ybus, V, Ibus, pq, pvpq)
-    
-    dF_dlam = -r_[Sxfr[pvpq].real, Sxfr[pq].imag]
-
-    dP_dV, dP_dlam = cpf_p_jac(parametrization, z, V, lam, Vprv, lamprv, pv, pq, pvpq)
-    
-    # linear operator for computing the tangent predictor
-    '''
-    J2 = [   J   dF_dlam
-           dP_dV dP_dlam ]
-    '''
-    J2 = vstack([hstack([J,     dF_dlam.reshape(nj, 1)]),
-                 hstack([dP_dV, dP_dlam])], format="csc")
 
     Va_prev = np.angle(V)
     Vm_prev = np.abs(V)
@@ -735,7 +755,17 @@ def predictor(V, Ibus, lam, Ybus, Sxfr, pv, pq, step, z, Vprv, lamprv, parametri
     s[npv + 2 * npq] = 1
 
     # tangent vector
-    z[r_[pvpq, nb + pq, 2 * nb]] = spsolve(J2, s)
+    if linear_solver is not None and reuse_factorization and linear_solver.lu is not None:
+        # the factorization of the last corrector iteration is (almost) the augmented Jacobian at V
+        z[r_[pvpq, nb + pq, 2 * nb]] = linear_solver.solve(s)
+    else:
+        # linear operator for computing the tangent predictor
+        J2 = augmented_jacobian(Ybus, V, Ibus, pv, pq, Sxfr, z, lam, Vprv, lamprv, parametrization)
+
+        if linear_solver is None:
+            z[r_[pvpq, nb + pq, 2 * nb]] = spsolve(J2, s)
+        else:
+            z[r_[pvpq, nb + pq, 2 * nb]] = linear_solver.factorize(J2).solve(s)
 
     # normalize_string tangent predictor  (dividing by the euclidean norm)
     z /= linalg.norm(z)
@@ -756,7 +786,8 @@ def predictor(V, Ibus, lam, Ybus, Sxfr, pv, pq, step, z, Vprv, lamprv, parametri
 def continuation_nr(Ybus, Ibus_base, Ibus_target, Sbus_base, Sbus_target, V, pv, pq, step,
                     approximation_order: VCParametrization,
                     adapt_step, step_min, step_max, error_tol=1e-3, tol=1e-6, max_it=20,
-                    stop_at=VCStopAt.Nose, verbose=False, call_back_fx=None):
+                    stop_at=VCStopAt.Nose, verbose=False, call_back_fx=None, linear_solver: ReusableSuperLU = None,
+                    reuse_predictor_factorization=True, max_steps=None, step_retries=0):
     """
     Runs a full AC continuation power flow using a normalized tangent
     predictor and selected approximation_order scheme.
@@ -779,6 +810,13 @@ def continuation_nr(Ybus, Ibus_base, Ibus_target, Sbus_base, Sbus_target, V, pv,
     :param stop_at:  Value of Lambda to stop at. It can be a number or {'NOSE', 'FULL'}
     :param verbose: Display additional intermediate information?
     :param call_back_fx: Function to call on every iteration passing the lambda parameter
+    :param linear_solver: ReusableSuperLU instance used for all the augmented Jacobian systems, so that the ordering
+                          (symbolic factorization) is computed once. If None a new one is created
+    :param reuse_predictor_factorization: compute the tangent predictor with the factorization of the last corrector
+                                          iteration instead of factorizing the augmented Jacobian again
+    :param max_steps: maximum number of continuation steps (if None, the curve is traced until the stop point)
+    :param step_retries: number of times that a step whose corrector does not converge is repeated from the last
+                         solution with a quarter of the step size before giving up (0: stop at the first failure)
     :return: Voltage_series: List of all the voltage solutions from the base to the target
              Lambda_series: Lambda values used in the continuation
 
@@ -815,14 +853,26 @@ def continuation_nr(Ybus, Ibus_base, Ibus_target, Sbus_base, Sbus_target, V, pv,
     z = zeros(2 * nb + 1)
     z[2 * nb] = 1.0
 
+    # all the augmented Jacobians have the same size and sparsity pattern
+    if linear_solver is None:
+        linear_solver = ReusableSuperLU()
+
+    # is the last factorization the one of a corrector at the current point?
+    corrector_factorized = False
+
     # result arrays
     voltage_series = list()
     lambda_series = list()
 
     # Simulation
+    retries = 0
+
     while continuation:
         cont_steps += 1
 
+        # keep the state at the start of the step, in case it has to be repeated
+        step_start = (V, lam, V_prev, lam_prev, z.copy())
+
         # prediction for next step
         V0, lam0, z = predictor(V=V,
                                 Ibus=Ibus_base,
@@ -835,7 +885,9 @@ def continuation_nr(Ybus, Ibus_base, Ibus_target, Sbus_base, Sbus_target, V, pv,
                                 z=z,
                                 Vprv=V_prev,
                                 lamprv=lam_prev,
-                                parametrization=approximation_order)
+                                parametrization=approximation_order,
+                                linear_solver=linear_solver,
+                                reuse_factorization=reuse_predictor_factorization and corrector_factorized)
 
         # save previous voltage, lambda before updating
         V_prev = V.copy()
@@ -857,7 +909,10 @@ def continuation_nr(Ybus, Ibus_base, Ibus_target, Sbus_base, Sbus_target, V, pv,
                                               parametrization=approximation_order,
                                               tol=tol,
                                               max_it=max_it,
-                                              verbose=verbose)
+                                              verbose=verbose,
+                                              linear_solver=linear_solver)
+
+        corrector_factorized = i > 0
 
         # store series values
         voltage_series.append(V)
@@ -917,10 +972,26 @@ def continuation_nr(Ybus, Ibus_base, Ibus_target, Sbus_base, Sbus_target, V, pv,
                     if step < step_min:
                         step = step_min
 
+            if max_steps is not None and cont_steps >= max_steps:
+                continuation = False
+
             # call callback function
             if call_back_fx is not None:
                 call_back_fx(lam)
 
+        elif retries < step_retries and step > step_min:
+
+            # repeat the step from the last solution with a shorter step
+            retries += 1
+            V, lam, V_prev, lam_prev, z = step_start
+            voltage_series.pop()
+            lambda_series.pop()
+            step = max(step / 4.0, step_min)
+            corrector_factorized = False
+
+            if verbose:
+                print('step ', cont_steps, ' : corrector did not converge, retrying with step ', step)
+
         else:
 
             continuation = False
@@ -931,6 +1002,201 @@ def continuation_nr(Ybus, Ibus_base, Ibus_target, Sbus_base, Sbus_target, V, pv,
     return voltage_series, lambda_series, normF, success
 
 
+def point_of_collapse(Ybus, Ibus, Sbus_base, Sbus_target, V, lam, pv, pq, tol=1e-6, max_it=20, eps=1e-5,
+                      verbose=False):
+    """
+    Direct computation of the nose point (saddle-node bifurcation) by the point of collapse method.
+    The Newton method is applied to the extended system
+
+        F(x, lam) = 0       power flow equations with the injections Sbus_base + lam * (Sbus_target - Sbus_base)
+        J(x) v = 0          the Jacobian is singular at the nose, v is its right eigenvector of the zero eigenvalue
+        v_k - 1 = 0         normalization of the eigenvector
+
+    where x = [Va(pv, pq), Vm(pq)]. The derivative of J(x) v with respect to x is the derivative of the Jacobian
+    along v (the second derivatives of the power flow equations are symmetric), computed with a central difference.
+    The method converges in a few iterations when started close to the nose, i.e. from a coarse continuation.
+    :param Ybus: Admittance matrix
+    :param Ibus: Current injections array
+    :param Sbus_base: Power array of the base solvable case
+    :param Sbus_target: Power array of the case to be solved
+    :param V: Voltage array of the starting point
+    :param lam: loading factor of the starting point
+    :param pv: Array of pv indices
+    :param pq: Array of pq indices
+    :param tol: Solutions tolerance
+    :param max_it: Maximum iterations
+    :param eps: step of the central difference of the Jacobian
+    :param verbose: Display additional intermediate information?
+    :return: V, lambda at the nose, critical eigenvector (dVa(pv, pq), dVm(pq)), converged?, error, iterations
+    """
+    Sxfr = Sbus_target - Sbus_base
+    pvpq = r_[pv, pq]
+    npvpq = len(pvpq)
+    npq = len(pq)
+    nj = npvpq + npq
+
+    x = r_[angle(V)[pvpq], np.abs(V)[pq]]
+    Va = angle(V)
+    Vm = np.abs(V)
+
+    def get_voltage(x_):
+        """
+        Voltage of the state x_ = [Va(pv, pq), Vm(pq)]
+        """
+        Va[pvpq] = x_[:npvpq]
+        Vm[pq] = x_[npvpq:]
+        return Vm * exp(1j * Va)
+
+    def extended_residual(x_, v_, lam_):
+        """
+        Residual of the extended system and the Jacobian at x_
+        """
+        V_ = get_voltage(x_)
+        J_ = Jacobian(Ybus, V_, Ibus, pq, pvpq)
+        mismatch = V_ * conj(Ybus * V_ - Ibus) - Sbus_base - lam_ * Sxfr
+        return r_[mismatch[pvpq].real, mismatch[pq].imag, J_ * v_, v_[k_norm] - 1.0], J_
+
+    dF_dlam = -r_[Sxfr[pvpq].real, Sxfr[pq].imag]
+
+    # initial eigenvector: close to the nose the tangent of the curve dx/dlam = J^-1 Sxfr is aligned with the
+    # eigenvector of the vanishing eigenvalue; a few inverse iterations refine it
+    lu = splu(Jacobian(Ybus, get_voltage(x), Ibus, pq, pvpq).tocsc())
+    v = -dF_dlam
+    for k in range(3):
+        v = lu.solve(v)
+        v /= linalg.norm(v, Inf)
+    k_norm = np.argmax(np.abs(v))
+    v /= v[k_norm]
+
+    e_k = csc_matrix((np.ones(1), (np.zeros(1, dtype=int), np.array([k_norm]))), shape=(1, nj))
+
+    F, J = extended_residual(x, v, lam)
+    normF = linalg.norm(F, Inf)
+    converged = normF < tol
+    i = 0
+    while not converged and i < max_it:
+
+        i += 1
+
+        # derivative of J(x) v with respect to x
+        Hv = (Jacobian(Ybus, get_voltage(x + eps * v), Ibus, pq, pvpq) -
+              Jacobian(Ybus, get_voltage(x - eps * v), Ibus, pq, pvpq)) / (2.0 * eps)
+
+        Jext = vstack([hstack([J, csc_matrix((nj, nj)), csc_matrix(dF_dlam.reshape(-1, 1))]),
+                       hstack([Hv, J, csc_matrix((nj, 1))]),
+                       hstack([csc_matrix((1, nj)), e_k, csc_matrix((1, 1))])], format='csc')
+
+        try:
+            dz = -splu(Jext).solve(F)
+        except RuntimeError:
+            # singular extended system: the starting point is not close enough to a nose point
+            break
+
+        # damped update: the step is halved until the error decreases (the region of quadratic convergence
+        # of the point of collapse method is small)
+        mu = 1.0
+        while True:
+            x_new = x + mu * dz[:nj]
+            v_new = v + mu * dz[nj:2 * nj]
+            lam_new = lam + mu * dz[2 * nj]
+            F_new, J_new = extended_residual(x_new, v_new, lam_new)
+            normF_new = linalg.norm(F_new, Inf)
+            if normF_new < normF or mu < 1e-3:
+                break
+            mu *= 0.5
+
+        x, v, lam, F, J, normF = x_new, v_new, lam_new, F_new, J_new, normF_new
+        converged = normF < tol
+
+        if verbose:
+            print('Point of collapse iteration ', i, ' lambda: ', lam, ' error: ', normF, ' step: ', mu)
+
+    V = get_voltage(x)
+
+    return V, lam, v, converged, normF, i
+
+
+def continuation_point_of_collapse(Ybus, Ibus, Sbus_base, Sbus_target, V, pv, pq, seed_steps=30, seed_step=0.05,
+                                   seed_step_max=0.5, seed_error_tol=3e-3, tol=1e-6, max_it=20, verbose=False,
+                                   call_back_fx=None):
+    """
+    Find the nose point with a few coarse continuation steps followed by the point of collapse method
+    :param Ybus: Admittance matrix
+    :param Ibus: Current injections array
+    :param Sbus_base: Power array of the base solvable case
+    :param Sbus_target: Power array of the case to be solved
+    :param V: Voltage array of the base solved case
+    :param pv: Array of pv indices
+    :param pq: Array of pq indices
+    :param seed_steps: maximum number of coarse continuation steps
+    :param seed_step: initial step of the coarse continuation
+    :param seed_step_max: maximum step of the coarse continuation
+    :param seed_error_tol: step adaptation error tolerance of the coarse continuation
+    :param tol: Solutions tolerance
+    :param max_it: Maximum iterations
+    :param verbose: Display additional intermediate information?
+    :param call_back_fx: Function to call on every continuation step passing the lambda parameter
+    :return: Voltage_series: List of the coarse voltage solutions and the nose point
+             Lambda_series: Lambda values of the coarse solutions and the nose point
+             normF: error of the nose point
+             success: did the point of collapse method converge?
+             v: critical eigenvector at the nose (dVa(pv, pq), dVm(pq)) or None
+    """
+    voltage_series, lambda_series, normF, success = continuation_nr(
+        Ybus=Ybus,
+        Ibus_base=Ibus,
+        Ibus_target=Ibus,
+        Sbus_base=Sbus_base,
+        Sbus_target=Sbus_target,
+        V=V,
+        pv=pv,
+        pq=pq,
+        step=seed_step,
+        approximation_order=VCParametrization.PseudoArcLength,
+        adapt_step=True,
+        step_min=1e-4,
+        step_max=seed_step_max,
+        error_tol=seed_error_tol,
+        tol=tol,
+        max_it=max_it,
+        stop_at=VCStopAt.Nose,
+        verbose=verbose,
+        call_back_fx=call_back_fx,
+        max_steps=seed_steps,
+        step_retries=5)
+    if not success:
+        # the last point did not converge
+        voltage_series = voltage_series[:-1]
+        lambda_series = lambda_series[:-1]
+
+    if len(lambda_series) == 0:
+        return voltage_series, lambda_series, normF, False, None
+
+    # start from the highest loading found
+    k = int(np.argmax(lambda_series))
+    V_nose, lam_nose, v, success, normF, it = point_of_collapse(Ybus=Ybus,
+                                                                Ibus=Ibus,
+                                                                Sbus_base=Sbus_base,
+                                                                Sbus_target=Sbus_target,
+                                                                V=voltage_series[k],
+                                                                lam=lambda_series[k],
+                                                                pv=pv,
+                                                                pq=pq,
+                                                                tol=tol,
+                                                                max_it=max_it,
+                                                                verbose=verbose)
+
+    if not success or lam_nose < lambda_series[k] - tol:
+        # not converged or converged to a point that is not the maximum loading of the curve
+        return voltage_series, lambda_series, normF, False, None
+
+    # the seed points up to the nose and the nose point itself
+    voltage_series = voltage_series[:k + 1] + [V_nose]
+    lambda_series = lambda_series[:k + 1] + [lam_nose]
+
+    return voltage_series, lambda_series, normF, True, v
+
+
 if __name__ == '__main__':
 
     from GridCal.Engine.IO.file_handler import *
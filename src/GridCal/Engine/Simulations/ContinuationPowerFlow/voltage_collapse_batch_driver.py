@@ -0,0 +1,297 @@
+# This file is part of GridCal.
+#
+# GridCal is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# GridCal is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with GridCal.  If not, see <http://www.gnu.org/licenses/>.
+
+import multiprocessing
+import numpy as np
+import pandas as pd
+
+from PySide2.QtCore import QThread, Signal
+
+from GridCal.Engine.basic_structures import Logger
+from GridCal.Engine.Core.multi_circuit import MultiCircuit
+from GridCal.Engine.Simulations.ContinuationPowerFlow.voltage_collapse_driver import VoltageCollapseOptions, \
+    voltage_collapse_islands
+from GridCal.Engine.Simulations.sparse_solve import ReusableSuperLU
+
+
+########################################################################################################################
+# Voltage collapse of many load increase directions
+########################################################################################################################
+
+
+class VoltageCollapseBatchOptions:
+
+    def __init__(self, vc_options: VoltageCollapseOptions = None, store_curves=False, multi_thread=True,
+                 n_processes=None):
+        """
+        Options of the voltage collapse of many stress directions
+        :param vc_options: VoltageCollapseOptions used for every direction
+        :param store_curves: store the full curve (VoltageCollapseResults) of every direction? (memory intensive)
+        :param multi_thread: trace the directions in a pool of processes?
+        :param n_processes: number of processes (if None, the number of cores)
+        """
+        self.vc_options = VoltageCollapseOptions() if vc_options is None else vc_options
+
+        self.store_curves = store_curves
+
+        self.multi_thread = multi_thread
+
+        self.n_processes = n_processes
+
+
+class VoltageCollapseBatchInput:
+
+    def __init__(self, Sbase, Vbase, Starget, names=None):
+        """
+        VoltageCollapseBatchInput constructor
+        :param Sbase: Initial power array (nbus)
+        :param Vbase: Initial voltage array (nbus)
+        :param Starget: Final power matrix (directions, nbus): one stress direction per row
+        :param names: names of the directions (optional)
+        """
+        self.Sbase = Sbase
+
+        self.Vbase = Vbase
+
+        self.Starget = np.atleast_2d(Starget)
+
+        if names is None:
+            names = ['Direction ' + str(i) for i in range(self.Starget.shape[0])]
+        self.names = names
+
+
+class VoltageCollapseBatchResults:
+
+    def __init__(self, n_directions, names=None):
+        """
+        Results of the voltage collapse of many stress directions
+        :param n_directions: number of directions
+        :param names: names of the directions
+        """
+        self.names = names
+
+        # loading factor at the nose point of every direction
+        self.margins = np.zeros(n_directions)
+
+        self.converged = np.zeros(n_directions, dtype=bool)
+
+        # VoltageCollapseResults of every direction (only if the curves are stored)
+        self.curves = [None] * n_directions
+
+    def set_direction(self, idx, results):
+        """
+        Store the results of a direction
+        :param idx: direction index
+        :param results: VoltageCollapseResults instance
+        """
+        self.margins[idx] = results.margin
+        self.converged[idx] = results.converged
+        self.curves[idx] = results
+
+    def get_table(self):
+        """
+        Get the margins table
+        :return: DataFrame
+        """
+        return pd.DataFrame(data={'Margin': self.margins, 'Converged': self.converged},
+                            index=self.names,
+                            columns=['Margin', 'Converged'])
+
+
+def voltage_collapse_direction(islands, options: VoltageCollapseBatchOptions, Sbase, Vbase, Starget, nbus, nbr,
+                               linear_solvers=None):
+    """
+    Trace the voltage collapse curve of one stress direction
+    :param islands: list of CalculationInputs instances (the islands of the circuit)
+    :param options: VoltageCollapseBatchOptions instance
+    :param Sbase: Initial power array (nbus)
+    :param Vbase: Initial voltage array (nbus)
+    :param Starget: Final power array of the direction (nbus)
+    :param nbus: number of buses of the circuit
+    :param nbr: number of branches of the circuit
+    :param linear_solvers: list of ReusableSuperLU instances, one per island, shared by all the directions
+    :return: VoltageCollapseResults instance (only the margin and convergence if the curves are not stored)
+    """
+    results = voltage_collapse_islands(islands=islands,
+                                       options=options.vc_options,
+                                       Sbase=Sbase,
+                                       Vbase=Vbase,
+                                       Starget=Starget,
+                                       nbus=nbus,
+                                       nbr=nbr,
+                                       linear_solvers=linear_solvers)
+
+    if not options.store_curves:
+        results.voltages = None
+        results.lambdas = None
+        results.error = None
+
+    return results
+
+
+# per process data of the directions pool
+_worker_data = dict()
+
+
+def _init_voltage_collapse_worker(islands, options: VoltageCollapseBatchOptions, Sbase, Vbase, nbus, nbr):
+    """
+    Pool initializer: store the compiled islands once per process
+    """
+    _worker_data['islands'] = islands
+    _worker_data['options'] = options
+    _worker_data['Sbase'] = Sbase
+    _worker_data['Vbase'] = Vbase
+    _worker_data['nbus'] = nbus
+    _worker_data['nbr'] = nbr
+    _worker_data['linear_solvers'] = [ReusableSuperLU() for _ in islands]
+
+
+def voltage_collapse_worker(args):
+    """
+    Voltage collapse worker to schedule the directions in parallel
+    :param args: direction index, Final power array of the direction
+    :return: direction index, VoltageCollapseResults instance
+    """
+    idx, Starget = args
+    return idx, voltage_collapse_direction(islands=_worker_data['islands'],
+                                           options=_worker_data['options'],
+                                           Sbase=_worker_data['Sbase'],
+                                           Vbase=_worker_data['Vbase'],
+                                           Starget=Starget,
+                                           nbus=_worker_data['nbus'],
+                                           nbr=_worker_data['nbr'],
+                                           linear_solvers=_worker_data['linear_solvers'])
+
+
+class VoltageCollapseBatch(QThread):
+    progress_signal = Signal(float)
+    progress_text = Signal(str)
+    done_signal = Signal()
+
+    def __init__(self, circuit: MultiCircuit, options: VoltageCollapseBatchOptions, inputs: VoltageCollapseBatchInput):
+        """
+        Voltage collapse of many stress directions (per area, per corridor, per generator loss...).
+        The circuit is compiled and split in islands once, and all the directions are traced from that structure.
+        :param circuit: MultiCircuit instance
+        :param options: VoltageCollapseBatchOptions instance
+        :param inputs: VoltageCollapseBatchInput instance
+        """
+        QThread.__init__(self)
+
+        self.circuit = circuit
+
+        self.options = options
+
+        self.inputs = inputs
+
+        self.results = None
+
+        self.logger = Logger()
+
+        self.__cancel__ = False
+
+    def run_single_thread(self, islands, nbus, nbr):
+        """
+        Trace the directions one after the other
+        :param islands: list of CalculationInputs instances
+        :param nbus: number of buses
+        :param nbr: number of branches
+        """
+        n = self.inputs.Starget.shape[0]
+        linear_solvers = [ReusableSuperLU() for _ in islands]
+
+        for i in range(n):
+
+            if self.__cancel__:
+                break
+
+            res = voltage_collapse_direction(islands=islands,
+                                             options=self.options,
+                                             Sbase=self.inputs.Sbase,
+                                             Vbase=self.inputs.Vbase,
+                                             Starget=self.inputs.Starget[i, :],
+                                             nbus=nbus,
+                                             nbr=nbr,
+                                             linear_solvers=linear_solvers)
+            self.results.set_direction(i, res)
+
+            self.progress_signal.emit((i + 1) / n * 100.0)
+
+    def run_multi_thread(self, islands, nbus, nbr):
+        """
+        Trace the directions in a pool of processes; the islands are sent once to every process
+        :param islands: list of CalculationInputs instances
+        :param nbus: number of buses
+        :param nbr: number of branches
+        """
+        n = self.inputs.Starget.shape[0]
+
+        n_cores = multiprocessing.cpu_count() if self.options.n_processes is None else self.options.n_processes
+        self.progress_text.emit('Running the voltage collapse directions using ' + str(n_cores) + ' cores ...')
+
+        pool = multiprocessing.Pool(processes=n_cores,
+                                    initializer=_init_voltage_collapse_worker,
+                                    initargs=(islands, self.options, self.inputs.Sbase, self.inputs.Vbase, nbus, nbr))
+
+        chunk_size = max(1, n // (4 * n_cores))
+        tasks = ((i, self.inputs.Starget[i, :]) for i in range(n))
+        try:
+            for k, (i, res) in enumerate(pool.imap_unordered(voltage_collapse_worker, tasks, chunksize=chunk_size)):
+                self.results.set_direction(i, res)
+                self.progress_signal.emit((k + 1) / n * 100.0)
+
+                if self.__cancel__:
+                    pool.terminate()
+                    break
+        finally:
+            pool.close()
+            pool.join()
+
+    def run(self):
+        """
+        Run the voltage collapse of all the directions
+        """
+        self.__cancel__ = False
+
+        self.progress_signal.emit(0.0)
+        self.progress_text.emit('Running voltage collapse of many directions...')
+
+        nbus = len(self.circuit.buses)
+        nbr = len(self.circuit.branches)
+
+        # compile only once: all the directions share the islands
+        numerical_circuit = self.circuit.compile()
+        islands = numerical_circuit.compute()
+
+        self.results = VoltageCollapseBatchResults(n_directions=self.inputs.Starget.shape[0],
+                                                   names=self.inputs.names)
+
+        if self.options.multi_thread:
+            self.run_multi_thread(islands, nbus, nbr)
+        else:
+            self.run_single_thread(islands, nbus, nbr)
+
+        self.progress_signal.emit(0.0)
+        self.progress_text.emit('Done!')
+        self.done_signal.emit()
+
+    def cancel(self):
+        """
+        Cancel the simulation
+        """
+        self.__cancel__ = True
+        self.progress_signal.emit(0.0)
+        self.progress_text.emit('Cancelled!')
+        self.done_signal.emit()
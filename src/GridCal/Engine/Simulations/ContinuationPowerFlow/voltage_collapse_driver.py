@@ -22,7 +22,8 @@ from PySide2.QtCore import QThread, Signal
 
 from GridCal.Engine.Simulations.PowerFlow.power_flow_results import PowerFlowResults
 from GridCal.Engine.Simulations.result_types import ResultTypes
-from GridCal.Engine.Simulations.ContinuationPowerFlow.continuation_power_flow import continuation_nr, VCStopAt, VCParametrization
+from GridCal.Engine.Simulations.ContinuationPowerFlow.continuation_power_flow import continuation_nr, VCStopAt, \
+    VCParametrization, continuation_point_of_collapse
 from GridCal.Engine.Core.multi_circuit import MultiCircuit
 from GridCal.Engine.plot_config import LINEWIDTH
 from GridCal.Gui.GuiFunctions import ResultsModel
@@ -36,7 +37,8 @@ from GridCal.Gui.GuiFunctions import ResultsModel
 class VoltageCollapseOptions:
 
     def __init__(self, step=0.01, approximation_order=VCParametrization.Natural, adapt_step=True, step_min=0.0001,
-                 step_max=0.2, error_tol=1e-3, tol=1e-6, max_it=20, stop_at=VCStopAt.Nose, verbose=False):
+                 step_max=0.2, error_tol=1e-3, tol=1e-6, max_it=20, stop_at=VCStopAt.Nose, verbose=False,
+                 point_of_collapse=False, seed_steps=30):
         """
         Voltage collapse options
         @param step: Step length
@@ -49,6 +51,10 @@ class VoltageCollapseOptions:
         @param max_it: Maximum number of iterations
         @param stop_at: Value of lambda to stop at, it can be specified by a concept namely NOSE to sto at the edge or
         FULL tp draw the full curve
+        @param point_of_collapse: when stopping at the nose, compute it directly with the point of collapse method
+        seeded by a few coarse continuation steps, instead of tracing the curve up to it (if the method does not
+        converge, the curve is traced)
+        @param seed_steps: maximum number of coarse continuation steps that seed the point of collapse method
         """
 
         self.step = step
@@ -71,6 +77,10 @@ class VoltageCollapseOptions:
 
         self.verbose = verbose
 
+        self.point_of_collapse = point_of_collapse
+
+        self.seed_steps = seed_steps
+
 
 class VoltageCollapseInput:
 
@@ -105,6 +115,14 @@ class VoltageCollapseResults:
 
         self.converged = False
 
+        # loading factor at the nose point of the most stressed island
+        self.margin = 0.0
+
+        # critical eigenvector at the nose (angle and module components), only with the point of collapse method
+        self.critical_va = None
+
+        self.critical_vm = None
+
         self.Sbranch = np.zeros(nbr, dtype=complex)
 
         self.Ibranch = np.zeros(nbr, dtype=complex)
@@ -187,6 +205,13 @@ class VoltageCollapseResults:
                     # same number of lambda values, just copy where needed
                     self.voltages[:, bus_original_idx] = voltage_collapse_res.voltages
 
+            if voltage_collapse_res.critical_va is not None:
+                if self.critical_va is None:
+                    self.critical_va = np.zeros(nbus_full)
+                    self.critical_vm = np.zeros(nbus_full)
+                self.critical_va[bus_original_idx] = voltage_collapse_res.critical_va
+                self.critical_vm[bus_original_idx] = voltage_collapse_res.critical_vm
+
             # set the branch values
             self.Sbranch[branch_original_idx] = pf_res.Sbranch
             self.Ibranch[branch_original_idx] = pf_res.Ibranch
@@ -230,6 +255,111 @@ class VoltageCollapseResults:
             return mdl
 
 
+def voltage_collapse_islands(islands, options: VoltageCollapseOptions, Sbase, Vbase, Starget, nbus, nbr,
+                             call_back_fx=None, linear_solvers=None):
+    """
+    Run the continuation power flow of every island of a compiled circuit
+    :param islands: list of CalculationInputs instances (the islands of the circuit)
+    :param options: VoltageCollapseOptions instance
+    :param Sbase: Initial power array (nbus)
+    :param Vbase: Initial voltage array (nbus)
+    :param Starget: Final power array (nbus)
+    :param nbus: number of buses of the circuit
+    :param nbr: number of branches of the circuit
+    :param call_back_fx: Function to call on every iteration passing the lambda parameter
+    :param linear_solvers: list of ReusableSuperLU instances, one per island, to re-use the ordering of the augmented
+                           Jacobian between calls (if None, every continuation computes its own)
+    :return: VoltageCollapseResults instance
+    """
+    results = VoltageCollapseResults(nbus=nbus, nbr=nbr)
+    margins = list()
+    converged = list()
+
+    for i, numerical_island in enumerate(islands):
+
+        if len(numerical_island.ref) > 0:
+
+            success = False
+            v_critical = None
+            if options.point_of_collapse and options.stop_at == VCStopAt.Nose:
+                Voltage_series, Lambda_series, \
+                normF, success, v_critical = continuation_point_of_collapse(
+                    Ybus=numerical_island.Ybus,
+                    Ibus=numerical_island.Ibus,
+                    Sbus_base=Sbase[numerical_island.original_bus_idx],
+                    Sbus_target=Starget[numerical_island.original_bus_idx],
+                    V=Vbase[numerical_island.original_bus_idx],
+                    pv=numerical_island.pv,
+                    pq=numerical_island.pq,
+                    seed_steps=options.seed_steps,
+                    tol=options.tol,
+                    max_it=options.max_it,
+                    verbose=options.verbose,
+                    call_back_fx=call_back_fx)
+
+            if not success:
+                # trace the curve
+                Voltage_series, Lambda_series, \
+                normF, success = continuation_nr(Ybus=numerical_island.Ybus,
+                                                 Ibus_base=numerical_island.Ibus,
+                                                 Ibus_target=numerical_island.Ibus,
+                                                 Sbus_base=Sbase[numerical_island.original_bus_idx],
+                                                 Sbus_target=Starget[numerical_island.original_bus_idx],
+                                                 V=Vbase[numerical_island.original_bus_idx],
+                                                 pv=numerical_island.pv,
+                                                 pq=numerical_island.pq,
+                                                 step=options.step,
+                                                 approximation_order=options.approximation_order,
+                                                 adapt_step=options.adapt_step,
+                                                 step_min=options.step_min,
+                                                 step_max=options.step_max,
+                                                 error_tol=options.error_tol,
+                                                 tol=options.tol,
+                                                 max_it=options.max_it,
+                                                 stop_at=options.stop_at,
+                                                 verbose=False,
+                                                 call_back_fx=call_back_fx,
+                                                 linear_solver=None if linear_solvers is None else linear_solvers[i])
+
+            # nbus can be zero, because all the arrays are going to be overwritten
+            res = VoltageCollapseResults(nbus=numerical_island.nbus, nbr=numerical_island.nbr)
+            res.voltages = np.array(Voltage_series)
+            res.lambdas = np.array(Lambda_series)
+            res.error = normF
+            res.converged = bool(success)
+
+            if v_critical is not None:
+                pvpq = np.r_[numerical_island.pv, numerical_island.pq]
+                res.critical_va = np.zeros(numerical_island.nbus)
+                res.critical_vm = np.zeros(numerical_island.nbus)
+                res.critical_va[pvpq] = v_critical[:len(pvpq)]
+                res.critical_vm[numerical_island.pq] = v_critical[len(pvpq):]
+
+            converged.append(res.converged)
+            if len(Lambda_series) > 0:
+                margins.append(max(Lambda_series))
+        else:
+            res = VoltageCollapseResults(nbus=numerical_island.nbus, nbr=numerical_island.nbr)
+            res.voltages = np.array([[0] * numerical_island.nbus])
+            res.lambdas = np.array([[0] * numerical_island.nbus])
+            res.error = [0]
+            res.converged = True
+
+        if len(res.voltages) > 0:
+            # compute the island branch results
+            branch_res = numerical_island.compute_branch_results(res.voltages[-1])
+
+            results.apply_from_island(res, branch_res, numerical_island.original_bus_idx,
+                                      numerical_island.original_branch_idx, nbus)
+        else:
+            print('No voltage values!')
+
+    results.margin = min(margins) if len(margins) > 0 else 0.0
+    results.converged = all(converged)
+
+    return results
+
+
 class VoltageCollapse(QThread):
     progress_signal = Signal(float)
     progress_text = Signal(str)
@@ -281,61 +411,23 @@ class VoltageCollapse(QThread):
         print('Running voltage collapse...')
         nbus = len(self.circuit.buses)
         nbr = len(self.circuit.branches)
-        self.results = VoltageCollapseResults(nbus=nbus, nbr=nbr)
 
         # compile the numerical circuit
         numerical_circuit = self.circuit.compile()
         numerical_input_islands = numerical_circuit.compute()
 
-        self.results.bus_types = numerical_circuit.bus_types
-
-        for nc, numerical_island in enumerate(numerical_input_islands):
+        self.progress_text.emit('Running voltage collapse...')
+        self.results = voltage_collapse_islands(islands=numerical_input_islands,
+                                                options=self.options,
+                                                Sbase=self.inputs.Sbase,
+                                                Vbase=self.inputs.Vbase,
+                                                Starget=self.inputs.Starget,
+                                                nbus=nbus,
+                                                nbr=nbr,
+                                                call_back_fx=self.progress_callback)
 
-            self.progress_text.emit('Running voltage collapse at circuit ' + str(nc) + '...')
+        self.results.bus_types = numerical_circuit.bus_types
 
-            if len(numerical_island.ref) > 0:
-                Voltage_series, Lambda_series, \
-                normF, success = continuation_nr(Ybus=numerical_island.Ybus,
-                                                 Ibus_base=numerical_island.Ibus,
-                                                 Ibus_target=numerical_island.Ibus,
-                                                 Sbus_base=self.inputs.Sbase[numerical_island.original_bus_idx],
-                                                 Sbus_target=self.inputs.Starget[numerical_island.original_bus_idx],
-                                                 V=self.inputs.Vbase[numerical_island.original_bus_idx],
-                                                 pv=numerical_island.pv,
-                                                 pq=numerical_island.pq,
-                                                 step=self.options.step,
-                                                 approximation_order=self.options.approximation_order,
-                                                 adapt_step=self.options.adapt_step,
-                                                 step_min=self.options.step_min,
-                                                 step_max=self.options.step_max,
-                                                 error_tol=self.options.error_tol,
-                                                 tol=self.options.tol,
-                                                 max_it=self.options.max_it,
-                                                 stop_at=self.options.stop_at,
-                                                 verbose=False,
-                                                 call_back_fx=self.progress_callback)
-
-                # nbus can be zero, because all the arrays are going to be overwritten
-                res = VoltageCollapseResults(nbus=numerical_island.nbus, nbr=numerical_island.nbr)
-                res.voltages = np.array(Voltage_series)
-                res.lambdas = np.array(Lambda_series)
-                res.error = normF
-                res.converged = bool(success)
-            else:
-                res = VoltageCollapseResults(nbus=numerical_island.nbus, nbr=numerical_island.nbr)
-                res.voltages = np.array([[0] * numerical_island.nbus])
-                res.lambdas = np.array([[0] * numerical_island.nbus])
-                res.error = [0]
-                res.converged = True
-
-            if len(res.voltages) > 0:
-                # compute the island branch results
-                branch_res = numerical_island.compute_branch_results(res.voltages[-1])
-
-                self.results.apply_from_island(res, branch_res, numerical_island.original_bus_idx,
-                                               numerical_island.original_branch_idx, nbus)
-            else:
-                print('No voltage values!')
         print('done!')
         self.progress_text.emit('Done!')
         self.done_signal.emit()
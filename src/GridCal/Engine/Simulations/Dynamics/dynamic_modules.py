@@ -22,22 +22,14 @@ from enum import Enum
 from warnings import warn
 from matplotlib import pyplot as plt
 
+from GridCal.Engine.Devices.types import DynamicModels
+
 
 class DiffEqSolver(Enum):
     EULER = 1,
     RUNGE_KUTTA = 2
 
 
-class DynamicModels(Enum):
-    NoModel = 0,
-    SynchronousGeneratorOrder4 = 1,  # fourth order synchronous machine
-    SynchronousGeneratorOrder6 = 2,  # sixth order synchronous machine
-    VoltageSourceConverter = 3,  # voltage source converter
-    ExternalGrid = 4,  # external grid
-    AsynchronousSingleCageMotor = 5,  # single cage asynchronous motor
-    AsynchronousDoubleCageMotor = 6  # double cage asynchronous motor
-
-
 class TransientStabilityEvents:
 
     def __init__(self):
@@ -87,7 +79,23 @@ class TransientStabilityResults:
 
         self.time = None
 
-        self.available_results = ['Bus voltage']
+        # summary indices
+        self.stable = True
+
+        self.stop_time = 0.0
+
+        self.max_angle_spread = 0.0
+
+        self.max_speed_deviation = 0.0
+
+        self.min_voltage = 1.0
+
+        self.factorizations = 0
+
+        # number of integration steps that did not converge to max_err
+        self.non_converged_steps = 0
+
+        self.available_results = ['Bus voltage', 'Machine speed']
 
     def plot(self, result_type, ax=None, indices=None, names=None, LINEWIDTH=2):
         """
@@ -115,6 +123,12 @@ class TransientStabilityResults:
                 y_label = '(p.u.)'
                 title = 'Bus voltage module'
 
+            elif result_type == 'Machine speed':
+
+                y = self.omega[:, indices]
+                y_label = '(p.u.)'
+                title = 'Machine speed'
+
             else:
                 pass
 
@@ -285,27 +299,44 @@ class SynchronousMachineOrder4:
         # Initialise the rest
         self.Vt = np.abs(vt0)
         self.Pm = self.P
-        self.omega = 1
+        self.omega = np.ones_like(self.Vt)
 
         self.check_diffs()
 
-    def calc_currents(self, Vbus, Ibus):
+    def get_states(self):
         """
-        Calculate machine current injections (in network reference frame)
-        :param vt: complex initial voltage
-        :return:
+        Get the state variables
+        :return: array (4, number of machines) with Eqp, Edp, omega and delta
         """
+        return np.array([self.Eqp, self.Edp, self.omega, self.delta], dtype=float).reshape(4, -1)
 
-        vt = Vbus[self.bus_idx]
+    def set_states(self, x):
+        """
+        Set the state variables
+        :param x: array (4, number of machines) with Eqp, Edp, omega and delta
+        """
+        self.Eqp, self.Edp, self.omega, self.delta = x[0].copy(), x[1].copy(), x[2].copy(), x[3].copy()
+
+    def derivatives(self):
+        """
+        Derivatives of the state variables with the algebraic variables of the last calc_currents
+        :return: array (4, number of machines)
+        """
+        return np.array(self.function(1.0, self.Eqp, self.Edp, self.omega), dtype=float).reshape(4, -1)
+
+    def calc_currents(self, vt):
+        """
+        Calculate machine current injections (in network reference frame)
+        :param vt: complex voltage at the machines buses
+        :return: current injections
+        """
 
         # Calculate terminal voltage in dq reference frame
         self.Vd = np.abs(vt) * np.sin(self.delta - np.angle(vt))
         self.Vq = np.abs(vt) * np.cos(self.delta - np.angle(vt))
 
         # Check if speed-voltage term should be included
-        k = np.where(self.speed_volt == False)[0]
-        omega = self.omega
-        omega[k] = np.ones_like(k)
+        omega = np.where(self.speed_volt, self.omega, 1.0)
 
         # Calculate Id and Iq (Norton equivalent current injection in dq frame)
         self.Id = (self.Eqp - self.Ra / (self.Xqp * omega) * (self.Vd - self.Edp) - self.Vq / omega) / (self.Xdp + self.Ra ** 2 / (omega * omega * self.Xqp))
@@ -322,8 +353,7 @@ class SynchronousMachineOrder4:
         self.Vt = np.abs(vt)
         self.Vang = np.angle(vt)
 
-        # apply th currents to the passed vector
-        Ibus[self.bus_idx] = self.Im
+        return self.Im
 
     def check_diffs(self):
         """
@@ -462,10 +492,10 @@ class SynchronousMachineOrder6SauerPai:
 
     def get_yg(self):
         """
-        Get the generator admittance
+        Get the generator admittance (the subtransient one, used by the current injections)
         :return: shunt admittance
         """
-        return (self.Ra - 1j * 0.5 * (self.Xdp + self.Xqp)) / (self.Ra ** 2.0 + (self.Xdp * self.Xqp))
+        return self.Yg
 
     def initialise(self, vt0, S0):
         """
@@ -500,13 +530,35 @@ class SynchronousMachineOrder6SauerPai:
 
         # Initialise signals, states and parameters
         self.Vt = np.abs(vt0)
-        self.Vang = 0
+        self.Vang = np.angle(vt0)
         self.Pm = self.P
         self.Tm = self.P
-        self.omega = 1
+        self.omega = np.ones_like(self.Vt)
 
         self.check_diffs()
 
+    def get_states(self):
+        """
+        Get the state variables
+        :return: array (6, number of machines) with Eqp, Edp, phid_pp, phiq_pp, omega and delta
+        """
+        return np.array([self.Eqp, self.Edp, self.phid_pp, self.phiq_pp, self.omega, self.delta],
+                        dtype=float).reshape(6, -1)
+
+    def set_states(self, x):
+        """
+        Set the state variables
+        :param x: array (6, number of machines) with Eqp, Edp, phid_pp, phiq_pp, omega and delta
+        """
+        self.Eqp, self.Edp, self.phid_pp, self.phiq_pp, self.omega, self.delta = [x[i].copy() for i in range(6)]
+
+    def derivatives(self):
+        """
+        Derivatives of the state variables with the algebraic variables of the last calc_currents
+        :return: array (6, number of machines)
+        """
+        return np.array(self.function(self.Eqp, self.Edp, self.omega), dtype=float).reshape(6, -1)
+
     def check_diffs(self):
         """
         Check if differential equations are zero (on initialisation)
@@ -537,10 +589,7 @@ class SynchronousMachineOrder6SauerPai:
         self.Vq = np.abs(vt) * np.cos(self.delta - np.angle(vt))
 
         # Check if speed-voltage term should be included
-        if self.speed_volt:
-            omega = self.omega
-        else:
-            omega = 1
+        omega = np.where(self.speed_volt, self.omega, 1.0)
 
         # Calculate Id and Iq (Norton equivalent current injection in dq frame)
         self.Id = (-self.Vq / omega + self.gamma_d1 * self.Eqp + (1 - self.gamma_d1) * self.phid_pp
@@ -660,7 +709,28 @@ class VoltageSourceConverterAverage:
         self.Vt = np.abs(vt0)
         self.Ed = np.real(self.Edq)
         self.Eq = np.imag(self.Edq)
-        self.omega = 1.0
+        self.omega = np.ones_like(self.Vt)
+
+    def get_states(self):
+        """
+        Get the state variables (this model has none)
+        :return: array (0, number of converters)
+        """
+        return np.zeros((0, len(self.bus_idx)))
+
+    def set_states(self, x):
+        """
+        Set the state variables (this model has none)
+        :param x: array (0, number of converters)
+        """
+        pass
+
+    def derivatives(self):
+        """
+        Derivatives of the state variables (this model has none)
+        :return: array (0, number of converters)
+        """
+        return np.zeros((0, len(self.bus_idx)))
 
     def calc_currents(self, vt):
         """
@@ -741,9 +811,31 @@ class ExternalGrid:
         self.P = p0
         self.Pm = p0
         self.Eq = np.abs(Eq0)
-        self.omega = 1
+        self.omega = np.ones_like(self.Vt)
         self.delta = delta0
 
+    def get_states(self):
+        """
+        Get the state variables
+        :return: array (2, number of grids) with omega and delta
+        """
+        return np.array([self.omega, self.delta], dtype=float).reshape(2, -1)
+
+    def set_states(self, x):
+        """
+        Set the state variables
+        :param x: array (2, number of grids) with omega and delta
+        """
+        self.omega, self.delta = x[0].copy(), x[1].copy()
+
+    def derivatives(self):
+        """
+        Derivatives of the state variables with the algebraic variables of the last calc_currents
+        :return: array (2, number of grids)
+        """
+        f1, f2, _, _ = self.function(self.Eq, self.Eq, self.omega)
+        return np.array([f1, f2], dtype=float).reshape(2, -1)
+
     def get_yg(self):
         """
         Return the shunt admittance
@@ -863,22 +955,44 @@ class SingleCageAsynchronousMotor:
         """
      
         # Initialise signals, states and parameters
-        self.Id = 0
-        self.Iq = 0
-        self.Vd = 0
-        self.Vq = 0
         self.Vt = np.abs(vt0)
-        self.P = 0
-        self.Q = 0
-        self.Te = 0
-        self.omega = 1 - 0
-
-        self.slip = 1
-        self.Eqp = 0
-        self.Edp = 0
+        self.Id = np.zeros_like(self.Vt)
+        self.Iq = np.zeros_like(self.Vt)
+        self.Vd = np.zeros_like(self.Vt)
+        self.Vq = np.zeros_like(self.Vt)
+        self.P = np.zeros_like(self.Vt)
+        self.Q = np.zeros_like(self.Vt)
+        self.Te = np.zeros_like(self.Vt)
+
+        self.slip = np.ones_like(self.Vt)
+        self.omega = 1 - self.slip
+        self.Eqp = np.zeros_like(self.Vt)
+        self.Edp = np.zeros_like(self.Vt)
 
         self.check_diffs()
 
+    def get_states(self):
+        """
+        Get the state variables
+        :return: array (3, number of motors) with Eqp, Edp and the slip
+        """
+        return np.array([self.Eqp, self.Edp, self.slip], dtype=float).reshape(3, -1)
+
+    def set_states(self, x):
+        """
+        Set the state variables
+        :param x: array (3, number of motors) with Eqp, Edp and the slip
+        """
+        self.Eqp, self.Edp, self.slip = x[0].copy(), x[1].copy(), x[2].copy()
+        self.omega = 1 - self.slip
+
+    def derivatives(self):
+        """
+        Derivatives of the state variables with the algebraic variables of the last calc_currents
+        :return: array (3, number of motors)
+        """
+        return np.array(self.function(self.Edp, self.Eqp), dtype=float).reshape(3, -1)
+
     def calc_tmech(self, s):
         """
         Calculate mechanical load torque (with a quadratic load model)
@@ -911,7 +1025,7 @@ class SingleCageAsynchronousMotor:
 
             # Calculate machine current injection (Norton equivalent current injection in network frame)
             self.In = (self.Id + 1j * self.Iq) * np.exp(1j * (-np.pi / 2))
-            self.Im = -self.In  # + self.Ym * vt
+            self.Im = -self.In + self.get_yg() * vt
 
             # Update signals
             self.Vt = np.abs(vt)
@@ -919,7 +1033,8 @@ class SingleCageAsynchronousMotor:
             self.omega = 1 - self.slip
 
         else:
-            self.Im = 0
+            # the motor is not connected: compensate its admittance in the network
+            self.Im = self.get_yg() * vt
 
         return self.Im
 
@@ -1037,24 +1152,46 @@ class DoubleCageAsynchronousMotor:
         """
 
         # Initialise signals, states and parameters
-        self.Id = 0
-        self.Iq = 0
-        self.Vd = 0
-        self.Vq = 0
         self.Vt = np.abs(vt0)
-        self.P = 0
-        self.Q = 0
-        self.Te = 0
-        self.slip = 1
+        self.Id = np.zeros_like(self.Vt)
+        self.Iq = np.zeros_like(self.Vt)
+        self.Vd = np.zeros_like(self.Vt)
+        self.Vq = np.zeros_like(self.Vt)
+        self.P = np.zeros_like(self.Vt)
+        self.Q = np.zeros_like(self.Vt)
+        self.Te = np.zeros_like(self.Vt)
+        self.slip = np.ones_like(self.Vt)
         self.omega = 1 - self.slip
-        
-        self.Eqp = 0
-        self.Edp = 0
-        self.Eqpp = 0
-        self.Edpp = 0
+
+        self.Eqp = np.zeros_like(self.Vt)
+        self.Edp = np.zeros_like(self.Vt)
+        self.Eqpp = np.zeros_like(self.Vt)
+        self.Edpp = np.zeros_like(self.Vt)
 
         self.check_diffs()
 
+    def get_states(self):
+        """
+        Get the state variables
+        :return: array (5, number of motors) with Eqp, Edp, Eqpp, Edpp and the slip
+        """
+        return np.array([self.Eqp, self.Edp, self.Eqpp, self.Edpp, self.slip], dtype=float).reshape(5, -1)
+
+    def set_states(self, x):
+        """
+        Set the state variables
+        :param x: array (5, number of motors) with Eqp, Edp, Eqpp, Edpp and the slip
+        """
+        self.Eqp, self.Edp, self.Eqpp, self.Edpp, self.slip = [x[i].copy() for i in range(5)]
+        self.omega = 1 - self.slip
+
+    def derivatives(self):
+        """
+        Derivatives of the state variables with the algebraic variables of the last calc_currents
+        :return: array (5, number of motors)
+        """
+        return np.array(self.solve_step(self.Edp, self.Eqp, self.Edpp, self.Eqpp), dtype=float).reshape(5, -1)
+
     def calc_tmech(self, s):
         """
         Calculate mechanical load torque (with a quadratic load model)
@@ -1085,7 +1222,7 @@ class DoubleCageAsynchronousMotor:
 
             # Calculate machine current injection (Norton equivalent current injection in network frame)
             self.In = (self.Id + 1j * self.Iq) * np.exp(1j * (-np.pi / 2))
-            self.Im = -self.In  # + self.Ym * vt
+            self.Im = -self.In + self.get_yg() * vt
 
             # Update signals
             self.Vt = np.abs(vt)
@@ -1093,7 +1230,8 @@ class DoubleCageAsynchronousMotor:
             self.omega = 1 - self.slip
 
         else:
-            self.Im = 0
+            # the motor is not connected: compensate its admittance in the network
+            self.Im = self.get_yg() * vt
 
         return self.Im
 
@@ -1164,299 +1302,490 @@ class DoubleCageAsynchronousMotor:
             print('dEdp = ' + str(dEdp) + ', dEqp = ' + str(dEqp) + ', ds = ' + str(ds))
 
 
-def dynamic_simulation(n, Vbus, Sbus, Ybus, Sbase, fBase, t_sim, h, dynamic_devices=list(), bus_indices=list(),
-                       callback=None):
+# parameters of every dynamic model, as they are read from the dynamic devices
+MODEL_PARAMETERS = {
+    DynamicModels.SynchronousGeneratorOrder4: ['H', 'Ra', 'Xd', 'Xdp', 'Xdpp', 'Xq', 'Xqp', 'Xqpp', 'Td0p', 'Tq0p',
+                                               'Snom', 'speed_volt'],
+    DynamicModels.SynchronousGeneratorOrder6: ['H', 'Ra', 'Xa', 'Xd', 'Xdp', 'Xdpp', 'Xq', 'Xqp', 'Xqpp', 'Td0p',
+                                               'Tq0p', 'Td0pp', 'Tq0pp', 'Snom', 'speed_volt'],
+    DynamicModels.VoltageSourceConverter: ['R1', 'X1'],
+    DynamicModels.ExternalGrid: ['Xdp', 'H'],
+    DynamicModels.AsynchronousSingleCageMotor: ['H', 'Rr', 'Xr', 'Rs', 'Xs', 'a', 'Xm', 'MVA_Rating'],
+    DynamicModels.AsynchronousDoubleCageMotor: ['H', 'Rr', 'Xr', 'Rs', 'Xs', 'a', 'Xm', 'Rr2', 'Xr2', 'MVA_Rating']
+}
+
+
+def get_model_parameters(dynamic_devices, model: DynamicModels):
     """
-    Dynamic transient simulation of a power system
-    Args:
-        n: number of nodes
-        Vbus:
-        Ybus:
-        Sbase:
-        fBase: base frequency i.e. 50Hz
-        t_sim:
-        h:
-        dynamic_devices: objects of each machine
-        bus_indices:
+    Collect the parameters of the devices of a model into arrays
+    :param dynamic_devices: list of dynamic devices
+    :param model: DynamicModels value
+    :return: indices of the devices of the model, dictionary parameter name -> array
+    """
+    idx = np.array([k for k, elm in enumerate(dynamic_devices) if elm.machine_model == model], dtype=int)
+    params = dict()
+    for name in MODEL_PARAMETERS[model]:
+        params[name] = np.array([getattr(dynamic_devices[k], name) for k in idx],
+                                dtype=bool if name == 'speed_volt' else float)
+    return idx, params
 
-    Returns:
 
+def build_dynamic_models(dynamic_devices, bus_indices, Sbase, fBase):
     """
-    max_err = 1e-3
-    max_iter = 20
-
-    # compose dynamic controllers
-    '''
-    class DynamicModels(Enum):
-    NoModel = 0,
-    SM4 = 1,
-    SM6b = 2,
-    VSC = 3,
-    EG = 4,
-    SAM = 5,
-    DAM = 6  
-    '''
-    sm4_idx = list()
-    sm6b_idx = list()
-    vsc_idx = list()
-    eg_idx = list()
-    sam_idx = list()
-    dam_idx = list()
-
-    sm4_bus_idx = list()
-    sm6b_bus_idx = list()
-    vsc_bus_idx = list()
-    eg_bus_idx = list()
-    sam_bus_idx = list()
-    dam_bus_idx = list()
-
-    n_obj = len(dynamic_devices)
-    H = np.zeros(n_obj)
-    a = np.zeros(n_obj)
-    Xm = np.zeros(n_obj)
-    Ra = np.zeros(n_obj)
-    Rs = np.zeros(n_obj)
-    Xs = np.zeros(n_obj)
-    Xd = np.zeros(n_obj)
-    Xa = np.zeros(n_obj)
-    Xdp = np.zeros(n_obj)
-    Xdpp = np.zeros(n_obj)
-    Xq = np.zeros(n_obj)
-    Xqp = np.zeros(n_obj)
-    Xqpp = np.zeros(n_obj)
-    Td0p = np.zeros(n_obj)
-    Tq0p = np.zeros(n_obj)
-    Td0pp = np.zeros(n_obj)
-    Tq0pp = np.zeros(n_obj)
-    base_mva = np.zeros(n_obj)
-
-    Rr = np.zeros(n_obj)
-    Rr2 = np.zeros(n_obj)
-    Xr = np.zeros(n_obj)
-    Xr2 = np.zeros(n_obj)
-    speed_volt = np.zeros(n_obj, dtype=bool)
-
-    machine_types = [None] * n_obj
-
-    # extract the parameters from the objects into the arrays
-    for k, machine in enumerate(dynamic_devices):
-
-        # store the machine model in a list for later
-        machine_types[k] = machine.machine_model
-
-        # store the machine data into the representing vector
-        if machine.machine_model == DynamicModels.NoModel:  # no model
-            pass
-
-        elif machine.machine_model == DynamicModels.SynchronousGeneratorOrder4:  # fourth order synchronous machine
-
-            H[k] = dynamic_devices[k].H
-            Ra[k] = dynamic_devices[k].Ra
-            Xd[k] = dynamic_devices[k].Xd
-            Xa[k] = dynamic_devices[k].Xa
-            Xdp[k] = dynamic_devices[k].Xdp
-            Xdpp[k] = dynamic_devices[k].Xdpp
-            Xq[k] = dynamic_devices[k].Xq
-            Xqp[k] = dynamic_devices[k].Xqp
-            Xqpp[k] = dynamic_devices[k].Xqpp
-            Td0p[k] = dynamic_devices[k].Td0p
-            Tq0p[k] = dynamic_devices[k].Tq0p
-            base_mva[k] = dynamic_devices[k].Snom
-            speed_volt[k] = dynamic_devices[k].speed_volt
-            sm4_idx.append(k)
-            sm4_bus_idx.append(bus_indices[k])
-
-        elif machine.machine_model == DynamicModels.SynchronousGeneratorOrder6:  # sixth order synchronous machine
-
-            H[k] = dynamic_devices[k].H
-            Ra[k] = dynamic_devices[k].Ra
-            Xd[k] = dynamic_devices[k].Xd
-            Xdp[k] = dynamic_devices[k].Xdp
-            Xdpp[k] = dynamic_devices[k].Xdpp
-            Xq[k] = dynamic_devices[k].Xq
-            Xqp[k] = dynamic_devices[k].Xqp
-            Xqpp[k] = dynamic_devices[k].Xqpp
-            Td0p[k] = dynamic_devices[k].Td0p
-            Tq0p[k] = dynamic_devices[k].Tq0p
-            Td0pp[k] = dynamic_devices[k].Td0pp
-            Tq0pp[k] = dynamic_devices[k].Tq0pp
-            base_mva[k] = dynamic_devices[k].Snom
-            speed_volt[k] = dynamic_devices[k].speed_volt
-            sm6b_idx.append(k)
-            sm6b_bus_idx.append(bus_indices[k])
-
-        elif machine.machine_model == DynamicModels.VoltageSourceConverter:  # voltage source converter
-
-            # R1, X1, fn
-            Ra[k] = dynamic_devices[k].R1
-            Xd[k] = dynamic_devices[k].X1
-            vsc_idx.append(k)
-            vsc_bus_idx.append(bus_indices[k])
-
-        elif machine.machine_model == DynamicModels.ExternalGrid:  # external grid
-            # Xdp, H
-            H[k] = dynamic_devices[k].H
-            Xdp[k] = dynamic_devices[k].Xdp
-            eg_idx.append(k)
-            eg_bus_idx.append(bus_indices[k])
-
-        elif machine.machine_model == DynamicModels.AsynchronousSingleCageMotor:  # single cage asynchronous motor
-            # H, Rr, Xr, Rs, Xs, a, Xm, Sbase, MVA_Rating
-            H[k] = dynamic_devices[k].H
-            Rr[k] = dynamic_devices[k].Rr
-            Xr[k] = dynamic_devices[k].Xr
-            Rs[k] = dynamic_devices[k].Rs
-            Xs[k] = dynamic_devices[k].Xs
-            Xq[k] = dynamic_devices[k].Xq
-            a[k] = dynamic_devices[k].a
-            Xm[k] = dynamic_devices[k].Xm
-            base_mva[k] = dynamic_devices[k].MVA_Rating
-            sam_idx.append(k)
-            sam_bus_idx.append(bus_indices[k])
-
-        elif machine.machine_model == DynamicModels.AsynchronousDoubleCageMotor:  # double cage asynchronous motor
-            # H, Rr, Xr, Rs, Xs, a, Xm, Rr2, Xr2, MVA_Rating, Sbase
-            H[k] = dynamic_devices[k].H
-            Rr[k] = dynamic_devices[k].Rr
-            Xr[k] = dynamic_devices[k].Xr
-            Rs[k] = dynamic_devices[k].Rs
-            Xs[k] = dynamic_devices[k].Xs
-            Rr2[k] = dynamic_devices[k].Rr2
-            Xr2[k] = dynamic_devices[k].Xr2
-            a[k] = dynamic_devices[k].a
-            Xm[k] = dynamic_devices[k].Xm
-            base_mva[k] = dynamic_devices[k].MVA_Rating
-            dam_idx.append(k)
-            dam_bus_idx.append(bus_indices[k])
-
-    # create the controllers
-    sm4 = SynchronousMachineOrder4(H=H[sm4_idx],
-                                   Ra=Ra[sm4_idx],
-                                   Xd=Xd[sm4_idx],
-                                   Xdp=Xdp[sm4_idx],
-                                   Xdpp=Xdpp[sm4_idx],
-                                   Xq=Xq[sm4_idx],
-                                   Xqp=Xqp[sm4_idx],
-                                   Xqpp=Xqp[sm4_idx],
-                                   Td0p=Td0p[sm4_idx],
-                                   Tq0p=Tq0p[sm4_idx],
-                                   base_mva=base_mva[sm4_idx],
-                                   Sbase=Sbase,
-                                   bus_idx=sm4_bus_idx,
-                                   fn=fBase,
-                                   speed_volt=speed_volt[sm4_idx])
-
-    sm6 = SynchronousMachineOrder6SauerPai(H=H[sm6b_idx],
-                                           Ra=Ra[sm6b_idx],
-                                           Xa=Xa[sm6b_idx],
-                                           Xd=Xd[sm6b_idx],
-                                           Xdp=Xdp[sm6b_idx],
-                                           Xdpp=Xdpp[sm6b_idx],
-                                           Xq=Xq[sm6b_idx],
-                                           Xqp=Xqp[sm6b_idx],
-                                           Xqpp=Xqpp[sm6b_idx],
-                                           Td0p=Td0p[sm6b_idx],
-                                           Tq0p=Tq0p[sm6b_idx],
-                                           Td0pp=Td0pp[sm6b_idx],
-                                           Tq0pp=Tq0pp[sm6b_idx],
-                                           base_mva=base_mva[sm6b_idx],
-                                           Sbase=Sbase,
-                                           bus_idx=sm6b_bus_idx,
-                                           fn=fBase,
-                                           speed_volt=speed_volt[sm6b_idx])
-
-    vsc = VoltageSourceConverterAverage(Rl=Ra[vsc_idx], Xl=Xd[vsc_idx], fn=fBase, bus_idx=vsc_bus_idx)
-
-    exg = ExternalGrid(Xdp=Xdp[eg_idx], H=H[eg_idx], fn=fBase, bus_idx=eg_bus_idx)
-
-    sam = SingleCageAsynchronousMotor(H=H[sam_idx],
-                                      Rr=Rr[sam_idx],
-                                      Xr=Xr[sam_idx],
-                                      Rs=Rs[sam_idx],
-                                      Xs=Xs[sam_idx],
-                                      a=a[sam_idx],
-                                      Xm=Xm[sam_idx],
-                                      MVA_Rating=base_mva[sam_idx],
-                                      Sbase=Sbase,
-                                      bus_idx=sam_bus_idx,
-                                      fn=fBase)
-
-    dam = DoubleCageAsynchronousMotor(H=H[dam_idx],
-                                      Rr=Rr[dam_idx],
-                                      Xr=Xr[dam_idx],
-                                      Rs=Rs[dam_idx],
-                                      Xs=Xs[dam_idx],
-                                      a=a[dam_idx],
-                                      Xm=Xm[dam_idx],
-                                      Rr2=Rr2[dam_idx],
-                                      Xr2=Xr2[dam_idx],
-                                      MVA_Rating=base_mva[dam_idx],
-                                      Sbase=Sbase,
-                                      bus_idx=dam_bus_idx,
-                                      fn=fBase)
-
-    # modify Ybus to add the admittances
+    Build one vectorised model object per machine model
+    :param dynamic_devices: list of dynamic devices (they have the machine_model attribute and its parameters)
+    :param bus_indices: bus index of every device
+    :param Sbase: system base power
+    :param fBase: base frequency
+    :return: list of (indices of the devices, model object)
+    """
+    bus_indices = np.array(bus_indices, dtype=int)
+    models = list()
 
-    Y_shunt = np.zeros(n, dtype=complex)
-    load_idx = np.where(Sbus > 0)[0]
-    Y_shunt[load_idx] = Sbus[load_idx] / np.power(Vbus[load_idx], 2)  # add loads as admittances
+    idx, p = get_model_parameters(dynamic_devices, DynamicModels.SynchronousGeneratorOrder4)
+    models.append((idx, SynchronousMachineOrder4(H=p['H'], Ra=p['Ra'], Xd=p['Xd'], Xdp=p['Xdp'], Xdpp=p['Xdpp'],
+                                                 Xq=p['Xq'], Xqp=p['Xqp'], Xqpp=p['Xqpp'], Td0p=p['Td0p'],
+                                                 Tq0p=p['Tq0p'], base_mva=p['Snom'], Sbase=Sbase,
+                                                 bus_idx=bus_indices[idx], fn=fBase, speed_volt=p['speed_volt'])))
 
-    Y_shunt[sm4.bus_idx] += sm4.get_yg()
-    Y_shunt[sm6.bus_idx] += sm6.get_yg()
-    Y_shunt[vsc.bus_idx] += vsc.get_yg()
-    Y_shunt[exg.bus_idx] += exg.get_yg()
-    Y_shunt[sam.bus_idx] += sam.get_yg()
-    Y_shunt[dam.bus_idx] += dam.get_yg()
+    idx, p = get_model_parameters(dynamic_devices, DynamicModels.SynchronousGeneratorOrder6)
+    models.append((idx, SynchronousMachineOrder6SauerPai(H=p['H'], Ra=p['Ra'], Xa=p['Xa'], Xd=p['Xd'], Xdp=p['Xdp'],
+                                                         Xdpp=p['Xdpp'], Xq=p['Xq'], Xqp=p['Xqp'], Xqpp=p['Xqpp'],
+                                                         Td0p=p['Td0p'], Tq0p=p['Tq0p'], Td0pp=p['Td0pp'],
+                                                         Tq0pp=p['Tq0pp'], base_mva=p['Snom'], Sbase=Sbase,
+                                                         bus_idx=bus_indices[idx], fn=fBase,
+                                                         speed_volt=p['speed_volt'])))
 
-    ib = range(n)
-    Ydiag = sparse((Y_shunt, (ib, ib)))
+    idx, p = get_model_parameters(dynamic_devices, DynamicModels.VoltageSourceConverter)
+    models.append((idx, VoltageSourceConverterAverage(Rl=p['R1'], Xl=p['X1'], fn=fBase, bus_idx=bus_indices[idx])))
 
-    # factorize the impedance matrix
-    Zbus = splu(Ybus + Ydiag)
+    idx, p = get_model_parameters(dynamic_devices, DynamicModels.ExternalGrid)
+    models.append((idx, ExternalGrid(Xdp=p['Xdp'], H=p['H'], fn=fBase, bus_idx=bus_indices[idx])))
 
-    # copy the initial voltage
-    V = Vbus.copy()
-    I = np.zeros(n, dtype=complex)
+    idx, p = get_model_parameters(dynamic_devices, DynamicModels.AsynchronousSingleCageMotor)
+    models.append((idx, SingleCageAsynchronousMotor(H=p['H'], Rr=p['Rr'], Xr=p['Xr'], Rs=p['Rs'], Xs=p['Xs'],
+                                                    a=p['a'], Xm=p['Xm'], MVA_Rating=p['MVA_Rating'], Sbase=Sbase,
+                                                    bus_idx=bus_indices[idx], fn=fBase)))
 
-    # initialize machines
-    sm4.initialise(vt0=Vbus[sm4_bus_idx], S0=Sbus[sm4_bus_idx])
-    sm6.initialise(vt0=Vbus[sm6b_bus_idx], S0=Sbus[sm6b_bus_idx])
-    vsc.initialise(vt0=Vbus[vsc_bus_idx], S0=Sbus[vsc_bus_idx])
-    exg.initialise(vt0=Vbus[eg_bus_idx], S0=Sbus[eg_bus_idx])
-    sam.initialise(vt0=Vbus[sam_bus_idx], S0=Sbus[sam_bus_idx])
-    dam.initialise(vt0=Vbus[dam_bus_idx], S0=Sbus[dam_bus_idx])
+    idx, p = get_model_parameters(dynamic_devices, DynamicModels.AsynchronousDoubleCageMotor)
+    models.append((idx, DoubleCageAsynchronousMotor(H=p['H'], Rr=p['Rr'], Xr=p['Xr'], Rs=p['Rs'], Xs=p['Xs'],
+                                                    a=p['a'], Xm=p['Xm'], Rr2=p['Rr2'], Xr2=p['Xr2'],
+                                                    MVA_Rating=p['MVA_Rating'], Sbase=Sbase,
+                                                    bus_idx=bus_indices[idx], fn=fBase)))
 
-    voltages = list()
-    omegas = list()
+    # only keep the models that have devices
+    return [(idx, model) for idx, model in models if len(idx) > 0]
 
-    # iterate
-    t = 0.0
-    time = list()
-    while t < t_sim:
 
-        sm4.solve(h)
+class DynamicNetwork:
+
+    def __init__(self, Ybus, Yshunt, Yf=None, Yt=None, Cf=None, Ct=None):
+        """
+        Network of the transient stability simulation: Ybus plus the loads and machines admittances.
+        The matrix is only factorized again when an event changes the topology
+        :param Ybus: admittance matrix
+        :param Yshunt: array of loads and machines admittances per bus
+        :param Yf: from admittance matrix of the branches (only needed by the line events)
+        :param Yt: to admittance matrix of the branches (only needed by the line events)
+        :param Cf: branch-bus from connectivity matrix (only needed by the line events)
+        :param Ct: branch-bus to connectivity matrix (only needed by the line events)
+        """
+        n = Ybus.shape[0]
+        self.Y0 = (Ybus + sparse((Yshunt, (range(n), range(n))), shape=(n, n))).tocsc()
+        self.Y = self.Y0
+
+        self.Yf = Yf
+        self.Yt = Yt
+        self.Cf = Cf
+        self.Ct = Ct
+
+        # admittance of the short circuits applied at each bus
+        self.fault_admittance = dict()
+
+        # number of factorizations done (one per topology state)
+        self.factorizations = 0
+
+        self.lu = None
+        self.factorize()
+
+        # factorization of the pre-event network, kept to start every simulation from it
+        self.lu0 = self.lu
+
+    def reset(self):
+        """
+        Go back to the pre-event network (no factorization needed)
+        """
+        self.Y = self.Y0
+        self.lu = self.lu0
+        self.fault_admittance = dict()
+        self.factorizations = 1
+
+    def factorize(self):
+        """
+        Factorize the network matrix
+        """
+        self.lu = splu(self.Y)
+        self.factorizations += 1
+
+    def solve(self, I):
+        """
+        Solve the network voltages for the current injections
+        :param I: current injections
+        :return: voltages
+        """
+        return self.lu.solve(I)
+
+    def branch_admittance(self, k):
+        """
+        Contribution of the branch k to the admittance matrix
+        :param k: branch index
+        :return: sparse matrix
+        """
+        return self.Cf[k, :].T * self.Yf[k, :] + self.Ct[k, :].T * self.Yt[k, :]
+
+    def apply_event(self, evt_type, idx, param):
+        """
+        Modify the network with an event
+        :param evt_type: event type (see TransientStabilityEvents)
+        :param idx: bus or branch index
+        :param param: fault impedance in p.u. for the bus short circuits (1e-6 if None)
+        """
+        n = self.Y.shape[0]
+
+        if evt_type == 'Bus short circuit':
+            yf = 1.0 / (1e-6 if param is None else param)
+            self.fault_admittance[idx] = self.fault_admittance.get(idx, 0) + yf
+            self.Y = (self.Y + sparse(([yf], ([idx], [idx])), shape=(n, n))).tocsc()
+
+        elif evt_type == 'Bus recovery':
+            yf = self.fault_admittance.pop(idx, 0)
+            self.Y = (self.Y - sparse(([yf], ([idx], [idx])), shape=(n, n))).tocsc()
+
+        elif evt_type == 'Line failure':
+            self.Y = (self.Y - self.branch_admittance(idx)).tocsc()
 
-        # compute machine currents
+        elif evt_type == 'Line recovery':
+            self.Y = (self.Y + self.branch_admittance(idx)).tocsc()
 
-        sm4.calc_currents(V, I)
+        else:
+            raise Exception('Event not supported!')
+
+        self.factorize()
 
-        # solve voltages
-        V = Zbus.solve(I)
 
-        voltages.append(V)
-        omegas.append(sm4.omega)
-        time.append(t)
+def initialise_dynamic_models(n, Vbus, Sbus, Sbase, fBase, dynamic_devices=list(), bus_indices=list()):
+    """
+    Build the dynamic models and initialise them from the power flow solution
+    :param n: number of nodes
+    :param Vbus: initial voltages (power flow solution)
+    :param Sbus: initial power injections (power flow solution) in p.u.
+    :param Sbase: base power
+    :param fBase: base frequency i.e. 50Hz
+    :param dynamic_devices: objects of each machine (they have the machine_model attribute and its parameters)
+    :param bus_indices: bus index of every dynamic device
+    :return: list of (indices of the devices, model object), array of loads and machines admittances per bus
+    """
+    models = build_dynamic_models(dynamic_devices, bus_indices, Sbase, fBase)
+
+    # the generators get the power of their bus (shared between the generators of the bus), the rest of the
+    # injections are modelled as constant admittances
+    generator_types = (SynchronousMachineOrder4, SynchronousMachineOrder6SauerPai, VoltageSourceConverterAverage,
+                       ExternalGrid)
+    n_gen_bus = np.zeros(n)
+    for idx, model in models:
+        if isinstance(model, generator_types):
+            np.add.at(n_gen_bus, model.bus_idx, 1)
 
-        t += h
+    Y_shunt = np.zeros(n, dtype=complex)
+    load_idx = np.where(n_gen_bus == 0)[0]
+    Y_shunt[load_idx] = -np.conj(Sbus[load_idx]) / np.power(np.abs(Vbus[load_idx]), 2)
+
+    for idx, model in models:
+        S0 = Sbus[model.bus_idx] / np.maximum(n_gen_bus[model.bus_idx], 1)
+        model.initialise(vt0=Vbus[model.bus_idx], S0=S0)
+        np.add.at(Y_shunt, model.bus_idx, model.get_yg())
+
+    return models, Y_shunt
+
+
+def run_dynamic_simulation(models, network: DynamicNetwork, Vbus, n_devices, t_sim, h, callback=None, max_err=1e-4,
+                           max_iter=25, events: TransientStabilityEvents = None, decimation=1, store_results=True,
+                           max_angle=None, settle_tol=None, settle_time=1.0):
+    """
+    Run the transient simulation of initialised models (see dynamic_simulation)
+    :param models: list of (indices of the devices, model object) from initialise_dynamic_models (they are modified)
+    :param network: DynamicNetwork instance at the pre-event state
+    :param Vbus: initial voltages (power flow solution)
+    :param n_devices: number of dynamic devices
+    :param t_sim: simulation time (s)
+    :param h: time step (s)
+    :param callback: function(text, progress) to report the progress
+    :param max_err: maximum mismatch of the voltages and states at each step
+    :param max_iter: maximum number of iterations per step
+    :param events: TransientStabilityEvents instance, the objects are the bus or branch indices
+    :param decimation: store one out of every "decimation" steps
+    :param store_results: store the voltages and speeds? (otherwise only the summary indices are computed)
+    :param max_angle: rotor angles spread (rad) at which the simulation stops as unstable (None to never stop)
+    :param settle_tol: spread of the machines speeds and deviation of the speeds from the synchronous speed (p.u.)
+                       below which, after the last event, the machines are considered settled (None to never stop)
+    :param settle_time: time (s) that the speeds must stay within settle_tol to stop the simulation
+    :return: TransientStabilityResults instance
+    """
+    n = len(Vbus)
+
+    # states vector structure
+    n_states = [model.get_states().shape[0] for idx, model in models]
+    n_dev = [len(idx) for idx, model in models]
+    offsets = np.r_[0, np.cumsum(np.array(n_states, dtype=int) * np.array(n_dev, dtype=int))].astype(int)
+
+    # models with rotor angle
+    synchronous = [model for idx, model in models
+                   if isinstance(model, (SynchronousMachineOrder4, SynchronousMachineOrder6SauerPai, ExternalGrid))]
+
+    def get_states():
+        if len(models):
+            return np.concatenate([model.get_states().ravel() for idx, model in models])
+        else:
+            return np.zeros(0)
 
-        if callback is not None:
-            progress = t / t_sim * 100
-            txt = 'Running transient stability t:' + str(t)
-            callback(txt, progress)
+    def set_states(x):
+        for i, (idx, model) in enumerate(models):
+            model.set_states(x[offsets[i]:offsets[i + 1]].reshape(n_states[i], n_dev[i]))
+
+    def derivatives():
+        if len(models):
+            return np.concatenate([model.derivatives().ravel() for idx, model in models])
+        else:
+            return np.zeros(0)
+
+    def injections(V):
+        I = np.zeros(n, dtype=complex)
+        for idx, model in models:
+            np.add.at(I, model.bus_idx, model.calc_currents(V[model.bus_idx]))
+        return I
+
+    def network_solution(V, tol=max_err):
+        # solve the network with the states fixed (after the events)
+        for it in range(max_iter):
+            V_new = network.solve(injections(V))
+            err = np.max(np.abs(V_new - V)) if n else 0
+            V = V_new
+            if err < tol:
+                break
+        injections(V)  # set the algebraic variables at the solution
+        return V
+
+    def trapezoidal_residual(x, V, x0, f0):
+        # mismatch of the trapezoidal rule with the network solved (tightly) for the states x
+        set_states(x)
+        V = network_solution(V, tol=1e-3 * max_err)
+        return x - x0 - 0.5 * h * (f0 + derivatives()), V
+
+    def newton_step(x0, f0, x, V):
+        # Newton-Raphson solution of the trapezoidal step, with the Jacobian of the residual computed by finite
+        # differences (it includes the network response to the states)
+        for it in range(max_iter):
+            g, V = trapezoidal_residual(x, V, x0, f0)
+            if np.max(np.abs(g)) < max_err:
+                return x, V, True
+            J = np.empty((len(x), len(x)))
+            for j in range(len(x)):
+                dx = 1e-6 * max(1.0, abs(x[j]))
+                xj = x.copy()
+                xj[j] += dx
+                gj, _ = trapezoidal_residual(xj, V, x0, f0)
+                J[:, j] = (gj - g) / dx
+            try:
+                x = x - np.linalg.solve(J, g)
+            except np.linalg.LinAlgError:
+                break
+        g, V = trapezoidal_residual(x, V, x0, f0)
+        return x, V, np.max(np.abs(g)) < max_err
+
+    def speed_deviation():
+        if len(models):
+            return np.max([np.max(np.abs(model.omega - 1.0)) for idx, model in models])
+        else:
+            return 0.0
+
+    def speed_spread():
+        if len(synchronous):
+            omega = np.concatenate([np.atleast_1d(model.omega) for model in synchronous])
+            return omega.max() - omega.min()
+        else:
+            return 0.0
+
+    def synchronous_speed_deviation():
+        if len(synchronous):
+            omega = np.concatenate([np.atleast_1d(model.omega) for model in synchronous])
+            return np.max(np.abs(omega - 1.0))
+        else:
+            return 0.0
+
+    def angle_spread():
+        if len(synchronous):
+            delta = np.concatenate([np.atleast_1d(model.delta) for model in synchronous])
+            return delta.max() - delta.min()
+        else:
+            return 0.0
+
+    # events sorted by time
+    if events is not None:
+        event_order = np.argsort(events.time, kind='stable')
+        event_list = [(events.time[i], events.event_type[i], events.object[i], events.params[i]) for i in event_order]
+    else:
+        event_list = list()
+    next_event = 0
+    t_last_event = event_list[-1][0] if len(event_list) else 0.0
+
+    # preallocate the results
+    n_steps = int(np.ceil(t_sim / h - 1e-9))
+    decimation = max(1, int(decimation))
+    n_out = n_steps // decimation + 1 if store_results else 1
+    voltages = np.zeros((n_out, n), dtype=complex)
+    omegas = np.ones((n_out, n_devices))
+    time = np.zeros(n_out)
+
+    def store(k, t, V):
+        voltages[k, :] = V
+        time[k] = t
+        for idx, model in models:
+            omegas[k, idx] = model.omega
+
+    # initial point
+    V = Vbus.copy()
+    injections(V)
+    store(0, 0.0, V)
+    k_out = 1
+
+    # summary indices
+    max_spread = angle_spread()
+    max_speed_deviation = 0.0
+    min_voltage = np.min(np.abs(V)) if n else 1.0
+    stable = True
+    t = 0.0
+    t_calm = None
+    non_converged_steps = 0
+
+    for step in range(n_steps):
+        t = step * h
+
+        # apply the events due at this time and solve the network again (the voltages jump, the states do not)
+        applied = False
+        while next_event < len(event_list) and event_list[next_event][0] <= t + 1e-9:
+            t_evt, evt_type, obj, param = event_list[next_event]
+            network.apply_event(evt_type, obj, param)
+            next_event += 1
+            applied = True
+        if applied:
+            V = network_solution(V)
+
+        # implicit trapezoidal step: the fixed point iteration of the states and the network is cheap, but it only
+        # converges while h is small compared to the fastest time constant of the machines (h * |df/dx| / 2 < 1);
+        # when it does not converge, the step is solved with Newton-Raphson from the explicit Euler predictor
+        x0 = get_states()
+        f0 = derivatives()
+        x = x0 + h * f0  # explicit Euler predictor
+        V_it = V
+        converged = False
+        for it in range(max_iter):
+            set_states(x)
+            V_new = network.solve(injections(V_it))
+            x_new = x0 + 0.5 * h * (f0 + derivatives())
+            err = max(np.max(np.abs(V_new - V_it)) if n else 0, np.max(np.abs(x_new - x)) if len(x) else 0)
+            V_it = V_new
+            x = x_new
+            if err < max_err:
+                converged = True
+                break
+        if not converged and len(x0):
+            x, V_it, converged = newton_step(x0, f0, x0 + h * f0, V)
+        if not converged:
+            non_converged_steps += 1
+        set_states(x)
+        injections(V_it)
+        V = V_it
+        t = (step + 1) * h
+
+        if store_results and (step + 1) % decimation == 0:
+            store(k_out, t, V)
+            k_out += 1
+
+        if callback is not None and (step + 1) % decimation == 0:
+            callback('Running transient stability t:' + str(t), (step + 1) / n_steps * 100)
+
+        # summary indices and early stop
+        spread = angle_spread()
+        dw = speed_deviation()
+        max_spread = max(max_spread, spread)
+        max_speed_deviation = max(max_speed_deviation, dw)
+        if n:
+            min_voltage = min(min_voltage, np.min(np.abs(V)))
+
+        if max_angle is not None and spread > max_angle:
+            stable = False
+            break
+
+        if settle_tol is not None and next_event == len(event_list) and t >= t_last_event:
+            # a single machine has no spread: its speed must also be back at the synchronous speed
+            if speed_spread() < settle_tol and synchronous_speed_deviation() < settle_tol:
+                if t_calm is None:
+                    t_calm = t
+                elif t - t_calm >= settle_time:
+                    break
+            else:
+                t_calm = None
 
     res = TransientStabilityResults()
-    res.voltage = np.array(voltages)
-    res.omegas = np.array(omegas)
-    res.time = np.array(time)
+    res.voltage = voltages[:k_out, :]
+    res.omega = omegas[:k_out, :]
+    res.time = time[:k_out]
+    res.factorizations = network.factorizations
+    res.stable = stable
+    res.stop_time = t
+    res.max_angle_spread = max_spread
+    res.max_speed_deviation = max_speed_deviation
+    res.min_voltage = min_voltage
+    res.non_converged_steps = non_converged_steps
 
     return res
+
+
+def dynamic_simulation(n, Vbus, Sbus, Ybus, Sbase, fBase, t_sim, h, dynamic_devices=list(), bus_indices=list(),
+                       callback=None, max_err=1e-4, max_iter=25, events: TransientStabilityEvents = None,
+                       Yf=None, Yt=None, Cf=None, Ct=None, decimation=1):
+    """
+    Dynamic transient simulation of a power system.
+    The machines differential equations and the network algebraic equations are solved simultaneously with the
+    implicit trapezoidal rule: every step iterates the network solution and the states until the voltage and the
+    states mismatches are below max_err; if that iteration does not converge (h too large for the fastest machine
+    time constants) the step is solved with Newton-Raphson, and the steps that still do not converge are counted in
+    the results. The network is factorized once and again only after each event.
+    Args:
+        n: number of nodes
+        Vbus: initial voltages (power flow solution)
+        Sbus: initial power injections (power flow solution) in p.u.
+        Ybus: admittance matrix
+        Sbase: base power
+        fBase: base frequency i.e. 50Hz
+        t_sim: simulation time (s)
+        h: time step (s)
+        dynamic_devices: objects of each machine (they have the machine_model attribute and its parameters)
+        bus_indices: bus index of every dynamic device
+        callback: function(text, progress) to report the progress
+        max_err: maximum mismatch of the voltages and states at each step
+        max_iter: maximum number of iterations per step
+        events: TransientStabilityEvents instance, the objects are the bus or branch indices
+        Yf, Yt, Cf, Ct: branches admittance and connectivity matrices (only needed by the line events)
+        decimation: store one out of every "decimation" steps
+
+    Returns: TransientStabilityResults instance
+    """
+    models, Y_shunt = initialise_dynamic_models(n=n, Vbus=Vbus, Sbus=Sbus, Sbase=Sbase, fBase=fBase,
+                                                dynamic_devices=dynamic_devices, bus_indices=bus_indices)
+
+    network = DynamicNetwork(Ybus=Ybus, Yshunt=Y_shunt, Yf=Yf, Yt=Yt, Cf=Cf, Ct=Ct)
+
+    return run_dynamic_simulation(models=models, network=network, Vbus=Vbus, n_devices=len(dynamic_devices),
+                                  t_sim=t_sim, h=h, callback=callback, max_err=max_err, max_iter=max_iter,
+                                  events=events, decimation=decimation)
@@ -0,0 +1,411 @@
+# This file is part of GridCal.
+#
+# GridCal is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# GridCal is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with GridCal.  If not, see <http://www.gnu.org/licenses/>.
+
+import copy
+import multiprocessing
+import numpy as np
+import pandas as pd
+
+from PySide2.QtCore import QThread, Signal
+
+from GridCal.Engine.basic_structures import Logger
+from GridCal.Engine.Core.multi_circuit import MultiCircuit
+from GridCal.Engine.Simulations.PowerFlow.power_flow_driver import PowerFlowResults
+from GridCal.Engine.Simulations.Dynamics.dynamic_modules import initialise_dynamic_models, run_dynamic_simulation, \
+    DynamicNetwork, TransientStabilityEvents, TransientStabilityResults
+from GridCal.Engine.Simulations.Dynamics.transient_stability_driver import TransientStabilityOptions, \
+    get_dynamic_generators, get_island_devices, get_island_events
+
+
+########################################################################################################################
+# Transient stability of many contingency scenarios
+########################################################################################################################
+
+
+class TransientStabilityBatchOptions:
+
+    def __init__(self, ts_options: TransientStabilityOptions = None, max_angle=180.0, settle_tol=5e-3,
+                 settle_time=1.0, store_results=False, multi_thread=True, n_processes=None):
+        """
+        Options of the transient stability of many scenarios
+        :param ts_options: TransientStabilityOptions used for every scenario (its events are ignored)
+        :param max_angle: rotor angles spread (deg) at which a scenario is declared unstable and stopped
+        :param settle_tol: spread of the machines speeds and deviation of the speeds from the synchronous speed
+                           (p.u.) under which the machines are settled after the last event
+        :param settle_time: time (s) that the machines must stay settled to stop the scenario
+        :param store_results: store the curves (TransientStabilityResults) of every scenario? (memory intensive)
+                              The scenarios with stored curves are not stopped when they settle.
+        :param multi_thread: run the scenarios in a pool of processes?
+        :param n_processes: number of processes (if None, the number of cores)
+        """
+        self.ts_options = TransientStabilityOptions() if ts_options is None else ts_options
+
+        self.max_angle = max_angle
+
+        self.settle_tol = settle_tol
+
+        self.settle_time = settle_time
+
+        self.store_results = store_results
+
+        self.multi_thread = multi_thread
+
+        self.n_processes = n_processes
+
+
+class TransientStabilityBatchResults:
+
+    def __init__(self, n_scenarios, names=None, max_angle=180.0):
+        """
+        Results of the transient stability of many scenarios
+        :param n_scenarios: number of scenarios
+        :param names: names of the scenarios
+        :param max_angle: rotor angles spread (deg) considered unstable
+        """
+        self.names = names
+
+        self.max_angle = max_angle
+
+        self.stable = np.zeros(n_scenarios, dtype=bool)
+
+        # time at which every scenario was stopped (unstable, settled or end of the simulation)
+        self.stop_time = np.zeros(n_scenarios)
+
+        # maximum spread of the rotor angles (deg)
+        self.max_angle_spread = np.zeros(n_scenarios)
+
+        self.max_speed_deviation = np.zeros(n_scenarios)
+
+        self.min_voltage = np.zeros(n_scenarios)
+
+        # number of integration steps that did not converge
+        self.non_converged_steps = np.zeros(n_scenarios, dtype=int)
+
+        # TransientStabilityResults of every scenario (only if the curves are stored)
+        self.results = [None] * n_scenarios
+
+    @property
+    def angle_margin(self):
+        """
+        Stability margin of every scenario: distance (deg) from the maximum rotor angles spread to max_angle
+        """
+        return self.max_angle - self.max_angle_spread
+
+    def set_scenario(self, idx, results: TransientStabilityResults):
+        """
+        Store the results of a scenario
+        :param idx: scenario index
+        :param results: TransientStabilityResults instance
+        """
+        self.stable[idx] = results.stable
+        self.stop_time[idx] = results.stop_time
+        self.max_angle_spread[idx] = np.rad2deg(results.max_angle_spread)
+        self.max_speed_deviation[idx] = results.max_speed_deviation
+        self.min_voltage[idx] = results.min_voltage
+        self.non_converged_steps[idx] = results.non_converged_steps
+        self.results[idx] = results if results.voltage is not None else None
+
+    def get_table(self):
+        """
+        Get the summary table
+        :return: DataFrame
+        """
+        cols = ['Stable', 'Angle margin (deg)', 'Max angle spread (deg)', 'Max speed deviation (p.u.)',
+                'Min voltage (p.u.)', 'Stop time (s)']
+        data = np.c_[self.stable, self.angle_margin, self.max_angle_spread, self.max_speed_deviation,
+                     self.min_voltage, self.stop_time]
+        df = pd.DataFrame(data=data, index=self.names, columns=cols)
+        df['Stable'] = df['Stable'].astype(bool)
+        return df
+
+
+class TransientStabilityIsland:
+
+    def __init__(self, calculation_input, pf_res: PowerFlowResults, generators, bus_dict, fBase):
+        """
+        Dynamic models of an island initialised from the power flow; shared by all the scenarios
+        :param calculation_input: CalculationInputs instance of the island
+        :param pf_res: PowerFlowResults instance
+        :param generators: list of the generators with a dynamic model
+        :param bus_dict: dictionary Bus -> index in the grid
+        :param fBase: base frequency
+        """
+        self.original_bus_idx = calculation_input.original_bus_idx
+
+        self.gen_idx, dynamic_devices, bus_indices = get_island_devices(calculation_input, generators, bus_dict)
+
+        self.Vbus = pf_res.voltage[self.original_bus_idx]
+
+        self.models, self.Y_shunt = initialise_dynamic_models(n=len(self.original_bus_idx),
+                                                              Vbus=self.Vbus,
+                                                              Sbus=pf_res.Sbus[self.original_bus_idx],
+                                                              Sbase=calculation_input.Sbase,
+                                                              fBase=fBase,
+                                                              dynamic_devices=dynamic_devices,
+                                                              bus_indices=bus_indices)
+
+        self.Ybus = calculation_input.Ybus
+        self.Yf = calculation_input.Yf
+        self.Yt = calculation_input.Yt
+        self.Cf = calculation_input.C_branch_bus_f
+        self.Ct = calculation_input.C_branch_bus_t
+
+    def get_network(self):
+        """
+        Factorize the pre-event network of the island
+        :return: DynamicNetwork instance
+        """
+        return DynamicNetwork(Ybus=self.Ybus, Yshunt=self.Y_shunt, Yf=self.Yf, Yt=self.Yt, Cf=self.Cf, Ct=self.Ct)
+
+
+def transient_stability_scenario(islands, networks, options: TransientStabilityBatchOptions, events, nbus, ngen):
+    """
+    Simulate one scenario
+    :param islands: list of TransientStabilityIsland instances
+    :param networks: list of DynamicNetwork instances, one per island, shared by all the scenarios
+    :param options: TransientStabilityBatchOptions instance
+    :param events: list of TransientStabilityEvents instances of the scenario, one per island (island indices)
+    :param nbus: number of buses of the grid
+    :param ngen: number of dynamic generators of the grid
+    :return: TransientStabilityResults instance (only the summary indices if the curves are not stored)
+    """
+    ts = options.ts_options
+    results = TransientStabilityResults()
+    results.min_voltage = np.inf
+
+    if options.store_results:
+        n_out = int(np.ceil(ts.t_sim / ts.h - 1e-9)) // max(1, int(ts.decimation)) + 1
+        results.voltage = np.zeros((n_out, nbus), dtype=complex)
+        results.omega = np.ones((n_out, ngen))
+
+    for island, network, island_events in zip(islands, networks, events):
+
+        network.reset()
+
+        res = run_dynamic_simulation(models=copy.deepcopy(island.models),
+                                     network=network,
+                                     Vbus=island.Vbus,
+                                     n_devices=len(island.gen_idx),
+                                     t_sim=ts.t_sim,
+                                     h=ts.h,
+                                     max_err=ts.max_err,
+                                     max_iter=ts.max_iter,
+                                     events=island_events,
+                                     decimation=ts.decimation,
+                                     store_results=options.store_results,
+                                     max_angle=np.deg2rad(options.max_angle),
+                                     settle_tol=None if options.store_results else options.settle_tol,
+                                     settle_time=options.settle_time)
+
+        results.stable &= res.stable
+        results.stop_time = max(results.stop_time, res.stop_time)
+        results.max_angle_spread = max(results.max_angle_spread, res.max_angle_spread)
+        results.max_speed_deviation = max(results.max_speed_deviation, res.max_speed_deviation)
+        results.min_voltage = min(results.min_voltage, res.min_voltage)
+        results.factorizations += res.factorizations
+        results.non_converged_steps += res.non_converged_steps
+
+        if options.store_results:
+            k = res.voltage.shape[0]
+            results.voltage[:k, island.original_bus_idx] = res.voltage
+            results.omega[:k, island.gen_idx] = res.omega
+            if results.time is None or len(res.time) > len(results.time):
+                results.time = res.time
+
+    if options.store_results:
+        # the unstable scenarios stop early
+        k = len(results.time)
+        results.voltage = results.voltage[:k, :]
+        results.omega = results.omega[:k, :]
+
+    return results
+
+
+# per process data of the scenarios pool
+_worker_data = dict()
+
+
+def _init_transient_stability_worker(islands, options: TransientStabilityBatchOptions, nbus, ngen):
+    """
+    Pool initializer: store the initialised islands and factorize their networks once per process
+    """
+    _worker_data['islands'] = islands
+    _worker_data['networks'] = [island.get_network() for island in islands]
+    _worker_data['options'] = options
+    _worker_data['nbus'] = nbus
+    _worker_data['ngen'] = ngen
+
+
+def transient_stability_worker(args):
+    """
+    Transient stability worker to schedule the scenarios in parallel
+    :param args: scenario index, list of TransientStabilityEvents of the scenario (one per island)
+    :return: scenario index, TransientStabilityResults instance
+    """
+    idx, events = args
+    return idx, transient_stability_scenario(islands=_worker_data['islands'],
+                                             networks=_worker_data['networks'],
+                                             options=_worker_data['options'],
+                                             events=events,
+                                             nbus=_worker_data['nbus'],
+                                             ngen=_worker_data['ngen'])
+
+
+class TransientStabilityBatch(QThread):
+    progress_signal = Signal(float)
+    progress_text = Signal(str)
+    done_signal = Signal()
+
+    def __init__(self, grid: MultiCircuit, options: TransientStabilityBatchOptions, pf_res: PowerFlowResults,
+                 scenarios, names=None):
+        """
+        Transient stability screening of many contingency scenarios (i.e. a fault at each bus cleared by tripping
+        each line). The machines are initialised from the power flow once, and the scenarios are simulated from
+        that state; every scenario stops as soon as the rotor angles diverge or the machines settle.
+        :param grid: MultiCircuit instance
+        :param options: TransientStabilityBatchOptions instance
+        :param pf_res: PowerFlowResults instance
+        :param scenarios: list of TransientStabilityEvents instances (with Bus and Branch objects)
+        :param names: names of the scenarios (optional)
+        """
+        QThread.__init__(self)
+
+        self.grid = grid
+
+        self.options = options
+
+        self.pf_res = pf_res
+
+        self.scenarios = scenarios
+
+        if names is None:
+            names = ['Scenario ' + str(i) for i in range(len(scenarios))]
+        self.names = names
+
+        self.results = None
+
+        self.logger = Logger()
+
+        self.__cancel__ = False
+
+    def run_single_thread(self, islands, events, nbus, ngen):
+        """
+        Simulate the scenarios one after the other
+        :param islands: list of TransientStabilityIsland instances
+        :param events: list of the scenarios events per island
+        :param nbus: number of buses
+        :param ngen: number of dynamic generators
+        """
+        n = len(events)
+        networks = [island.get_network() for island in islands]
+
+        for i in range(n):
+
+            if self.__cancel__:
+                break
+
+            res = transient_stability_scenario(islands=islands,
+                                               networks=networks,
+                                               options=self.options,
+                                               events=events[i],
+                                               nbus=nbus,
+                                               ngen=ngen)
+            self.results.set_scenario(i, res)
+
+            self.progress_signal.emit((i + 1) / n * 100.0)
+
+    def run_multi_thread(self, islands, events, nbus, ngen):
+        """
+        Simulate the scenarios in a pool of processes; the islands are sent once to every process
+        :param islands: list of TransientStabilityIsland instances
+        :param events: list of the scenarios events per island
+        :param nbus: number of buses
+        :param ngen: number of dynamic generators
+        """
+        n = len(events)
+
+        n_cores = multiprocessing.cpu_count() if self.options.n_processes is None else self.options.n_processes
+        self.progress_text.emit('Running the transient stability scenarios using ' + str(n_cores) + ' cores ...')
+
+        pool = multiprocessing.Pool(processes=n_cores,
+                                    initializer=_init_transient_stability_worker,
+                                    initargs=(islands, self.options, nbus, ngen))
+
+        chunk_size = max(1, n // (4 * n_cores))
+        tasks = ((i, events[i]) for i in range(n))
+        try:
+            for k, (i, res) in enumerate(pool.imap_unordered(transient_stability_worker, tasks,
+                                                             chunksize=chunk_size)):
+                self.results.set_scenario(i, res)
+                self.progress_signal.emit((k + 1) / n * 100.0)
+
+                if self.__cancel__:
+                    pool.terminate()
+                    break
+        finally:
+            pool.close()
+            pool.join()
+
+    def run(self):
+        """
+        Run the transient stability of all the scenarios
+        """
+        self.__cancel__ = False
+
+        self.progress_signal.emit(0.0)
+        self.progress_text.emit('Running transient stability of many scenarios...')
+
+        # compile and initialise the machines only once: all the scenarios share them
+        numerical_circuit = self.grid.compile()
+        calculation_inputs = numerical_circuit.compute()
+
+        bus_dict = {bus: i for i, bus in enumerate(self.grid.buses)}
+        branch_dict = {branch: i for i, branch in enumerate(self.grid.branches)}
+        self.logger = Logger()
+        generators = get_dynamic_generators(self.grid, self.logger)
+
+        islands = [TransientStabilityIsland(calculation_input, self.pf_res, generators, bus_dict, self.grid.fBase)
+                   for calculation_input in calculation_inputs]
+
+        events = [[get_island_events(calculation_input, scenario, bus_dict, branch_dict)
+                   for calculation_input in calculation_inputs]
+                  for scenario in self.scenarios]
+
+        self.results = TransientStabilityBatchResults(n_scenarios=len(self.scenarios),
+                                                      names=self.names,
+                                                      max_angle=self.options.max_angle)
+
+        if self.options.multi_thread:
+            self.run_multi_thread(islands, events, len(self.grid.buses), len(generators))
+        else:
+            self.run_single_thread(islands, events, len(self.grid.buses), len(generators))
+
+        for name, n_steps in zip(self.names, self.results.non_converged_steps):
+            if n_steps:
+                self.logger.append(str(name) + ': ' + str(n_steps) + ' integration steps did not converge, '
+                                   'reduce the step length h')
+
+        self.progress_signal.emit(0.0)
+        self.progress_text.emit('Done!')
+        self.done_signal.emit()
+
+    def cancel(self):
+        """
+        Cancel the simulation
+        """
+        self.__cancel__ = True
+        self.progress_signal.emit(0.0)
+        self.progress_text.emit('Cancelled!')
+        self.done_signal.emit()
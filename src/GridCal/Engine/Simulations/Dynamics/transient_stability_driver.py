@@ -14,11 +14,14 @@
 # along with GridCal.  If not, see <http://www.gnu.org/licenses/>.
 
 
+import numpy as np
 from PySide2.QtCore import QThread, Signal
 
+from GridCal.Engine.basic_structures import Logger
 from GridCal.Engine.Core.multi_circuit import MultiCircuit
 from GridCal.Engine.Simulations.PowerFlow.power_flow_driver import PowerFlowResults
-from GridCal.Engine.Simulations.Dynamics.dynamic_modules import dynamic_simulation
+from GridCal.Engine.Simulations.Dynamics.dynamic_modules import dynamic_simulation, DynamicModels, \
+    TransientStabilityEvents, TransientStabilityResults
 
 ########################################################################################################################
 # Transient stability
@@ -27,7 +30,8 @@ from GridCal.Engine.Simulations.Dynamics.dynamic_modules import dynamic_simulati
 
 class TransientStabilityOptions:
 
-    def __init__(self, h=0.001, t_sim=15, max_err=0.0001, max_iter=25):
+    def __init__(self, h=0.001, t_sim=15, max_err=0.0001, max_iter=25, decimation=1,
+                 events: TransientStabilityEvents = None):
 
         # step length (s)
         self.h = h
@@ -41,6 +45,71 @@ class TransientStabilityOptions:
         # Maximum number of network iterations
         self.max_iter = max_iter
 
+        # store one out of every "decimation" steps
+        self.decimation = decimation
+
+        # events (the objects are the Bus and Branch objects of the grid)
+        self.events = TransientStabilityEvents() if events is None else events
+
+
+# dynamic models that can be simulated with the parameters of the Generator device
+GENERATOR_DYNAMIC_MODELS = [DynamicModels.SynchronousGeneratorOrder4,
+                            DynamicModels.SynchronousGeneratorOrder6,
+                            DynamicModels.ExternalGrid]
+
+
+def get_dynamic_generators(grid: MultiCircuit, logger: Logger = None):
+    """
+    Get the generators that have a dynamic model
+    :param grid: MultiCircuit instance
+    :param logger: Logger instance where the generators with a model that they cannot use are reported (optional)
+    :return: list of generators
+    """
+    generators = list()
+    for elm in grid.get_generators():
+        if elm.machine_model in GENERATOR_DYNAMIC_MODELS:
+            generators.append(elm)
+        elif elm.machine_model != DynamicModels.NoModel and logger is not None:
+            logger.append('Generator ' + str(elm) + ': the model ' + str(elm.machine_model) +
+                          ' is not available for generators, it is not simulated')
+    return generators
+
+
+def get_island_devices(calculation_input, generators, bus_dict):
+    """
+    Get the dynamic devices of an island
+    :param calculation_input: CalculationInputs instance of the island
+    :param generators: list of the generators with a dynamic model
+    :param bus_dict: dictionary Bus -> index in the grid
+    :return: indices of the island devices in generators, list of devices, island bus index of each device
+    """
+    bus_pos = {k: i for i, k in enumerate(calculation_input.original_bus_idx)}
+    gen_idx = [i for i, elm in enumerate(generators) if bus_dict[elm.bus] in bus_pos]
+    dynamic_devices = [generators[i] for i in gen_idx]
+    bus_indices = [bus_pos[bus_dict[elm.bus]] for elm in dynamic_devices]
+    return gen_idx, dynamic_devices, bus_indices
+
+
+def get_island_events(calculation_input, events: TransientStabilityEvents, bus_dict, branch_dict):
+    """
+    Get the events of an island with the objects replaced by their island index
+    :param calculation_input: CalculationInputs instance of the island
+    :param events: TransientStabilityEvents instance with Bus and Branch objects
+    :param bus_dict: dictionary Bus -> index in the grid
+    :param branch_dict: dictionary Branch -> index in the grid
+    :return: TransientStabilityEvents instance
+    """
+    bus_pos = {k: i for i, k in enumerate(calculation_input.original_bus_idx)}
+    branch_pos = {k: i for i, k in enumerate(calculation_input.original_branch_idx)}
+
+    island_events = TransientStabilityEvents()
+    for t, evt_type, obj, param in zip(events.time, events.event_type, events.object, events.params):
+        if obj in bus_dict and bus_dict[obj] in bus_pos:
+            island_events.add(t, evt_type, bus_pos[bus_dict[obj]], param)
+        elif obj in branch_dict and branch_dict[obj] in branch_pos:
+            island_events.add(t, evt_type, branch_pos[branch_dict[obj]], param)
+    return island_events
+
 
 class TransientStability(QThread):
     progress_signal = Signal(float)
@@ -63,6 +132,8 @@ class TransientStability(QThread):
 
         self.results = None
 
+        self.logger = Logger()
+
     def get_steps(self):
         """
         Get time steps list of strings
@@ -85,28 +156,55 @@ class TransientStability(QThread):
         self.progress_signal.emit(0.0)
         self.progress_text.emit('Running transient stability...')
 
-        # print('Compiling...', end='')
         numerical_circuit = self.grid.compile()
         calculation_inputs = numerical_circuit.compute()
 
+        bus_dict = {bus: i for i, bus in enumerate(self.grid.buses)}
+        branch_dict = {branch: i for i, branch in enumerate(self.grid.branches)}
+
+        # the generators with a dynamic model
+        self.logger = Logger()
+        generators = get_dynamic_generators(self.grid, self.logger)
+
+        n = len(self.grid.buses)
+        n_out = int(np.ceil(self.options.t_sim / self.options.h - 1e-9)) // max(1, int(self.options.decimation)) + 1
+        self.results = TransientStabilityResults()
+        self.results.voltage = np.zeros((n_out, n), dtype=complex)
+        self.results.omega = np.ones((n_out, len(generators)))
+
         for calculation_input in calculation_inputs:
 
-            dynamic_devices = calculation_input.get_generators()
-            bus_indices = [calculation_input.buses_dict[elm.bus] for elm in dynamic_devices]
+            gen_idx, dynamic_devices, bus_indices = get_island_devices(calculation_input, generators, bus_dict)
+
+            events = get_island_events(calculation_input, self.options.events, bus_dict, branch_dict)
 
-            res = dynamic_simulation(n=len(calculation_input.buses),
+            res = dynamic_simulation(n=len(calculation_input.original_bus_idx),
                                      Vbus=self.pf_res.voltage[calculation_input.original_bus_idx],
                                      Sbus=self.pf_res.Sbus[calculation_input.original_bus_idx],
                                      Ybus=calculation_input.Ybus,
                                      Sbase=calculation_input.Sbase,
-                                     fBase=calculation_input.fBase,
+                                     fBase=self.grid.fBase,
                                      t_sim=self.options.t_sim,
                                      h=self.options.h,
                                      dynamic_devices=dynamic_devices,
                                      bus_indices=bus_indices,
-                                     callback=self.status)
-
-        self.results = res
+                                     callback=self.status,
+                                     max_err=self.options.max_err,
+                                     max_iter=self.options.max_iter,
+                                     events=events,
+                                     Yf=calculation_input.Yf,
+                                     Yt=calculation_input.Yt,
+                                     Cf=calculation_input.C_branch_bus_f,
+                                     Ct=calculation_input.C_branch_bus_t,
+                                     decimation=self.options.decimation)
+
+            if res.non_converged_steps:
+                self.logger.append(str(res.non_converged_steps) + ' integration steps did not converge, '
+                                   'reduce the step length h')
+
+            self.results.voltage[:, calculation_input.original_bus_idx] = res.voltage
+            self.results.omega[:, gen_idx] = res.omega
+            self.results.time = res.time
 
         # send the finnish signal
         self.progress_signal.emit(0.0)
@@ -0,0 +1,436 @@
+# This file is part of GridCal.
+#
+# GridCal is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# GridCal is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with GridCal.  If not, see <http://www.gnu.org/licenses/>.
+
+import multiprocessing
+import numpy as np
+import pandas as pd
+import scipy.sparse as sp
+from scipy.sparse.linalg import splu
+from matplotlib import pyplot as plt
+
+from PySide2.QtCore import QThread, Signal
+
+from GridCal.Engine.basic_structures import Logger
+from GridCal.Engine.Devices.branch import BranchType
+from GridCal.Engine.Core.multi_circuit import MultiCircuit
+from GridCal.Engine.Devices.tower import Tower, get_line_constants
+
+
+########################################################################################################################
+# Frequency scan of the driving point impedances
+########################################################################################################################
+
+
+class FrequencyScanOptions:
+
+    def __init__(self, frequencies=None, bus_indices=None, long_line_correction=True, include_loads=True,
+                 include_generators=True, multi_process=True, n_processes=None):
+        """
+        Options of the frequency scan
+        :param frequencies: array of frequencies (Hz) (if None, the harmonics 1 to 50 of the base frequency)
+        :param bus_indices: indices of the buses whose driving point impedance is computed (if None, all)
+        :param long_line_correction: use the exact pi model (hyperbolic functions) of the lines?
+        :param include_loads: represent the loads as their equivalent admittances?
+        :param include_generators: represent the generators as their sub-transient impedances (Ra + jXdpp)?
+        :param multi_process: solve the frequencies in a pool of processes?
+        :param n_processes: number of processes (if None, the number of cores)
+        """
+        self.frequencies = frequencies
+
+        self.bus_indices = bus_indices
+
+        self.long_line_correction = long_line_correction
+
+        self.include_loads = include_loads
+
+        self.include_generators = include_generators
+
+        self.multi_process = multi_process
+
+        self.n_processes = n_processes
+
+
+class FrequencyScanResults:
+
+    def __init__(self, frequencies, bus_indices, bus_names):
+        """
+        Results of the frequency scan
+        :param frequencies: array of frequencies (Hz)
+        :param bus_indices: indices of the scanned buses
+        :param bus_names: names of the scanned buses
+        """
+        self.frequencies = frequencies
+
+        self.bus_indices = bus_indices
+
+        self.bus_names = bus_names
+
+        # driving point impedance (p.u.) of every frequency (rows) and scanned bus (columns)
+        self.Z = np.zeros((len(frequencies), len(bus_indices)), dtype=complex)
+
+    def set_frequencies(self, idx, z):
+        """
+        Store the impedances of some frequencies
+        :param idx: frequency indices
+        :param z: driving point impedances (frequencies, scanned buses)
+        """
+        self.Z[idx, :] = z
+
+    def get_resonances(self):
+        """
+        Get the parallel resonances: frequencies where the magnitude of the driving point impedance peaks
+        :return: dictionary {bus name: array of frequencies}
+        """
+        z = np.abs(self.Z)
+        resonances = dict()
+        for j, name in enumerate(self.bus_names):
+            peaks = np.where((z[1:-1, j] > z[:-2, j]) & (z[1:-1, j] > z[2:, j]))[0] + 1
+            resonances[name] = self.frequencies[peaks]
+        return resonances
+
+    def get_table(self):
+        """
+        Get the table of the magnitudes of the driving point impedances
+        :return: DataFrame
+        """
+        return pd.DataFrame(data=np.abs(self.Z), index=self.frequencies, columns=self.bus_names)
+
+    def plot(self, ax=None):
+        """
+        Plot the magnitudes of the driving point impedances
+        :param ax: MatPlotLib axis (if None, a new figure is created)
+        """
+        if ax is None:
+            fig = plt.figure()
+            ax = fig.add_subplot(111)
+
+        df = self.get_table()
+        df.plot(ax=ax, logy=True)
+        ax.set_xlabel('Frequency (Hz)')
+        ax.set_ylabel('|Z| (p.u.)')
+        ax.set_title('Frequency scan')
+
+
+def get_frequency_scan_data(circuit: MultiCircuit, options: FrequencyScanOptions, logger=Logger()):
+    """
+    Compile the frequency independent data of the frequency scan
+    :param circuit: MultiCircuit instance
+    :param options: FrequencyScanOptions instance
+    :param logger: Logger instance
+    :return: dictionary with the data passed to frequency_scan_chunk
+    """
+    numerical_circuit = circuit.compile()
+    Sbase = numerical_circuit.Sbase
+    frequencies = options.frequencies
+    nbus = len(circuit.buses)
+
+    # branches: series impedance and shunt admittance at the base frequency
+    active = numerical_circuit.branch_active.astype(bool)
+    tap = numerical_circuit.tap_mod * np.exp(1.0j * numerical_circuit.tap_ang)
+    is_line = np.array([branch.branch_type == BranchType.Line for branch in circuit.branches], dtype=bool)
+
+    # lines with a tower: positive sequence impedance and admittance of every frequency from the geometry
+    tower_idx = list()
+    z_tower = list()
+    y_tower = list()
+    constants = dict()  # id(tower) -> (z, y) per km, or None if the tower is not valid
+    for k, branch in enumerate(circuit.branches):
+        if branch.branch_type == BranchType.Line and isinstance(branch.template, Tower) \
+                and branch.length > 0 and active[k]:
+            tower = branch.template
+            if id(tower) not in constants:
+                if tower.check(logger):
+                    z, y = get_line_constants(tower.wires_in_tower, f=frequencies, rho=tower.earth_resistivity)
+                    constants[id(tower)] = (z[4][:, 1, 1], y[4][:, 1, 1])
+                else:
+                    constants[id(tower)] = None
+            if constants[id(tower)] is None:
+                continue
+            z_km, y_km = constants[id(tower)]
+            Zbase = branch.bus_to.Vnom * branch.bus_to.Vnom / Sbase
+            tower_idx.append(k)
+            z_tower.append(z_km * branch.length / Zbase)
+            y_tower.append(y_km * branch.length * Zbase)
+
+    if len(tower_idx):
+        logger.append(str(len(tower_idx)) + ' lines computed from their towers geometry')
+        z_tower = np.array(z_tower).T
+        y_tower = np.array(y_tower).T
+    else:
+        z_tower = np.zeros((len(frequencies), 0), dtype=complex)
+        y_tower = np.zeros((len(frequencies), 0), dtype=complex)
+
+    # shunts: the capacitive part scales with the harmonic order, the inductive part with its inverse
+    y_sh = numerical_circuit.shunt_admittance * numerical_circuit.shunt_active / Sbase
+    if options.include_loads:
+        y_ld = numerical_circuit.load_admittance * numerical_circuit.load_active / Sbase
+        s_ld = numerical_circuit.load_power * numerical_circuit.load_active / Sbase
+    else:
+        y_ld = np.zeros(numerical_circuit.load_admittance.shape[0], dtype=complex)
+        s_ld = np.zeros(numerical_circuit.load_admittance.shape[0], dtype=complex)
+
+    Cs = numerical_circuit.C_shunt_bus.T.tocsr()
+    Cl = numerical_circuit.C_load_bus.T.tocsr()
+    G_bus = Cs * y_sh.real + Cl * (y_ld.real + s_ld.real)
+    B_cap = Cs * np.maximum(y_sh.imag, 0) + Cl * (np.maximum(y_ld.imag, 0) + np.maximum(-s_ld.imag, 0))
+    B_ind = Cs * np.minimum(y_sh.imag, 0) + Cl * (np.minimum(y_ld.imag, 0) + np.minimum(-s_ld.imag, 0))
+
+    # generators: sub-transient impedance in the system base
+    z_gen = list()
+    gen_bus = list()
+    if options.include_generators:
+        bus_dict = {bus: i for i, bus in enumerate(circuit.buses)}
+        for bus in circuit.buses:
+            for gen in bus.controlled_generators:
+                if gen.active:
+                    Snom = gen.Snom if gen.Snom > 0 else Sbase
+                    z_gen.append(complex(gen.Ra, gen.Xdpp) * Sbase / Snom)
+                    gen_bus.append(bus_dict[bus])
+
+    return {'nbus': nbus,
+            'fBase': circuit.fBase,
+            'F': numerical_circuit.F[active],
+            'T': numerical_circuit.T[active],
+            'R': numerical_circuit.R[active],
+            'X': numerical_circuit.X[active],
+            'G': numerical_circuit.G[active],
+            'B': numerical_circuit.B[active],
+            'tap': tap[active],
+            'tap_f': numerical_circuit.tap_f[active],
+            'tap_t': numerical_circuit.tap_t[active],
+            'is_line': is_line[active],
+            'tower_idx': np.searchsorted(np.where(active)[0], tower_idx).astype(int),
+            'z_tower': z_tower,
+            'y_tower': y_tower,
+            'long_line_correction': options.long_line_correction,
+            'G_bus': G_bus,
+            'B_cap': B_cap,
+            'B_ind': B_ind,
+            'z_gen': np.array(z_gen, dtype=complex),
+            'gen_bus': np.array(gen_bus, dtype=int),
+            'bus_indices': np.array(options.bus_indices, dtype=int)}
+
+
+def get_harmonic_admittance(data, k, f):
+    """
+    Build the admittance matrix at a frequency
+    :param data: dictionary from get_frequency_scan_data
+    :param k: index of the frequency in the frequencies array
+    :param f: frequency (Hz)
+    :return: CSC admittance matrix (p.u.)
+    """
+    h = f / data['fBase']
+
+    # branches series impedance and shunt admittance
+    z = data['R'] + 1.0j * data['X'] * h
+    y = data['G'] + 1.0j * data['B'] * h
+    tower_idx = data['tower_idx']
+    z[tower_idx] = data['z_tower'][k, :]
+    y[tower_idx] = data['y_tower'][k, :]
+
+    # exact pi model of the lines: Z' = Z sinh(gl) / gl, Y' = Y tanh(gl/2) / (gl/2)
+    if data['long_line_correction']:
+        idx = np.where(data['is_line'] & (np.abs(y) > 0))[0]
+        gl = np.sqrt(z[idx] * y[idx])
+        z[idx] *= np.sinh(gl) / gl
+        y[idx] *= np.tanh(gl / 2) / (gl / 2)
+
+    Ys = 1.0 / z
+    GBc = y
+    tap = data['tap']
+    tap_f = data['tap_f']
+    tap_t = data['tap_t']
+    Ytt = (Ys + GBc / 2.0) / (tap_t * tap_t)
+    Yff = (Ys + GBc / 2.0) / (tap_f * tap_f * tap * np.conj(tap))
+    Yft = - Ys / (tap_f * tap_t * np.conj(tap))
+    Ytf = - Ys / (tap_t * tap_f * tap)
+
+    # shunt elements of the buses
+    Ysh = data['G_bus'] + 1.0j * (data['B_cap'] * h + data['B_ind'] / h)
+    np.add.at(Ysh, data['gen_bus'], 1.0 / (data['z_gen'].real + 1.0j * data['z_gen'].imag * h))
+
+    F = data['F']
+    T = data['T']
+    buses = np.arange(data['nbus'])
+    rows = np.r_[F, F, T, T, buses]
+    cols = np.r_[F, T, F, T, buses]
+    values = np.r_[Yff, Yft, Ytf, Ytt, Ysh]
+
+    return sp.coo_matrix((values, (rows, cols)), shape=(data['nbus'], data['nbus'])).tocsc()
+
+
+def frequency_scan_chunk(idx, frequencies, data):
+    """
+    Driving point impedances of some frequencies: one sparse factorization per frequency
+    :param idx: frequency indices
+    :param frequencies: frequencies (Hz) of the indices
+    :param data: dictionary from get_frequency_scan_data
+    :return: driving point impedances (frequencies, scanned buses)
+    """
+    bus_indices = data['bus_indices']
+    rhs = np.zeros((data['nbus'], len(bus_indices)), dtype=complex)
+    rhs[bus_indices, np.arange(len(bus_indices))] = 1.0
+
+    z = np.zeros((len(idx), len(bus_indices)), dtype=complex)
+    for i, (k, f) in enumerate(zip(idx, frequencies)):
+        try:
+            lu = splu(get_harmonic_admittance(data, k, f))
+            z[i, :] = lu.solve(rhs)[bus_indices, np.arange(len(bus_indices))]
+        except RuntimeError:
+            # singular matrix (i.e. a floating island)
+            z[i, :] = np.nan
+
+    return z
+
+
+# per process data of the frequencies pool
+_worker_data = dict()
+
+
+def _init_frequency_scan_worker(data):
+    """
+    Pool initializer: store the frequency independent data once per process
+    """
+    _worker_data['data'] = data
+
+
+def frequency_scan_worker(args):
+    """
+    Frequency scan worker to schedule the frequencies in parallel
+    :param args: frequency indices, frequencies
+    :return: frequency indices, driving point impedances
+    """
+    idx, frequencies = args
+    return idx, frequency_scan_chunk(idx, frequencies, _worker_data['data'])
+
+
+class FrequencyScan(QThread):
+    progress_signal = Signal(float)
+    progress_text = Signal(str)
+    done_signal = Signal()
+
+    def __init__(self, circuit: MultiCircuit, options: FrequencyScanOptions):
+        """
+        Frequency scan: driving point impedance of some buses over a range of frequencies (harmonic studies).
+        The admittance matrix of every frequency is built from the branches data (and the towers of the lines)
+        and factorized once to get the impedances of all the scanned buses.
+        :param circuit: MultiCircuit instance
+        :param options: FrequencyScanOptions instance
+        """
+        QThread.__init__(self)
+
+        self.circuit = circuit
+
+        self.options = options
+
+        self.results = None
+
+        self.logger = Logger()
+
+        self.__cancel__ = False
+
+    def get_chunks(self, frequencies, n_chunks):
+        """
+        Split the frequencies in chunks
+        :param frequencies: array of frequencies
+        :param n_chunks: number of chunks
+        :return: list of (frequency indices, frequencies)
+        """
+        return [(idx, frequencies[idx])
+                for idx in np.array_split(np.arange(len(frequencies)), n_chunks) if len(idx)]
+
+    def run_single_process(self, frequencies, data):
+        """
+        Solve the frequencies one chunk after the other
+        :param frequencies: array of frequencies
+        :param data: dictionary from get_frequency_scan_data
+        """
+        chunks = self.get_chunks(frequencies, min(len(frequencies), 100))
+
+        for k, (idx, f) in enumerate(chunks):
+
+            if self.__cancel__:
+                break
+
+            self.results.set_frequencies(idx, frequency_scan_chunk(idx, f, data))
+
+            self.progress_signal.emit((k + 1) / len(chunks) * 100.0)
+
+    def run_multi_process(self, frequencies, data):
+        """
+        Solve the frequencies in a pool of processes; the frequency independent data is sent once to every process
+        :param frequencies: array of frequencies
+        :param data: dictionary from get_frequency_scan_data
+        """
+        n_cores = multiprocessing.cpu_count() if self.options.n_processes is None else self.options.n_processes
+        self.progress_text.emit('Running the frequency scan using ' + str(n_cores) + ' cores ...')
+
+        chunks = self.get_chunks(frequencies, min(len(frequencies), 4 * n_cores))
+
+        pool = multiprocessing.Pool(processes=n_cores,
+                                    initializer=_init_frequency_scan_worker,
+                                    initargs=(data,))
+        try:
+            for k, (idx, z) in enumerate(pool.imap_unordered(frequency_scan_worker, chunks)):
+                self.results.set_frequencies(idx, z)
+                self.progress_signal.emit((k + 1) / len(chunks) * 100.0)
+
+                if self.__cancel__:
+                    pool.terminate()
+                    break
+        finally:
+            pool.close()
+            pool.join()
+
+    def run(self):
+        """
+        Run the frequency scan
+        """
+        self.__cancel__ = False
+
+        self.progress_signal.emit(0.0)
+        self.progress_text.emit('Running the frequency scan...')
+
+        if self.options.frequencies is None:
+            self.options.frequencies = self.circuit.fBase * np.arange(1, 51)
+        if self.options.bus_indices is None:
+            self.options.bus_indices = np.arange(len(self.circuit.buses))
+
+        frequencies = np.atleast_1d(np.array(self.options.frequencies, dtype=float))
+        self.options.frequencies = frequencies
+
+        data = get_frequency_scan_data(self.circuit, self.options, self.logger)
+
+        self.results = FrequencyScanResults(frequencies=frequencies,
+                                            bus_indices=data['bus_indices'],
+                                            bus_names=[self.circuit.buses[i].name for i in data['bus_indices']])
+
+        if self.options.multi_process:
+            self.run_multi_process(frequencies, data)
+        else:
+            self.run_single_process(frequencies, data)
+
+        self.progress_signal.emit(0.0)
+        self.progress_text.emit('Done!')
+        self.done_signal.emit()
+
+    def cancel(self):
+        """
+        Cancel the simulation
+        """
+        self.__cancel__ = True
+        self.progress_signal.emit(0.0)
+        self.progress_text.emit('Cancelled!')
+        self.done_signal.emit()
@@ -2,7 +2,10 @@
 
 from GridCal.Engine.Simulations.OPF.dc_opf import *
 from GridCal.Engine.Simulations.OPF.dc_opf_ts import *
+from GridCal.Engine.Simulations.OPF.dc_opf_matrix import *
+from GridCal.Engine.Simulations.OPF.dc_opf_sc import *
 from GridCal.Engine.Simulations.OPF.ac_opf import *
 from GridCal.Engine.Simulations.OPF.ac_opf_ts import *
+from GridCal.Engine.Simulations.OPF.ac_opf_ipm import *
 from GridCal.Engine.Simulations.OPF.opf_driver import *
 from GridCal.Engine.Simulations.OPF.opf_time_series_driver import *
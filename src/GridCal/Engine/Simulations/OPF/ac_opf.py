@@ -18,6 +18,7 @@ This file implements a DC-OPF for time series
 That means that solves the OPF problem for a complete time series at once
 """
 
+from GridCal.Engine.basic_structures import MIPSolvers
 from GridCal.Engine.Core.numerical_circuit import NumericalCircuit
 from GridCal.Engine.Simulations.OPF.opf_templates import Opf
 from GridCal.ThirdParty.pulp import *
@@ -94,18 +95,20 @@ def get_power_injections(C_bus_gen, Pg, C_bus_bat, Pb, C_bus_load, PlSlack, QlSl
     return P, Q
 
 
-def add_ac_nodal_power_balance(numerical_circuit, problem: LpProblem, dvm, dva, P, Q):
+def add_ac_nodal_power_balance(numerical_circuit, problem: LpProblem, dvm, dva, P, Q, calculation_inputs=None):
     """
     Add the nodal power balance
     :param numerical_circuit: NumericalCircuit instance
     :param problem: LpProblem instance
     :param dva: Voltage angles LpVars (n, nt)
     :param P: Power injection at the buses LpVars (n, nt)
+    :param calculation_inputs: list of CalculationInputs (islands), if None they are computed
     :return: Nothing, the restrictions are added to the problem
     """
 
     # do the topological computation
-    calculation_inputs = numerical_circuit.compute()
+    if calculation_inputs is None:
+        calculation_inputs = numerical_circuit.compute()
 
     nodal_restrictions_P = np.empty(numerical_circuit.nbus, dtype=object)
     nodal_restrictions_Q = np.empty(numerical_circuit.nbus, dtype=object)
@@ -216,12 +219,16 @@ def add_branch_loading_restriction(problem: LpProblem,
 
 class AcOpf(Opf):
 
-    def __init__(self, numerical_circuit: NumericalCircuit):
+    def __init__(self, numerical_circuit: NumericalCircuit, calculation_inputs=None,
+                 solver: MIPSolvers = MIPSolvers.CBC):
         """
         DC time series linear optimal power flow
         :param numerical_circuit: NumericalCircuit instance
+        :param calculation_inputs: list of CalculationInputs (islands), if None they are computed
+        :param solver: MIP solver to use
         """
-        Opf.__init__(self, numerical_circuit=numerical_circuit)
+        Opf.__init__(self, numerical_circuit=numerical_circuit, solver=solver,
+                     calculation_inputs=calculation_inputs)
 
         self.v0 = None
         self.dva = None
@@ -299,7 +306,8 @@ class AcOpf(Opf):
         # compute the nodal power balance restrictions
         nodal_restrictions_P, nodal_restrictions_Q = add_ac_nodal_power_balance(numerical_circuit=numerical_circuit,
                                                                                 problem=problem,
-                                                                                dvm=dvm, dva=dva, P=P, Q=Q)
+                                                                                dvm=dvm, dva=dva, P=P, Q=Q,
+                                                                                calculation_inputs=self.calculation_inputs)
 
         # add the branch loading restriction
         load_f, load_t = add_branch_loading_restriction(problem, theta_f, theta_t, Bseries, branch_ratings,
@@ -0,0 +1,590 @@
+# This file is part of GridCal.
+#
+# GridCal is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# GridCal is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with GridCal.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+This file implements the full (non linear) AC-OPF solved with a primal-dual interior point method.
+
+    min  f(x)
+    s.t. g(x) = 0
+         h(x) <= 0
+
+with x = [Va, Vm, Pg, Qg] per island. g(x) are the nodal power balances (plus the slack angle and the
+non-dispatchable generation), and h(x) are the squared apparent power flow limits at both ends of the branches
+plus the voltage and generation limits. The first derivatives are the ones of the Newton-Raphson power flow and
+of the state estimation (dSbus_dV, dSbr_dV) and the second derivatives are computed analytically, so every
+iteration solves one sparse KKT system. The KKT pattern does not change between iterations, so the fill-reducing
+ordering is computed once and re-used (ReusableSuperLU).
+
+The derivatives follow:
+[TN2]  R. D. Zimmerman, "AC Power Flows, Generalized OPF Costs and their Derivatives using Complex Matrix Notation",
+       MATPOWER Technical Note 2, February 2010.
+and the interior point algorithm follows MIPS:
+       H. Wang, C. E. Murillo-Sanchez, R. D. Zimmerman, R. J. Thomas, "On Computational Issues of Market-Based Optimal
+       Power Flow", IEEE Transactions on Power Systems, Vol. 22, No. 3, Aug. 2007, pp. 1185-1193.
+"""
+
+import numpy as np
+import scipy.sparse as sp
+
+from GridCal.Engine.basic_structures import Logger
+from GridCal.Engine.Core.numerical_circuit import NumericalCircuit
+from GridCal.Engine.Simulations.sparse_solve import ReusableSuperLU
+from GridCal.Engine.Simulations.PowerFlow.jacobian_based_power_flow import dSbus_dV
+from GridCal.Engine.Simulations.StateEstimation.state_estimation import dSbr_dV
+
+
+def d2Sbus_dV2(Ybus, V, lam):
+    """
+    Computes the second derivatives of the power injections w.r.t. the voltage, multiplied by lam
+    (the Hessian of lam^T x Sbus)
+    :param Ybus: Admittance matrix
+    :param V: Bus voltages array
+    :param lam: array of multipliers (one per bus)
+    :return: Gaa, Gav, Gva, Gvv
+    """
+    n = len(V)
+    ib = np.arange(n)
+
+    Ibus = Ybus * V
+    diaglam = sp.csr_matrix((lam, (ib, ib)))
+    diagV = sp.csr_matrix((V, (ib, ib)))
+
+    A = sp.csr_matrix((lam * V, (ib, ib)))
+    B = Ybus * diagV
+    C = A * np.conj(B)
+    D = Ybus.conj().transpose() * diagV
+    E = diagV.conj() * (D * diaglam - sp.csr_matrix((D * lam, (ib, ib))))
+    F = C - A * sp.csr_matrix((np.conj(Ibus), (ib, ib)))
+    G = sp.csr_matrix((1.0 / np.abs(V), (ib, ib)))
+
+    Gaa = E + F
+    Gva = 1j * G * (E - F)
+    Gav = Gva.transpose()
+    Gvv = G * (C + C.transpose()) * G
+
+    return Gaa, Gav, Gva, Gvv
+
+
+def d2Sbr_dV2(Cbr, Ybr, V, lam):
+    """
+    Computes the second derivatives of the complex branch power flows w.r.t. the voltage, multiplied by lam
+    :param Cbr: branch-bus connectivity matrix of the branch side (f or t)
+    :param Ybr: branch admittance matrix of the branch side (Yf or Yt)
+    :param V: Bus voltages array
+    :param lam: array of multipliers (one per branch)
+    :return: Haa, Hav, Hva, Hvv
+    """
+    nb = len(V)
+    nl = len(lam)
+    ib = np.arange(nb)
+    il = np.arange(nl)
+
+    diaglam = sp.csr_matrix((lam, (il, il)))
+    diagV = sp.csr_matrix((V, (ib, ib)))
+
+    A = Ybr.conj().transpose() * diaglam * Cbr
+    B = diagV.conj() * A * diagV
+    D = sp.csr_matrix(((A * V) * np.conj(V), (ib, ib)))
+    E = sp.csr_matrix(((A.transpose() * np.conj(V)) * V, (ib, ib)))
+    F = B + B.transpose()
+    G = sp.csr_matrix((1.0 / np.abs(V), (ib, ib)))
+
+    Haa = F - D - E
+    Hva = 1j * G * (B - B.transpose() - D + E)
+    Hav = Hva.transpose()
+    Hvv = G * F * G
+
+    return Haa, Hav, Hva, Hvv
+
+
+def dAbr_dV(dSbr_dVa, dSbr_dVm, Sbr):
+    """
+    Computes the derivatives of the squared apparent power flows |Sbr|^2 w.r.t. the voltage
+    :param dSbr_dVa: derivatives of the complex flows w.r.t. the voltage angles
+    :param dSbr_dVm: derivatives of the complex flows w.r.t. the voltage modules
+    :param Sbr: complex branch flows
+    :return: dAbr_dVa, dAbr_dVm
+    """
+    il = np.arange(len(Sbr))
+    dP = sp.csr_matrix((Sbr.real, (il, il)))
+    dQ = sp.csr_matrix((Sbr.imag, (il, il)))
+
+    dAbr_dVa = 2.0 * (dP * dSbr_dVa.real + dQ * dSbr_dVa.imag)
+    dAbr_dVm = 2.0 * (dP * dSbr_dVm.real + dQ * dSbr_dVm.imag)
+
+    return dAbr_dVa, dAbr_dVm
+
+
+def d2Abr_dV2(dSbr_dVa, dSbr_dVm, Sbr, Cbr, Ybr, V, lam):
+    """
+    Computes the second derivatives of the squared apparent power flows |Sbr|^2 w.r.t. the voltage, multiplied by lam
+    :param dSbr_dVa: derivatives of the complex flows w.r.t. the voltage angles
+    :param dSbr_dVm: derivatives of the complex flows w.r.t. the voltage modules
+    :param Sbr: complex branch flows
+    :param Cbr: branch-bus connectivity matrix of the branch side (f or t)
+    :param Ybr: branch admittance matrix of the branch side (Yf or Yt)
+    :param V: Bus voltages array
+    :param lam: array of multipliers (one per branch)
+    :return: Haa, Hav, Hva, Hvv
+    """
+    il = np.arange(len(lam))
+    diaglam = sp.csr_matrix((lam, (il, il)))
+
+    Saa, Sav, Sva, Svv = d2Sbr_dV2(Cbr, Ybr, V, np.conj(Sbr) * lam)
+
+    Haa = 2.0 * (Saa + dSbr_dVa.transpose() * diaglam * dSbr_dVa.conj()).real
+    Hva = 2.0 * (Sva + dSbr_dVm.transpose() * diaglam * dSbr_dVa.conj()).real
+    Hav = 2.0 * (Sav + dSbr_dVa.transpose() * diaglam * dSbr_dVm.conj()).real
+    Hvv = 2.0 * (Svv + dSbr_dVm.transpose() * diaglam * dSbr_dVm.conj()).real
+
+    return Haa, Hav, Hva, Hvv
+
+
+def interior_point_solver(x0, f_eval, g_eval, h_eval, hessian_eval, max_iter=100, tolerance=1e-6,
+                          linear_solver: ReusableSuperLU = None, verbose=False, logger: Logger = None):
+    """
+    Primal-dual interior point solver for the problem:
+        min  f(x)
+        s.t. g(x) = 0
+             h(x) <= 0
+    :param x0: initial point
+    :param f_eval: function returning the objective value and its gradient: f, df
+    :param g_eval: function returning the equality constraints and its jacobian: g, Jg (sparse neq x nx)
+    :param h_eval: function returning the inequality constraints and its jacobian: h, Jh (sparse niq x nx)
+    :param hessian_eval: function returning the hessian of the lagrangian: Lxx(x, lam, mu) (sparse nx x nx)
+    :param max_iter: maximum number of iterations
+    :param tolerance: feasibility, gradient, complementarity and cost tolerance
+    :param linear_solver: ReusableSuperLU instance used to solve the KKT systems
+    :param verbose: report the progress of every iteration to the logger?
+    :param logger: Logger instance
+    :return: x, lam, mu, converged, iterations
+    """
+    gamma = 1.0  # barrier coefficient
+    sigma = 0.1  # centering parameter
+    xi = 0.99995  # step to the boundary
+    z0 = 1.0
+
+    if linear_solver is None:
+        linear_solver = ReusableSuperLU()
+
+    if logger is None:
+        logger = Logger()
+
+    x = x0.copy()
+    nx = len(x)
+
+    f, df = f_eval(x)
+    g, Jg = g_eval(x)
+    h, Jh = h_eval(x)
+    neq = len(g)
+    niq = len(h)
+
+    # slacks and multipliers
+    z = z0 * np.ones(niq)
+    mu = z0 * np.ones(niq)
+    lam = np.zeros(neq)
+    k = h < -z0
+    z[k] = -h[k]
+    k = (gamma / z) > z0
+    mu[k] = gamma / z[k]
+    e = np.ones(niq)
+
+    converged = False
+    iterations = 0
+    f0 = f
+
+    while iterations < max_iter:
+
+        # gradient of the lagrangian
+        Lx = df + Jg.transpose() * lam + Jh.transpose() * mu
+
+        # convergence criteria
+        max_x = max(np.max(np.abs(x)), np.max(np.abs(z)) if niq else 0.0)
+        feas_cond = max(np.max(np.abs(g)) if neq else 0.0, np.max(h) if niq else 0.0) / (1.0 + max_x)
+        grad_cond = np.max(np.abs(Lx)) / (1.0 + max(np.max(np.abs(lam)) if neq else 0.0,
+                                                    np.max(np.abs(mu)) if niq else 0.0))
+        comp_cond = z.dot(mu) / (1.0 + np.max(np.abs(x)))
+        cost_cond = abs(f - f0) / (1.0 + abs(f0))
+
+        if verbose:
+            logger.append('Interior point iteration ' + str(iterations) + ': f=' + str(f) +
+                          ', feasibility=' + str(feas_cond) + ', gradient=' + str(grad_cond) +
+                          ', complementarity=' + str(comp_cond) + ', cost=' + str(cost_cond))
+
+        if feas_cond < tolerance and grad_cond < tolerance and comp_cond < tolerance and cost_cond < tolerance:
+            converged = True
+            break
+
+        # reduced KKT system
+        Lxx = hessian_eval(x, lam, mu)
+        z_inv = sp.diags(1.0 / z)
+        mu_diag = sp.diags(mu)
+        dh_zinv = Jh.transpose() * z_inv
+        M = Lxx + dh_zinv * mu_diag * Jh
+        N = Lx + dh_zinv * (mu * h + gamma * e)
+
+        KKT = sp.bmat([[M, Jg.transpose()], [Jg, None]], format='csc')
+        rhs = -np.r_[N, g]
+
+        try:
+            dxl = linear_solver.factorize(KKT).solve(rhs)
+        except RuntimeError as e:
+            # the KKT matrix is singular
+            logger.append('Interior point iteration ' + str(iterations) + ': singular KKT system (' + str(e) + ')')
+            break
+
+        dx = dxl[:nx]
+        dlam = dxl[nx:]
+        dz = -h - z - Jh * dx
+        dmu = -mu + z_inv * (gamma * e - mu * dz)
+
+        # step lengths that keep the slacks and their multipliers positive
+        k = dz < 0
+        alpha_p = min(xi * np.min(-z[k] / dz[k]), 1.0) if k.any() else 1.0
+        k = dmu < 0
+        alpha_d = min(xi * np.min(-mu[k] / dmu[k]), 1.0) if k.any() else 1.0
+
+        x += alpha_p * dx
+        z += alpha_p * dz
+        lam += alpha_d * dlam
+        mu += alpha_d * dmu
+        if niq > 0:
+            gamma = sigma * z.dot(mu) / niq
+
+        f0 = f
+        f, df = f_eval(x)
+        g, Jg = g_eval(x)
+        h, Jh = h_eval(x)
+
+        if np.isnan(x).any():
+            break
+
+        iterations += 1
+
+    return x, lam, mu, converged, iterations
+
+
+class AcOpfIpm:
+
+    def __init__(self, numerical_circuit: NumericalCircuit, calculation_inputs=None, max_iter=100,
+                 tolerance=1e-6, logger: Logger = None, verbose=False):
+        """
+        Non linear AC optimal power flow solved with a primal-dual interior point method.
+        The constant current load components and the load shedding are not modelled.
+        :param numerical_circuit: NumericalCircuit instance
+        :param calculation_inputs: list of CalculationInputs (islands), if None they are computed
+        :param max_iter: maximum number of interior point iterations
+        :param tolerance: interior point tolerance
+        :param logger: Logger instance
+        :param verbose: report the progress of the interior point iterations to the logger?
+        """
+        self.numerical_circuit = numerical_circuit
+
+        if calculation_inputs is None:
+            calculation_inputs = numerical_circuit.compute()
+        self.calculation_inputs = calculation_inputs
+
+        self.max_iter = max_iter
+
+        self.tolerance = tolerance
+
+        self.logger = Logger() if logger is None else logger
+
+        self.verbose = verbose
+
+        nc = numerical_circuit
+        n = nc.nbus
+        m = nc.nbr
+        ng = nc.n_ctrl_gen
+        nb = nc.n_batt
+
+        # the generators and the batteries are dispatched as generation units
+        self.C_unit_bus = sp.vstack([nc.C_gen_bus, nc.C_batt_bus], format='csr')
+        self.unit_active = np.r_[nc.generator_active, nc.battery_active].astype(bool)
+        self.unit_dispatchable = np.r_[nc.generator_dispatchable, nc.battery_dispatchable].astype(bool)
+        self.unit_pmin = np.r_[nc.generator_pmin, nc.battery_pmin] / nc.Sbase
+        self.unit_pmax = np.r_[nc.generator_pmax, nc.battery_pmax] / nc.Sbase
+        self.unit_qmin = np.r_[nc.generator_qmin, nc.battery_qmin] / nc.Sbase
+        self.unit_qmax = np.r_[nc.generator_qmax, nc.battery_qmax] / nc.Sbase
+        self.unit_p_fix = np.r_[nc.generator_power, nc.battery_power] / nc.Sbase
+        self.unit_cost = np.r_[nc.generator_cost, nc.battery_cost]
+        self.ng = ng
+        self.nb = nb
+
+        # fixed power demanded at the buses (p.u.)
+        self.S_fixed = nc.C_load_bus.T * (nc.load_power / nc.Sbase * nc.load_active)
+        self.S_fixed -= nc.C_sta_gen_bus.T * (nc.static_gen_power / nc.Sbase * nc.static_gen_active)
+
+        self.rating = nc.br_rates / nc.Sbase
+
+        # load power (p.u.), the loads are not dispatched
+        self.Pl = nc.load_power.real * nc.load_active / nc.Sbase
+
+        # results
+        self.V = np.ones(n, dtype=complex)
+        self.Sf = np.zeros(m, dtype=complex)
+        self.St = np.zeros(m, dtype=complex)
+        self.Pu = np.zeros(ng + nb)
+        self.Qu = np.zeros(ng + nb)
+        self.lam_p = np.zeros(n)
+        self.lam_q = np.zeros(n)
+        self.all_converged = False
+        self.iterations = list()
+
+        # one KKT factorization per island, the ordering is re-used along the iterations
+        self.linear_solvers = list()
+
+    def solve_island(self, island):
+        """
+        Solve the AC-OPF of an island
+        :param island: CalculationInputs instance
+        :return: converged?
+        """
+        nc = self.numerical_circuit
+        Sbase = nc.Sbase
+
+        bus_idx = np.array(island.original_bus_idx)
+        br_idx = np.array(island.original_branch_idx, dtype=int)
+        n = len(bus_idx)
+
+        # generation units of the island
+        Cu = self.C_unit_bus[:, bus_idx].tocsr()
+        unit_idx = np.where((np.asarray(np.abs(Cu).sum(axis=1)).ravel() > 0) & self.unit_active)[0]
+        Cu = Cu[unit_idx, :]
+        nu = len(unit_idx)
+        CuT = Cu.transpose().tocsr()
+
+        # branches of the island
+        Yf = sp.csr_matrix(island.Yf)
+        Yt = sp.csr_matrix(island.Yt)
+        Cf = sp.csr_matrix(island.C_branch_bus_f)
+        Ct = sp.csr_matrix(island.C_branch_bus_t)
+        f = np.asarray(Cf.argmax(axis=1)).ravel()
+        t = np.asarray(Ct.argmax(axis=1)).ravel()
+        lim = np.where(self.rating[br_idx] > 0)[0]
+        nlim = len(lim)
+        rate2 = np.power(self.rating[br_idx][lim], 2.0)
+        Ybus = sp.csr_matrix(island.Ybus)
+        S_fixed = self.S_fixed[bus_idx]
+
+        # variables x = [Va, Vm, Pg, Qg]
+        nx = 2 * n + 2 * nu
+        va = np.arange(n)
+        vm = n + np.arange(n)
+        pg = 2 * n + np.arange(nu)
+        qg = 2 * n + nu + np.arange(nu)
+
+        # linear equalities: slack angles and non-dispatchable generation
+        ref = np.array(island.ref)
+        fixed = np.where(~self.unit_dispatchable[unit_idx])[0]
+        rows = np.r_[va[ref], pg[fixed]]
+        A_eq = sp.csr_matrix((np.ones(len(rows)), (np.arange(len(rows)), rows)), shape=(len(rows), nx))
+        b_eq = np.r_[np.angle(island.Vbus[ref]), self.unit_p_fix[unit_idx][fixed]]
+
+        # linear inequalities (bounds): A_iq x <= b_iq
+        dispatchable = np.where(self.unit_dispatchable[unit_idx])[0]
+        ub_idx = np.r_[vm, pg[dispatchable], qg]
+        ub_val = np.r_[nc.Vmax[bus_idx], self.unit_pmax[unit_idx][dispatchable], self.unit_qmax[unit_idx]]
+        lb_idx = np.r_[vm, pg[dispatchable], qg]
+        lb_val = np.r_[nc.Vmin[bus_idx], self.unit_pmin[unit_idx][dispatchable], self.unit_qmin[unit_idx]]
+        k1 = np.isfinite(ub_val)
+        k2 = np.isfinite(lb_val)
+        nr = k1.sum() + k2.sum()
+        A_iq = sp.csr_matrix((np.r_[np.ones(k1.sum()), -np.ones(k2.sum())],
+                              (np.arange(nr), np.r_[ub_idx[k1], lb_idx[k2]])), shape=(nr, nx))
+        b_iq = np.r_[ub_val[k1], -lb_val[k2]]
+
+        # objective (linear costs)
+        c = np.zeros(nx)
+        c[pg] = self.unit_cost[unit_idx] * Sbase
+
+        Z_u = sp.csr_matrix((nlim, 2 * nu))
+
+        def f_eval(x):
+            return c.dot(x), c
+
+        def g_eval(x):
+            V = x[vm] * np.exp(1j * x[va])
+            S = V * np.conj(Ybus * V) + S_fixed - CuT * (x[pg] + 1j * x[qg])
+            dS_dVm, dS_dVa = dSbus_dV(Ybus, V, np.zeros(n, dtype=complex))
+            Jp = sp.hstack([dS_dVa.real, dS_dVm.real, -CuT, sp.csr_matrix((n, nu))])
+            Jq = sp.hstack([dS_dVa.imag, dS_dVm.imag, sp.csr_matrix((n, nu)), -CuT])
+            g = np.r_[S.real, S.imag, A_eq * x - b_eq]
+            Jg = sp.vstack([Jp, Jq, A_eq], format='csr')
+            return g, Jg
+
+        def branch_derivatives(x):
+            V = x[vm] * np.exp(1j * x[va])
+            dSf_dVa, dSf_dVm, dSt_dVa, dSt_dVm, Sf, St = dSbr_dV(Yf, Yt, V, f, t)
+            return V, dSf_dVa[lim, :], dSf_dVm[lim, :], dSt_dVa[lim, :], dSt_dVm[lim, :], Sf[lim], St[lim]
+
+        def h_eval(x):
+            V, dSf_dVa, dSf_dVm, dSt_dVa, dSt_dVm, Sf, St = branch_derivatives(x)
+            dAf_dVa, dAf_dVm = dAbr_dV(dSf_dVa, dSf_dVm, Sf)
+            dAt_dVa, dAt_dVm = dAbr_dV(dSt_dVa, dSt_dVm, St)
+            h = np.r_[np.power(np.abs(Sf), 2.0) - rate2,
+                      np.power(np.abs(St), 2.0) - rate2,
+                      A_iq * x - b_iq]
+            Jh = sp.vstack([sp.hstack([dAf_dVa, dAf_dVm, Z_u]),
+                            sp.hstack([dAt_dVa, dAt_dVm, Z_u]),
+                            A_iq], format='csr')
+            return h, Jh
+
+        def hessian_eval(x, lam, mu):
+            V, dSf_dVa, dSf_dVm, dSt_dVa, dSt_dVm, Sf, St = branch_derivatives(x)
+
+            # nodal balance: real part with the P multipliers, imaginary part with the Q multipliers
+            Gaa_p, Gav_p, Gva_p, Gvv_p = d2Sbus_dV2(Ybus, V, lam[:n])
+            Gaa_q, Gav_q, Gva_q, Gvv_q = d2Sbus_dV2(Ybus, V, lam[n:2 * n])
+
+            # branch flows
+            Haa_f, Hav_f, Hva_f, Hvv_f = d2Abr_dV2(dSf_dVa, dSf_dVm, Sf, Cf[lim, :], Yf[lim, :], V, mu[:nlim])
+            Haa_t, Hav_t, Hva_t, Hvv_t = d2Abr_dV2(dSt_dVa, dSt_dVm, St, Ct[lim, :], Yt[lim, :], V,
+                                                   mu[nlim:2 * nlim])
+
+            Haa = Gaa_p.real + Gaa_q.imag + Haa_f + Haa_t
+            Hav = Gav_p.real + Gav_q.imag + Hav_f + Hav_t
+            Hva = Gva_p.real + Gva_q.imag + Hva_f + Hva_t
+            Hvv = Gvv_p.real + Gvv_q.imag + Hvv_f + Hvv_t
+
+            return sp.bmat([[Haa, Hav, None], [Hva, Hvv, None], [None, None, sp.csr_matrix((2 * nu, 2 * nu))]],
+                           format='csr')
+
+        # initial point: flat angles, the set points clipped to the limits and no reactive power
+        x0 = np.zeros(nx)
+        x0[va] = np.angle(island.Vbus[ref[0]])
+        x0[vm] = np.clip(np.abs(island.Vbus), nc.Vmin[bus_idx], nc.Vmax[bus_idx])
+        x0[pg] = np.clip(self.unit_p_fix[unit_idx], self.unit_pmin[unit_idx], self.unit_pmax[unit_idx])
+        x0[pg[fixed]] = self.unit_p_fix[unit_idx][fixed]
+        x0[qg] = np.clip(0.0, self.unit_qmin[unit_idx], self.unit_qmax[unit_idx])
+
+        linear_solver = ReusableSuperLU()
+        self.linear_solvers.append(linear_solver)
+
+        x, lam, mu, converged, iterations = interior_point_solver(x0=x0,
+                                                                  f_eval=f_eval,
+                                                                  g_eval=g_eval,
+                                                                  h_eval=h_eval,
+                                                                  hessian_eval=hessian_eval,
+                                                                  max_iter=self.max_iter,
+                                                                  tolerance=self.tolerance,
+                                                                  linear_solver=linear_solver,
+                                                                  verbose=self.verbose,
+                                                                  logger=self.logger)
+
+        # store the island results
+        V = x[vm] * np.exp(1j * x[va])
+        dSf_dVa, dSf_dVm, dSt_dVa, dSt_dVm, Sf, St = dSbr_dV(Yf, Yt, V, f, t)
+        self.V[bus_idx] = V
+        self.Sf[br_idx] = Sf
+        self.St[br_idx] = St
+        self.Pu[unit_idx] = x[pg]
+        self.Qu[unit_idx] = x[qg]
+        self.lam_p[bus_idx] = lam[:n]
+        self.lam_q[bus_idx] = lam[n:2 * n]
+        self.iterations.append(iterations)
+
+        if not converged:
+            self.logger.append('The interior point AC-OPF did not converge in ' + str(iterations) + ' iterations')
+
+        return converged
+
+    def solve(self):
+        """
+        Solve the AC-OPF of every island with slack
+        :return: status string
+        """
+        self.all_converged = True
+        self.iterations = list()
+        self.linear_solvers = list()
+
+        for island in self.calculation_inputs:
+            if len(island.ref) > 0:
+                self.all_converged &= self.solve_island(island)
+
+        return 'Optimal' if self.all_converged else 'Not solved'
+
+    def get_voltage(self):
+        """
+        return the complex voltages
+        :return: 1D array
+        """
+        return self.V
+
+    def get_overloads(self):
+        """
+        return the branch overloads (the limits are hard constraints)
+        :return: 1D array
+        """
+        return np.zeros(self.numerical_circuit.nbr)
+
+    def get_loading(self):
+        """
+        return the branch loading
+        :return: 1D array
+        """
+        return np.maximum(np.abs(self.Sf), np.abs(self.St)) / (self.rating + 1e-12)
+
+    def get_branch_power(self):
+        """
+        return the branch power
+        :return: 1D array
+        """
+        return np.abs(self.Sf) * self.numerical_circuit.Sbase
+
+    def get_battery_power(self):
+        """
+        return the battery dispatch
+        :return: 1D array
+        """
+        return self.Pu[self.ng:] * self.numerical_circuit.Sbase
+
+    def get_generator_power(self):
+        """
+        return the generator dispatch
+        :return: 1D array
+        """
+        return self.Pu[:self.ng] * self.numerical_circuit.Sbase
+
+    def get_generator_reactive_power(self):
+        """
+        return the generator reactive power
+        :return: 1D array
+        """
+        return self.Qu[:self.ng] * self.numerical_circuit.Sbase
+
+    def get_load_shedding(self):
+        """
+        return the load shedding (not modelled)
+        :return: 1D array
+        """
+        return np.zeros(self.numerical_circuit.n_ld)
+
+    def get_load_power(self):
+        """
+        return the load power
+        :return: 1D array
+        """
+        return self.Pl * self.numerical_circuit.Sbase
+
+    def get_shadow_prices(self):
+        """
+        return the nodal prices (cost per MW)
+        :return: 1D array
+        """
+        return self.lam_p / self.numerical_circuit.Sbase
+
+    def converged(self):
+        return self.all_converged
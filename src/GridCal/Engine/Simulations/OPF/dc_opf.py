@@ -17,6 +17,7 @@
 This file implements a DC-OPF for time series
 That means that solves the OPF problem for a complete time series at once
 """
+from GridCal.Engine.basic_structures import MIPSolvers
 from GridCal.Engine.Core.numerical_circuit import NumericalCircuit
 from GridCal.Engine.Simulations.OPF.opf_templates import Opf
 from GridCal.ThirdParty.pulp import *
@@ -90,18 +91,20 @@ def get_power_injections(C_bus_gen, Pg, C_bus_bat, Pb, C_bus_load, LSlack, Pl):
     return P
 
 
-def add_dc_nodal_power_balance(numerical_circuit, problem: LpProblem, theta, P):
+def add_dc_nodal_power_balance(numerical_circuit, problem: LpProblem, theta, P, calculation_inputs=None):
     """
     Add the nodal power balance
     :param numerical_circuit: NumericalCircuit instance
     :param problem: LpProblem instance
     :param theta: Voltage angles LpVars (n, nt)
     :param P: Power injection at the buses LpVars (n, nt)
+    :param calculation_inputs: list of CalculationInputs (islands), if None they are computed
     :return: Nothing, the restrictions are added to the problem
     """
 
     # do the topological computation
-    calculation_inputs = numerical_circuit.compute()
+    if calculation_inputs is None:
+        calculation_inputs = numerical_circuit.compute()
 
     nodal_restrictions = np.empty(numerical_circuit.nbus, dtype=object)
 
@@ -184,12 +187,16 @@ def add_branch_loading_restriction(problem: LpProblem, theta_f, theta_t, Bseries
 
 class DcOpf(Opf):
 
-    def __init__(self, numerical_circuit: NumericalCircuit):
+    def __init__(self, numerical_circuit: NumericalCircuit, calculation_inputs=None,
+                 solver: MIPSolvers = MIPSolvers.CBC):
         """
         DC time series linear optimal power flow
         :param numerical_circuit: NumericalCircuit instance
+        :param calculation_inputs: list of CalculationInputs (islands), if None they are computed
+        :param solver: MIP solver to use
         """
-        Opf.__init__(self, numerical_circuit=numerical_circuit)
+        Opf.__init__(self, numerical_circuit=numerical_circuit, solver=solver,
+                     calculation_inputs=calculation_inputs)
 
         # build the formulation
         self.problem = self.formulate()
@@ -257,7 +264,8 @@ class DcOpf(Opf):
                                  LSlack=load_slack, Pl=Pl)
 
         # add the DC grid restrictions
-        nodal_restrictions = add_dc_nodal_power_balance(numerical_circuit, problem, theta, P)
+        nodal_restrictions = add_dc_nodal_power_balance(numerical_circuit, problem, theta, P,
+                                                        calculation_inputs=self.calculation_inputs)
 
         # add the branch loading restriction
         load_f, load_t = add_branch_loading_restriction(problem, theta_f, theta_t, Bseries, branch_ratings,
@@ -0,0 +1,844 @@
+# This file is part of GridCal.
+#
+# GridCal is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# GridCal is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with GridCal.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+This file implements the DC-OPF (snapshot and time series) in matrix form.
+Instead of building one PuLP expression per element, the LP is assembled directly
+as sparse matrices from the NumericalCircuit:
+
+    min  c x
+    s.t. A_eq x = b_eq
+         A_ub x <= b_ub
+         lb <= x <= ub
+
+and it is handed to an in-process LP solver (scipy's HiGHS when available) or written in bulk as a MPS file.
+The variables are stored in blocks, each one of shape (devices, nt) flattened in row-major order,
+so the variable of the device i at the time t of the block is offset + i * nt + t
+"""
+
+import numpy as np
+import scipy.sparse as sp
+from collections import OrderedDict
+from scipy.optimize import linprog
+
+from GridCal.Engine.Core.numerical_circuit import NumericalCircuit
+from GridCal.Engine.Core.topology_cache import TopologyCache
+from GridCal.ThirdParty.pulp.solver_interfaces.scipy_session import get_linprog_method
+
+
+class LpMatrixModel:
+
+    def __init__(self, name='LP'):
+        """
+        Sparse matrix LP model
+        :param name: name of the model
+        """
+        self.name = name
+
+        # variable blocks: name -> (offset, shape)
+        self.blocks = OrderedDict()
+
+        # number of variables
+        self.nvar = 0
+
+        self.c = None
+        self.lb = None
+        self.ub = None
+
+        self.A_eq = None
+        self.b_eq = None
+
+        self.A_ub = None
+        self.b_ub = None
+
+        # solution
+        self.x = None
+        self.eq_duals = None
+        self.status = 'Not solved'
+        self.success = False
+        self.objective = 0.0
+
+    def add_block(self, name, shape):
+        """
+        Add a block of variables
+        :param name: name of the block
+        :param shape: (number of devices, number of time steps)
+        :return: offset of the block
+        """
+        offset = self.nvar
+        self.blocks[name] = (offset, shape)
+        self.nvar += shape[0] * shape[1]
+        return offset
+
+    def idx(self, name, dev, t):
+        """
+        Get the indices of the variables of a block
+        :param name: name of the block
+        :param dev: device indices (array or int)
+        :param t: time indices (array or int)
+        :return: variable indices
+        """
+        offset, shape = self.blocks[name]
+        return offset + np.asarray(dev) * shape[1] + np.asarray(t)
+
+    def allocate(self):
+        """
+        Allocate the cost and bounds vectors once all the blocks are declared
+        """
+        self.c = np.zeros(self.nvar)
+        self.lb = np.zeros(self.nvar)
+        self.ub = np.zeros(self.nvar)
+
+    def set_block(self, name, cost=None, lower=None, upper=None):
+        """
+        Set the cost and bounds of a block
+        :param name: name of the block
+        :param cost: cost (scalar, (devices) or (devices, nt)) or None to leave untouched
+        :param lower: lower bound (scalar, (devices) or (devices, nt)), -np.inf for unbounded
+        :param upper: upper bound (scalar, (devices) or (devices, nt)), np.inf for unbounded
+        """
+        offset, shape = self.blocks[name]
+        sl = slice(offset, offset + shape[0] * shape[1])
+
+        for vec, val in [(self.c, cost), (self.lb, lower), (self.ub, upper)]:
+            if val is not None:
+                val = np.asarray(val, dtype=float)
+                if val.ndim == 1:
+                    val = val[:, np.newaxis]
+                vec[sl] = np.broadcast_to(val, shape).ravel()
+
+    def get_block(self, name, arr=None):
+        """
+        Get the values of a block in GridCal format (time, device)
+        :param name: name of the block
+        :param arr: array of the size of the variables (if None, the solution is used)
+        :return: 2D array (nt, devices)
+        """
+        offset, shape = self.blocks[name]
+        if arr is None:
+            arr = self.x
+        return arr[offset:offset + shape[0] * shape[1]].reshape(shape).transpose()
+
+    def solve(self):
+        """
+        Solve the model with scipy's linprog
+        :return: status string
+        """
+        bounds = np.c_[np.where(np.isinf(self.lb), None, self.lb),
+                       np.where(np.isinf(self.ub), None, self.ub)]
+
+        kwargs = dict()
+        if self.A_eq is not None and self.A_eq.shape[0] > 0:
+            kwargs['A_eq'] = self.A_eq.tocsc()
+            kwargs['b_eq'] = self.b_eq
+        if self.A_ub is not None and self.A_ub.shape[0] > 0:
+            kwargs['A_ub'] = self.A_ub.tocsc()
+            kwargs['b_ub'] = self.b_ub
+
+        method = get_linprog_method()
+        if method == 'interior-point':
+            kwargs['options'] = dict(sparse=True, presolve=True)
+
+        res = linprog(c=self.c, bounds=bounds, method=method, **kwargs)
+
+        self.success = res.success
+        self.status = 'Optimal' if res.success else res.message
+        self.x = res.x if res.x is not None else np.zeros(self.nvar)
+        self.objective = res.fun if res.fun is not None else 0.0
+
+        # dual values of the equality rows (only the HiGHS interface provides them)
+        eqlin = getattr(res, 'eqlin', None)
+        if eqlin is not None and self.A_eq is not None:
+            self.eq_duals = np.asarray(eqlin.marginals)
+        elif self.A_eq is not None:
+            self.eq_duals = np.zeros(self.A_eq.shape[0])
+
+        return self.status
+
+    def write_mps(self, file_name):
+        """
+        Write the model in free MPS format
+        :param file_name: name of the file
+        """
+        var_names = np.array(['x' + str(i) for i in range(self.nvar)])
+
+        A_eq = self.A_eq.tocsc() if self.A_eq is not None else sp.csc_matrix((0, self.nvar))
+        A_ub = self.A_ub.tocsc() if self.A_ub is not None else sp.csc_matrix((0, self.nvar))
+        n_eq = A_eq.shape[0]
+        n_ub = A_ub.shape[0]
+        row_names = np.array(['e' + str(i) for i in range(n_eq)] + ['u' + str(i) for i in range(n_ub)])
+
+        # stack the objective and the rows so that the columns section is a single pass over a CSC matrix
+        A = sp.vstack([sp.csr_matrix(self.c), A_eq, A_ub]).tocsc()
+        all_rows = np.r_[['obj'], row_names]
+
+        with open(file_name, 'w') as f:
+            f.write('NAME ' + self.name + '\n')
+
+            f.write('ROWS\n')
+            f.write(' N obj\n')
+            f.write(''.join(' E ' + r + '\n' for r in row_names[:n_eq]))
+            f.write(''.join(' L ' + r + '\n' for r in row_names[n_eq:]))
+
+            f.write('COLUMNS\n')
+            cols = np.repeat(np.arange(self.nvar), np.diff(A.indptr))
+            lines = np.char.add(np.char.add(np.char.add(' ', var_names[cols]), ' '),
+                                np.char.add(np.char.add(all_rows[A.indices], ' '), A.data.astype(str)))
+            f.write('\n'.join(lines))
+            f.write('\n')
+
+            f.write('RHS\n')
+            rhs = np.r_[self.b_eq if n_eq else [], self.b_ub if n_ub else []]
+            nz = np.where(rhs != 0)[0]
+            f.write(''.join(' RHS ' + row_names[i] + ' ' + str(rhs[i]) + '\n' for i in nz))
+
+            f.write('BOUNDS\n')
+            lb_inf = np.isinf(self.lb)
+            ub_inf = np.isinf(self.ub)
+            fx = self.lb == self.ub
+            fr = lb_inf & ub_inf & ~fx
+            rest = ~(fx | fr)
+
+            # (bound type, variables, values) of every kind of bound line
+            kinds = [(' FX BND ', np.where(fx)[0], self.lb),
+                     (' FR BND ', np.where(fr)[0], None),
+                     (' MI BND ', np.where(rest & lb_inf)[0], None),
+                     (' LO BND ', np.where(rest & ~lb_inf & (self.lb != 0))[0], self.lb),
+                     (' UP BND ', np.where(rest & ~ub_inf)[0], self.ub)]
+
+            idx = np.concatenate([k[1] for k in kinds])
+            lines = np.concatenate([np.char.add(tpe, var_names[k]) if val is None
+                                    else np.char.add(np.char.add(np.char.add(tpe, var_names[k]), ' '),
+                                                     val[k].astype(str))
+                                    for tpe, k, val in kinds])
+
+            # keep the lines of each variable together, in the kinds order
+            order = np.argsort(idx, kind='stable')
+            if len(order):
+                f.write('\n'.join(lines[order]))
+                f.write('\n')
+
+            f.write('ENDATA\n')
+
+
+def build_dc_opf_matrix_structure(model: LpMatrixModel, numerical_circuit: NumericalCircuit, islands_per_t, nt,
+                                  Bseries, Efficiency=None, dt=None):
+    """
+    Declare the DC-OPF variables and build the constraint matrices.
+    The matrices only depend on the topology (islands and branch states), on the batteries efficiency and on
+    the time steps, so they can be re-used by the windows sharing those
+    :param model: LpMatrixModel instance (empty)
+    :param numerical_circuit: NumericalCircuit instance
+    :param islands_per_t: list of (time indices array, list of CalculationInputs) sharing the same topology
+    :param nt: number of time steps
+    :param Bseries: branch series susceptances (m, nt)
+    :param Efficiency: batteries efficiency (nb), if None the energy is not modelled
+    :param dt: time increments in hours (nt)
+    :return: indices of the nodal balance rows (n, nt) (-1 if not formulated)
+    """
+    n = numerical_circuit.nbus
+    m = numerical_circuit.nbr
+    ng = numerical_circuit.n_ctrl_gen
+    nb = numerical_circuit.n_batt
+    nl = numerical_circuit.n_ld
+    with_energy = Efficiency is not None and nb > 0
+
+    # declare the variables
+    model.add_block('theta', (n, nt))
+    model.add_block('Pg', (ng, nt))
+    model.add_block('Pb', (nb, nt))
+    if with_energy:
+        model.add_block('E', (nb, nt))
+    model.add_block('LSlack', (nl, nt))
+    model.add_block('FSlack1', (m, nt))
+    model.add_block('FSlack2', (m, nt))
+    model.allocate()
+
+    # nodal power balance: B theta - Cg^T Pg - Cb^T Pb - Cl^T LSlack = - Cl^T Pl
+    # the rows are indexed as bus * nt + t, and only the rows of the islands with a slack are kept
+    It = sp.identity(nt, format='csr')
+    t_off = model.blocks['theta'][0]
+    rows = list()
+    cols = list()
+    vals = list()
+    formulated = np.zeros(n * nt, dtype=bool)
+
+    for t_idx, islands in islands_per_t:
+        t_idx = np.asarray(t_idx)
+        k = len(t_idx)
+        for island in islands:
+            if len(island.ref) > 0:
+                bus_idx = np.array(island.original_bus_idx)
+                B = island.Ybus.imag.tocoo()
+                rows.append(np.repeat(bus_idx[B.row] * nt, k) + np.tile(t_idx, B.nnz))
+                cols.append(np.repeat(t_off + bus_idx[B.col] * nt, k) + np.tile(t_idx, B.nnz))
+                vals.append(np.repeat(B.data, k))
+                formulated[(bus_idx[:, np.newaxis] * nt + t_idx[np.newaxis, :]).ravel()] = True
+
+    A_theta = sp.coo_matrix((np.concatenate(vals) if len(vals) else np.zeros(0),
+                             (np.concatenate(rows) if len(rows) else np.zeros(0, dtype=int),
+                              np.concatenate(cols) if len(cols) else np.zeros(0, dtype=int))),
+                            shape=(n * nt, model.nvar)).tocsr()
+
+    def block_matrix(name, C):
+        """
+        Sparse (n * nt, nvar) matrix placing kron(C, I) at the columns of the block
+        """
+        offset, shape = model.blocks[name]
+        if shape[0] == 0:
+            return sp.csr_matrix((n * nt, model.nvar))
+        K = sp.kron(sp.csr_matrix(C), It, format='csr')
+        left = sp.csr_matrix((n * nt, offset))
+        right = sp.csr_matrix((n * nt, model.nvar - offset - shape[0] * shape[1]))
+        return sp.hstack([left, K, right], format='csr')
+
+    Cg = numerical_circuit.C_gen_bus.transpose()
+    Cb = numerical_circuit.C_batt_bus.transpose()
+    Cl = numerical_circuit.C_load_bus.transpose()
+
+    A_nodal = A_theta - block_matrix('Pg', Cg) - block_matrix('Pb', Cb) - block_matrix('LSlack', Cl)
+
+    nodal_rows = np.where(formulated)[0]
+    nodal_restrictions = np.full(n * nt, -1, dtype=int)
+    nodal_restrictions[nodal_rows] = np.arange(len(nodal_rows))
+
+    A_eq_list = [A_nodal[nodal_rows, :]]
+
+    # battery energy: E[0] = SoC0 * Capacity, E[t] - E[t-1] + dt[t-1] * Pb[t] / eff = 0
+    if with_energy:
+        dev = np.arange(nb)
+        e0 = model.idx('E', dev, 0)
+        A_eq_list.append(sp.coo_matrix((np.ones(nb), (np.arange(nb), e0)), shape=(nb, model.nvar)))
+
+        if nt > 1:
+            d = np.repeat(dev, nt - 1)
+            t = np.tile(np.arange(1, nt), nb)
+            r = np.arange(len(d))
+            coef = dt[t - 1] / Efficiency[d]
+            A1 = sp.coo_matrix((np.r_[np.ones(len(d)), -np.ones(len(d)), coef],
+                                (np.r_[r, r, r],
+                                 np.r_[model.idx('E', d, t), model.idx('E', d, t - 1), model.idx('Pb', d, t)])),
+                               shape=(len(d), model.nvar))
+            A_eq_list.append(A1)
+
+    model.A_eq = sp.vstack(A_eq_list, format='csr')
+
+    # branch loading: Bseries (theta_f - theta_t) - FSlack1 <= rate and Bseries (theta_t - theta_f) - FSlack2 <= rate
+    br = np.repeat(np.arange(m), nt)
+    t = np.tile(np.arange(nt), m)
+    r = np.arange(m * nt)
+    b = Bseries.ravel()
+    th_f = model.idx('theta', numerical_circuit.F[br], t)
+    th_t = model.idx('theta', numerical_circuit.T[br], t)
+    A_f = sp.coo_matrix((np.r_[b, -b, -np.ones(m * nt)],
+                         (np.r_[r, r, r], np.r_[th_f, th_t, model.idx('FSlack1', br, t)])),
+                        shape=(m * nt, model.nvar))
+    A_t = sp.coo_matrix((np.r_[-b, b, -np.ones(m * nt)],
+                         (np.r_[r, r, r], np.r_[th_f, th_t, model.idx('FSlack2', br, t)])),
+                        shape=(m * nt, model.nvar))
+    model.A_ub = sp.vstack([A_f, A_t], format='csr')
+
+    return nodal_restrictions.reshape((n, nt))
+
+
+def set_dc_opf_matrix_values(model: LpMatrixModel, numerical_circuit: NumericalCircuit, islands_per_t,
+                             nodal_restrictions,
+                             Pg_min, Pg_max, P_fix, cost_g, enabled_for_dispatch,
+                             Pb_min, Pb_max, cost_b,
+                             Pl, cost_l,
+                             rates, cost_br,
+                             Capacity=None, minSoC=None, maxSoC=None, SoC0=None):
+    """
+    Set the costs, bounds and right hand sides of a DC-OPF model whose structure is already built.
+    All the time dependent arrays are given as (devices, nt)
+    :param model: LpMatrixModel instance with the structure already built
+    :param numerical_circuit: NumericalCircuit instance
+    :param islands_per_t: list of (time indices array, list of CalculationInputs) sharing the same topology
+    :param nodal_restrictions: indices of the nodal balance rows (n, nt)
+    :param Pg_min: generators minimum power (ng)
+    :param Pg_max: generators maximum power (ng)
+    :param P_fix: generators fixed power (ng, nt)
+    :param cost_g: generators cost (ng, nt)
+    :param enabled_for_dispatch: generators dispatchable flag (ng)
+    :param Pb_min: batteries minimum power (nb)
+    :param Pb_max: batteries maximum power (nb)
+    :param cost_b: batteries cost (nb, nt)
+    :param Pl: loads power (nl, nt)
+    :param cost_l: load shedding cost (nl, nt)
+    :param rates: branch ratings (m, nt)
+    :param cost_br: branch overload cost (m, nt)
+    :param Capacity: batteries capacity (nb)
+    :param minSoC: batteries minimum state of charge (nb)
+    :param maxSoC: batteries maximum state of charge (nb)
+    :param SoC0: batteries initial state of charge (nb)
+    """
+    n = numerical_circuit.nbus
+    nb = numerical_circuit.n_batt
+    nt = Pl.shape[1]
+    with_energy = 'E' in model.blocks
+
+    # costs and bounds
+    theta_lb = np.full((n, nt), -3.14)
+    theta_ub = np.full((n, nt), 3.14)
+    for t_idx, islands in islands_per_t:
+        for island in islands:
+            if len(island.ref) > 0:
+                # slack angles equal to zero
+                vd = np.array(island.original_bus_idx)[island.ref]
+                theta_lb[np.ix_(vd, t_idx)] = 0.0
+                theta_ub[np.ix_(vd, t_idx)] = 0.0
+
+    Pg_lb = np.repeat(Pg_min[:, np.newaxis], nt, axis=1)
+    Pg_ub = np.repeat(Pg_max[:, np.newaxis], nt, axis=1)
+    fix = np.where(enabled_for_dispatch == False)[0]
+    Pg_lb[fix, :] = P_fix[fix, :]
+    Pg_ub[fix, :] = P_fix[fix, :]
+
+    model.set_block('theta', lower=theta_lb, upper=theta_ub)
+    model.set_block('Pg', cost=cost_g, lower=Pg_lb, upper=Pg_ub)
+    model.set_block('Pb', cost=cost_b, lower=Pb_min, upper=Pb_max)
+    if with_energy:
+        model.set_block('E', lower=Capacity * minSoC, upper=Capacity * maxSoC)
+    model.set_block('LSlack', cost=cost_l, lower=0, upper=np.inf)
+    model.set_block('FSlack1', cost=cost_br, lower=0, upper=np.inf)
+    model.set_block('FSlack2', cost=cost_br, lower=0, upper=np.inf)
+
+    # right hand sides
+    idx = nodal_restrictions.ravel()
+    b_nodal = -(numerical_circuit.C_load_bus.transpose() * Pl).ravel()
+    b_eq_list = [b_nodal[idx >= 0]]
+    if with_energy:
+        b_eq_list.append(SoC0 * Capacity)
+        b_eq_list.append(np.zeros(nb * (nt - 1)))
+    model.b_eq = np.concatenate(b_eq_list)
+
+    model.b_ub = np.r_[rates.ravel(), rates.ravel()]
+
+
+def formulate_dc_opf_matrix(model: LpMatrixModel, numerical_circuit: NumericalCircuit, islands_per_t,
+                            Pg_min, Pg_max, P_fix, cost_g, enabled_for_dispatch,
+                            Pb_min, Pb_max, cost_b,
+                            Pl, cost_l,
+                            rates, Bseries, cost_br,
+                            Capacity=None, minSoC=None, maxSoC=None, SoC0=None, Efficiency=None, dt=None):
+    """
+    Build the complete DC-OPF model. All the time dependent arrays are given as (devices, nt)
+    See build_dc_opf_matrix_structure and set_dc_opf_matrix_values for the parameters
+    :return: the model is filled in place, the indices of the nodal balance rows (n, nt) (-1 if not formulated)
+    """
+    nodal_restrictions = build_dc_opf_matrix_structure(model=model,
+                                                       numerical_circuit=numerical_circuit,
+                                                       islands_per_t=islands_per_t,
+                                                       nt=Pl.shape[1],
+                                                       Bseries=Bseries,
+                                                       Efficiency=Efficiency if Capacity is not None else None,
+                                                       dt=dt)
+
+    set_dc_opf_matrix_values(model=model, numerical_circuit=numerical_circuit, islands_per_t=islands_per_t,
+                             nodal_restrictions=nodal_restrictions,
+                             Pg_min=Pg_min, Pg_max=Pg_max, P_fix=P_fix, cost_g=cost_g,
+                             enabled_for_dispatch=enabled_for_dispatch,
+                             Pb_min=Pb_min, Pb_max=Pb_max, cost_b=cost_b,
+                             Pl=Pl, cost_l=cost_l,
+                             rates=rates, cost_br=cost_br,
+                             Capacity=Capacity, minSoC=minSoC, maxSoC=maxSoC, SoC0=SoC0)
+
+    return nodal_restrictions
+
+
+class DcOpfMatrix:
+
+    def __init__(self, numerical_circuit: NumericalCircuit, topology_cache: TopologyCache = None):
+        """
+        DC linear optimal power flow built in matrix form
+        :param numerical_circuit: NumericalCircuit instance
+        :param topology_cache: TopologyCache instance (optional) to avoid recomputing the islands
+        """
+        self.numerical_circuit = numerical_circuit
+
+        if topology_cache is None:
+            topology_cache = TopologyCache(numerical_circuit)
+        self.topology_cache = topology_cache
+
+        self.rating = None
+        self.Pl = None
+        self.Bseries = None
+        self.nodal_restrictions = None
+
+        self.model = self.formulate()
+
+    def formulate(self):
+        """
+        Formulate the DC OPF
+        :return: LpMatrixModel instance
+        """
+        nc = self.numerical_circuit
+        Sbase = nc.Sbase
+
+        self.Pl = (nc.load_active * nc.load_power.real)[:, np.newaxis] / Sbase
+        self.rating = nc.br_rates / Sbase
+        self.Bseries = (nc.branch_active * (1 / (nc.R + 1j * nc.X))).imag
+
+        islands = self.topology_cache.get_islands(nc.branch_active)
+
+        model = LpMatrixModel(name='DC_OPF')
+        self.nodal_restrictions = formulate_dc_opf_matrix(model=model,
+                                                          numerical_circuit=nc,
+                                                          islands_per_t=[(np.array([0]), islands)],
+                                                          Pg_min=nc.generator_pmin / Sbase,
+                                                          Pg_max=nc.generator_pmax / Sbase,
+                                                          P_fix=(nc.generator_power / Sbase)[:, np.newaxis],
+                                                          cost_g=nc.generator_cost,
+                                                          enabled_for_dispatch=nc.generator_dispatchable,
+                                                          Pb_min=nc.battery_pmin / Sbase,
+                                                          Pb_max=nc.battery_pmax / Sbase,
+                                                          cost_b=nc.battery_cost,
+                                                          Pl=self.Pl,
+                                                          cost_l=nc.load_cost,
+                                                          rates=self.rating[:, np.newaxis],
+                                                          Bseries=self.Bseries[:, np.newaxis],
+                                                          cost_br=nc.branch_cost)
+        return model
+
+    def solve(self):
+        """
+        Solve the LP
+        :return: status string
+        """
+        return self.model.solve()
+
+    def write_mps(self, file_name):
+        """
+        Write the LP in MPS format
+        :param file_name: name of the file
+        """
+        self.model.write_mps(file_name)
+
+    def get_branch_flow(self):
+        """
+        return the from->to branch power in p.u.
+        """
+        theta = self.model.get_block('theta')[0, :]
+        nc = self.numerical_circuit
+        return self.Bseries * (theta[nc.F] - theta[nc.T])
+
+    def get_voltage(self):
+        """
+        return the complex voltages
+        :return: 1D array
+        """
+        angles = self.model.get_block('theta')[0, :]
+        return np.ones_like(angles) * np.exp(-1j * angles)
+
+    def get_overloads(self):
+        """
+        return the branch overloads
+        :return: 1D array
+        """
+        return (self.model.get_block('FSlack1') + self.model.get_block('FSlack2'))[0, :]
+
+    def get_loading(self):
+        """
+        return the branch loading
+        :return: 1D array
+        """
+        return np.abs(self.get_branch_flow()) / (self.rating + 1e-12)
+
+    def get_branch_power(self):
+        """
+        return the branch power
+        :return: 1D array
+        """
+        return np.abs(self.get_branch_flow()) * self.numerical_circuit.Sbase
+
+    def get_battery_power(self):
+        """
+        return the battery dispatch
+        :return: 1D array
+        """
+        return self.model.get_block('Pb')[0, :] * self.numerical_circuit.Sbase
+
+    def get_generator_power(self):
+        """
+        return the generator dispatch
+        :return: 1D array
+        """
+        return self.model.get_block('Pg')[0, :] * self.numerical_circuit.Sbase
+
+    def get_load_shedding(self):
+        """
+        return the load shedding
+        :return: 1D array
+        """
+        return self.model.get_block('LSlack')[0, :] * self.numerical_circuit.Sbase
+
+    def get_load_power(self):
+        """
+        return the load power
+        :return: 1D array
+        """
+        return self.Pl[:, 0] * self.numerical_circuit.Sbase
+
+    def get_shadow_prices(self):
+        """
+        return the nodal prices
+        :return: 1D array
+        """
+        idx = self.nodal_restrictions[:, 0]
+        val = np.zeros(len(idx))
+        val[idx >= 0] = -self.model.eq_duals[idx[idx >= 0]]
+        return val
+
+    def converged(self):
+        return self.model.success
+
+
+class OpfDcMatrixTimeSeries:
+
+    def __init__(self, numerical_circuit: NumericalCircuit, start_idx, end_idx, batteries_energy_0=None,
+                 topology_cache: TopologyCache = None):
+        """
+        DC time series linear optimal power flow built in matrix form
+        :param numerical_circuit: NumericalCircuit instance
+        :param start_idx: start index of the time series
+        :param end_idx: end index of the time series
+        :param batteries_energy_0: initial state of the batteries, if None the default values are taken
+        :param topology_cache: TopologyCache instance (optional) to avoid recomputing the islands
+        """
+        self.numerical_circuit = numerical_circuit
+        self.start_idx = start_idx
+        self.end_idx = end_idx
+
+        if topology_cache is None:
+            topology_cache = TopologyCache(numerical_circuit)
+        self.topology_cache = topology_cache
+
+        self.rating = None
+        self.Pl = None
+        self.Bseries = None
+        self.nodal_restrictions = None
+
+        # key of the structure currently built and number of times that the structure has been built
+        self.structure_key = None
+        self.n_structure_builds = 0
+
+        self.model = None
+        self.model = self.formulate(batteries_energy_0=batteries_energy_0)
+
+    def get_topologies(self):
+        """
+        Group the time steps by branch states and get the islands of each group
+        :return: list of (time indices, list of CalculationInputs), tuple of the topology keys of every time step
+        """
+        a = self.start_idx
+        b = self.end_idx
+        states = self.numerical_circuit.branch_active_prof[a:b, :]
+        groups = OrderedDict()
+        keys = list()
+        for t in range(b - a):
+            key = self.topology_cache.get_key(states[t, :])
+            keys.append(key)
+            if key in groups:
+                groups[key][0].append(t)
+            else:
+                groups[key] = ([t], states[t, :])
+
+        islands_per_t = [(np.array(t_idx), self.topology_cache.get_islands(state)) for t_idx, state in groups.values()]
+
+        return islands_per_t, tuple(keys)
+
+    def formulate(self, batteries_energy_0=None):
+        """
+        Formulate the DC OPF time series in the non-sequential fashion (all to the solver at once).
+        If the current model has the same structure (number of time steps, topologies and time increments)
+        only the costs, bounds and right hand sides are updated
+        :param batteries_energy_0: initial energy state of the batteries (if none, the default is taken)
+        :return: LpMatrixModel instance
+        """
+        nc = self.numerical_circuit
+        nt = self.end_idx - self.start_idx
+        a = self.start_idx
+        b = self.end_idx
+        Sbase = nc.Sbase
+
+        # battery
+        Capacity = nc.battery_Enom / Sbase
+        if batteries_energy_0 is None:
+            SoC0 = nc.battery_soc_0
+        else:
+            SoC0 = (batteries_energy_0 / Sbase) / Capacity
+        Efficiency = (nc.battery_discharge_efficiency + nc.battery_charge_efficiency) / 2.0
+
+        # Compute time delta in hours
+        dt = np.zeros(nt)
+        for t in range(1, nt):
+            dt[t - 1] = (nc.time_array[a + t] - nc.time_array[a + t - 1]).seconds / 3600
+
+        self.Pl = (nc.load_active_prof[a:b, :] * nc.load_power_profile.real[a:b, :]).transpose() / Sbase
+        self.rating = nc.br_rate_profile[a:b, :].transpose() / Sbase
+        self.Bseries = (nc.branch_active_prof[a:b, :] * (1 / (nc.R + 1j * nc.X))).imag.transpose()
+
+        islands_per_t, topology_keys = self.get_topologies()
+        structure_key = (nt, topology_keys, dt.tobytes())
+
+        if self.model is None or structure_key != self.structure_key:
+            model = LpMatrixModel(name='DC_OPF_Time_Series')
+            self.nodal_restrictions = build_dc_opf_matrix_structure(model=model,
+                                                                    numerical_circuit=nc,
+                                                                    islands_per_t=islands_per_t,
+                                                                    nt=nt,
+                                                                    Bseries=self.Bseries,
+                                                                    Efficiency=Efficiency,
+                                                                    dt=dt)
+            self.structure_key = structure_key
+            self.n_structure_builds += 1
+        else:
+            model = self.model
+
+        set_dc_opf_matrix_values(model=model,
+                                 numerical_circuit=nc,
+                                 islands_per_t=islands_per_t,
+                                 nodal_restrictions=self.nodal_restrictions,
+                                 Pg_min=nc.generator_pmin / Sbase,
+                                 Pg_max=nc.generator_pmax / Sbase,
+                                 P_fix=nc.generator_power_profile[a:b, :].transpose() / Sbase,
+                                 cost_g=nc.generator_cost_profile[a:b, :].transpose(),
+                                 enabled_for_dispatch=nc.generator_dispatchable,
+                                 Pb_min=nc.battery_pmin / Sbase,
+                                 Pb_max=nc.battery_pmax / Sbase,
+                                 cost_b=nc.battery_cost_profile[a:b, :].transpose(),
+                                 Pl=self.Pl,
+                                 cost_l=nc.load_cost_prof[a:b, :].transpose(),
+                                 rates=self.rating,
+                                 cost_br=nc.branch_cost_profile[a:b, :].transpose(),
+                                 Capacity=Capacity,
+                                 minSoC=nc.battery_min_soc,
+                                 maxSoC=nc.battery_max_soc,
+                                 SoC0=SoC0)
+        return model
+
+    def update(self, start_idx, end_idx, batteries_energy_0=None):
+        """
+        Move the problem to another time window, re-using the formulated structure when possible
+        :param start_idx: start index of the time series
+        :param end_idx: end index of the time series
+        :param batteries_energy_0: initial state of the batteries, if None the default values are taken
+        """
+        self.start_idx = start_idx
+        self.end_idx = end_idx
+        self.model = self.formulate(batteries_energy_0=batteries_energy_0)
+
+    def solve(self, msg=False):
+        """
+        Solve the LP
+        :param msg: unused, kept for compatibility with the PuLP based formulations
+        :return: status string
+        """
+        return self.model.solve()
+
+    def write_mps(self, file_name):
+        """
+        Write the LP in MPS format
+        :param file_name: name of the file
+        """
+        self.model.write_mps(file_name)
+
+    def get_branch_flow(self):
+        """
+        return the from->to branch power in p.u. (time, device)
+        """
+        theta = self.model.get_block('theta')
+        nc = self.numerical_circuit
+        return self.Bseries.transpose() * (theta[:, nc.F] - theta[:, nc.T])
+
+    def get_voltage(self):
+        """
+        return the complex voltages (time, device)
+        :return: 2D array
+        """
+        angles = self.model.get_block('theta')
+        return np.ones_like(angles) * np.exp(-1j * angles)
+
+    def get_overloads(self):
+        """
+        return the branch overloads (time, device)
+        :return: 2D array
+        """
+        return self.model.get_block('FSlack1') + self.model.get_block('FSlack2')
+
+    def get_loading(self):
+        """
+        return the branch loading (time, device)
+        :return: 2D array
+        """
+        return np.abs(self.get_branch_flow()) / self.rating.transpose()
+
+    def get_branch_power(self):
+        """
+        return the branch power (time, device)
+        :return: 2D array
+        """
+        return np.abs(self.get_branch_flow()) * self.numerical_circuit.Sbase
+
+    def get_battery_power(self):
+        """
+        return the battery dispatch (time, device)
+        :return: 2D array
+        """
+        return self.model.get_block('Pb') * self.numerical_circuit.Sbase
+
+    def get_battery_energy(self):
+        """
+        return the battery energy (time, device)
+        :return: 2D array
+        """
+        if 'E' in self.model.blocks:
+            return self.model.get_block('E') * self.numerical_circuit.Sbase
+        else:
+            return self.model.get_block('Pb') * 0.0
+
+    def get_generator_power(self):
+        """
+        return the generator dispatch (time, device)
+        :return: 2D array
+        """
+        return self.model.get_block('Pg') * self.numerical_circuit.Sbase
+
+    def get_load_shedding(self):
+        """
+        return the load shedding (time, device)
+        :return: 2D array
+        """
+        return self.model.get_block('LSlack') * self.numerical_circuit.Sbase
+
+    def get_load_power(self):
+        """
+        return the load power (time, device)
+        :return: 2D array
+        """
+        return self.Pl.transpose() * self.numerical_circuit.Sbase
+
+    def get_shadow_prices(self):
+        """
+        return the nodal prices (time, device)
+        :return: 2D array
+        """
+        idx = self.nodal_restrictions
+        val = np.zeros(idx.shape)
+        val[idx >= 0] = -self.model.eq_duals[idx[idx >= 0]]
+        return val.transpose()
+
+    def converged(self):
+        return self.model.success
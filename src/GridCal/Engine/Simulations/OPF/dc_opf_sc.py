@@ -0,0 +1,456 @@
+# This file is part of GridCal.
+#
+# GridCal is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# GridCal is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with GridCal.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+This file implements a security constrained DC-OPF (N-1) in PTDF form.
+The branch flows are written as F = PTDF x P, and the post-contingency flows as
+F_l^k = F_l + LODF_lk x F_k. The PTDF and LODF are never built as dense matrices: their rows and columns
+are computed when needed from the factorized Bbus of every island. Instead of adding the m x m post-contingency constraints up front,
+the LP is solved in a cutting plane loop: after each solution the most violated post-contingency
+constraints are added, until the dispatch is N-1 secure. Like the base case ratings, every
+post-contingency constraint has a slack column penalised with the branch cost, so an insecure
+grid gives the least overloaded dispatch instead of an infeasible problem.
+"""
+
+import numpy as np
+import scipy.sparse as sp
+from scipy.sparse.linalg import splu
+
+from GridCal.Engine.basic_structures import Logger
+from GridCal.Engine.Core.numerical_circuit import NumericalCircuit
+from GridCal.Engine.Simulations.OPF.dc_opf_matrix import LpMatrixModel
+
+
+class DcSensitivities:
+
+    def __init__(self, Bseries, Cf, Ct, calculation_inputs):
+        """
+        DC power flow sensitivities of every island, computed on demand from the factorized reduced Bbus of the
+        islands instead of building the dense PTDF (m, n) and LODF (m, m) matrices
+        :param Bseries: branch series susceptances (m), zero for the inactive branches
+        :param Cf: branch-from bus connectivity matrix (m, n)
+        :param Ct: branch-to bus connectivity matrix (m, n)
+        :param calculation_inputs: list of CalculationInputs (islands)
+        """
+        self.m, self.n = Cf.shape
+        self.A = (Cf - Ct).tocsr()
+        self.Bf = (sp.diags(Bseries) * self.A).tocsr()
+        Bbus = (self.A.transpose() * self.Bf).tocsc()
+
+        # (non slack buses, factorization) of every island with slack (the island is referred to its first slack)
+        self.islands = list()
+        for island in calculation_inputs:
+            if len(island.ref) == 0 or len(island.original_branch_idx) == 0:
+                continue
+            bus_idx = np.array(island.original_bus_idx)
+            no_slack = bus_idx[np.delete(np.arange(len(bus_idx)), island.ref[0])]
+            if len(no_slack):
+                self.islands.append((no_slack, splu(Bbus[no_slack, :][:, no_slack].tocsc())))
+
+    def get_angles(self, P):
+        """
+        Solve the DC power flow angles
+        :param P: nodal injections, array (n) or matrix (n, c)
+        :return: angles, the slack buses angles are zero
+        """
+        P = P.toarray() if sp.issparse(P) else np.asarray(P, dtype=float)
+        theta = np.zeros(P.shape)
+        for no_slack, lu in self.islands:
+            theta[no_slack] = lu.solve(P[no_slack])
+        return theta
+
+    def get_flows(self, P):
+        """
+        Branch flows of some nodal injections (PTDF x P)
+        :param P: nodal injections, array (n) or matrix (n, c)
+        :return: flows, array (m) or matrix (m, c)
+        """
+        return self.Bf * self.get_angles(P)
+
+    def get_ptdf_rows(self, branches):
+        """
+        Rows of the PTDF matrix (Bbus is symmetric: PTDF[l, :] = Bbus^-1 x Bf[l, :]^T)
+        :param branches: branch indices
+        :return: dense matrix (len(branches), n), the columns of the slack buses are zero
+        """
+        return self.get_angles(self.Bf[branches, :].transpose()).transpose()
+
+    def get_transfer_flows(self, branches):
+        """
+        Columns of the PTDF x (Cf - Ct)^T matrix: flow change in every branch when injecting 1 p.u. at the from bus
+        of each branch and withdrawing it at its to bus
+        :param branches: branch indices
+        :return: dense matrix (m, len(branches))
+        """
+        return self.get_flows(self.A[branches, :].transpose())
+
+
+def compute_lodf_denominators(sensitivities: DcSensitivities, block_size=256, tolerance=1e-5):
+    """
+    Compute the denominators 1 - H_kk of the Line Outage Distribution Factors LODF[:, k] = H[:, k] / (1 - H_kk),
+    where H = PTDF x (Cf - Ct)^T, processing the branches in blocks to bound the memory to m x block_size
+    :param sensitivities: DcSensitivities instance
+    :param block_size: number of branches per block
+    :param tolerance: minimum value of 1 - H_kk to consider that the outage of k does not split the grid
+    :return: array of denominators (m), array of valid contingencies (the outage does not make islands)
+    """
+    m = sensitivities.m
+    den = np.zeros(m)
+    for a in range(0, m, block_size):
+        k_idx = np.arange(a, min(a + block_size, m))
+        H = sensitivities.get_transfer_flows(k_idx)
+        den[k_idx] = 1.0 - H[k_idx, np.arange(len(k_idx))]
+
+    valid = np.abs(den) > tolerance
+
+    return den, valid
+
+
+class DcScOpf:
+
+    def __init__(self, numerical_circuit: NumericalCircuit, calculation_inputs=None, contingency_indices=None,
+                 max_iter=100, tolerance=1e-6, cuts_per_iteration=1, block_size=256, logger: Logger = None):
+        """
+        Security constrained (N-1) DC linear optimal power flow in PTDF form solved by constraint generation
+        :param numerical_circuit: NumericalCircuit instance
+        :param calculation_inputs: list of CalculationInputs (islands), if None they are computed
+        :param contingency_indices: indices of the branches to fail (if None, all the active branches)
+        :param max_iter: maximum number of cutting plane iterations
+        :param tolerance: post-contingency overload tolerance (p.u.)
+        :param cuts_per_iteration: number of the most violated post-contingency constraints added per iteration
+        :param block_size: number of contingencies whose post-contingency flows are computed at once
+                           (bounds the memory of the violations check to m x block_size)
+        :param logger: Logger instance
+        """
+        self.numerical_circuit = numerical_circuit
+
+        if calculation_inputs is None:
+            calculation_inputs = numerical_circuit.compute()
+        self.calculation_inputs = calculation_inputs
+
+        self.max_iter = max_iter
+
+        self.tolerance = tolerance
+
+        self.cuts_per_iteration = cuts_per_iteration
+
+        self.block_size = max(1, int(block_size))
+
+        self.logger = Logger() if logger is None else logger
+
+        nc = numerical_circuit
+        Sbase = nc.Sbase
+
+        self.Bseries = -(nc.branch_active * (1 / (nc.R + 1j * nc.X))).imag
+        self.rating = nc.br_rates / Sbase
+        self.Pl = (nc.load_active * nc.load_power.real) / Sbase
+
+        self.sensitivities = DcSensitivities(self.Bseries, nc.C_branch_bus_f, nc.C_branch_bus_t, calculation_inputs)
+        self.lodf_den, valid = compute_lodf_denominators(self.sensitivities, self.block_size)
+
+        # contingencies: active branches whose outage does not split an island
+        if contingency_indices is None:
+            contingency_indices = np.arange(nc.nbr)
+        contingency_indices = np.array(contingency_indices, dtype=int)
+        is_contingency = np.zeros(nc.nbr, dtype=bool)
+        is_contingency[contingency_indices] = True
+        is_contingency &= nc.branch_active.astype(bool)
+        radial = np.where(is_contingency & ~valid)[0]
+        for k in radial:
+            self.logger.append('The outage of ' + str(nc.branch_names[k]) + ' splits the grid and it is not considered')
+        self.is_contingency = is_contingency & valid
+
+        # list of added post-contingency constraints: (monitored branch, failed branch, sense)
+        self.cuts = list()
+
+        # index of the first post-contingency slack column (they are appended after the blocks)
+        self.cut_slack_offset = 0
+
+        self.iterations = 0
+
+        self.P0 = None
+        self.M = None
+        self.model = self.formulate()
+
+    def formulate(self):
+        """
+        Formulate the base case LP
+        :return: LpMatrixModel instance
+        """
+        nc = self.numerical_circuit
+        n = nc.nbus
+        m = nc.nbr
+        ng = nc.n_ctrl_gen
+        nb = nc.n_batt
+        nl = nc.n_ld
+        Sbase = nc.Sbase
+
+        model = LpMatrixModel(name='DC_SC_OPF')
+        model.add_block('Pg', (ng, 1))
+        model.add_block('Pb', (nb, 1))
+        model.add_block('LSlack', (nl, 1))
+        model.add_block('FSlack1', (m, 1))
+        model.add_block('FSlack2', (m, 1))
+        model.allocate()
+
+        Pg_lb = nc.generator_pmin / Sbase
+        Pg_ub = nc.generator_pmax / Sbase
+        fix = np.where(nc.generator_dispatchable == False)[0]
+        Pg_lb[fix] = nc.generator_power[fix] / Sbase
+        Pg_ub[fix] = nc.generator_power[fix] / Sbase
+
+        model.set_block('Pg', cost=nc.generator_cost, lower=Pg_lb, upper=Pg_ub)
+        model.set_block('Pb', cost=nc.battery_cost, lower=nc.battery_pmin / Sbase, upper=nc.battery_pmax / Sbase)
+        model.set_block('LSlack', cost=nc.load_cost, lower=0, upper=np.inf)
+        model.set_block('FSlack1', cost=nc.branch_cost, lower=0, upper=np.inf)
+        model.set_block('FSlack2', cost=nc.branch_cost, lower=0, upper=np.inf)
+
+        # nodal injections P = M x + P0
+        Cg = nc.C_gen_bus.transpose()
+        Cb = nc.C_batt_bus.transpose()
+        Cl = nc.C_load_bus.transpose()
+        self.M = sp.hstack([Cg.tocsr(), Cb.tocsr(), Cl.tocsr(), sp.csr_matrix((n, 2 * m))], format='csr')
+        self.P0 = -(Cl * self.Pl)
+
+        # power balance of every island with slack: sum(P) = 0
+        rows = list()
+        rhs = list()
+        for island in self.calculation_inputs:
+            if len(island.ref) > 0:
+                bus_idx = np.array(island.original_bus_idx)
+                rows.append(sp.csr_matrix(np.asarray(self.M[bus_idx, :].sum(axis=0))))
+                rhs.append(-self.P0[bus_idx].sum())
+        model.A_eq = sp.vstack(rows, format='csr')
+        model.b_eq = np.array(rhs)
+
+        # base case branch flows: F = PTDF (M x + P0), only the injection columns of M have sensitivities
+        Mc = self.M.tocsc()
+        cols = np.where(np.diff(Mc.indptr) > 0)[0]
+        A_flow = sp.csr_matrix(self.sensitivities.get_flows(Mc[:, cols]))
+        A_flow = sp.csr_matrix((A_flow.data, cols[A_flow.indices], A_flow.indptr), shape=(m, model.nvar))
+        F0 = self.sensitivities.get_flows(self.P0)
+        I = sp.identity(m, format='csr')
+        Z = sp.csr_matrix((m, m))
+        slack1 = sp.hstack([sp.csr_matrix((m, model.nvar - 2 * m)), -I, Z], format='csr')
+        slack2 = sp.hstack([sp.csr_matrix((m, model.nvar - 2 * m)), Z, -I], format='csr')
+
+        model.A_ub = sp.vstack([A_flow + slack1, -A_flow + slack2], format='csr')
+        model.b_ub = np.r_[self.rating - F0, self.rating + F0]
+
+        self.cut_slack_offset = model.nvar
+
+        return model
+
+    def get_injections(self):
+        """
+        Get the nodal injections of the current solution (p.u.)
+        :return: array (n)
+        """
+        return self.M * self.model.x + self.P0
+
+    def get_post_contingency_flows(self, F, contingencies):
+        """
+        Get the post-contingency flows of every monitored branch for the given contingencies
+        :param F: base case flows (m)
+        :param contingencies: indices of the failed branches (nk)
+        :return: matrix (m, nk) where the column j has the flows after the outage of contingencies[j]
+                 (the flow of the failed branch itself is zero)
+        """
+        H = self.sensitivities.get_transfer_flows(contingencies)
+        Fpost = F[:, np.newaxis] + H * (F[contingencies] / self.lodf_den[contingencies])[np.newaxis, :]
+        Fpost[contingencies, np.arange(len(contingencies))] = 0.0
+        return Fpost
+
+    def iter_post_contingency_flows(self, F):
+        """
+        Iterate the post-contingency flows of the contingencies in blocks of block_size
+        :param F: base case flows (m)
+        :return: generator of (indices of the failed branches, post-contingency flows (m, block))
+        """
+        contingencies = np.where(self.is_contingency)[0]
+        for a in range(0, len(contingencies), self.block_size):
+            k_idx = contingencies[a:a + self.block_size]
+            yield k_idx, self.get_post_contingency_flows(F, k_idx)
+
+    def add_cuts(self, cuts):
+        """
+        Add the post-contingency constraints sense * (F_l + LODF_lk F_k) - s <= rate_l, where s >= 0 is a new
+        slack column penalised with the cost of the monitored branch. The rows of all the cuts are stacked at once.
+        :param cuts: list of (monitored branch index, failed branch index, sense +1 or -1)
+        """
+        if len(cuts) == 0:
+            return
+
+        model = self.model
+        nc = len(cuts)
+        l_idx, k_idx, sense = [np.array(x) for x in zip(*cuts)]
+
+        # LODF_lk = (PTDF_l,from(k) - PTDF_l,to(k)) / (1 - H_kk)
+        ptdf_l = self.sensitivities.get_ptdf_rows(l_idx)
+        ptdf_k = self.sensitivities.get_ptdf_rows(k_idx)
+        lodf = (self.sensitivities.A[k_idx, :].multiply(ptdf_l)).sum(axis=1).A1 / self.lodf_den[k_idx]
+        ptdf_rows = ptdf_l + lodf[:, np.newaxis] * ptdf_k
+        ptdf_rows *= sense[:, np.newaxis]
+        rows = sp.csr_matrix(ptdf_rows) * self.M
+        rhs = self.rating[l_idx] - ptdf_rows.dot(self.P0)
+
+        # new slack columns: zero in the existing rows, -1 in the row of their cut
+        model.A_eq = sp.hstack([model.A_eq, sp.csr_matrix((model.A_eq.shape[0], nc))], format='csr')
+        model.A_ub = sp.bmat([[model.A_ub, None],
+                              [rows, -sp.identity(nc, format='csr')]], format='csr')
+        model.b_ub = np.r_[model.b_ub, rhs]
+
+        model.c = np.r_[model.c, self.numerical_circuit.branch_cost[l_idx]]
+        model.lb = np.r_[model.lb, np.zeros(nc)]
+        model.ub = np.r_[model.ub, np.full(nc, np.inf)]
+        model.nvar += nc
+
+        # the slacks do not inject power
+        self.M = sp.hstack([self.M, sp.csr_matrix((self.M.shape[0], nc))], format='csr')
+
+        self.cuts += cuts
+
+    def get_violations(self):
+        """
+        Get the post-contingency violations of the current solution
+        :return: list of (violation, monitored branch, failed branch, sense) sorted by decreasing violation
+        """
+        F = self.get_branch_flow()
+        violations = list()
+        for contingencies, Fpost in self.iter_post_contingency_flows(F):
+            excess = np.abs(Fpost) - self.rating[:, np.newaxis]
+
+            # the rating 0 means not monitored
+            excess[self.rating <= 0, :] = 0.0
+
+            l_idx, j_idx = np.where(excess > self.tolerance)
+            violations += [(excess[l, j], l, contingencies[j], int(np.sign(Fpost[l, j])))
+                           for l, j in zip(l_idx, j_idx)]
+        violations.sort(key=lambda x: -x[0])
+
+        return violations
+
+    def solve(self):
+        """
+        Solve the SC-OPF adding the violated post-contingency constraints until the dispatch is N-1 secure
+        :return: status string
+        """
+        added = set()
+        self.iterations = 0
+        status = self.model.solve()
+
+        while self.model.success and self.iterations < self.max_iter:
+
+            violations = [v for v in self.get_violations() if (v[1], v[2], v[3]) not in added]
+
+            if len(violations) == 0:
+                break
+
+            cuts = [(l, k, sense) for excess, l, k, sense in violations[:self.cuts_per_iteration]]
+            self.add_cuts(cuts)
+            added.update(cuts)
+
+            status = self.model.solve()
+            self.iterations += 1
+
+        if self.iterations == self.max_iter:
+            self.logger.append('The SC-OPF reached the maximum number of iterations')
+
+        if self.model.success and np.any(self.get_contingency_overloads() > self.tolerance):
+            self.logger.append('The SC-OPF could not avoid some post-contingency overloads')
+
+        return status
+
+    def get_branch_flow(self):
+        """
+        return the branch power in p.u.
+        """
+        return self.sensitivities.get_flows(self.get_injections())
+
+    def get_voltage(self):
+        """
+        return the complex voltages (DC angles)
+        :return: 1D array
+        """
+        return np.exp(1j * self.sensitivities.get_angles(self.get_injections()))
+
+    def get_overloads(self):
+        """
+        return the branch overloads
+        :return: 1D array
+        """
+        return (self.model.get_block('FSlack1') + self.model.get_block('FSlack2'))[0, :]
+
+    def get_contingency_overloads(self):
+        """
+        return the overload allowed in every post-contingency constraint (see cuts)
+        :return: 1D array
+        """
+        return self.model.x[self.cut_slack_offset:]
+
+    def get_loading(self):
+        """
+        return the branch loading
+        :return: 1D array
+        """
+        return np.abs(self.get_branch_flow()) / (self.rating + 1e-12)
+
+    def get_contingency_loading(self):
+        """
+        return the worst post-contingency loading of every branch
+        :return: 1D array
+        """
+        worst = np.zeros(self.numerical_circuit.nbr)
+        for contingencies, Fpost in self.iter_post_contingency_flows(self.get_branch_flow()):
+            worst = np.maximum(worst, np.abs(Fpost).max(axis=1))
+        return worst / (self.rating + 1e-12)
+
+    def get_branch_power(self):
+        """
+        return the branch power
+        :return: 1D array
+        """
+        return np.abs(self.get_branch_flow()) * self.numerical_circuit.Sbase
+
+    def get_battery_power(self):
+        """
+        return the battery dispatch
+        :return: 1D array
+        """
+        return self.model.get_block('Pb')[0, :] * self.numerical_circuit.Sbase
+
+    def get_generator_power(self):
+        """
+        return the generator dispatch
+        :return: 1D array
+        """
+        return self.model.get_block('Pg')[0, :] * self.numerical_circuit.Sbase
+
+    def get_load_shedding(self):
+        """
+        return the load shedding
+        :return: 1D array
+        """
+        return self.model.get_block('LSlack')[0, :] * self.numerical_circuit.Sbase
+
+    def get_load_power(self):
+        """
+        return the load power
+        :return: 1D array
+        """
+        return self.Pl * self.numerical_circuit.Sbase
+
+    def converged(self):
+        return self.model.success
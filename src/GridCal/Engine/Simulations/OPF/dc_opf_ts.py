@@ -93,18 +93,20 @@ def get_power_injections(C_bus_gen, Pg, C_bus_bat, Pb, C_bus_load, LSlack, Pl):
     return P
 
 
-def add_dc_nodal_power_balance(numerical_circuit, problem: LpProblem, theta, P, start_, end_):
+def add_dc_nodal_power_balance(numerical_circuit, problem: LpProblem, theta, P, start_, end_, calc_inputs_dict=None):
     """
     Add the nodal power balance
     :param numerical_circuit: NumericalCircuit instance
     :param problem: LpProblem instance
     :param theta: Voltage angles LpVars (n, nt)
     :param P: Power injection at the buses LpVars (n, nt)
+    :param calc_inputs_dict: dictionary of lists of CalculationInputs (compute_ts), if None it is computed
     :return: Nothing, the restrictions are added to the problem
     """
 
     # do the topological computation
-    calc_inputs_dict = numerical_circuit.compute_ts()
+    if calc_inputs_dict is None:
+        calc_inputs_dict = numerical_circuit.compute_ts()
 
     # generate the time indices to simulate
     if end_ == -1:
@@ -231,7 +233,7 @@ def add_battery_discharge_restriction(problem: LpProblem, SoC0, Capacity, Effici
 class OpfDcTimeSeries(OpfTimeSeries):
 
     def __init__(self, numerical_circuit: NumericalCircuit, start_idx, end_idx, solver: MIPSolvers = MIPSolvers.CBC,
-                 batteries_energy_0=None):
+                 batteries_energy_0=None, calc_inputs_dict=None):
         """
         DC time series linear optimal power flow
         :param numerical_circuit: NumericalCircuit instance
@@ -239,9 +241,10 @@ class OpfDcTimeSeries(OpfTimeSeries):
         :param end_idx: end index of the time series
         :param solver: MIP solver to use
         :param batteries_energy_0: initial state of the batteries, if None the default values are taken
+        :param calc_inputs_dict: dictionary of lists of CalculationInputs (compute_ts), if None it is computed
         """
         OpfTimeSeries.__init__(self, numerical_circuit=numerical_circuit, start_idx=start_idx, end_idx=end_idx,
-                               solver=solver)
+                               solver=solver, calc_inputs_dict=calc_inputs_dict)
 
         # build the formulation
         self.problem = self.formulate(batteries_energy_0=batteries_energy_0)
@@ -333,7 +336,8 @@ class OpfDcTimeSeries(OpfTimeSeries):
 
         # set the nodal restrictions
         nodal_restrictions = add_dc_nodal_power_balance(numerical_circuit, problem, theta, P,
-                                                        start_=self.start_idx, end_=self.end_idx)
+                                                        start_=self.start_idx, end_=self.end_idx,
+                                                        calc_inputs_dict=self.calc_inputs_dict)
 
         load_f, load_t = add_branch_loading_restriction(problem, theta_f, theta_t, Bseries, branch_ratings,
                                                         branch_rating_slack1, branch_rating_slack2)
@@ -21,8 +21,12 @@ from GridCal.Engine.basic_structures import Logger
 from GridCal.Engine.basic_structures import TimeGrouping, MIPSolvers
 from GridCal.Engine.Simulations.OPF.opf_results import OptimalPowerFlowResults
 from GridCal.Engine.Core.multi_circuit import MultiCircuit
+from GridCal.Engine.Core.topology_cache import TopologyCache
 from GridCal.Engine.Simulations.OPF.ac_opf import AcOpf
+from GridCal.Engine.Simulations.OPF.ac_opf_ipm import AcOpfIpm
 from GridCal.Engine.Simulations.OPF.dc_opf import DcOpf
+from GridCal.Engine.Simulations.OPF.dc_opf_matrix import DcOpfMatrix
+from GridCal.Engine.Simulations.OPF.dc_opf_sc import DcScOpf
 from GridCal.Engine.Simulations.PowerFlow.power_flow_worker import SolverType
 
 ########################################################################################################################
@@ -37,7 +41,8 @@ class OptimalPowerFlowOptions:
                  grouping: TimeGrouping = TimeGrouping.NoGrouping,
                  mip_solver=MIPSolvers.CBC,
                  faster_less_accurate=False,
-                 power_flow_options=None, bus_types=None):
+                 power_flow_options=None, bus_types=None, multi_thread=False,
+                 security_constrained=False, max_sc_iterations=100):
         """
         Optimal power flow options
         :param verbose:
@@ -47,6 +52,9 @@ class OptimalPowerFlowOptions:
         :param faster_less_accurate:
         :param power_flow_options:
         :param bus_types:
+        :param multi_thread: solve the independent time groups in parallel processes
+        :param security_constrained: enforce the N-1 branch contingencies (DC-OPF snapshot only)
+        :param max_sc_iterations: maximum number of constraint generation iterations of the security constrained OPF
         """
         self.verbose = verbose
 
@@ -62,23 +70,33 @@ class OptimalPowerFlowOptions:
 
         self.bus_types = bus_types
 
+        self.multi_thread = multi_thread
+
+        self.security_constrained = security_constrained
+
+        self.max_sc_iterations = max_sc_iterations
+
 
 class OptimalPowerFlow(QThread):
     progress_signal = Signal(float)
     progress_text = Signal(str)
     done_signal = Signal()
 
-    def __init__(self, grid: MultiCircuit, options: OptimalPowerFlowOptions):
+    def __init__(self, grid: MultiCircuit, options: OptimalPowerFlowOptions, topology_cache: TopologyCache = None):
         """
         PowerFlowDriver class constructor
         @param grid: MultiCircuit Object
         @param options: OPF options
+        @param topology_cache: TopologyCache of the compiled grid (optional, it can be shared with other drivers);
+                               if given, its numerical circuit and islands are used instead of compiling the grid
         """
         QThread.__init__(self)
 
         # Grid to run a power flow in
         self.grid = grid
 
+        self.topology_cache = topology_cache
+
         # Options to use
         self.options = options
 
@@ -108,15 +126,35 @@ class OptimalPowerFlow(QThread):
         # print('PowerFlowDriver at ', self.grid.name)
 
         # self.progress_signal.emit(0.0)
-        numerical_circuit = self.grid.compile()
+        if self.topology_cache is None:
+            numerical_circuit = self.grid.compile()
+            calculation_inputs = None
+        else:
+            numerical_circuit = self.topology_cache.numerical_circuit
+            calculation_inputs = self.topology_cache.get_islands()
 
         if self.options.solver == SolverType.DC_OPF:
             # DC optimal power flow
-            problem = DcOpf(numerical_circuit=numerical_circuit)
+            if self.options.security_constrained:
+                # N-1 constraints added lazily over the PTDF formulation
+                problem = DcScOpf(numerical_circuit=numerical_circuit, calculation_inputs=calculation_inputs,
+                                  max_iter=self.options.max_sc_iterations, logger=self.logger)
+            elif self.options.mip_solver == MIPSolvers.HIGHS:
+                # matrix formulation solved in-process (the PuLP formulations use the in-process session instead)
+                problem = DcOpfMatrix(numerical_circuit=numerical_circuit, topology_cache=self.topology_cache)
+            else:
+                problem = DcOpf(numerical_circuit=numerical_circuit, calculation_inputs=calculation_inputs,
+                                solver=self.options.mip_solver)
 
         elif self.options.solver == SolverType.AC_OPF:
-            # AC optimal power flow
-            problem = AcOpf(numerical_circuit=numerical_circuit)
+            # AC optimal power flow (with HiGHS, the PuLP problem is solved by the in-process session)
+            problem = AcOpf(numerical_circuit=numerical_circuit, calculation_inputs=calculation_inputs,
+                            solver=self.options.mip_solver)
+
+        elif self.options.solver == SolverType.IPM_OPF:
+            # non linear AC optimal power flow (interior point)
+            problem = AcOpfIpm(numerical_circuit=numerical_circuit, calculation_inputs=calculation_inputs,
+                               logger=self.logger)
         else:
             raise Exception('Solver not recognized ' + str(self.options.solver))
 
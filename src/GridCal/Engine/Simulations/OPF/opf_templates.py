@@ -20,13 +20,19 @@ from GridCal.ThirdParty.pulp import *
 
 class Opf:
 
-    def __init__(self, numerical_circuit: NumericalCircuit, solver: MIPSolvers=MIPSolvers.CBC):
+    def __init__(self, numerical_circuit: NumericalCircuit, solver: MIPSolvers=MIPSolvers.CBC,
+                 calculation_inputs=None):
         """
         Optimal power flow template class
         :param numerical_circuit: NumericalCircuit instance
+        :param solver: MIP solver to use
+        :param calculation_inputs: list of CalculationInputs (islands) of the numerical circuit, if None they are
+                                   computed when formulating
         """
         self.numerical_circuit = numerical_circuit
 
+        self.calculation_inputs = calculation_inputs
+
         self.theta = None
         self.Pg = None
         self.Pb = None
@@ -41,7 +47,8 @@ class Opf:
 
         self.solver = solver
 
-        self.problem = self.formulate()
+        # the subclasses formulate the problem once their own attributes are set
+        self.problem = None
 
     def formulate(self):
         """
@@ -68,6 +75,8 @@ class Opf:
             params = GUROBI_CMD(msg=1)
         elif self.solver == MIPSolvers.XPRESS:
             params = XPRESS(msg=1)
+        elif self.solver == MIPSolvers.HIGHS:
+            params = SCIPY_SESSION()
         else:
             raise Exception('Solver not supported! ' + str(self.solver))
 
@@ -165,14 +174,19 @@ class Opf:
 
 class OpfTimeSeries:
 
-    def __init__(self, numerical_circuit: NumericalCircuit, start_idx, end_idx, solver:MIPSolvers=MIPSolvers.CBC):
+    def __init__(self, numerical_circuit: NumericalCircuit, start_idx, end_idx, solver:MIPSolvers=MIPSolvers.CBC,
+                 calc_inputs_dict=None):
         """
 
         :param numerical_circuit:
         :param start_idx:
         :param end_idx:
+        :param solver: MIP solver to use
+        :param calc_inputs_dict: dictionary of lists of CalculationInputs given by numerical_circuit.compute_ts(),
+                                 if None it is computed when formulating
         """
         self.numerical_circuit = numerical_circuit
+        self.calc_inputs_dict = calc_inputs_dict
         self.start_idx = start_idx
         self.end_idx = end_idx
         self.solver = solver
@@ -189,7 +203,8 @@ class OpfTimeSeries:
         self.load_shedding = None
         self.nodal_restrictions = None
 
-        self.problem = self.formulate()
+        # the subclasses formulate the problem once their own attributes are set
+        self.problem = None
 
     def formulate(self):
         """
@@ -215,6 +230,8 @@ class OpfTimeSeries:
             params = GUROBI_CMD(msg=msg)
         elif self.solver == MIPSolvers.XPRESS:
             params = XPRESS(msg=msg)
+        elif self.solver == MIPSolvers.HIGHS:
+            params = SCIPY_SESSION()
         else:
             raise Exception('Solver not supported! ' + str(self.solver))
 
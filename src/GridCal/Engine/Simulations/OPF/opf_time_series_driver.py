@@ -13,6 +13,7 @@
 # You should have received a copy of the GNU General Public License
 # along with GridCal.  If not, see <http://www.gnu.org/licenses/>.
 
+import multiprocessing
 import pandas as pd
 import numpy as np
 from numpy import complex, zeros,  array
@@ -20,11 +21,14 @@ import time
 from PySide2.QtCore import QThread, Signal
 
 from GridCal.Engine.basic_structures import Logger
-from GridCal.Engine.basic_structures import TimeGrouping, get_time_groups
+from GridCal.Engine.basic_structures import TimeGrouping, MIPSolvers, get_time_groups
 from GridCal.Engine.Core.multi_circuit import MultiCircuit
+from GridCal.Engine.Core.numerical_circuit import NumericalCircuit
+from GridCal.Engine.Core.topology_cache import TopologyCache
 from GridCal.Engine.Simulations.PowerFlow.power_flow_worker import SolverType
 from GridCal.Engine.Simulations.OPF.opf_driver import OptimalPowerFlowResults, OptimalPowerFlowOptions
 from GridCal.Engine.Simulations.OPF.dc_opf_ts import OpfDcTimeSeries
+from GridCal.Engine.Simulations.OPF.dc_opf_matrix import OpfDcMatrixTimeSeries
 from GridCal.Engine.Simulations.OPF.ac_opf_ts import OpfAcTimeSeries
 from GridCal.Gui.GuiFunctions import ResultsModel
 from GridCal.Engine.Simulations.result_types import ResultTypes
@@ -238,23 +242,133 @@ class OptimalPowerFlowTimeSeriesResults:
             return None
 
 
+def get_opf_time_series_problem(numerical_circuit: NumericalCircuit, options: OptimalPowerFlowOptions, start_, end_,
+                                batteries_energy_0=None, topology_cache: TopologyCache = None):
+    """
+    Formulate the OPF time series problem of a time window
+    :param numerical_circuit: NumericalCircuit instance
+    :param options: OptimalPowerFlowOptions instance
+    :param start_: start index
+    :param end_: end index
+    :param batteries_energy_0: initial state of the batteries, if None the default values are taken
+    :param topology_cache: TopologyCache instance to get the islands from (if None they are computed)
+    :return: OPF problem instance or None if the solver is not supported
+    """
+    calc_inputs_dict = topology_cache.get_islands_ts() if topology_cache is not None else None
+
+    if options.solver == SolverType.DC_OPF:
+
+        # DC optimal power flow
+        if options.mip_solver == MIPSolvers.HIGHS:
+            # matrix formulation solved in-process
+            return OpfDcMatrixTimeSeries(numerical_circuit=numerical_circuit,
+                                         start_idx=start_, end_idx=end_,
+                                         batteries_energy_0=batteries_energy_0,
+                                         topology_cache=topology_cache)
+        else:
+            return OpfDcTimeSeries(numerical_circuit=numerical_circuit,
+                                   start_idx=start_, end_idx=end_,
+                                   solver=options.mip_solver, batteries_energy_0=batteries_energy_0,
+                                   calc_inputs_dict=calc_inputs_dict)
+
+    elif options.solver == SolverType.AC_OPF:
+
+        # AC optimal power flow
+        return OpfAcTimeSeries(numerical_circuit=numerical_circuit,
+                               start_idx=start_, end_idx=end_,
+                               solver=options.mip_solver, batteries_energy_0=batteries_energy_0,
+                               calc_inputs_dict=calc_inputs_dict)
+
+    else:
+        return None
+
+
+def get_opf_time_series_values(problem):
+    """
+    Get the results of a solved OPF time series problem
+    :param problem: OPF problem instance (solved)
+    :return: dictionary of result arrays (time, device)
+    """
+    return {'voltage': problem.get_voltage(),
+            'load_shedding': problem.get_load_shedding(),
+            'battery_power': problem.get_battery_power(),
+            'battery_energy': problem.get_battery_energy(),
+            'controlled_generator_power': problem.get_generator_power(),
+            'Sbranch': problem.get_branch_power(),
+            'overloads': problem.get_overloads(),
+            'loading': problem.get_loading(),
+            'shadow_prices': problem.get_shadow_prices()}
+
+
+def has_storage_coupling(numerical_circuit: NumericalCircuit):
+    """
+    Are the time windows coupled by the energy of the batteries?
+    :param numerical_circuit: NumericalCircuit instance
+    :return: bool
+    """
+    return numerical_circuit.n_batt > 0 and np.any(numerical_circuit.battery_Enom > 0)
+
+
+# per process data of the OPF windows pool
+_window_worker_data = dict()
+
+
+def _init_opf_window_worker(numerical_circuit: NumericalCircuit, options: OptimalPowerFlowOptions):
+    """
+    Pool initializer: store the circuit once per process; the process keeps its own topology cache
+    :param numerical_circuit: NumericalCircuit instance
+    :param options: OptimalPowerFlowOptions instance
+    """
+    _window_worker_data['numerical_circuit'] = numerical_circuit
+    _window_worker_data['options'] = options
+    _window_worker_data['topology_cache'] = TopologyCache(numerical_circuit)
+
+
+def opf_window_worker(window):
+    """
+    Solve an independent OPF time window in a pool process
+    :param window: (start index, end index)
+    :return: start index, end index, dictionary of result arrays (None if the solver is not supported)
+    """
+    start_, end_ = window
+    problem = get_opf_time_series_problem(numerical_circuit=_window_worker_data['numerical_circuit'],
+                                          options=_window_worker_data['options'],
+                                          start_=start_, end_=end_,
+                                          topology_cache=_window_worker_data['topology_cache'])
+    if problem is None:
+        return start_, end_, None
+
+    problem.solve()
+    return start_, end_, get_opf_time_series_values(problem)
+
+
 class OptimalPowerFlowTimeSeries(QThread):
     progress_signal = Signal(float)
     progress_text = Signal(str)
     done_signal = Signal()
 
-    def __init__(self, grid: MultiCircuit, options: OptimalPowerFlowOptions, start_=0, end_=None):
+    def __init__(self, grid: MultiCircuit, options: OptimalPowerFlowOptions, start_=0, end_=None,
+                 topology_cache: TopologyCache = None):
         """
         PowerFlowDriver class constructor
         @param grid: MultiCircuit Object
         @param options: OPF options
+        @param topology_cache: TopologyCache of the compiled grid (optional, it can be shared with other drivers);
+                               if given, its numerical circuit is used instead of compiling the grid
         """
         QThread.__init__(self)
 
         # Grid to run a power flow in
         self.grid = grid
 
-        self.numerical_circuit = self.grid.compile()
+        if topology_cache is None:
+            self.numerical_circuit = self.grid.compile()
+            topology_cache = TopologyCache(self.numerical_circuit)
+        else:
+            self.numerical_circuit = topology_cache.numerical_circuit
+
+        # islands of the numerical circuit shared by all the formulations
+        self.topology_cache = topology_cache
 
         # Options to use
         self.options = options
@@ -314,21 +428,13 @@ class OptimalPowerFlowTimeSeries(QThread):
             self.progress_signal.emit(0.0)
             self.progress_text.emit('Running all in an external solver, this may take a while...')
 
-        if self.options.solver == SolverType.DC_OPF:
-
-            # DC optimal power flow
-            problem = OpfDcTimeSeries(numerical_circuit=self.numerical_circuit,
-                                      start_idx=start_, end_idx=end_,
-                                      solver=self.options.mip_solver, batteries_energy_0=batteries_energy_0)
+        problem = get_opf_time_series_problem(numerical_circuit=self.numerical_circuit,
+                                              options=self.options,
+                                              start_=start_, end_=end_,
+                                              batteries_energy_0=batteries_energy_0,
+                                              topology_cache=self.topology_cache)
 
-        elif self.options.solver == SolverType.AC_OPF:
-
-            # AC optimal power flow
-            problem = OpfAcTimeSeries(numerical_circuit=self.numerical_circuit,
-                                      start_idx=start_, end_idx=end_,
-                                      solver=self.options.mip_solver, batteries_energy_0=batteries_energy_0)
-
-        else:
+        if problem is None:
             self.logger.append('Solver not supported in this mode: ' + str(self.options.solver))
             return
 
@@ -336,20 +442,103 @@ class OptimalPowerFlowTimeSeries(QThread):
         status = problem.solve()
         # print("Status:", status)
 
-        a = start_
-        b = end_
-        self.results.voltage[a:b, :] = problem.get_voltage()
-        self.results.load_shedding[a:b, :] = problem.get_load_shedding()
-        self.results.battery_power[a:b, :] = problem.get_battery_power()
-        self.results.battery_energy[a:b, :] = problem.get_battery_energy()
-        self.results.controlled_generator_power[a:b, :] = problem.get_generator_power()
-        self.results.Sbranch[a:b, :] = problem.get_branch_power()
-        self.results.overloads[a:b, :] = problem.get_overloads()
-        self.results.loading[a:b, :] = problem.get_loading()
-        self.results.shadow_prices[a:b, :] = problem.get_shadow_prices()
+        self.set_window_results(start_, end_, get_opf_time_series_values(problem))
 
         return self.results
 
+    def set_window_results(self, start_, end_, values):
+        """
+        Copy the results of a time window into the results object
+        :param start_: start index
+        :param end_: end index
+        :param values: dictionary of result arrays (see get_opf_time_series_values)
+        """
+        for name, arr in values.items():
+            getattr(self.results, name)[start_:end_, :] = arr
+
+    def get_windows(self):
+        """
+        Get the time windows given by the grouping that are within the start:end boundaries
+        :return: list of (start index, end index)
+        """
+        groups = get_time_groups(t_array=self.grid.time_profile, grouping=self.options.grouping)
+
+        return [(groups[i - 1], groups[i]) for i in range(1, len(groups))
+                if groups[i - 1] >= self.start_ and groups[i] <= self.end_]
+
+    def opf_rolling_horizon(self):
+        """
+        Run the OPF window after window re-using the formulated problem: the windows with the same structure
+        (length, topologies and time steps) only update the costs, bounds and right hand sides.
+        The batteries energy is passed from each window to the next one.
+        """
+        self.progress_signal.emit(0.0)
+        self.progress_text.emit('Making groups...')
+
+        windows = self.get_windows()
+
+        problem = None
+        energy_0 = None
+        for k, (start_, end_) in enumerate(windows):
+
+            if self.__cancel__:
+                break
+
+            self.progress_text.emit('Running OPF for the time group ' + str(k + 1) + '...')
+
+            if problem is None:
+                problem = get_opf_time_series_problem(numerical_circuit=self.numerical_circuit,
+                                                      options=self.options,
+                                                      start_=start_, end_=end_,
+                                                      batteries_energy_0=energy_0,
+                                                      topology_cache=self.topology_cache)
+                if problem is None:
+                    self.logger.append('Solver not supported in this mode: ' + str(self.options.solver))
+                    return
+            else:
+                problem.update(start_idx=start_, end_idx=end_, batteries_energy_0=energy_0)
+
+            problem.solve()
+
+            self.set_window_results(start_, end_, get_opf_time_series_values(problem))
+
+            energy_0 = self.results.battery_energy[end_ - 1, :]
+
+            self.progress_signal.emit((k + 1) / len(windows) * 100.0)
+
+    def opf_parallel_windows(self):
+        """
+        Run the independent OPF windows in a pool of processes (only valid without storage coupling)
+        """
+        self.progress_signal.emit(0.0)
+        self.progress_text.emit('Making groups...')
+
+        windows = self.get_windows()
+
+        n_cores = multiprocessing.cpu_count()
+        self.progress_text.emit('Running the OPF time groups in parallel using ' + str(n_cores) + ' cores ...')
+
+        pool = multiprocessing.Pool(processes=n_cores,
+                                    initializer=_init_opf_window_worker,
+                                    initargs=(self.numerical_circuit, self.options))
+        try:
+            for k, (start_, end_, values) in enumerate(pool.imap_unordered(opf_window_worker, windows)):
+
+                if values is None:
+                    self.logger.append('Solver not supported in this mode: ' + str(self.options.solver))
+                    pool.terminate()
+                    break
+
+                self.set_window_results(start_, end_, values)
+                self.progress_signal.emit((k + 1) / len(windows) * 100.0)
+
+                if self.__cancel__:
+                    pool.terminate()
+                    break
+        finally:
+            pool.close()
+            pool.join()
+
     def opf_by_groups(self):
         """
         Run the OPF by groups
@@ -394,6 +583,15 @@ class OptimalPowerFlowTimeSeries(QThread):
 
         if self.options.grouping == TimeGrouping.NoGrouping:
             self.opf(start_=self.start_, end_=self.end_)
+
+        elif self.options.multi_thread and not has_storage_coupling(self.numerical_circuit):
+            # the windows are independent
+            self.opf_parallel_windows()
+
+        elif self.options.mip_solver == MIPSolvers.HIGHS and self.options.solver == SolverType.DC_OPF:
+            # the matrix formulation can be updated in place from one window to the next
+            self.opf_rolling_horizon()
+
         else:
             self.opf_by_groups()
 
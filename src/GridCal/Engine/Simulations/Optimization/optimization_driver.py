@@ -12,26 +12,72 @@
 #
 # You should have received a copy of the GNU General Public License
 # along with GridCal.  If not, see <http://www.gnu.org/licenses/>.
+import threading
+import multiprocessing
 import numpy as np
 from matplotlib import pyplot as plt
 from PySide2.QtCore import QThread, Signal
 from pySOT.experimental_design import SymmetricLatinHypercube
 from pySOT.strategy import SRBFStrategy
-from pySOT.surrogate import GPRegressor
+from pySOT.surrogate import RBFInterpolant, CubicKernel, LinearTail
 from pySOT.optimization_problems import OptimizationProblem
-from poap.controller import ThreadController, BasicWorkerThread
 
+from GridCal.Engine.basic_structures import Logger
 from GridCal.Engine.Core.multi_circuit import MultiCircuit
-from GridCal.Engine.Simulations.PowerFlow.power_flow_driver import PowerFlowDriver, PowerFlowOptions
+from GridCal.Engine.Simulations.PowerFlow.power_flow_driver import PowerFlowOptions
 from GridCal.Engine.Simulations.PowerFlow.power_flow_worker import single_island_pf
 from GridCal.Engine.Simulations.Stochastic.monte_carlo_results import MonteCarloResults
 from GridCal.Engine.Simulations.Stochastic.monte_carlo_driver import make_monte_carlo_input
+from GridCal.Engine.Simulations.Optimization.parallel_evaluation import ProcessEvaluator, run_thread_optimization, \
+    run_socket_optimization
 
 ########################################################################################################################
 # Optimization classes
 ########################################################################################################################
 
 
+def voltage_optimization_objective(x, islands, mc_inputs, options: PowerFlowOptions, nbus, nbr):
+    """
+    Objective function of the voltage optimization: the power injections are sampled from their
+    cumulative density functions at x and the power flow is run on every island
+    :param x: Data point (probability values of every bus)
+    :param islands: list of CalculationInputs instances
+    :param mc_inputs: list of MonteCarloInput instances, one per island
+    :param options: PowerFlowOptions instance
+    :param nbus: number of buses
+    :param nbr: number of branches
+    :return: function value, (bus powers, bus voltages, branch currents, branch loadings)
+    """
+    S = np.zeros(nbus, dtype=complex)
+    V = np.zeros(nbus, dtype=complex)
+    I = np.zeros(nbr, dtype=complex)
+    loading = np.zeros(nbr, dtype=complex)
+
+    for island, mc_input in zip(islands, mc_inputs):
+        bus_idx = island.original_bus_idx
+        br_idx = island.original_branch_idx
+
+        # sample the injections at x
+        Ysh, Ibus, Sbus = mc_input.get_at(x[bus_idx]).get_at(t=0)
+
+        res = single_island_pf(circuit=island,
+                               Vbus=island.Vbus,
+                               Sbus=Sbus,
+                               Ibus=Ibus,
+                               branch_rates=island.branch_rates,
+                               options=options,
+                               logger=Logger())
+
+        S[bus_idx] = Sbus
+        V[bus_idx] = res.voltage
+        I[br_idx] = res.Ibranch
+        loading[br_idx] = res.loading
+
+    f = abs(V.sum()) / nbus
+
+    return f, (S, V, I, loading)
+
+
 class VoltageOptimizationProblem(OptimizationProblem):
     """
 
@@ -51,9 +97,6 @@ class VoltageOptimizationProblem(OptimizationProblem):
 
         self.callback = callback
 
-        # initialize the power flow
-        self.power_flow = PowerFlowDriver(self.circuit, self.options)
-
         n = len(self.circuit.buses)
         m = len(self.circuit.branches)
 
@@ -74,63 +117,103 @@ class VoltageOptimizationProblem(OptimizationProblem):
 
         # compile circuits
         self.numerical_circuit = self.circuit.compile()
-        self.numerical_input_islands = self.numerical_circuit.compute(ignore_single_node_islands=options.ignore_single_node_islands)
+        self.numerical_input_islands = self.numerical_circuit.compute(
+            ignore_single_node_islands=options.ignore_single_node_islands)
+
+        # the sampling functions are built once, not at every evaluation
+        self.monte_carlo_inputs = [make_monte_carlo_input(island) for island in self.numerical_input_islands]
+
+        # ProcessEvaluator (if None, the evaluations run in the calling thread)
+        self.evaluator = None
+
+        # the evaluations may come from several threads
+        self.lock = threading.Lock()
 
         self.it = 0
 
+    def get_objective_data(self):
+        """
+        Arguments of voltage_optimization_objective besides the data point
+        :return: dictionary
+        """
+        return {'islands': self.numerical_input_islands,
+                'mc_inputs': self.monte_carlo_inputs,
+                'options': self.options,
+                'nbus': self.numerical_circuit.nbus,
+                'nbr': self.numerical_circuit.nbr}
+
+    def store(self, f, details):
+        """
+        Store the results of an evaluation
+        :param f: function value
+        :param details: bus powers, bus voltages, branch currents and branch loadings of the evaluation
+        """
+        with self.lock:
+            if self.it < self.max_eval:
+                S, V, I, loading = details
+                self.results.S_points[self.it, :] = S
+                self.results.V_points[self.it, :] = V
+                self.results.I_points[self.it, :] = I
+                self.results.loading_points[self.it, :] = loading
+
+            self.it += 1
+
+            if self.callback is not None:
+                prog = self.it / self.max_eval * 100
+                self.callback(prog)
+
     def eval(self, x):
         """
-        Evaluate the Ackley function  at x
+        Evaluate the function at x
 
         :param x: Data point
         :type x: numpy.array
         :return: Value at x
         :rtype: float
         """
-        # For every circuit, run the time series
-        for numerical_island in self.numerical_input_islands:
-            # sample from the CDF give the vector x of values in [0, 1]
-            # c.sample_at(x)
-            monte_carlo_input = make_monte_carlo_input(numerical_island)
-            mc_time_series = monte_carlo_input.get_at(x)
-
-            Y, I, S = mc_time_series.get_at(t=0)
-
-            #  run the sampled values
-            # res = self.power_flow.run_at(0, mc=True)
-            res = single_island_pf(circuit, Vbus, Sbus, Ibus, options=self.options, logger=self.logger)
-
-            self.results.S_points[self.it, numerical_island.original_bus_idx] = S
-            self.results.V_points[self.it, numerical_island.original_bus_idx] = res.voltage[
-                numerical_island.original_bus_idx]
-            self.results.I_points[self.it, numerical_island.original_branch_idx] = res.Ibranch[
-                numerical_island.original_branch_idx]
-            self.results.loading_points[self.it, numerical_island.original_branch_idx] = res.loading[
-                numerical_island.original_branch_idx]
-
-        self.it += 1
-        if self.callback is not None:
-            prog = self.it / self.max_eval * 100
-            self.callback(prog)
-
-        f = abs(self.results.V_points[self.it - 1, :].sum()) / self.dim
-        # print(prog, ' % \t', f)
+        if self.evaluator is None:
+            f, details = voltage_optimization_objective(x, **self.get_objective_data())
+        else:
+            f, details = self.evaluator.eval(x)
+
+        self.store(f, details)
 
         return f
 
+    def eval_batch(self, X):
+        """
+        Evaluate the function at a batch of points (in parallel if there is an evaluator)
+
+        :param X: Data points (one per row)
+        :return: Values at X
+        """
+        if self.evaluator is None:
+            evaluations = [voltage_optimization_objective(x, **self.get_objective_data()) for x in X]
+        else:
+            evaluations = self.evaluator.eval_batch(X)
+
+        for f, details in evaluations:
+            self.store(f, details)
+
+        return np.array([f for f, details in evaluations])
+
 
 class Optimize(QThread):
     progress_signal = Signal(float)
     progress_text = Signal(str)
     done_signal = Signal()
 
-    def __init__(self, circuit: MultiCircuit, options: PowerFlowOptions, max_iter=1000):
+    def __init__(self, circuit: MultiCircuit, options: PowerFlowOptions, max_iter=1000, n_processes=None,
+                 use_sockets=False):
         """
         Constructor
         Args:
             circuit: Grid to cascade
             options: Power flow Options
             max_iter: max iterations
+            n_processes: number of evaluation processes (if None, the number of cores)
+            use_sockets: evaluate with the socket workers of Replacements.tcpserve in local processes
+                         instead of a pool of processes (the per evaluation results are not stored)
         """
 
         QThread.__init__(self)
@@ -141,6 +224,10 @@ class Optimize(QThread):
 
         self.max_iter = max_iter
 
+        self.n_processes = n_processes
+
+        self.use_sockets = use_sockets
+
         self.__cancel__ = False
 
         self.problem = None
@@ -154,94 +241,51 @@ class Optimize(QThread):
         Run the optimization
         @return: Nothing
         """
-        # self.it = 0
-        # n = len(self.circuit.buses)
-        # m = len(self.circuit.branches)
-        # self.xlow = zeros(n)  # lower bounds
-        # self.xup = ones(n)  # upper bounds
-        # self.progress_signal.emit(0.0)
-        # self.progress_text.emit('Running stochastic voltage collapse...')
-        # self.results = MonteCarloResults(n, m, self.max_eval)
+        self.progress_signal.emit(0.0)
+        self.progress_text.emit('Running the voltage optimization...')
 
         self.problem = VoltageOptimizationProblem(self.circuit,
                                                   self.options,
                                                   self.max_iter,
                                                   callback=self.progress_signal.emit)
 
-        # # (1) Optimization problem
-        # # print(data.info)
-        #
-        # # (2) Experimental design
-        # # Use a symmetric Latin hypercube with 2d + 1 samples
-        # exp_des = SymmetricLatinHypercube(dim=self.problem.dim, npts=2 * self.problem.dim + 1)
-        #
-        # # (3) Surrogate model
-        # # Use a cubic RBF interpolant with a linear tail
-        # surrogate = RBFInterpolant(kernel=CubicKernel, tail=LinearTail, maxp=self.max_eval)
-        #
-        # # (4) Adaptive sampling
-        # # Use DYCORS with 100d candidate points
-        # adapt_samp = CandidateDYCORS(data=self, numcand=100 * self.dim)
-        #
-        # # Use the serial controller (uses only one thread)
-        # controller = SerialController(self.objfunction)
-        #
-        # # (5) Use the sychronous strategy without non-bound constraints
-        # strategy = SyncStrategyNoConstraints(worker_id=0,
-        #                                      data=self,
-        #                                      maxeval=self.max_eval,
-        #                                      nsamples=1,
-        #                                      exp_design=exp_des,
-        #                                      response_surface=surrogate,
-        #                                      sampling_method=adapt_samp)
-        #
-        # controller.strategy = strategy
-        #
-        # # Run the optimization strategy
-        # result = controller.run()
-        #
-        # # Print the final result
-        # print('Best value found: {0}'.format(result.value))
-        # print('Best solution found: {0}'.format(np.array_str(result.params[0], max_line_width=np.inf, precision=5,
-        #                                                      suppress_small=True)))
-
-        num_threads = 4
-
-        surrogate_model = GPRegressor(dim=self.problem.dim)
+        n_workers = multiprocessing.cpu_count() if self.n_processes is None else self.n_processes
+
+        # cubic RBF interpolant with a linear tail: the surrogate of the SRBF strategy, whose predictions have
+        # the (points, 1) shape that the merit function expects with every scikit-learn version
+        surrogate_model = RBFInterpolant(dim=self.problem.dim, kernel=CubicKernel(), tail=LinearTail(self.problem.dim))
         sampler = SymmetricLatinHypercube(dim=self.problem.dim, num_pts=2 * (self.problem.dim + 1))
 
-        # Create a strategy and a controller
-        controller = ThreadController()
-        controller.strategy = SRBFStrategy(max_evals=self.max_iter,
-                                           opt_prob=self.problem,
-                                           exp_design=sampler,
-                                           surrogate=surrogate_model,
-                                           asynchronous=True,
-                                           batch_size=num_threads)
-
-        print("Number of threads: {}".format(num_threads))
-        print("Maximum number of evaluations: {}".format(self.max_iter))
-        print("Strategy: {}".format(controller.strategy.__class__.__name__))
-        print("Experimental design: {}".format(sampler.__class__.__name__))
-        print("Surrogate: {}".format(surrogate_model.__class__.__name__))
-
-        # Launch the threads and give them access to the objective function
-        for _ in range(num_threads):
-            worker = BasicWorkerThread(controller, self.problem.eval)
-            controller.launch_worker(worker)
-
-        # Run the optimization strategy
-        result = controller.run()
-
-        print('Best value found: {0}'.format(result.value))
-        print('Best solution found: {0}\n'.format(np.array_str(result.params[0],
-                                                               max_line_width=np.inf,
-                                                               precision=4, suppress_small=True)))
+        # asynchronous strategy: a new point is proposed as soon as any worker is free
+        strategy = SRBFStrategy(max_evals=self.max_iter,
+                                opt_prob=self.problem,
+                                exp_design=sampler,
+                                surrogate=surrogate_model,
+                                asynchronous=True,
+                                batch_size=n_workers)
+
+        if self.use_sockets:
+            result, controller = run_socket_optimization(strategy=strategy,
+                                                         function=voltage_optimization_objective,
+                                                         kwargs=self.problem.get_objective_data(),
+                                                         n_workers=n_workers)
+        else:
+            # every process holds the compiled islands; the worker threads just wait for them
+            self.problem.evaluator = ProcessEvaluator(function=voltage_optimization_objective,
+                                                      kwargs=self.problem.get_objective_data(),
+                                                      n_processes=n_workers)
+            try:
+                result, controller = run_thread_optimization(strategy=strategy,
+                                                             objective=self.problem.eval,
+                                                             n_workers=n_workers)
+            finally:
+                self.problem.evaluator.close()
+                self.problem.evaluator = None
 
         self.solution = result.params[0]
 
         # Extract function values from the controller
-        self.optimization_values = np.array([o.value for o in controller.fevals])
+        self.optimization_values = np.array([o.value for o in controller.fevals if o.value is not None])
 
         # send the finnish signal
         self.progress_signal.emit(0.0)
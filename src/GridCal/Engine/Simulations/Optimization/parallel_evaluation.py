@@ -0,0 +1,147 @@
+# This file is part of GridCal.
+#
+# GridCal is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# GridCal is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with GridCal.  If not, see <http://www.gnu.org/licenses/>.
+import multiprocessing
+from poap.controller import ThreadController, BasicWorkerThread
+
+from GridCal.Engine.Replacements.tcpserve import ThreadedTCPServer, SimpleSocketWorker, LocalSocketWorkers
+
+
+########################################################################################################################
+# Parallel evaluation of the optimization objectives
+########################################################################################################################
+
+
+# per process data of the evaluations pool
+_worker_data = dict()
+
+
+def _init_evaluation_worker(function, kwargs):
+    """
+    Pool initializer: store the objective function and its data (compiled islands, options...) once per process
+    """
+    _worker_data['function'] = function
+    _worker_data['kwargs'] = kwargs
+
+
+def evaluation_worker(x):
+    """
+    Evaluate the objective function of the process at a point
+    :param x: Data point
+    :return: whatever the objective function returns
+    """
+    return _worker_data['function'](x, **_worker_data['kwargs'])
+
+
+class ProcessEvaluator:
+
+    def __init__(self, function, kwargs, n_processes=None):
+        """
+        Evaluator of an objective function in a pool of processes.
+        The function data is sent once to every process, and the evaluations run outside of the GIL,
+        so that several poap worker threads (or a batch of points) use all the cores.
+        :param function: module level function with the signature function(x, **kwargs)
+        :param kwargs: dictionary with the rest of the arguments of the function
+        :param n_processes: number of processes (if None, the number of cores)
+        """
+        self.n_processes = multiprocessing.cpu_count() if n_processes is None else n_processes
+
+        self.pool = multiprocessing.Pool(processes=self.n_processes,
+                                         initializer=_init_evaluation_worker,
+                                         initargs=(function, kwargs))
+
+    def eval(self, x):
+        """
+        Evaluate the function at a point (blocks the calling thread until a process returns)
+        :param x: Data point
+        :return: whatever the function returns
+        """
+        return self.pool.apply(evaluation_worker, (x,))
+
+    def eval_batch(self, X):
+        """
+        Evaluate the function at a batch of points
+        :param X: Data points (one per row)
+        :return: list of whatever the function returns, in the order of the points
+        """
+        points = list(X)
+        chunk_size = max(1, len(points) // (4 * self.n_processes))
+        return self.pool.map(evaluation_worker, points, chunksize=chunk_size)
+
+    def close(self):
+        """
+        Terminate the processes
+        """
+        self.pool.terminate()
+        self.pool.join()
+
+
+def run_thread_optimization(strategy, objective, n_workers):
+    """
+    Run a pySOT strategy with poap worker threads
+    :param strategy: pySOT strategy
+    :param objective: objective function of a point returning the function value (i.e. problem.eval)
+    :param n_workers: number of worker threads
+    :return: best EvalRecord, ThreadController
+    """
+    controller = ThreadController()
+    controller.strategy = strategy
+
+    for _ in range(n_workers):
+        controller.launch_worker(BasicWorkerThread(controller, objective))
+
+    return controller.run(), controller
+
+
+def _run_socket_worker(sockname, function, kwargs):
+    """
+    Socket worker process: connect to the optimization server and evaluate the points that it sends
+    :param sockname: (host, port) of the server
+    :param function: module level function with the signature function(x, **kwargs) returning (value, details)
+    :param kwargs: dictionary with the rest of the arguments of the function
+    """
+    worker = SimpleSocketWorker(objective=lambda x: function(x, **kwargs)[0], sockname=sockname, retries=5)
+    worker.run()
+
+
+def run_socket_optimization(strategy, function, kwargs, n_workers, host='localhost', max_retries=2, max_restarts=3):
+    """
+    Run a pySOT strategy with socket workers (Replacements.tcpserve) in local processes.
+    The function data is sent once to every process; the messages carry only the points, in binary.
+    The workers that die are restarted and their evaluations are sent to other workers.
+    :param strategy: pySOT strategy
+    :param function: module level function with the signature function(x, **kwargs) returning (value, details)
+    :param kwargs: dictionary with the rest of the arguments of the function
+    :param n_workers: number of worker processes
+    :param host: host where to serve the workers
+    :param max_retries: times an evaluation is resent after losing its worker
+    :param max_restarts: number of dead workers that may be restarted
+    :return: best EvalRecord, ThreadController
+    """
+    server = ThreadedTCPServer(sockname=(host, 0), strategy=strategy, max_retries=max_retries)
+
+    workers = LocalSocketWorkers(server=server,
+                                 target=_run_socket_worker,
+                                 args=(function, kwargs),
+                                 n_workers=n_workers,
+                                 max_restarts=max_restarts)
+    workers.start()
+
+    try:
+        result = server.run()
+    finally:
+        server.server_close()
+        workers.stop()
+
+    return result, server.controller
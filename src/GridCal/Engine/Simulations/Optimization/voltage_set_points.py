@@ -12,26 +12,64 @@
 #
 # You should have received a copy of the GNU General Public License
 # along with GridCal.  If not, see <http://www.gnu.org/licenses/>.
+import threading
 import numpy as np
 from matplotlib import pyplot as plt
 from PySide2.QtCore import QThread, Signal
-from pySOT.experimental_design import SymmetricLatinHypercube
-from pySOT.strategy import SRBFStrategy
-from pySOT.surrogate import GPRegressor
 from pySOT.optimization_problems import OptimizationProblem
-from poap.controller import ThreadController, BasicWorkerThread
 from scipy.optimize import fmin_bfgs, minimize
 
+from GridCal.Engine.basic_structures import Logger
 from GridCal.Engine.Core.multi_circuit import MultiCircuit
-from GridCal.Engine.Simulations.PowerFlow.power_flow_driver import PowerFlowDriver, PowerFlowOptions
+from GridCal.Engine.Simulations.PowerFlow.power_flow_driver import PowerFlowOptions
+from GridCal.Engine.Simulations.PowerFlow.power_flow_worker import single_island_pf
 from GridCal.Engine.Simulations.Stochastic.monte_carlo_results import MonteCarloResults
-from GridCal.Engine.Simulations.Stochastic.monte_carlo_driver import make_monte_carlo_input
+from GridCal.Engine.Simulations.Optimization.parallel_evaluation import ProcessEvaluator
 
 ########################################################################################################################
 # Optimization classes
 ########################################################################################################################
 
 
+def set_points_objective(x, islands, C_gen_bus, options: PowerFlowOptions, nbr):
+    """
+    Objective function of the generators voltage set points optimization: the losses of the power flow
+    :param x: Data point; x is a vector of Vset increment (from 1 p.u.) for all the generators
+    :param islands: list of CalculationInputs instances
+    :param C_gen_bus: generators-bus connectivity matrix (CSC)
+    :param options: PowerFlowOptions instance
+    :param nbr: number of branches
+    :return: function value, branch losses
+    """
+    # set point of the buses with generators (the mean if there are several)
+    n_gen_bus = C_gen_bus.T * np.ones(C_gen_bus.shape[0])
+    v_set = 1.0 + (C_gen_bus.T * x) / np.maximum(n_gen_bus, 1)
+    gen_bus = n_gen_bus > 0
+
+    losses = np.zeros(nbr, dtype=complex)
+
+    for island in islands:
+        bus_idx = island.original_bus_idx
+
+        V = island.Vbus.copy()
+        ctrl = gen_bus[bus_idx]
+        V[ctrl] = v_set[bus_idx][ctrl] * np.exp(1j * np.angle(V[ctrl]))
+
+        res = single_island_pf(circuit=island,
+                               Vbus=V,
+                               Sbus=island.Sbus,
+                               Ibus=island.Ibus,
+                               branch_rates=island.branch_rates,
+                               options=options,
+                               logger=Logger())
+
+        losses[island.original_branch_idx] = res.losses
+
+    f = np.abs(losses.sum()) / C_gen_bus.shape[0]
+
+    return f, losses
+
+
 class SetPointsOptimizationProblem(OptimizationProblem):
     """
 
@@ -44,15 +82,15 @@ class SetPointsOptimizationProblem(OptimizationProblem):
     :ivar minimum: Global minimizer
     :ivar info: String with problem info
     """
-    def __init__(self, circuit: MultiCircuit, options: PowerFlowOptions, max_iter=1000, callback=None):
+    def __init__(self, circuit: MultiCircuit, options: PowerFlowOptions, max_iter=1000, callback=None, eps=1e-3):
         self.circuit = circuit
 
         self.options = options
 
         self.callback = callback
 
-        # initialize the power flow
-        self.power_flow = PowerFlowDriver(self.circuit, self.options)
+        # finite differences step of the gradient (p.u.)
+        self.eps = eps
 
         # compile circuits
         self.numerical_circuit = self.circuit.compile()
@@ -79,8 +117,40 @@ class SetPointsOptimizationProblem(OptimizationProblem):
 
         self.all_f = list()
 
+        # ProcessEvaluator (if None, the evaluations run in the calling thread)
+        self.evaluator = None
+
+        # the evaluations may come from several threads
+        self.lock = threading.Lock()
+
         self.it = 0
 
+    def get_objective_data(self):
+        """
+        Arguments of set_points_objective besides the data point
+        :return: dictionary
+        """
+        return {'islands': self.numerical_input_islands,
+                'C_gen_bus': self.numerical_circuit.C_gen_bus.tocsc(),
+                'options': self.options,
+                'nbr': self.numerical_circuit.nbr}
+
+    def store(self, f, losses):
+        """
+        Store the results of an evaluation
+        :param f: function value
+        :param losses: branch losses of the evaluation
+        """
+        with self.lock:
+            if self.it < self.max_eval:
+                self.results.losses_points[self.it, :] = losses
+
+            self.it += 1
+            if self.callback is not None:
+                self.callback(f)
+
+            self.all_f.append(f)
+
     def eval(self, x):
         """
         Evaluate the function  at x
@@ -90,41 +160,42 @@ class SetPointsOptimizationProblem(OptimizationProblem):
         :return: Value at x
         :rtype: float
         """
+        if self.evaluator is None:
+            f, losses = set_points_objective(x, **self.get_objective_data())
+        else:
+            f, losses = self.evaluator.eval(x)
 
-        inc_v = self.numerical_circuit.C_gen_bus.T * x
-
-        losses = np.empty(self.numerical_circuit.nbr, dtype=complex)
-
-        # For every circuit, run the time series
-        for island in self.numerical_input_islands:
-            # sample from the CDF give the vector x of values in [0, 1]
-            # c.sample_at(x)
+        self.store(f, losses)
 
-            V = island.Vbus + inc_v[island.original_bus_idx]
+        return f
 
-            #  run the sampled values
-            # res = self.power_flow.run_at(0, mc=True)
-            res = single_island_pf(circuit, Vbus, Sbus, Ibus, options=self.options, logger=self.logger)
+    def eval_batch(self, X):
+        """
+        Evaluate the function at a batch of points (in parallel if there is an evaluator)
 
-            # self.results.S_points[self.it, island.original_bus_idx] = island.Sbus
-            # self.results.V_points[self.it, island.original_bus_idx] = res.voltage[island.original_bus_idx]
-            # self.results.I_points[self.it, island.original_branch_idx] = res.Ibranch[island.original_branch_idx]
-            # self.results.loading_points[self.it, island.original_branch_idx] = res.loading[island.original_branch_idx]
-            # self.results.losses_points[self.it, island.original_branch_idx] = res.losses[island.original_branch_idx]
-            losses[island.original_branch_idx] = res.losses[island.original_branch_idx]
+        :param X: Data points (one per row)
+        :return: Values at X
+        """
+        if self.evaluator is None:
+            evaluations = [set_points_objective(x, **self.get_objective_data()) for x in X]
+        else:
+            evaluations = self.evaluator.eval_batch(X)
 
-        f = np.abs(losses.sum()) / self.dim
-        self.it += 1
-        if self.callback is not None:
-            prog = self.it / self.max_eval * 100
-            # self.callback(prog)
-            self.callback(f)
+        for f, losses in evaluations:
+            self.store(f, losses)
 
-        # print(prog, ' % \t', f)
+        return np.array([f for f, losses in evaluations])
 
-        self.all_f.append(f)
+    def gradient(self, x):
+        """
+        Forward differences gradient at x: the point and its dim perturbations are evaluated as one batch
 
-        return f
+        :param x: Data point
+        :return: gradient array
+        """
+        X = x + np.vstack((np.zeros(self.dim), self.eps * np.eye(self.dim)))
+        f = self.eval_batch(X)
+        return (f[1:] - f[0]) / self.eps
 
 
 class OptimizeVoltageSetPoints(QThread):
@@ -132,13 +203,14 @@ class OptimizeVoltageSetPoints(QThread):
     progress_text = Signal(str)
     done_signal = Signal()
 
-    def __init__(self, circuit: MultiCircuit, options: PowerFlowOptions, max_iter=1000):
+    def __init__(self, circuit: MultiCircuit, options: PowerFlowOptions, max_iter=1000, n_processes=None):
         """
         Constructor
         Args:
             circuit: Grid to cascade
             options: Power flow Options
             max_iter: max iterations
+            n_processes: number of processes to evaluate the gradients (if None, the number of cores)
         """
 
         QThread.__init__(self)
@@ -149,6 +221,8 @@ class OptimizeVoltageSetPoints(QThread):
 
         self.max_iter = max_iter
 
+        self.n_processes = n_processes
+
         self.__cancel__ = False
 
         self.problem = None
@@ -157,23 +231,32 @@ class OptimizeVoltageSetPoints(QThread):
 
         self.optimization_values = None
 
-    def run_bfgs(self):
+    def initialize_problem(self):
         """
-        Run the optimization
-        @return: Nothing
+        Compile the problem and send it to the evaluation processes
         """
-
         self.problem = SetPointsOptimizationProblem(self.circuit,
                                                     self.options,
                                                     self.max_iter,
                                                     callback=self.progress_signal.emit)
 
-        xopt = fmin_bfgs(f=self.problem.eval, x0=self.problem.x0,
-                         fprime=None, args=(), gtol=1e-05,  epsilon=1e-2,
-                         maxiter=self.max_iter, full_output=0, disp=1, retall=0,
-                         callback=None)
+        self.problem.evaluator = ProcessEvaluator(function=set_points_objective,
+                                                  kwargs=self.problem.get_objective_data(),
+                                                  n_processes=self.n_processes)
 
-        self.solution = np.ones(self.problem.dim) + xopt
+    def close_evaluator(self):
+        """
+        Close the evaluation processes
+        """
+        self.problem.evaluator.close()
+        self.problem.evaluator = None
+
+    def finalize_problem(self, x):
+        """
+        Gather the solution
+        :param x: optimal data point
+        """
+        self.solution = np.ones(self.problem.dim) + x
 
         # Extract function values from the controller
         self.optimization_values = np.array(self.problem.all_f)
@@ -183,28 +266,38 @@ class OptimizeVoltageSetPoints(QThread):
         self.progress_text.emit('Done!')
         self.done_signal.emit()
 
-    def run_slsqp(self):
+    def run_bfgs(self):
+        """
+        Run the optimization
+        @return: Nothing
+        """
+        self.initialize_problem()
 
-        self.problem = SetPointsOptimizationProblem(self.circuit,
-                                                    self.options,
-                                                    self.max_iter,
-                                                    callback=self.progress_signal.emit)
+        try:
+            xopt = fmin_bfgs(f=self.problem.eval, x0=self.problem.x0,
+                             fprime=self.problem.gradient, args=(), gtol=1e-05,
+                             maxiter=self.max_iter, full_output=0, disp=1, retall=0,
+                             callback=None)
+        finally:
+            self.close_evaluator()
 
-        bounds = [(l, u) for l, u in zip(self.problem.lb, self.problem.ub)]
+        self.finalize_problem(xopt)
+
+    def run_slsqp(self):
 
-        options = {'maxiter': self.max_iter, 'tol': 0.01}
+        self.initialize_problem()
 
-        res = minimize(fun=self.problem.eval, x0=self.problem.x0, method='SLSQP', bounds=bounds, options=options)
+        bounds = [(l, u) for l, u in zip(self.problem.lb, self.problem.ub)]
 
-        self.solution = np.ones(self.problem.dim) + res.x
+        options = {'maxiter': self.max_iter}
 
-        # Extract function values from the controller
-        self.optimization_values = np.array(self.problem.all_f)
+        try:
+            res = minimize(fun=self.problem.eval, x0=self.problem.x0, jac=self.problem.gradient, method='SLSQP',
+                           bounds=bounds, tol=0.01, options=options)
+        finally:
+            self.close_evaluator()
 
-        # send the finnish signal
-        self.progress_signal.emit(0.0)
-        self.progress_text.emit('Done!')
-        self.done_signal.emit()
+        self.finalize_problem(res.x)
 
     def plot(self, ax=None):
         """
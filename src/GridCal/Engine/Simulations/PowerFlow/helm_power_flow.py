@@ -10,8 +10,9 @@ import numpy as np
 np.set_printoptions(linewidth=32000, suppress=False)
 from numpy import zeros, ones, mod, angle, conj, array, c_, r_, linalg, Inf, complex128, double
 from numpy.linalg import solve
-from scipy.sparse.linalg import factorized
-from scipy.sparse import lil_matrix
+import pandas as pd
+from scipy.sparse.linalg import factorized, splu
+from scipy.sparse import csc_matrix
 from scipy.sparse import hstack as hstack_s, vstack as vstack_s
 import time
 # Set the complex precision to use
@@ -34,32 +35,29 @@ def prepare_system_matrices(Ybus, Vbus, bus_idx, pqpv, pq, pv, ref):
     # Compute the starting voltages
     # ##################################################################################################################
 
-    # System matrix
-    A = lil_matrix((n_bus2, n_bus2))  # lil matrices are faster to populate
+    # Ybus entries of the pq and pv rows
+    Ycoo = Ybus.tocoo()
+    is_pqpv = zeros(n_bus, dtype=bool)
+    is_pqpv[pqpv] = True
+    mask = is_pqpv[Ycoo.row]
+    a = Ycoo.row[mask]
+    b = Ycoo.col[mask]
+    g = Ycoo.data[mask].real
+    bb = Ycoo.data[mask].imag
+
+    # System matrix: every Ybus entry expands to the 2x2 block [[G, -B], [B, G]] and the slack rows are the identity
+    rows = r_[2 * a, 2 * a, 2 * a + 1, 2 * a + 1, 2 * ref, 2 * ref + 1]
+    cols = r_[2 * b, 2 * b + 1, 2 * b, 2 * b + 1, 2 * ref, 2 * ref + 1]
+    data = r_[g, -bb, bb, g, ones(2 * len(ref))]
+    A = csc_matrix((data, (rows, cols)), shape=(n_bus2, n_bus2))
 
     # Expanded slack voltages
     Vslack = zeros(n_bus2)
-
-    # Populate A
-    for a in pqpv:  # rows
-        for ii in range(Ybus.indptr[a], Ybus.indptr[a + 1]):  # columns in sparse format
-            b = Ybus.indices[ii]
-
-            A[2 * a + 0, 2 * b + 0] = Ybus[a, b].real
-            A[2 * a + 0, 2 * b + 1] = -Ybus[a, b].imag
-            A[2 * a + 1, 2 * b + 0] = Ybus[a, b].imag
-            A[2 * a + 1, 2 * b + 1] = Ybus[a, b].real
-
-    # set vd elements
-    for a in ref:
-        A[a * 2, a * 2] = 1.0
-        A[a * 2 + 1, a * 2 + 1] = 1.0
-
-        Vslack[a * 2] = Vbus[a].real
-        Vslack[a * 2 + 1] = Vbus[a].imag
+    Vslack[2 * ref] = Vbus[ref].real
+    Vslack[2 * ref + 1] = Vbus[ref].imag
 
     # Solve starting point voltages
-    Vst_expanded = factorized(A.tocsc())(Vslack)
+    Vst_expanded = factorized(A)(Vslack)
 
     # Invert the voltages obtained: Get the complex voltage and voltage inverse vectors
     Vst = Vst_expanded[2 * bus_idx] + 1j * Vst_expanded[2 * bus_idx + 1]
@@ -69,19 +67,12 @@ def prepare_system_matrices(Ybus, Vbus, bus_idx, pqpv, pq, pv, ref):
     # Compute the final system matrix
     # ##################################################################################################################
 
-    # System matrices
-    B = lil_matrix((n_bus2, npv))
-    C = lil_matrix((npv, n_bus2 + npv))
-
-    for i, a in enumerate(pv):
-        # "a" is the actual bus index
-        # "i" is the number of the pv bus in the pv buses list
-
-        B[2 * a + 0, i + 0] = Wst[a].imag
-        B[2 * a + 1, i + 0] = Wst[a].real
-
-        C[i + 0, 2 * a + 0] = Vst[a].real
-        C[i + 0, 2 * a + 1] = Vst[a].imag
+    # System matrices: "pv" holds the actual bus indices and "pvpos" the position in the pv buses list
+    pvpos = array(range(npv), dtype=int)
+    B = csc_matrix((r_[Wst[pv].imag, Wst[pv].real], (r_[2 * pv, 2 * pv + 1], r_[pvpos, pvpos])),
+                   shape=(n_bus2, npv))
+    C = csc_matrix((r_[Vst[pv].real, Vst[pv].imag], (r_[pvpos, pvpos], r_[2 * pv, 2 * pv + 1])),
+                   shape=(npv, n_bus2 + npv))
 
     Asys = vstack_s([
                     hstack_s([A, B]),
@@ -95,18 +86,18 @@ def calc_W(n, V, W):
     """
     Calculation of the inverse coefficients W.
     @param n: Order of the coefficients
-    @param V: Structure of voltage coefficients (Ncoeff x nbus elements)
-    @param W: Structure of inverse voltage coefficients (Ncoeff x nbus elements)
+    @param V: Structure of voltage coefficients (Ncoeff x nbus elements), at least n + 1 rows filled
+    @param W: Structure of inverse voltage coefficients (Ncoeff x nbus elements), at least n rows filled
     @return: Array of inverse voltage coefficients for the order n
     """
 
     if n == 0:
-        res = 1.0 / conj(V[0, :])
+        res = 1.0 / V[0, :]
     else:
-        l = array(range(n))
-        res = -(W[l, :] * V[n - l, :]).sum(axis=0)
+        # convolution W[l] * V[n - l] for l = 0..n-1 of all the buses at once
+        res = -(W[:n, :] * V[n:0:-1, :]).sum(axis=0)
 
-        res /= conj(V[0, :])
+        res /= V[0, :]
 
     return res
 
@@ -115,25 +106,26 @@ def get_rhs(n, V, W, Q, Vbus, Vst, Sbus, Pbus, nsys, nbus2, pv, pq, pvpos):
     """
     Right hand side
     :param n: order of the coefficients
-    :param V: Voltage coefficients (order, all buses)
-    :param W: Inverse voltage coefficients (order, pv buses)
-    :param Q: Reactive power coefficients  (order, pv buses)
+    :param V: Voltage coefficients (order, all buses[, cases])
+    :param W: Inverse voltage coefficients (order, all buses[, cases])
+    :param Q: Reactive power coefficients  (order, pv buses[, cases])
     :param Vbus: Initial bus estimate (only used to pick the PV buses set voltage)
     :param Vst: Start voltage due to slack injections
-    :param Pbus: Active power injections (all the buses)
+    :param Sbus: Power injections (all the buses[, cases])
+    :param Pbus: Active power injections (all the buses[, cases])
     :param nsys: number of rows or cols in the system matrix A
     :param nbus2: two times the number of buses
     :param pv: list of pv indices in the grid
     :param pvpos: array from 0..npv
     :return: right hand side vector to solve the coefficients of order n
     """
-    rhs = zeros(nsys)
-    m = array(range(1, n), dtype=int)
+    rhs = zeros((nsys,) + Sbus.shape[1:])
+
     # ##################################################################################################################
     # PQ nodes
     # ##################################################################################################################
 
-    f1 = conj(Sbus[pq] * W[:, pq][n - 1, :])
+    f1 = conj(Sbus[pq] * W[n - 1, pq])
     idx1 = 2 * pq
     rhs[idx1 + 0] = f1.real
     rhs[idx1 + 1] = f1.imag
@@ -141,16 +133,19 @@ def get_rhs(n, V, W, Q, Vbus, Vst, Sbus, Pbus, nsys, nbus2, pv, pq, pvpos):
     # ##################################################################################################################
     # PV nodes
     # ##################################################################################################################
-    # Compute convolutions
-    QW_convolution = (Q[n - m, :] * W[m, :][:, pv].conjugate()).sum(axis=0)  # only pv nodes
-    VV_convolution = (V[m, :][:, pv] * V[n - m, :][:, pv].conjugate()).sum(axis=0)  # only pv nodes
+    # Compute the convolutions for m = 1..n-1 (only pv nodes)
+    Wpv = W[1:n, pv]
+    Vpv = V[:n, pv]
+    QW_convolution = (Q[n - 1:0:-1, :] * Wpv.conjugate()).sum(axis=0)
+    VV_convolution = (Vpv[1:n, :] * Vpv[n - 1:0:-1, :].conjugate()).sum(axis=0)
 
-    # compute the formulas
-    f2 = Pbus[pv] * W[n-1, pv] + QW_convolution
+    # compute the formulas: the pv injections are (P - jQ) conj(W), with Q[n] moved to the system matrix
+    f2 = Pbus[pv] * conj(W[n - 1, pv]) - 1j * QW_convolution
 
     epsilon = -0.5 * VV_convolution
     if n == 1:
-        epsilon += 0.5 * (abs(Vbus[pv]) ** 2 - abs(Vst[pv]) ** 2)
+        delta = 0.5 * (abs(Vbus[pv]) ** 2 - abs(Vst[pv]) ** 2)
+        epsilon += delta if epsilon.ndim == 1 else delta[:, np.newaxis]
 
     # Assign the values to the right hand side vector
     idx2 = 2 * pv
@@ -173,7 +168,7 @@ def get_rhs(n, V, W, Q, Vbus, Vst, Sbus, Pbus, nsys, nbus2, pv, pq, pvpos):
 def assign_solution(x, bus_idx, pvpos, pv, nbus):
     """
     Assign the solution vector to the appropriate coefficients
-    :param x: solution vector
+    :param x: solution vector (or matrix with one column per case)
     :param bus_idx: array from 0..nbus-1
     :param nbus2: two times the number of buses (integer)
     :param pvpos: array from 0..npv
@@ -197,151 +192,201 @@ def assign_solution(x, bus_idx, pvpos, pv, nbus):
 
         # No PV nodes
 
-        q = zeros(0)
+        q = zeros((0,) + x.shape[1:])
 
     return v, q
 
 
 def pade_approximation(n, an, s=1):
     """
-    Computes the n/2 pade approximant of the series an at the approximation
-    point s
+    Computes the [L/L] pade approximant of all the series an at the approximation point s at once
 
     Arguments:
         an: coefficient matrix, (number of coefficients, number of series)
-        n:  order of the series
+        n:  number of coefficients to use (at least 3)
         s: point of approximation
 
     Returns:
-        pade approximation at s
+        pade approximation at s (one value per series), the numerator coefficients (L + 1, number of series)
+        and the denominator coefficients (L + 1, number of series)
     """
-    nn = int(n / 2)
-    if mod(nn, 2) == 0:
-        nn -= 1
-
-    L = nn
-    M = nn
+    an = an[:n, :] if an.ndim == 2 else an[:n, np.newaxis]
+    n_series = an.shape[1]
 
-    an = np.ndarray.flatten(an)
-    rhs = an[L + 1:L + M + 1]
+    # the [L/L] approximant uses 2L + 1 coefficients
+    L = (n - 1) // 2
 
-    C = zeros((L, M), dtype=complex_type)
-    for i in range(L):
-        k = i + 1
-        C[i, :] = an[L - M + k:L + k]
+    # Toeplitz systems of every series: C[k, i, j] = an[i + j + 1, k]
+    idx = np.arange(L)[:, np.newaxis] + np.arange(L)[np.newaxis, :] + 1
+    C = np.transpose(an[idx, :], (2, 0, 1))
+    rhs = -an[L + 1:2 * L + 1, :].T
 
     try:
-        b = solve(C, -rhs)  # bn to b1
-    except:
-        return 0, zeros(L + 1, dtype=complex_type), zeros(L + 1, dtype=complex_type)
-
-    b = r_[1, b[::-1]]  # b0 = 1
-
-    a = zeros(L + 1, dtype=complex_type)
-    a[0] = an[0]
-    for i in range(L):
-        val = complex_type(0)
-        k = i + 1
-        for j in range(k + 1):
-            val += an[k - j] * b[j]
-        a[i + 1] = val
-
-    p = complex_type(0)
-    q = complex_type(0)
-    for i in range(L + 1):
-        p += a[i] * s ** i
-        q += b[i] * s ** i
+        b = solve(C, rhs[:, :, np.newaxis])[:, :, 0]  # bL to b1
+    except linalg.LinAlgError:
+        nan_coeff = np.full((L + 1, n_series), np.nan, dtype=complex_type)
+        return an.sum(axis=0), nan_coeff, nan_coeff
+
+    b = r_[np.ones((1, n_series), dtype=complex_type), b[:, ::-1].T]  # b0 = 1
+
+    # a_k = sum_j an[k - j] * b[j]
+    a = zeros((L + 1, n_series), dtype=complex_type)
+    for k in range(L + 1):
+        a[k, :] = (an[k::-1, :] * b[:k + 1, :]).sum(axis=0)
+
+    powers = s ** np.arange(L + 1)
+    p = powers.dot(a)
+    q = powers.dot(b)
 
     return p / q, a, b
 
 
-def helm(Vbus, Sbus, Ybus, pq, pv, ref, pqpv, tol=1e-9, max_coefficient_count=30):
+class HelmSystem:
+
+    def __init__(self, Vbus, Ybus, pq, pv, ref, pqpv):
+        """
+        HELM system of an island: the system matrix, its factorization and the germ solution depend on Ybus, the bus
+        types and the slack voltages only, so they are shared by the power flows of any number of injection vectors
+        :param Vbus: voltages array (only the slack voltages are used)
+        :param Ybus: System admittance matrix
+        :param pq: list of pq node indices
+        :param pv: list of pv node indices
+        :param ref: list of slack node indices
+        :param pqpv: list of pq and pv node indices sorted
+        """
+        self.nbus = len(Vbus)
+
+        self.Ybus = Ybus
+
+        self.pq = pq
+
+        self.pv = pv
+
+        self.ref = ref
+
+        self.bus_idx = array(range(self.nbus), dtype=int)
+
+        self.pvpos = array(range(len(pv)), dtype=int)
+
+        # Prepare system matrices
+        self.Asys, self.Vst, self.Wst = prepare_system_matrices(Ybus, Vbus, self.bus_idx, pqpv, pq, pv, ref)
+
+        # Factorize the system matrix (the LU solve accepts many right hand sides at once)
+        self.Afact = splu(self.Asys)
+
+        self.nsys = self.Asys.shape[0]
+
+
+def power_mismatch(Ybus, V, Sbus, pv, pq):
     """
-    Helm Method
-    :param Vbus: voltages array
-    :param Sbus: Power injections array
-    :param Ibus: Currents injection array
+    Power mismatch of one or many voltage solutions
     :param Ybus: System admittance matrix
-    :param pq: list of pq node indices
+    :param V: voltages (nbus) or (nbus, number of cases)
+    :param Sbus: power injections with the same shape as V
     :param pv: list of pv node indices
-    :param ref: list of slack node indices
-    :param pqpv: list of pq and pv node indices sorted
-    :param tol: tolerance
-    :return: Voltage array and the power mismatch
+    :param pq: list of pq node indices
+    :return: calculated power, infinite norm of the mismatch (one per case)
     """
-    start = time.time()
+    Scalc = V * conj(Ybus * V)
+    mismatch = Scalc - Sbus  # complex power mismatch
+    power_mismatch_ = r_[mismatch[pv].real, mismatch[pq].real, mismatch[pq].imag]
+    normF = np.abs(power_mismatch_).max(axis=0) if len(power_mismatch_) else zeros(Sbus.shape[1:])
+    return Scalc, normF
 
-    nbus = len(Vbus)
-    npv = len(pv)
-    bus_idx = array(range(nbus), dtype=int)
-    pvpos = array(range(npv))
-
-    # Prepare system matrices
-    Asys, Vst, Wst = prepare_system_matrices(Ybus, Vbus, bus_idx, pqpv, pq, pv, ref)
 
-    # Factorize the system matrix
-    Afact = factorized(Asys)
+def helm_system_solve(system: HelmSystem, Vbus, Sbus, tol=1e-9, max_coefficient_count=30, use_pade=True):
+    """
+    Compute the HELM series of one or many injection vectors with an already factorized system
+    :param system: HelmSystem instance
+    :param Vbus: voltages array (the pv set points are taken from its modules)
+    :param Sbus: Power injections array (nbus) or matrix (nbus, number of cases): every order is solved for all the
+                 cases at once
+    :param tol: tolerance
+    :param max_coefficient_count: maximum number of coefficients of the series
+    :param use_pade: evaluate the series with the Padé approximant too and keep the one with the lower mismatch
+    :return: voltage, converged, normF, Scalc, number of coefficients, elapsed (voltage, Scalc, converged and normF
+             have one column per case when Sbus is a matrix)
+    """
+    start = time.time()
 
-    # get the shape
-    nsys = Asys.shape[0]
+    nbus = system.nbus
+    pv = system.pv
+    pq = system.pq
+    shape = Sbus.shape
 
     # declare the active power injections
     Pbus = Sbus.real
 
-    # declare the matrix of coefficients: [order, bus index]
-    V = zeros((1, nbus), dtype=complex_type)
+    # the coefficient structures are allocated once for all the orders
+    n_coeff = max(max_coefficient_count, 1)
+
+    # declare the matrix of coefficients: [order, bus index (, case)]
+    V = zeros((n_coeff,) + shape, dtype=complex_type)
 
-    # Declare the inverse voltage coefficients: [order, pv bus index]
-    W = zeros((1, nbus), dtype=complex_type)
+    # Declare the inverse voltage coefficients: [order, bus index (, case)]
+    W = zeros((n_coeff,) + shape, dtype=complex_type)
 
-    # Reactive power coefficients on the PV nodes: [order, pv bus index]
-    Q = zeros((1, npv), dtype=double)
+    # Reactive power coefficients on the PV nodes: [order, pv bus index (, case)]
+    Q = zeros((n_coeff, len(pv)) + shape[1:], dtype=double)
 
-    # Assign the initial values
-    V[0, :] = Vst
-    W[0, :] = Wst
+    # Assign the initial values (the germ is the same for all the cases)
+    column = (nbus,) + (1,) * (len(shape) - 1)
+    V[0] = system.Vst.reshape(column)
+    W[0] = system.Wst.reshape(column)
 
     # Compute the reactive power matching the initial solution Vst, then assign it as initial reactive power
-    Scalc = Vst * conj(Ybus * Vst)
-    Q[0, :] = Scalc[pv].imag
+    Scalc, normF = power_mismatch(system.Ybus, V[0], Sbus, pv, pq)
+    Q[0] = Scalc[pv].imag
 
-    n = 1
-    converged = False
+    # running sum of the voltage coefficients
+    series = V[0].copy()
+    voltage = series.copy()
+    converged = normF < tol
 
-    while n < max_coefficient_count and not converged:
+    n = 1
+    while n < max_coefficient_count and not converged.all():
 
         # Compute the free terms
         rhs = get_rhs(n=n, V=V, W=W, Q=Q,
-                      Vbus=Vbus, Vst=Vst,
+                      Vbus=Vbus, Vst=system.Vst,
                       Sbus=Sbus,
-                      Pbus=Pbus, nsys=nsys,
+                      Pbus=Pbus, nsys=system.nsys,
                       nbus2=2 * nbus,
                       pv=pv, pq=pq,
-                      pvpos=pvpos)
+                      pvpos=system.pvpos)
 
         # Solve the linear system Asys x res = rhs
-        res = Afact(rhs)
+        res = system.Afact.solve(rhs)
 
         # get the new rows of coefficients
-        v, q = assign_solution(x=res, bus_idx=bus_idx, pvpos=pvpos, pv=pv, nbus=nbus)
+        V[n], Q[n] = assign_solution(x=res, bus_idx=system.bus_idx, pvpos=system.pvpos, pv=pv, nbus=nbus)
 
-        # Add coefficients row
-        V = np.vstack((V, v))
-        Q = np.vstack((Q, q))
+        # Calculate W[n]
+        W[n] = calc_W(n, V, W)
 
-        # Calculate W[n] and add it to the coefficients structure
-        w = calc_W(n, V, W)
-        W = np.vstack((W, w))
+        series += V[n]
 
-        voltage = V.sum(axis=0)
+        # Calculate the error of the series sum
+        voltage_n = series
+        Scalc_n, normF_n = power_mismatch(system.Ybus, voltage_n, Sbus, pv, pq)
 
-        # Calculate the error and check the convergence
-        Scalc = voltage * conj(Ybus * voltage)
-        mismatch = Scalc - Sbus  # complex power mismatch
-        power_mismatch_ = r_[mismatch[pv].real, mismatch[pq].real, mismatch[pq].imag]
+        if use_pade and n > 2:
+            # evaluate all the buses of all the cases with the Padé approximant, which extends the convergence
+            # radius of the series, and keep it where it lowers the mismatch
+            with np.errstate(all='ignore'):
+                voltage_pade, _, _ = pade_approximation(n + 1, V[:n + 1].reshape(n + 1, -1))
+                voltage_pade = voltage_pade.reshape(shape)
+                Scalc_pade, normF_pade = power_mismatch(system.Ybus, voltage_pade, Sbus, pv, pq)
+                better = np.isfinite(voltage_pade).all(axis=0) & (normF_pade < normF_n)
 
-        # check for convergence
-        normF = linalg.norm(power_mismatch_, Inf)
+            voltage_n = np.where(better, voltage_pade, voltage_n)
+            Scalc_n = np.where(better, Scalc_pade, Scalc_n)
+            normF_n = np.where(better, normF_pade, normF_n)
+
+        # the cases that already converged keep their solution
+        voltage = np.where(converged, voltage, voltage_n)
+        Scalc = np.where(converged, Scalc, Scalc_n)
+        normF = np.where(converged, normF, normF_n)
 
         converged = normF < tol
         n += 1
@@ -349,6 +394,42 @@ def helm(Vbus, Sbus, Ybus, pq, pv, ref, pqpv, tol=1e-9, max_coefficient_count=30
     end = time.time()
     elapsed = end - start
 
+    if len(shape) == 1:
+        converged = bool(converged)
+        normF = float(normF)
+
+    return voltage, converged, normF, Scalc, n, elapsed
+
+
+def helm(Vbus, Sbus, Ybus, pq, pv, ref, pqpv, tol=1e-9, max_coefficient_count=30, use_pade=True, system=None):
+    """
+    Helm Method
+    :param Vbus: voltages array
+    :param Sbus: Power injections array
+    :param Ibus: Currents injection array
+    :param Ybus: System admittance matrix
+    :param pq: list of pq node indices
+    :param pv: list of pv node indices
+    :param ref: list of slack node indices
+    :param pqpv: list of pq and pv node indices sorted
+    :param tol: tolerance
+    :param max_coefficient_count: maximum number of coefficients of the series
+    :param use_pade: evaluate the series with the Padé approximant too and keep the one with the lower mismatch
+    :param system: HelmSystem of Ybus and the bus types to reuse (optional, it is computed if not given)
+    :return: Voltage array and the power mismatch
+    """
+    start = time.time()
+
+    if system is None:
+        system = HelmSystem(Vbus=Vbus, Ybus=Ybus, pq=pq, pv=pv, ref=ref, pqpv=pqpv)
+
+    voltage, converged, normF, Scalc, n, _ = helm_system_solve(system=system, Vbus=Vbus, Sbus=Sbus, tol=tol,
+                                                               max_coefficient_count=max_coefficient_count,
+                                                               use_pade=use_pade)
+
+    end = time.time()
+    elapsed = end - start
+
     # V, converged, normF, Scalc, it, el
     return voltage, converged, normF, Scalc, n, elapsed
 
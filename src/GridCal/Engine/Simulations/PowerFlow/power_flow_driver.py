@@ -31,16 +31,19 @@ class PowerFlowDriver(QThread):
     Power flow wrapper to use with Qt
     """
 
-    def __init__(self, grid: MultiCircuit, options: PowerFlowOptions):
+    def __init__(self, grid: MultiCircuit, options: PowerFlowOptions, topology_cache=None):
         """
         PowerFlowDriver class constructor
         **grid: MultiCircuit Object
+        **topology_cache: TopologyCache of the compiled grid (optional, it can be shared with other drivers)
         """
         QThread.__init__(self)
 
         # Grid to run a power flow in
         self.grid = grid
 
+        self.topology_cache = topology_cache
+
         # Options to use
         self.options = options
 
@@ -62,7 +65,8 @@ class PowerFlowDriver(QThread):
         """
         self.results = multi_island_pf(multi_circuit=self.grid,
                                        options=self.options,
-                                       logger=self.logger)
+                                       logger=self.logger,
+                                       topology_cache=self.topology_cache)
         self.convergence_reports = self.results.convergence_reports
         # send the finnish signal
         self.progress_signal.emit(0.0)
@@ -18,7 +18,7 @@ import numpy as np
 
 from GridCal.Engine.basic_structures import BusMode, ReactivePowerControlMode, SolverType, TapsControlMode, Logger
 from GridCal.Engine.Simulations.PowerFlow.linearized_power_flow import dcpf, lacpf
-from GridCal.Engine.Simulations.PowerFlow.helm_power_flow import helm
+from GridCal.Engine.Simulations.PowerFlow.helm_power_flow import helm, HelmSystem, helm_system_solve
 from GridCal.Engine.Simulations.PowerFlow.jacobian_based_power_flow import IwamotoNR
 from GridCal.Engine.Simulations.PowerFlow.jacobian_based_power_flow import LevenbergMarquardtPF
 from GridCal.Engine.Simulations.PowerFlow.jacobian_based_power_flow import NR_LS2, NR_I_LS
@@ -1149,12 +1149,94 @@ def single_island_pf(circuit: CalculationInputs, Vbus, Sbus, Ibus, branch_rates,
         return results
 
 
-def multi_island_pf(multi_circuit: MultiCircuit, options: PowerFlowOptions, logger=Logger()):
+def helm_batch_supported(circuit: CalculationInputs, options: PowerFlowOptions):
+    """
+    Can the power flows of many injection vectors of the circuit be solved in one HELM batch?
+    (the outer loop controls change the bus types or the admittances from one vector to the other)
+    :param circuit: CalculationInputs instance
+    :param options: PowerFlowOptions instance
+    :return: True / False
+    """
+    return options.solver_type == SolverType.HELM \
+        and options.control_Q == ReactivePowerControlMode.NoControl \
+        and options.control_taps == TapsControlMode.NoControl \
+        and not options.distributed_slack \
+        and len(circuit.ref) > 0
+
+
+def helm_batch_pf(circuit: CalculationInputs, Vbus, Sbus, Ibus, branch_rates, options: PowerFlowOptions,
+                  logger: Logger, system: HelmSystem = None):
+    """
+    Run the HELM power flow of many injection vectors of a circuit at once: the HELM system is factorized once and
+    every order of the series is solved for all the vectors in a single multi right hand side solve.
+    The vectors that do not converge are solved again with single_island_pf.
+    :param circuit: CalculationInputs instance (see helm_batch_supported)
+    :param Vbus: Initial voltage at each bus in complex per unit
+    :param Sbus: Power injections matrix (nbus, number of vectors)
+    :param Ibus: Current injections matrix (nbus, number of vectors)
+    :param branch_rates: Branch rates matrix (number of vectors, nbr)
+    :param options: PowerFlowOptions instance
+    :param logger: Logger instance
+    :param system: HelmSystem of the circuit to reuse (optional, it is computed if not given)
+    :return: list of PowerFlowResults instances, one per vector
+    """
+    if system is None:
+        system = HelmSystem(Vbus=Vbus, Ybus=circuit.Ybus, pq=circuit.pq, pv=circuit.pv, ref=circuit.ref,
+                            pqpv=circuit.pqpv)
+
+    V, converged, normF, Scalc, it, el = helm_system_solve(system=system,
+                                                           Vbus=Vbus,
+                                                           Sbus=Sbus,
+                                                           tol=options.tolerance,
+                                                           max_coefficient_count=options.max_iter)
+
+    results_list = list()
+    for k in range(Sbus.shape[1]):
+
+        if converged[k]:
+            Sbranch, Ibranch, Vbranch, loading, losses, \
+             flow_direction, Sbus_k = power_flow_post_process(calculation_inputs=circuit,
+                                                              V=V[:, k],
+                                                              branch_rates=branch_rates[k, :])
+
+            results = PowerFlowResults(Sbus=Sbus_k.copy(),
+                                       voltage=V[:, k],
+                                       Sbranch=Sbranch,
+                                       Ibranch=Ibranch,
+                                       Vbranch=Vbranch,
+                                       loading=loading,
+                                       losses=losses,
+                                       flow_direction=flow_direction,
+                                       tap_module=circuit.tap_mod.copy(),
+                                       error=[normF[k]],
+                                       converged=[True],
+                                       Qpv=Sbus_k.imag[circuit.pv],
+                                       inner_it=[it],
+                                       outer_it=1,
+                                       elapsed=[el / Sbus.shape[1]],
+                                       methods=[SolverType.HELM])
+        else:
+            # solve this vector alone (with the retry options)
+            results = single_island_pf(circuit=circuit, Vbus=Vbus, Sbus=Sbus[:, k], Ibus=Ibus[:, k],
+                                       branch_rates=branch_rates[k, :], options=options, logger=logger)
+
+            # the post process returns the circuit Sbus array, which the next vectors overwrite
+            results.Sbus = results.Sbus.copy()
+
+        results_list.append(results)
+
+    return results_list
+
+
+def multi_island_pf(multi_circuit: MultiCircuit, options: PowerFlowOptions, logger=Logger(), topology_cache=None):
     """
     Multiple islands power flow (this is the most generic power flow function)
     :param multi_circuit: MultiCircuit instance
     :param options: PowerFlowOptions instance
     :param logger: list of evenets to add to
+    :param topology_cache: TopologyCache of the compiled grid (optional); if given and compiled with the same
+                           temperature, impedance tolerance and single node islands settings as the options, its
+                           numerical circuit and islands are used instead of compiling the grid
     :return:
     """
     # print('PowerFlowDriver at ', self.grid.name)
@@ -1163,11 +1245,25 @@ def multi_island_pf(multi_circuit: MultiCircuit, options: PowerFlowOptions, logg
     results = PowerFlowResults()
     results.initialize(n, m)
 
-    numerical_circuit = multi_circuit.compile()
+    if topology_cache is not None and not topology_cache.is_compatible(
+            apply_temperature=options.apply_temperature_correction,
+            branch_tolerance_mode=options.branch_impedance_tolerance_mode,
+            ignore_single_node_islands=options.ignore_single_node_islands):
+        logger.append('The topology cache was computed with other settings than the power flow options, '
+                      'compiling the grid again')
+        topology_cache = None
+
+    if topology_cache is None:
+        numerical_circuit = multi_circuit.compile()
+
+        calculation_inputs = numerical_circuit.compute(apply_temperature=options.apply_temperature_correction,
+                                                       branch_tolerance_mode=options.branch_impedance_tolerance_mode,
+                                                       ignore_single_node_islands=options.ignore_single_node_islands)
+    else:
+        numerical_circuit = topology_cache.numerical_circuit
 
-    calculation_inputs = numerical_circuit.compute(apply_temperature=options.apply_temperature_correction,
-                                                   branch_tolerance_mode=options.branch_impedance_tolerance_mode,
-                                                   ignore_single_node_islands=options.ignore_single_node_islands)
+        # the cached islands are shared: the controls must not modify them
+        calculation_inputs = [island.copy() for island in topology_cache.get_islands()]
 
     results.bus_types = numerical_circuit.bus_types
 
@@ -26,7 +26,9 @@ from GridCal.Engine.Simulations.PowerFlow.power_flow_results import PowerFlowRes
 from GridCal.Engine.Simulations.result_types import ResultTypes
 from GridCal.Engine.Core.multi_circuit import MultiCircuit
 from GridCal.Engine.Simulations.PowerFlow.power_flow_options import PowerFlowOptions
-from GridCal.Engine.Simulations.PowerFlow.power_flow_worker import single_island_pf, power_flow_worker_args
+from GridCal.Engine.Simulations.PowerFlow.power_flow_worker import single_island_pf, power_flow_worker_args, \
+    helm_batch_supported, helm_batch_pf
+from GridCal.Engine.Simulations.PowerFlow.helm_power_flow import HelmSystem
 from GridCal.Gui.GuiFunctions import ResultsModel
 
 
@@ -412,6 +414,9 @@ class TimeSeries(QThread):
 
         self.returned_results = list()
 
+        # number of time steps solved at once by the HELM batches
+        self.helm_block_size = 96
+
         self.pool = multiprocessing.Pool()
 
         self.__cancel__ = False
@@ -422,6 +427,29 @@ class TimeSeries(QThread):
         """
         return [l.strftime('%d-%m-%Y %H:%M') for l in pd.to_datetime(self.grid.time_profile)]
 
+    def run_helm_block(self, calculation_input, system: HelmSystem, it0, Vbus):
+        """
+        Solve the next block of time steps of an island with one HELM batch
+        :param calculation_input: CalculationInputs instance of the island
+        :param system: HelmSystem of the island
+        :param it0: position of the first time step of the block in the island time steps
+        :param Vbus: Initial voltage
+        :return: dictionary time index -> PowerFlowResults instance
+        """
+        idx = [i for i in range(it0, min(it0 + self.helm_block_size, calculation_input.ntime))
+               if self.start_ <= calculation_input.original_time_idx[i] < self.end_]
+
+        res_list = helm_batch_pf(circuit=calculation_input,
+                                 Vbus=Vbus,
+                                 Sbus=calculation_input.Sbus_prof[:, idx],
+                                 Ibus=calculation_input.Ibus_prof[:, idx],
+                                 branch_rates=calculation_input.branch_rates_prof[idx, :],
+                                 options=self.options,
+                                 logger=self.logger,
+                                 system=system)
+
+        return {calculation_input.original_time_idx[i]: res for i, res in zip(idx, res_list)}
+
     def run_single_thread(self) -> TimeSeriesResults:
         """
         Run single thread time series
@@ -484,6 +512,15 @@ class TimeSeries(QThread):
                     # default value in case of single-valued profile
                     dt = 1.0
 
+                    # with HELM the island system is factorized once and the time steps are solved in blocks
+                    if not self.options.dispatch_storage and helm_batch_supported(calculation_input, self.options):
+                        helm_system = HelmSystem(Vbus=last_voltage, Ybus=calculation_input.Ybus,
+                                                 pq=calculation_input.pq, pv=calculation_input.pv,
+                                                 ref=calculation_input.ref, pqpv=calculation_input.pqpv)
+                    else:
+                        helm_system = None
+                    helm_results = dict()
+
                     # traverse the time profiles of the partition and simulate each time step
                     for it, t in enumerate(calculation_input.original_time_idx):
 
@@ -516,9 +553,15 @@ class TimeSeries(QThread):
                                 pass
 
                             # run power flow at the circuit
-                            res = single_island_pf(circuit=calculation_input, Vbus=last_voltage, Sbus=S, Ibus=I,
-                                                   branch_rates=branch_rates,
-                                                   options=self.options, logger=self.logger)
+                            if helm_system is not None:
+                                if t not in helm_results:
+                                    helm_results = self.run_helm_block(calculation_input, helm_system, it,
+                                                                       last_voltage)
+                                res = helm_results.pop(t)
+                            else:
+                                res = single_island_pf(circuit=calculation_input, Vbus=last_voltage, Sbus=S, Ibus=I,
+                                                       branch_rates=branch_rates,
+                                                       options=self.options, logger=self.logger)
 
                             # Recycle voltage solution
                             # last_voltage = res.voltage
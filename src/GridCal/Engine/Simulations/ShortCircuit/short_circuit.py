@@ -1,4 +1,9 @@
+import numpy as np
 from numpy import zeros, diag
+from scipy.sparse import csc_matrix
+from scipy.sparse.linalg import splu
+
+from GridCal.Engine.basic_structures import FaultType
 
 
 def short_circuit_3p(bus_idx, Zbus, Vbus, Zf, baseMVA):
@@ -37,4 +42,323 @@ def short_circuit_3p(bus_idx, Zbus, Vbus, Zf, baseMVA):
     # SCC[bus_idx] = abs(Vbus[bus_idx]) * baseMVA / abs(Z[bus_idx])
     SCC = -I_k * Vbus * baseMVA
 
-    return V, SCC
\ No newline at end of file
+    return V, SCC
+
+
+def factorize_ybus(Ybus):
+    """
+    Factorize the admittance matrix once, so that any column of Zbus = Ybus^-1 is a pair of triangular solves
+    :param Ybus: Admittance matrix (sparse)
+    :return: SuperLU factorization object
+    """
+    return splu(csc_matrix(Ybus, dtype=complex))
+
+
+def get_zbus_columns(Ybus_lu, idx):
+    """
+    Get the columns of Zbus (the inverse of Ybus) without forming the dense inverse
+    :param Ybus_lu: factorization of Ybus (see factorize_ybus)
+    :param idx: array of column indices
+    :return: dense array (n, len(idx)) with Zbus[:, idx]
+    """
+    idx = np.array(idx, dtype=int)
+    n = Ybus_lu.shape[0]
+    E = np.zeros((n, len(idx)), dtype=complex)
+    E[idx, np.arange(len(idx))] = 1.0
+    return Ybus_lu.solve(E)
+
+
+def get_zbus_diagonal(Ybus_lu, idx=None, block_size=256):
+    """
+    Get the diagonal entries of Zbus (the inverse of Ybus) by solving blocks of unit right hand sides
+    The memory used is n x block_size instead of the n x n of the dense inverse
+    :param Ybus_lu: factorization of Ybus (see factorize_ybus)
+    :param idx: array of the bus indices where the diagonal is needed (all of them if None)
+    :param block_size: number of right hand sides solved at once
+    :return: array of Zbus[idx, idx]
+    """
+    n = Ybus_lu.shape[0]
+    if idx is None:
+        idx = np.arange(n)
+    else:
+        idx = np.array(idx, dtype=int)
+
+    Zdiag = np.zeros(len(idx), dtype=complex)
+    for a in range(0, len(idx), block_size):
+        b = min(a + block_size, len(idx))
+        cols = get_zbus_columns(Ybus_lu, idx[a:b])
+        Zdiag[a:b] = cols[idx[a:b], np.arange(b - a)]
+
+    return Zdiag
+
+
+def short_circuit_3p_factorized(bus_idx, Ybus_lu, Vbus, Zf, baseMVA):
+    """
+    Executes a 3-phase balanced short circuit study using the factorization of Ybus.
+    Only the columns of Zbus of the faulted buses are computed, so the cost is one factorization plus
+    len(bus_idx) pairs of triangular solves instead of the dense inverse.
+    Args:
+        bus_idx: Index of the bus at which the short circuit is being studied
+        Ybus_lu: factorization of the admittance matrix (see factorize_ybus)
+        Vbus: Voltages of the buses in the steady state
+        Zf: Fault impedance array
+
+    Returns: Voltages after the short circuit (p.u.), Short circuit power in MVA
+    """
+    bus_idx = np.array(bus_idx, dtype=int)
+    n = len(Vbus)
+
+    # columns of Zbus of the faulted buses
+    Zcols = get_zbus_columns(Ybus_lu, bus_idx)
+    Z = Zcols[bus_idx, np.arange(len(bus_idx))]
+
+    # Voltage Source Contribution
+    I_k = zeros(n, dtype=complex)
+    I_k[bus_idx] = -1 * Vbus[bus_idx] / (Z + Zf[bus_idx])
+
+    # voltage increment due to these currents
+    incV = Zcols.dot(I_k[bus_idx]) / len(bus_idx)
+
+    V = Vbus + incV
+
+    # Short circuit power in MVA
+    SCC = -I_k * Vbus * baseMVA
+
+    return V, SCC
+
+
+def short_circuit_3p_sweep(bus_idx, Ybus_lu, Vbus, Zf, block_size=256):
+    """
+    Executes a separate 3-phase balanced short circuit at each of the given buses (one fault at a time).
+    The Zbus columns are obtained by blocks of right hand sides from a single factorization of Ybus, so
+    sweeping all the buses costs one factorization and n pairs of triangular solves with n x block_size memory.
+    :param bus_idx: indices of the buses to fault (one at a time)
+    :param Ybus_lu: factorization of the admittance matrix (see factorize_ybus)
+    :param Vbus: Voltages of the buses in the steady state
+    :param Zf: Fault impedance array (per bus)
+    :param block_size: number of faults solved at once
+    :return: Thevenin impedance, fault current (p.u.) and minimum retained voltage module of each fault
+    """
+    bus_idx = np.array(bus_idx, dtype=int)
+    nf = len(bus_idx)
+
+    Zth = np.zeros(nf, dtype=complex)
+    Ik = np.zeros(nf, dtype=complex)
+    Vmin = np.zeros(nf, dtype=float)
+
+    for a in range(0, nf, block_size):
+        b = min(a + block_size, nf)
+        idx = bus_idx[a:b]
+        Zcols = get_zbus_columns(Ybus_lu, idx)
+
+        Zth[a:b] = Zcols[idx, np.arange(b - a)]
+        Ik[a:b] = Vbus[idx] / (Zth[a:b] + Zf[idx])
+
+        # voltages of all the buses during each of the faults of the block
+        Vret = Vbus[:, np.newaxis] - Zcols * Ik[a:b]
+        Vmin[a:b] = np.abs(Vret).min(axis=0)
+
+    return Zth, Ik, Vmin
+
+
+def mid_line_zth(Zff, Zft, Ztf, Ztt, z_series, x):
+    """
+    Thevenin impedance at the per unit distance x of a line from the Zbus entries of its terminal buses.
+    A current I injected at the fault point is equivalent to injecting (1 - x) I at the "from" bus and x I at the
+    "to" bus plus the local drop x (1 - x) z I
+    :param Zff: Zbus[f, f]
+    :param Zft: Zbus[f, t]
+    :param Ztf: Zbus[t, f]
+    :param Ztt: Zbus[t, t]
+    :param z_series: series impedance of the line
+    :param x: per unit distance of the fault measured from the "from" bus (0 ~ 1)
+    :return: Thevenin impedance
+    """
+    return (1 - x) ** 2 * Zff + x * (1 - x) * (Zft + Ztf) + x ** 2 * Ztt + x * (1 - x) * z_series
+
+
+def get_mid_line_zth(f_idx, t_idx, z_series, fault_locations, Ybus_lu):
+    """
+    Thevenin impedances at intermediate points of lines (see mid_line_zth)
+    :param f_idx: array of "from" bus indices of the faulted lines
+    :param t_idx: array of "to" bus indices of the faulted lines
+    :param z_series: array of series impedances of the faulted lines (p.u.)
+    :param fault_locations: per unit distance of each fault measured from the "from" bus (0 ~ 1)
+    :param Ybus_lu: factorization of the admittance matrix (see factorize_ybus)
+    :return: array of Thevenin impedances
+    """
+    f_idx = np.array(f_idx, dtype=int)
+    t_idx = np.array(t_idx, dtype=int)
+    rng = np.arange(len(f_idx))
+    Zf_cols = get_zbus_columns(Ybus_lu, f_idx)
+    Zt_cols = get_zbus_columns(Ybus_lu, t_idx)
+    return mid_line_zth(Zf_cols[f_idx, rng], Zt_cols[f_idx, rng], Zf_cols[t_idx, rng], Zt_cols[t_idx, rng],
+                        np.array(z_series, dtype=complex), np.array(fault_locations, dtype=float))
+
+
+def short_circuit_3p_mid_line_sweep(f_idx, t_idx, z_series, fault_locations, Ybus_lu, Vbus, Zf, block_size=256):
+    """
+    Executes a separate 3-phase balanced short circuit at an intermediate point of each of the given lines.
+    The line is not split (see mid_line_zth), so only the Zbus columns of the line terminal buses are needed.
+    The line charging is kept at the line ends.
+    :param f_idx: array of "from" bus indices of the faulted lines
+    :param t_idx: array of "to" bus indices of the faulted lines
+    :param z_series: array of series impedances of the faulted lines (p.u.)
+    :param fault_locations: per unit distance of each fault measured from the "from" bus (0 ~ 1)
+    :param Ybus_lu: factorization of the admittance matrix (see factorize_ybus)
+    :param Vbus: Voltages of the buses in the steady state
+    :param Zf: Fault impedance array (per fault)
+    :param block_size: number of faults solved at once
+    :return: pre-fault voltage, Thevenin impedance, fault current (p.u.) and minimum retained voltage module
+             of each fault
+    """
+    f_idx = np.array(f_idx, dtype=int)
+    t_idx = np.array(t_idx, dtype=int)
+    z_series = np.array(z_series, dtype=complex)
+    x = np.array(fault_locations, dtype=float)
+    Zf = np.array(Zf, dtype=complex)
+    nf = len(f_idx)
+
+    Vpre = np.zeros(nf, dtype=complex)
+    Zth = np.zeros(nf, dtype=complex)
+    Ik = np.zeros(nf, dtype=complex)
+    Vmin = np.zeros(nf, dtype=float)
+
+    for a in range(0, nf, block_size):
+        b = min(a + block_size, nf)
+        rng = np.arange(b - a)
+        f = f_idx[a:b]
+        t = t_idx[a:b]
+        xa = x[a:b]
+
+        Zf_cols = get_zbus_columns(Ybus_lu, f)
+        Zt_cols = get_zbus_columns(Ybus_lu, t)
+
+        Zff = Zf_cols[f, rng]
+        Ztf = Zf_cols[t, rng]
+        Zft = Zt_cols[f, rng]
+        Ztt = Zt_cols[t, rng]
+
+        Zth[a:b] = mid_line_zth(Zff, Zft, Ztf, Ztt, z_series[a:b], xa)
+        Vpre[a:b] = (1 - xa) * Vbus[f] + xa * Vbus[t]
+        Ik[a:b] = Vpre[a:b] / (Zth[a:b] + Zf[a:b])
+
+        # the fault current splits between the line ends
+        Vret = Vbus[:, np.newaxis] - (Zf_cols * (1 - xa) + Zt_cols * xa) * Ik[a:b]
+        Vmin[a:b] = np.abs(Vret).min(axis=0)
+
+    return Vpre, Zth, Ik, Vmin
+
+
+def fault_sequence_currents(Vf, Z0, Z1, Z2, Zf, fault_type: FaultType):
+    """
+    Sequence components of the fault current for the classic fault connections of the sequence networks.
+    The unbalanced faults involve the phase a (LG) or the phases b and c (LL, LLG).
+    :param Vf: pre-fault voltage at the fault location (p.u.)
+    :param Z0: zero-sequence Thevenin impedance (p.u.)
+    :param Z1: positive-sequence Thevenin impedance (p.u.)
+    :param Z2: negative-sequence Thevenin impedance (p.u.)
+    :param Zf: fault impedance (p.u.)
+    :param fault_type: FaultType
+    :return: I0, I1, I2 flowing from the network into the fault (p.u.)
+    """
+    if fault_type == FaultType.ph3:
+        I1 = Vf / (Z1 + Zf)
+        I2 = zeros(np.shape(I1), dtype=complex)
+        I0 = zeros(np.shape(I1), dtype=complex)
+
+    elif fault_type == FaultType.LG:
+        I1 = Vf / (Z0 + Z1 + Z2 + 3 * Zf)
+        I2 = I1
+        I0 = I1
+
+    elif fault_type == FaultType.LL:
+        I1 = Vf / (Z1 + Z2 + Zf)
+        I2 = -I1
+        I0 = zeros(np.shape(I1), dtype=complex)
+
+    elif fault_type == FaultType.LLG:
+        Z0f = Z0 + 3 * Zf
+        I1 = Vf / (Z1 + Z2 * Z0f / (Z2 + Z0f))
+        I2 = -I1 * Z0f / (Z2 + Z0f)
+        I0 = -I1 * Z2 / (Z2 + Z0f)
+
+    else:
+        raise Exception('Unknown fault type ' + str(fault_type))
+
+    return I0, I1, I2
+
+
+def sequence_to_phase(X0, X1, X2):
+    """
+    Convert sequence components to phase components
+    :param X0: zero-sequence component(s)
+    :param X1: positive-sequence component(s)
+    :param X2: negative-sequence component(s)
+    :return: phase a, b and c components
+    """
+    a = np.exp(2j * np.pi / 3)
+    a2 = a * a
+    return X0 + X1 + X2, X0 + a2 * X1 + a * X2, X0 + a * X1 + a2 * X2
+
+
+def phase_to_sequence(Xa, Xb, Xc):
+    """
+    Convert phase components to sequence components
+    :param Xa: phase a component(s)
+    :param Xb: phase b component(s)
+    :param Xc: phase c component(s)
+    :return: zero, positive and negative-sequence components
+    """
+    a = np.exp(2j * np.pi / 3)
+    a2 = a * a
+    return (Xa + Xb + Xc) / 3, (Xa + a * Xb + a2 * Xc) / 3, (Xa + a2 * Xb + a * Xc) / 3
+
+
+def short_circuit_unbalanced(bus_idx, Ybus_lu, Ybus0_lu, Vbus, Zf, fault_type: FaultType):
+    """
+    Executes an unbalanced short circuit at one bus with the sequence networks.
+    The negative-sequence network of the passive elements is the positive-sequence one, so only Ybus and Ybus0
+    need to be factorized.
+    :param bus_idx: index of the faulted bus
+    :param Ybus_lu: factorization of the positive-sequence admittance matrix (see factorize_ybus)
+    :param Ybus0_lu: factorization of the zero-sequence admittance matrix (see factorize_ybus)
+    :param Vbus: Voltages of the buses in the steady state
+    :param Zf: fault impedance (p.u.)
+    :param fault_type: FaultType
+    :return: phase voltages of the buses (n, 3) and phase currents of the fault (3)
+    """
+    Z1col = get_zbus_columns(Ybus_lu, [bus_idx])[:, 0]
+    Z0col = get_zbus_columns(Ybus0_lu, [bus_idx])[:, 0]
+    Z1 = Z1col[bus_idx]
+    Z0 = Z0col[bus_idx]
+
+    I0, I1, I2 = fault_sequence_currents(Vbus[bus_idx], Z0, Z1, Z1, Zf, fault_type)
+
+    # sequence voltages of all the buses
+    V1 = Vbus - Z1col * I1
+    V2 = -Z1col * I2
+    V0 = -Z0col * I0
+
+    Vabc = np.c_[sequence_to_phase(V0, V1, V2)]
+    Iabc = np.array(sequence_to_phase(I0, I1, I2))
+
+    return Vabc, Iabc
+
+
+def short_circuit_unbalanced_sweep(Vf, Z0, Z1, Zf):
+    """
+    Maximum phase current of every fault type for a set of separate faults whose sequence Thevenin impedances are
+    known (the negative sequence is taken equal to the positive sequence), so sweeping all the fault types costs
+    no linear solves beyond the Zbus diagonals
+    :param Vf: pre-fault voltages at the fault locations (p.u.)
+    :param Z0: zero-sequence Thevenin impedances (p.u.)
+    :param Z1: positive-sequence Thevenin impedances (p.u.)
+    :param Zf: fault impedances (p.u.)
+    :return: dictionary FaultType -> array of maximum phase current modules (p.u.)
+    """
+    res = dict()
+    for fault_type in FaultType:
+        I0, I1, I2 = fault_sequence_currents(Vf, Z0, Z1, Z1, Zf, fault_type)
+        res[fault_type] = np.abs(np.c_[sequence_to_phase(I0, I1, I2)]).max(axis=1)
+    return res
@@ -14,13 +14,15 @@
 # along with GridCal.  If not, see <http://www.gnu.org/licenses/>.
 
 import numpy as np
-from scipy.sparse.linalg import inv
+import pandas as pd
 from PySide2.QtCore import QRunnable
 
 from GridCal.Engine.basic_structures import Logger
-from GridCal.Engine.Simulations.ShortCircuit.short_circuit import short_circuit_3p
+from GridCal.Engine.Simulations.ShortCircuit.short_circuit import short_circuit_3p_factorized, factorize_ybus, \
+    short_circuit_3p_sweep, short_circuit_3p_mid_line_sweep, short_circuit_unbalanced_sweep, get_zbus_diagonal, \
+    get_mid_line_zth, short_circuit_unbalanced, phase_to_sequence
 from GridCal.Engine.Core.multi_circuit import MultiCircuit
-from GridCal.Engine.basic_structures import BranchImpedanceMode
+from GridCal.Engine.basic_structures import BranchImpedanceMode, FaultType
 from GridCal.Engine.Simulations.PowerFlow.power_flow_driver import PowerFlowResults, PowerFlowOptions
 from GridCal.Engine.Core.calculation_inputs import CalculationInputs
 from GridCal.Engine.Simulations.result_types import ResultTypes
@@ -36,15 +38,19 @@ class ShortCircuitOptions:
 
     def __init__(self, bus_index=[], branch_index=[], branch_fault_locations=[], branch_fault_impedance=[],
                  branch_impedance_tolerance_mode=BranchImpedanceMode.Specified,
-                 verbose=False):
+                 verbose=False, sweep=False, sweep_block_size=256, fault_type=FaultType.ph3):
         """
 
         Args:
-            bus_index:
-            branch_index:
-            branch_fault_locations:
-            branch_fault_impedance:
+            bus_index: indices of the faulted buses (in sweep mode, an empty list means all the buses)
+            branch_index: faulted branches (in sweep mode, Branch objects or branch indices)
+            branch_fault_locations: per unit distance of each branch fault measured from the "from" bus (0 ~ 1)
+            branch_fault_impedance: fault impedance of each branch fault (p.u.)
             verbose:
+            sweep: if True, each bus and branch location is faulted separately instead of simultaneously
+            sweep_block_size: number of faults solved at once in sweep mode
+            fault_type: FaultType of the simultaneous faults (the unbalanced faults are studied at a single bus;
+                        in sweep mode, all the fault types are computed)
         """
 
         assert (len(branch_fault_locations) == len(branch_index))
@@ -62,6 +68,12 @@ class ShortCircuitOptions:
 
         self.verbose = verbose
 
+        self.sweep = sweep
+
+        self.sweep_block_size = sweep_block_size
+
+        self.fault_type = fault_type
+
 
 class ShortCircuitResults(PowerFlowResults):
 
@@ -87,6 +99,11 @@ class ShortCircuitResults(PowerFlowResults):
 
         self.short_circuit_power = SCpower
 
+        # phase voltages of the buses (n, 3) and phase currents of the fault (3) of the unbalanced faults
+        self.voltage_abc = None
+
+        self.fault_current_abc = None
+
         self.available_results = [ResultTypes.BusVoltage,
                                   ResultTypes.BranchPower,
                                   ResultTypes.BranchCurrent,
@@ -137,6 +154,10 @@ class ShortCircuitResults(PowerFlowResults):
 
         self.buses_useful_for_storage = list()
 
+        self.voltage_abc = None
+
+        self.fault_current_abc = None
+
     def apply_from_island(self, results, b_idx, br_idx):
         """
         Apply results from another island circuit to the circuit results represented here
@@ -173,6 +194,14 @@ class ShortCircuitResults(PowerFlowResults):
         if results.buses_useful_for_storage is not None:
             self.buses_useful_for_storage = b_idx[results.buses_useful_for_storage]
 
+        if results.voltage_abc is not None:
+            if self.voltage_abc is None:
+                self.voltage_abc = np.zeros((len(self.voltage), 3), dtype=complex)
+            self.voltage_abc[b_idx, :] = results.voltage_abc
+
+        if results.fault_current_abc is not None:
+            self.fault_current_abc = results.fault_current_abc
+
     def mdl(self, result_type, indices=None, names=None) -> "ResultsModel":
         """
         Plot the results
@@ -233,6 +262,92 @@ class ShortCircuitResults(PowerFlowResults):
             return None
 
 
+class ShortCircuitSweepResults:
+
+    def __init__(self, n_faults=0):
+        """
+        Results of a short circuit sweep, where each fault is studied separately.
+        The three-phase fault is fully described (Ik, Sk, Vmin), and the maximum phase current of the
+        unbalanced faults is given from the sequence Thevenin impedances
+        :param n_faults: number of faults
+        """
+        self.n_faults = n_faults
+
+        self.names = np.empty(n_faults, dtype=object)
+
+        self.fault_types = np.empty(n_faults, dtype=object)
+
+        # per unit distance from the "from" bus for the branch faults (0 for the bus faults)
+        self.locations = np.zeros(n_faults, dtype=float)
+
+        self.converged = np.zeros(n_faults, dtype=bool)
+
+        self.Vpre = np.zeros(n_faults, dtype=complex)
+
+        self.Zth = np.zeros(n_faults, dtype=complex)
+
+        self.Z0 = np.zeros(n_faults, dtype=complex)
+
+        self.Zf = np.zeros(n_faults, dtype=complex)
+
+        self.Ik = np.zeros(n_faults, dtype=complex)
+
+        self.Ik_kA = np.zeros(n_faults, dtype=float)
+
+        self.Sk = np.zeros(n_faults, dtype=float)
+
+        self.Vmin = np.zeros(n_faults, dtype=float)
+
+        # base current at the fault location (kA)
+        self.Ibase = np.zeros(n_faults, dtype=float)
+
+        # maximum phase current of each fault type (p.u.)
+        self.Imax = {fault_type: np.zeros(n_faults, dtype=float) for fault_type in FaultType}
+
+    def set_faults(self, idx, Vpre, Zth, Z0, Zf, Ik, Vmin, Vnom, Sbase):
+        """
+        Store the results of a group of faults
+        :param idx: positions of the faults in the results
+        :param Vpre: pre-fault voltages (p.u.)
+        :param Zth: Thevenin impedances (p.u.)
+        :param Z0: zero-sequence Thevenin impedances (p.u.)
+        :param Zf: fault impedances (p.u.)
+        :param Ik: fault currents (p.u.)
+        :param Vmin: minimum retained voltage modules (p.u.)
+        :param Vnom: nominal voltages at the fault locations (kV)
+        :param Sbase: base power (MVA)
+        """
+        self.converged[idx] = True
+        self.Vpre[idx] = Vpre
+        self.Zth[idx] = Zth
+        self.Z0[idx] = Z0
+        self.Zf[idx] = Zf
+        self.Ik[idx] = Ik
+        self.Ibase[idx] = Sbase / (np.sqrt(3) * Vnom + 1e-20)
+        self.Ik_kA[idx] = np.abs(Ik) * self.Ibase[idx]
+        self.Sk[idx] = np.abs(Vpre * np.conj(Ik)) * Sbase
+        self.Vmin[idx] = Vmin
+
+        for fault_type, Imax in short_circuit_unbalanced_sweep(Vf=Vpre, Z0=Z0, Z1=Zth, Zf=Zf).items():
+            self.Imax[fault_type][idx] = Imax
+
+    def get_table(self):
+        """
+        Get the fault levels DataFrame
+        :return: DataFrame
+        """
+        data = np.c_[self.fault_types, self.locations, np.abs(self.Vpre), self.Zth.real, self.Zth.imag,
+                     self.Z0.real, self.Z0.imag, np.abs(self.Ik), self.Ik_kA, self.Sk, self.Vmin,
+                     self.Imax[FaultType.LG] * self.Ibase,
+                     self.Imax[FaultType.LL] * self.Ibase,
+                     self.Imax[FaultType.LLG] * self.Ibase]
+        return pd.DataFrame(data=data,
+                            columns=['Type', 'Location (p.u.)', 'Vpre (p.u.)', 'Rth (p.u.)', 'Xth (p.u.)',
+                                     'R0 (p.u.)', 'X0 (p.u.)', 'Ik (p.u.)', 'Ik (kA)', 'Sk (MVA)', 'Vmin (p.u.)',
+                                     'Ik LG (kA)', 'Ik LL (kA)', 'Ik LLG (kA)'],
+                            index=self.names)
+
+
 class ShortCircuit(QRunnable):
     # progress_signal = pyqtSignal(float)
     # progress_text = pyqtSignal(str)
@@ -315,36 +430,63 @@ class ShortCircuit(QRunnable):
                      r=r * fault_position,
                      x=x * fault_position,
                      g=g * fault_position,
-                     b=b * fault_position)
+                     b=b * fault_position,
+                     r0=branch.R0 * fault_position,
+                     x0=branch.X0 * fault_position,
+                     g0=branch.G0 * fault_position,
+                     b0=branch.B0 * fault_position)
 
         br2 = Branch(bus_from=middle_bus,
                      bus_to=branch.bus_to,
                      r=r * (1 - fault_position),
                      x=x * (1 - fault_position),
                      g=g * (1 - fault_position),
-                     b=b * (1 - fault_position))
+                     b=b * (1 - fault_position),
+                     r0=branch.R0 * (1 - fault_position),
+                     x0=branch.X0 * (1 - fault_position),
+                     g0=branch.G0 * (1 - fault_position),
+                     b0=branch.B0 * (1 - fault_position))
 
         return br1, br2, middle_bus
 
-    def single_short_circuit(self, calculation_inputs: CalculationInputs, Vpf, Zf):
+    def single_short_circuit(self, calculation_inputs: CalculationInputs, Vpf, Zf, bus_idx=None):
         """
         Run a power flow simulation for a single circuit
         @param calculation_inputs:
         @param Vpf: Power flow voltage vector applicable to the island
         @param Zf: Short circuit impedance vector applicable to the island
+        @param bus_idx: indices of the faulted buses in the island (if None, the options bus indices are used)
         @return: short circuit results
         """
-        # compute Zbus
-        # is dense, so no need to store it as sparse
+        if bus_idx is None:
+            bus_idx = self.options.bus_index
+
         if calculation_inputs.Ybus.shape[0] > 1:
-            Zbus = inv(calculation_inputs.Ybus).toarray()
 
-            # Compute the short circuit
-            V, SCpower = short_circuit_3p(bus_idx=self.options.bus_index,
-                                          Zbus=Zbus,
-                                          Vbus=Vpf,
-                                          Zf=Zf,
-                                          baseMVA=calculation_inputs.Sbase)
+            Vabc = None
+            Iabc = None
+
+            if len(bus_idx) > 0 and self.options.fault_type != FaultType.ph3:
+                # unbalanced fault with the sequence networks
+                V, SCpower, Vabc, Iabc = self.single_unbalanced_short_circuit(calculation_inputs=calculation_inputs,
+                                                                              Vpf=Vpf,
+                                                                              Zf=Zf,
+                                                                              bus_idx=bus_idx)
+
+            elif len(bus_idx) > 0:
+                # factorize Ybus once and compute only the Zbus columns of the faulted buses
+                Ybus_lu = factorize_ybus(calculation_inputs.Ybus)
+
+                # Compute the short circuit
+                V, SCpower = short_circuit_3p_factorized(bus_idx=bus_idx,
+                                                         Ybus_lu=Ybus_lu,
+                                                         Vbus=Vpf,
+                                                         Zf=Zf,
+                                                         baseMVA=calculation_inputs.Sbase)
+            else:
+                # no fault in this island
+                V = Vpf.copy()
+                SCpower = np.zeros(len(Vpf), dtype=complex)
 
             # Compute the branches power
             Sbranch, Ibranch, loading, losses = self.compute_branch_results(calculation_inputs=calculation_inputs, V=V)
@@ -360,6 +502,8 @@ class ShortCircuit(QRunnable):
                                           error=0,
                                           converged=True,
                                           Qpv=None)
+            results.voltage_abc = Vabc
+            results.fault_current_abc = Iabc
         else:
             nbus = calculation_inputs.Ybus.shape[0]
             nbr = calculation_inputs.nbr
@@ -378,6 +522,49 @@ class ShortCircuit(QRunnable):
 
         return results
 
+    def single_unbalanced_short_circuit(self, calculation_inputs: CalculationInputs, Vpf, Zf, bus_idx):
+        """
+        Run an unbalanced short circuit (options fault type) at a single bus of an island
+        @param calculation_inputs: CalculationInputs instance of the island
+        @param Vpf: Power flow voltage vector applicable to the island
+        @param Zf: Short circuit impedance vector applicable to the island
+        @param bus_idx: indices of the faulted buses in the island (only the first one is faulted)
+        @return: positive-sequence voltages, short circuit power (MVA), phase voltages (n, 3),
+                 phase currents of the fault (3)
+        """
+        if len(bus_idx) > 1:
+            self.logger.append('The unbalanced faults are studied at a single bus: only the bus ' +
+                               str(calculation_inputs.bus_names[bus_idx[0]]) + ' is faulted')
+        k = bus_idx[0]
+
+        Ybus_lu = factorize_ybus(calculation_inputs.Ybus)
+        Ybus0_lu = factorize_ybus(calculation_inputs.Ybus0)
+
+        Vabc, Iabc = short_circuit_unbalanced(bus_idx=k,
+                                              Ybus_lu=Ybus_lu,
+                                              Ybus0_lu=Ybus0_lu,
+                                              Vbus=Vpf,
+                                              Zf=Zf[k],
+                                              fault_type=self.options.fault_type)
+
+        V0, V1, V2 = phase_to_sequence(Vabc[:, 0], Vabc[:, 1], Vabc[:, 2])
+
+        # fault level from the largest phase current
+        SCpower = np.zeros(len(Vpf), dtype=complex)
+        SCpower[k] = np.abs(Vpf[k]) * np.abs(Iabc).max() * calculation_inputs.Sbase
+
+        return V1, SCpower, Vabc, Iabc
+
+    def log_zero_sequence_fallback(self):
+        """
+        Log the branches that have no zero-sequence data, whose positive-sequence values are used in the
+        zero-sequence network of the unbalanced faults
+        """
+        for branch in self.grid.branches:
+            if branch.R0 == 0 and branch.X0 == 0:
+                self.logger.append('Branch ' + str(branch.name) + ' has no zero-sequence impedance: '
+                                   'the positive sequence is used')
+
     @staticmethod
     def compute_branch_results(calculation_inputs: CalculationInputs, V):
         """
@@ -397,12 +584,150 @@ class ShortCircuit(QRunnable):
 
         return Sbranch, Ibranch, loading, losses
 
+    def run_sweep(self):
+        """
+        Run a separate short circuit at every selected bus and branch location.
+        The positive and zero-sequence admittance matrices of each island are factorized once, and the branch faults
+        are computed analytically without splitting the branches, so the grid is neither copied nor recompiled.
+        """
+        nbus = len(self.grid.buses)
+
+        # the unbalanced fault levels use the zero-sequence network
+        self.log_zero_sequence_fallback()
+
+        # faulted buses: all of them if none is given
+        if len(self.options.bus_index) > 0:
+            bus_index = np.array(self.options.bus_index, dtype=int)
+        else:
+            bus_index = np.arange(nbus)
+
+        # faulted branches as indices
+        branch_index = np.array([self.grid.branches.index(br) if isinstance(br, Branch) else br
+                                 for br in self.options.branch_index], dtype=int)
+        nbf = len(bus_index)
+        nf = nbf + len(branch_index)
+
+        results = ShortCircuitSweepResults(nf)
+        bus_names = np.array([bus.name for bus in self.grid.buses], dtype=object)
+        results.names[:nbf] = bus_names[bus_index]
+        results.fault_types[:nbf] = 'Bus'
+        for k, br_idx in enumerate(branch_index):
+            results.names[nbf + k] = self.grid.branches[br_idx].name
+            results.fault_types[nbf + k] = 'Branch'
+        results.locations[nbf:] = self.options.branch_fault_locations
+
+        Vnom = np.array([bus.Vnom for bus in self.grid.buses], dtype=float)
+        Zf = self.compile_zf(self.grid)
+        Zf_branch = np.array(self.options.branch_fault_impedance, dtype=complex)
+
+        # Compile the grid
+        numerical_circuit = self.grid.compile()
+        calculation_inputs = numerical_circuit.compute(branch_tolerance_mode=self.options.branch_impedance_tolerance_mode,
+                                                       ignore_single_node_islands=self.pf_options.ignore_single_node_islands)
+
+        # the mid-branch faults need a plain series impedance: the branches with a tap ratio (module, phase shift or
+        # virtual taps of the transformers) have no mid-point and are not faulted
+        splittable = np.array([numerical_circuit.tap_mod[br_idx] == 1.0 and
+                               numerical_circuit.tap_ang[br_idx] == 0.0 and
+                               numerical_circuit.tap_f[br_idx] == 1.0 and
+                               numerical_circuit.tap_t[br_idx] == 1.0
+                               for br_idx in branch_index], dtype=bool)
+        rejected = np.zeros(nf, dtype=bool)
+        rejected[nbf:] = ~splittable
+        for br_idx in branch_index[~splittable]:
+            self.logger.append('Branch ' + str(self.grid.branches[br_idx].name) +
+                               ' has a tap ratio: its mid-branch fault is not computed')
+
+        for calculation_input in calculation_inputs:
+
+            if calculation_input.Ybus.shape[0] < 2:
+                continue
+
+            bus_original_idx = np.array(calculation_input.original_bus_idx, dtype=int)
+            branch_original_idx = np.array(calculation_input.original_branch_idx, dtype=int)
+            Vpf = self.pf_results.voltage[bus_original_idx]
+
+            # map from the original bus and branch indices to the island indices
+            bus_map = np.full(nbus, -1, dtype=int)
+            bus_map[bus_original_idx] = np.arange(len(bus_original_idx))
+            branch_map = np.full(len(self.grid.branches), -1, dtype=int)
+            branch_map[branch_original_idx] = np.arange(len(branch_original_idx))
+
+            # bus faults of this island: positions in the results and island bus indices
+            bus_pos = np.where(np.isin(bus_index, bus_original_idx))[0]
+
+            # branch faults of this island
+            br_pos = np.where(np.isin(branch_index, branch_original_idx) & splittable)[0]
+
+            if len(bus_pos) + len(br_pos) == 0:
+                continue
+
+            Ybus_lu = factorize_ybus(calculation_input.Ybus)
+            Ybus0_lu = factorize_ybus(calculation_input.Ybus0)
+
+            if len(bus_pos) > 0:
+                island_bus_idx = bus_map[bus_index[bus_pos]]
+                Zth, Ik, Vmin = short_circuit_3p_sweep(bus_idx=island_bus_idx,
+                                                       Ybus_lu=Ybus_lu,
+                                                       Vbus=Vpf,
+                                                       Zf=Zf[bus_original_idx],
+                                                       block_size=self.options.sweep_block_size)
+
+                Z0 = get_zbus_diagonal(Ybus0_lu, idx=island_bus_idx, block_size=self.options.sweep_block_size)
+
+                results.set_faults(idx=bus_pos, Vpre=Vpf[island_bus_idx], Zth=Zth, Z0=Z0,
+                                   Zf=Zf[bus_original_idx][island_bus_idx], Ik=Ik, Vmin=Vmin,
+                                   Vnom=Vnom[bus_index[bus_pos]], Sbase=calculation_input.Sbase)
+
+            if len(br_pos) > 0:
+                island_br_idx = branch_map[branch_index[br_pos]]
+                Cf = calculation_input.C_branch_bus_f.tocsr()[island_br_idx, :].tocoo()
+                Ct = calculation_input.C_branch_bus_t.tocsr()[island_br_idx, :].tocoo()
+                f = np.zeros(len(br_pos), dtype=int)
+                t = np.zeros(len(br_pos), dtype=int)
+                f[Cf.row] = Cf.col
+                t[Ct.row] = Ct.col
+
+                # series impedance from the branch admittance primitives (the faulted branches have no taps)
+                Yf = calculation_input.Yf.tocsr()
+                Yf0 = calculation_input.Yf0.tocsr()
+                z_series = -1.0 / np.array(Yf[island_br_idx, t]).ravel()
+                z0_series = -1.0 / np.array(Yf0[island_br_idx, t]).ravel()
+
+                Vpre, Zth, Ik, Vmin = short_circuit_3p_mid_line_sweep(f_idx=f,
+                                                                      t_idx=t,
+                                                                      z_series=z_series,
+                                                                      fault_locations=results.locations[nbf + br_pos],
+                                                                      Ybus_lu=Ybus_lu,
+                                                                      Vbus=Vpf,
+                                                                      Zf=Zf_branch[br_pos],
+                                                                      block_size=self.options.sweep_block_size)
+
+                Z0 = get_mid_line_zth(f_idx=f,
+                                      t_idx=t,
+                                      z_series=z0_series,
+                                      fault_locations=results.locations[nbf + br_pos],
+                                      Ybus_lu=Ybus0_lu)
+
+                # the nominal voltage of a line is the one of its "from" bus
+                results.set_faults(idx=nbf + br_pos, Vpre=Vpre, Zth=Zth, Z0=Z0, Zf=Zf_branch[br_pos], Ik=Ik,
+                                   Vmin=Vmin, Vnom=Vnom[bus_original_idx[f]], Sbase=calculation_input.Sbase)
+
+        for k in np.where(~results.converged & ~rejected)[0]:
+            self.logger.append('Fault ' + str(results.names[k]) + ' is not in a computable island')
+
+        self.results = results
+
     def run(self):
         """
         Run a power flow for every circuit
         @return:
         """
 
+        if self.options.sweep:
+            self.run_sweep()
+            return
+
         if len(self.options.branch_index) > 0:
 
             # if there are branch indices where to perform short circuits, modify the grid accordingly
@@ -427,6 +752,9 @@ class ShortCircuit(QRunnable):
         else:
             grid = self.grid
 
+        if self.options.fault_type != FaultType.ph3:
+            self.log_zero_sequence_fallback()
+
         n = len(grid.buses)
         m = len(grid.branches)
         results = ShortCircuitResults()  # yes, reuse this class
@@ -448,9 +776,13 @@ class ShortCircuit(QRunnable):
                 bus_original_idx = calculation_input.original_bus_idx
                 branch_original_idx = calculation_input.original_branch_idx
 
+                # faulted buses that belong to this island, in island indexing
+                island_bus_idx = np.where(np.isin(bus_original_idx, self.options.bus_index))[0]
+
                 res = self.single_short_circuit(calculation_inputs=calculation_input,
                                                 Vpf=self.pf_results.voltage[bus_original_idx],
-                                                Zf=Zf[bus_original_idx])
+                                                Zf=Zf[bus_original_idx],
+                                                bus_idx=island_bus_idx)
 
                 # merge results
                 results.apply_from_island(res, bus_original_idx, branch_original_idx)
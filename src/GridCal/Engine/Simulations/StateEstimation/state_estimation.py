@@ -1,5 +1,5 @@
-from scipy.sparse import hstack as sphs, vstack as spvs, csc_matrix, csr_matrix
-from scipy.sparse.linalg import spsolve
+from scipy.sparse import hstack as sphs, vstack as spvs, csc_matrix, csr_matrix, diags, identity
+from scipy.sparse.linalg import splu
 import numpy as np
 from numpy import conj, arange
 
@@ -256,8 +256,9 @@ def Jacobian_SE(Ybus, Yf, Yt, V, f, t, inputs, pvpq):
     H51 = np.abs(dIf_dVa[np.ix_(inputs.i_flow_idx, pvpq)])
     H52 = np.abs(dIf_dVm[inputs.i_flow_idx, :])
 
-    H61 = csc_matrix(np.zeros((len(inputs.vm_m_idx), len(pvpq))))
-    H62 = csc_matrix(np.diag(np.ones(n))[inputs.vm_m_idx, :])
+    nvm = len(inputs.vm_m_idx)
+    H61 = csc_matrix((nvm, len(pvpq)))
+    H62 = csc_matrix((np.ones(nvm), (np.arange(nvm), inputs.vm_m_idx)), shape=(nvm, n))
 
     # pack the Jacobian
     H = spvs([sphs([H11, H12]),
@@ -283,6 +284,223 @@ def Jacobian_SE(Ybus, Yf, Yt, V, f, t, inputs, pvpq):
     return H, h
 
 
+class GainMatrixSolver:
+
+    def __init__(self):
+        """
+        Linear solver for the gain matrix systems of the state estimation.
+        The gain matrix H^t·W·H (+ lambda·I) keeps the same sparsity pattern while the measurement configuration
+        does not change, so the fill-reducing ordering and the map of the values into the permuted matrix are
+        computed once, and every solve only refactorizes numerically with that fixed ordering.
+        """
+        # column ordering (COLAMD computed at the first factorization)
+        self.perm = None
+
+        # pattern of the gain matrix for which the value map was computed
+        self.indptr = None
+        self.indices = None
+
+        # position of each value of the gain matrix in the permuted matrix
+        self.value_map = None
+
+        # permuted matrix (its values are overwritten at each factorization)
+        self.A_perm = None
+
+        self.n_analysis = 0
+
+        self.n_factorizations = 0
+
+    def analyze(self, A: csc_matrix):
+        """
+        Compute the ordering and the value map of the matrix pattern
+        :param A: CSC matrix with sorted indices
+        """
+        if self.perm is None or len(self.perm) != A.shape[0]:
+            self.perm = splu(A, permc_spec='COLAMD').perm_c
+
+        # tag each value with its position to find where it ends after the permutation
+        tags = csc_matrix((np.arange(1, A.nnz + 1, dtype=float), A.indices, A.indptr), shape=A.shape)
+        tags_perm = tags[self.perm, :][:, self.perm].tocsc()
+        tags_perm.sort_indices()
+
+        self.value_map = tags_perm.data.astype(int) - 1
+        self.A_perm = tags_perm
+        self.indptr = A.indptr.copy()
+        self.indices = A.indices.copy()
+        self.n_analysis += 1
+
+    def solve(self, A, b):
+        """
+        Solve A·x = b
+        :param A: gain matrix (sparse, symmetric positive definite)
+        :param b: right hand side
+        :return: solution
+        """
+        A = csc_matrix(A)
+        A.sort_indices()
+
+        if self.indices is None or not (np.array_equal(A.indptr, self.indptr)
+                                        and np.array_equal(A.indices, self.indices)):
+            self.analyze(A)
+
+        self.A_perm.data = A.data[self.value_map]
+
+        # the gain matrix is symmetric positive definite: pivot on the diagonal to keep the ordering
+        lu = splu(self.A_perm, permc_spec='NATURAL', diag_pivot_thresh=0.0, options=dict(SymmetricMode=True))
+        self.n_factorizations += 1
+
+        x = np.empty_like(b)
+        x[self.perm] = lu.solve(b[self.perm])
+        return x
+
+
+class WlsStateEstimator:
+
+    def __init__(self, Ybus, Yf, Yt, f, t, se_input, ref, pq, pv, tol=1e-9, max_iter=100):
+        """
+        Weighted least squares state estimator of a fixed measurement configuration.
+        The structure (measurement indices, weights and the gain matrix ordering) is built once, so the repeated
+        SCADA snapshots of the same configuration only pay the numerical iterations, warm started from the
+        previous estimate.
+        :param Ybus: Admittance matrix
+        :param Yf: Admittance matrix of the from buses
+        :param Yt: Admittance matrix of the to buses
+        :param f: array with the from bus indices of all the branches
+        :param t: array with the to bus indices of all the branches
+        :param se_input: state estimation input instance (contains the measurements)
+        :param ref: array of slack bus indices
+        :param pq: array of pq bus indices
+        :param pv: array of pv bus indices
+        :param tol: convergence tolerance
+        :param max_iter: maximum number of iterations
+        """
+        self.Ybus = Ybus
+        self.Yf = Yf
+        self.Yt = Yt
+        self.f = f
+        self.t = t
+        self.se_input = se_input
+        self.ref = ref
+        self.pvpq = np.r_[pv, pq].astype(int)
+        self.tol = tol
+        self.max_iter = max_iter
+
+        self.n = Ybus.shape[0]
+
+        # number of state variables: the angles of the non-slack buses and all the voltage modules
+        self.nx = len(self.pvpq) + self.n
+
+        self.Idn = identity(self.nx, format='csc')
+
+        self.sigma = None
+        self.W = None
+
+        self.linear_solver = GainMatrixSolver()
+
+        # last estimate, used as the starting point of the next snapshot
+        self.V = np.ones(self.n, dtype=complex)
+
+    def set_sigma(self, sigma):
+        """
+        Set the measurements standard deviations (the weights matrix is only rebuilt if they change)
+        :param sigma: array of standard deviations
+        """
+        if self.sigma is None or not np.array_equal(sigma, self.sigma):
+            self.sigma = np.array(sigma, dtype=float)
+            self.W = diags(1.0 / np.power(self.sigma, 2.0), format='csc')
+
+    def solve(self, z=None, sigma=None, V0=None):
+        """
+        Solve the state estimation problem using the Levenberg-Marquadt method
+        :param z: array of measurements (if None, the values of the input measurements are used)
+        :param sigma: array of standard deviations (if None, the ones of the input measurements are used)
+        :param V0: initial voltage (if None, the last estimate is used)
+        :return: V, err, converged
+        """
+        if z is None or sigma is None:
+            z_, sigma_ = self.se_input.consolidate()
+            z = z_ if z is None else z
+            sigma = sigma_ if sigma is None else sigma
+
+        self.set_sigma(sigma)
+        W = self.W
+
+        npvpq = len(self.pvpq)
+        V = self.V.copy() if V0 is None else np.array(V0, dtype=complex)
+        Va = np.angle(V)
+        Vm = np.abs(V)
+
+        iter_ = 0
+        lbmda = 0  # any large number
+        f_obj_prev = 1e9  # very large number
+        converged = False
+        err = 1e20
+        nu = 2.0
+
+        # first computation of the jacobian and free term
+        H, h = Jacobian_SE(self.Ybus, self.Yf, self.Yt, V, self.f, self.t, self.se_input, self.pvpq)
+
+        while not converged and iter_ < self.max_iter:
+
+            # measurements error
+            dz = z - h
+
+            # System matrix
+            # H1 = H^t·W
+            H1 = H.transpose().dot(W)
+            # H2 = H1·H
+            H2 = H1.dot(H)
+
+            # set first value of lmbda
+            if iter_ == 0:
+                lbmda = 1e-3 * H2.diagonal().max()
+
+            # compute system matrix
+            A = H2 + lbmda * self.Idn
+
+            # right hand side
+            # H^t·W·dz
+            rhs = H1.dot(dz)
+
+            # Solve the increment
+            dx = self.linear_solver.solve(A, rhs)
+
+            # objective function
+            f_obj = 0.5 * dz.dot(W * dz)
+
+            # decision function
+            rho = (f_obj_prev - f_obj) / (0.5 * dx.dot(lbmda * dx + rhs))
+
+            # lambda update
+            if rho > 0:
+                lbmda = lbmda * max([1.0 / 3.0, 1 - (2 * rho - 1) ** 3])
+                nu = 2.0
+
+                # modify the solution
+                Va[self.pvpq] += dx[0:npvpq]
+                Vm += dx[npvpq:]
+                V = Vm * np.exp(1j * Va)
+
+                # update Jacobian
+                H, h = Jacobian_SE(self.Ybus, self.Yf, self.Yt, V, self.f, self.t, self.se_input, self.pvpq)
+
+            else:
+                lbmda = lbmda * nu
+                nu = nu * 2
+
+            # compute the convergence
+            err = np.linalg.norm(dx, np.Inf)
+            converged = err < self.tol
+
+            # update loops
+            f_obj_prev = f_obj
+            iter_ += 1
+
+        self.V = V
+
+        return V, err, converged
+
+
 def solve_se_lm(Ybus, Yf, Yt, f, t, se_input, ref, pq, pv):
     """
     Solve the state estimation problem using the Levenberg-Marquadt method
@@ -297,98 +515,9 @@ def solve_se_lm(Ybus, Yf, Yt, f, t, se_input, ref, pq, pv):
     :param pv: 
     :return: 
     """
+    estimator = WlsStateEstimator(Ybus=Ybus, Yf=Yf, Yt=Yt, f=f, t=t, se_input=se_input, ref=ref, pq=pq, pv=pv)
 
-    pvpq = np.r_[pv, pq]
-    npvpq = len(pvpq)
-    npq = len(pq)
-    nvd = len(ref)
-    n = Ybus.shape[0]
-    V = np.ones(n, dtype=complex)
-
-    # pick the measurements and uncertainties
-    z, sigma = se_input.consolidate()
-
-    # compute the weights matrix
-    W = csc_matrix(np.diag(1.0 / np.power(sigma, 2.0)))
-
-    # Levenberg-Marquardt method
-    tol = 1e-9
-    max_iter = 100
-    iter_ = 0
-    Idn = csc_matrix(np.identity(2 * n - nvd))  # identity matrix
-    # x = np.r_[np.angle(V)[pvpq], np.abs(V)]
-    Va = np.angle(V)
-    Vm = np.abs(V)
-    lbmda = 0  # any large number
-    f_obj_prev = 1e9  # very large number
-
-    update_jacobian = False
-    converged = False
-    err = 1e20
-    nu = 2.0
-
-    # first computation of the jacobian and free term
-    H, h = Jacobian_SE(Ybus, Yf, Yt, V, f, t, se_input, pvpq)
-
-    while not converged and iter_ < max_iter:
-
-        # measurements error
-        dz = z - h
-
-        # System matrix
-        # H1 = H^t·W
-        H1 = H.transpose().dot(W)
-        # H2 = H1·H
-        H2 = H1.dot(H)
-
-        # set first value of lmbda
-        if iter_ == 0:
-            lbmda = 1e-3 * H2.diagonal().max()
-
-        # compute system matrix
-        A = H2 + lbmda * Idn
-
-        # right hand side
-        # H^t·W·dz
-        rhs = H1.dot(dz)
-
-        # Solve the increment
-        dx = spsolve(A, rhs)
-
-        # objective function
-        f_obj = 0.5 * dz.dot(W * dz)
-
-        # decision function
-        rho = (f_obj_prev - f_obj) / (0.5 * dx.dot(lbmda * dx + rhs))
-
-        # lambda update
-        if rho > 0:
-            lbmda = lbmda * max([1.0 / 3.0, 1 - (2 * rho - 1) ** 3])
-            nu = 2.0
-
-            # modify the solution
-            dVa = dx[0:npvpq]
-            dVm = dx[npvpq:npvpq + npq + 1]
-            Va[pvpq] += dVa
-            Vm += dVm
-            V = Vm * np.exp(1j * Va)
-
-            # update Jacobian
-            H, h = Jacobian_SE(Ybus, Yf, Yt, V, f, t, se_input, pvpq)
-
-        else:
-            lbmda = lbmda * nu
-            nu = nu * 2
-
-        # compute the convergence
-        err = np.linalg.norm(dx, np.Inf)
-        converged = err < tol
-
-        # update loops
-        f_obj_prev = f_obj
-        iter_ += 1
-
-    return V, err, converged
+    return estimator.solve()
 
 
 if __name__ == '__main__':
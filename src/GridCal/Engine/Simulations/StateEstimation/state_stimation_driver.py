@@ -16,7 +16,7 @@
 import numpy as np
 from PySide2.QtCore import QRunnable
 
-from GridCal.Engine.Simulations.StateEstimation.state_estimation import solve_se_lm
+from GridCal.Engine.Simulations.StateEstimation.state_estimation import WlsStateEstimator
 from GridCal.Engine.Simulations.PowerFlow.power_flow_worker import PowerFlowResults, power_flow_post_process
 from GridCal.Engine.Core.multi_circuit import MultiCircuit
 from GridCal.Engine.Devices.measurement import MeasurementType
@@ -139,6 +139,15 @@ class StateEstimation(QRunnable):
 
         self.se_results = None
 
+        # islands and their estimators, re-used while the topology and the measurement configuration do not change
+        self.islands = list()
+
+        self.estimators = list()
+
+        self.bus_types = None
+
+        self.structure_key = None
+
     @staticmethod
     def collect_measurements(circuit: MultiCircuit, bus_idx, branch_idx):
         """
@@ -147,44 +156,44 @@ class StateEstimation(QRunnable):
         """
         se_input = StateEstimationInput()
 
-        # collect the bus measurements
-        for i in bus_idx:
+        # collect the bus measurements (the indices are relative to bus_idx)
+        for k, i in enumerate(bus_idx):
 
             for m in circuit.buses[i].measurements:
 
                 if m.measurement_type == MeasurementType.Pinj:
-                    se_input.p_inj_idx.append(i)
+                    se_input.p_inj_idx.append(k)
                     se_input.p_inj.append(m)
 
                 elif m.measurement_type == MeasurementType.Qinj:
-                    se_input.q_inj_idx.append(i)
+                    se_input.q_inj_idx.append(k)
                     se_input.q_inj.append(m)
 
                 elif m.measurement_type == MeasurementType.Vmag:
-                    se_input.vm_m_idx.append(i)
+                    se_input.vm_m_idx.append(k)
                     se_input.vm_m.append(m)
 
                 else:
                     raise Exception('The bus ' + str(circuit.buses[i]) + ' contains a measurement of type '
                                     + str(m.measurement_type))
 
-        # collect the branch measurements
-        for i in branch_idx:
+        # collect the branch measurements (the indices are relative to branch_idx)
+        for k, i in enumerate(branch_idx):
 
             # branch = circuit.branches[i]
 
             for m in circuit.branches[i].measurements:
 
                 if m.measurement_type == MeasurementType.Pflow:
-                    se_input.p_flow_idx.append(i)
+                    se_input.p_flow_idx.append(k)
                     se_input.p_flow.append(m)
 
                 elif m.measurement_type == MeasurementType.Qflow:
-                    se_input.q_flow_idx.append(i)
+                    se_input.q_flow_idx.append(k)
                     se_input.q_flow.append(m)
 
                 elif m.measurement_type == MeasurementType.Iflow:
-                    se_input.i_flow_idx.append(i)
+                    se_input.i_flow_idx.append(k)
                     se_input.i_flow.append(m)
 
                 else:
@@ -193,42 +202,91 @@ class StateEstimation(QRunnable):
 
         return se_input
 
-    def run(self):
+    def get_structure_key(self):
         """
-        Run state estimation
-        :return:
+        Get a key that changes when the topology, the bus types, the admittances or the measurement configuration
+        change (the measurement values and deviations are not part of it)
+        :return: hashable key
         """
-        n = len(self.grid.buses)
-        m = len(self.grid.branches)
-        self.se_results = StateEstimationResults()
-        self.se_results.initialize(n, m)
+        branch_states = tuple(branch.active for branch in self.grid.branches)
+        bus_states = tuple(bus.active for bus in self.grid.buses)
 
-        numerical_circuit = self.grid.compile()
-        islands = numerical_circuit.compute()
+        # the bus types (reference and voltage controlled buses) are inferred from these at compilation
+        bus_types = tuple((bus.is_slack, bus.dispatch_storage) for bus in self.grid.buses)
+        generator_states = tuple((elm.active, elm.is_controlled)
+                                 for bus in self.grid.buses for elm in bus.controlled_generators + bus.batteries)
 
-        self.se_results.bus_types = numerical_circuit.bus_types
+        # the admittance matrices of the estimators depend on the branch and shunt parameters
+        branch_params = np.array([(branch.R, branch.X, branch.G, branch.B, branch.tap_module, branch.angle)
+                                  for branch in self.grid.branches], dtype=float).tobytes()
+        shunt_params = np.array([(shunt.active, shunt.G, shunt.B)
+                                 for shunt in self.grid.get_shunts()], dtype=float).tobytes()
+
+        measurements = tuple((id(m), m.measurement_type)
+                             for elm in self.grid.buses + self.grid.branches for m in elm.measurements)
+        return branch_states, bus_states, bus_types, generator_states, branch_params, shunt_params, measurements
+
+    def build(self):
+        """
+        Compile the grid and build one estimator per island
+        """
+        numerical_circuit = self.grid.compile()
+        self.islands = numerical_circuit.compute()
+        self.bus_types = numerical_circuit.bus_types
+        self.estimators = list()
 
-        for island in islands:
+        for island in self.islands:
 
             # collect inputs of the island
             se_input = self.collect_measurements(circuit=self.grid,
                                                  bus_idx=island.original_bus_idx,
                                                  branch_idx=island.original_branch_idx)
 
-            # run solver
-            v_sol, err, converged = solve_se_lm(Ybus=island.Ybus,
-                                                Yf=island.Yf,
-                                                Yt=island.Yt,
-                                                f=island.F,
-                                                t=island.T,
-                                                se_input=se_input,
-                                                ref=island.ref,
-                                                pq=island.pq,
-                                                pv=island.pv)
+            # branch terminals in island indices
+            Cf = island.C_branch_bus_f.tocoo()
+            Ct = island.C_branch_bus_t.tocoo()
+            f = np.zeros(island.nbr, dtype=int)
+            t = np.zeros(island.nbr, dtype=int)
+            f[Cf.row] = Cf.col
+            t[Ct.row] = Ct.col
+
+            self.estimators.append(WlsStateEstimator(Ybus=island.Ybus,
+                                                     Yf=island.Yf,
+                                                     Yt=island.Yt,
+                                                     f=f,
+                                                     t=t,
+                                                     se_input=se_input,
+                                                     ref=island.ref,
+                                                     pq=island.pq,
+                                                     pv=island.pv))
+
+        self.structure_key = self.get_structure_key()
+
+    def run(self):
+        """
+        Run state estimation.
+        The structure is only rebuilt when the topology or the measurement configuration change, so the
+        repeated snapshots (new measurement values) re-use the estimators and start from the last estimate.
+        :return:
+        """
+        if self.structure_key is None or self.structure_key != self.get_structure_key():
+            self.build()
+
+        n = len(self.grid.buses)
+        m = len(self.grid.branches)
+        self.se_results = StateEstimationResults()
+        self.se_results.initialize(n, m)
+        self.se_results.bus_types = self.bus_types
+
+        for island, estimator in zip(self.islands, self.estimators):
+
+            # run solver with the current measurement values
+            v_sol, err, converged = estimator.solve()
 
             # Compute the branches power and the slack buses power
-            Sbranch, Ibranch, Vbrnach, loading, \
-             losses, flow_direction, Sbus = power_flow_post_process(calculation_inputs=island, V=v_sol)
+            Sbranch, Ibranch, Vbranch, loading, \
+             losses, flow_direction, Sbus = power_flow_post_process(calculation_inputs=island, V=v_sol,
+                                                                    branch_rates=island.branch_rates)
 
             # pack results into a SE results object
             results = StateEstimationResults(Sbus=Sbus,
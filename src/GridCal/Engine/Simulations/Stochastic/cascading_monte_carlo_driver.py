@@ -0,0 +1,457 @@
+# This file is part of GridCal.
+#
+# GridCal is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# GridCal is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with GridCal.  If not, see <http://www.gnu.org/licenses/>.
+
+import multiprocessing
+import numpy as np
+import pandas as pd
+from PySide2.QtCore import QThread, Signal
+
+from GridCal.Engine.basic_structures import Logger
+from GridCal.Engine.Core.multi_circuit import MultiCircuit
+from GridCal.Engine.Core.numerical_circuit import NumericalCircuit
+from GridCal.Engine.Core.topology_cache import TopologyCache
+from GridCal.Engine.Simulations.PowerFlow.power_flow_results import PowerFlowResults
+from GridCal.Engine.Simulations.PowerFlow.power_flow_worker import PowerFlowOptions, single_island_pf
+from GridCal.Engine.Simulations.Stochastic.blackout_driver import CascadingReportElement
+
+
+########################################################################################################################
+# Cascading Monte Carlo classes
+########################################################################################################################
+
+
+class CascadingMonteCarloOptions:
+
+    def __init__(self, n_trees=1000, triggering_idx=None, n_initial_failures=1, stochastic=True,
+                 loading_threshold=1.0, max_loading=1.5, max_steps=50, seed=0, store_results=False,
+                 topology_cache_size=256):
+        """
+        Cascading Monte Carlo options
+        :param n_trees: number of cascade trees to simulate
+        :param triggering_idx: branch indices that start every cascade (if None, random branches are picked per tree)
+        :param n_initial_failures: number of random initial failures per tree (used if triggering_idx is None)
+        :param stochastic: if True the overloaded branches trip with a probability that grows with the loading,
+                           otherwise all the overloaded branches trip at once
+        :param loading_threshold: loading (p.u.) above which a branch is considered overloaded
+        :param max_loading: loading (p.u.) at which an overloaded branch trips for sure (stochastic mode)
+        :param max_steps: maximum number of cascade steps per tree
+        :param seed: random seed; the tree i uses the seed + i so the results do not depend on the scheduling
+        :param store_results: store the power flow results of every step? (memory intensive)
+        :param topology_cache_size: maximum number of topologies to keep per process
+        """
+        self.n_trees = n_trees
+
+        self.triggering_idx = triggering_idx
+
+        self.n_initial_failures = n_initial_failures
+
+        self.stochastic = stochastic
+
+        self.loading_threshold = loading_threshold
+
+        self.max_loading = max_loading
+
+        self.max_steps = max_steps
+
+        self.seed = seed
+
+        self.store_results = store_results
+
+        self.topology_cache_size = topology_cache_size
+
+
+class CascadeTree:
+
+    def __init__(self, tree_idx):
+        """
+        Record of a single cascade simulation
+        :param tree_idx: index of the tree in the Monte Carlo run
+        """
+        self.tree_idx = tree_idx
+
+        # list of CascadingReportElement, the first one is the triggering event
+        self.events = list()
+
+        # final branch states
+        self.branch_active = None
+
+        # load not supplied at the end of the cascade (MW)
+        self.load_shed = 0.0
+
+        # number of islands at the end of the cascade
+        self.n_islands = 1
+
+        # number of cascade steps where some branch failed (the trigger is not counted)
+        self.n_steps = 0
+
+    def get_failed_idx(self):
+        """
+        Return the array of all failed branches (including the triggering ones)
+        :return: array of branch indices
+        """
+        if len(self.events) > 0:
+            return np.concatenate([np.array(e.removed_idx, dtype=int) for e in self.events])
+        else:
+            return np.zeros(0, dtype=int)
+
+
+def cascade_tree(numerical_circuit: NumericalCircuit, topology_cache: TopologyCache, options: PowerFlowOptions,
+                 cascade_options: CascadingMonteCarloOptions, tree_idx=0, load_per_bus=None,
+                 logger=Logger()) -> CascadeTree:
+    """
+    Simulate one cascade directly on the compiled arrays.
+    At each step the branch states are toggled, the islands are fetched from the topology cache and the power flow
+    of each island is warm-started from the voltages of the previous step.
+    :param numerical_circuit: NumericalCircuit instance (it is not modified)
+    :param topology_cache: TopologyCache of the numerical circuit
+    :param options: PowerFlowOptions instance
+    :param cascade_options: CascadingMonteCarloOptions instance
+    :param tree_idx: index of the tree (used to seed the random generator)
+    :param load_per_bus: array of load per bus in MW (computed if None)
+    :param logger: Logger instance
+    :return: CascadeTree instance
+    """
+    nbus = numerical_circuit.nbus
+    nbr = numerical_circuit.nbr
+
+    rnd = np.random.RandomState(cascade_options.seed + tree_idx)
+
+    if load_per_bus is None:
+        load_per_bus = get_load_per_bus(numerical_circuit)
+
+    tree = CascadeTree(tree_idx)
+
+    branch_active = numerical_circuit.branch_active.copy()
+
+    # triggering event
+    if cascade_options.triggering_idx is not None:
+        idx = np.array(cascade_options.triggering_idx, dtype=int)
+    else:
+        candidates = np.where(branch_active > 0)[0]
+        n_init = min(cascade_options.n_initial_failures, len(candidates))
+        idx = np.sort(rnd.choice(candidates, size=n_init, replace=False))
+
+    branch_active[idx] = 0
+    tree.events.append(CascadingReportElement(idx, None, 'Trigger'))
+
+    V = numerical_circuit.V0.copy()
+    energized = np.zeros(nbus, dtype=bool)
+    islands = list()
+    step = 0
+    while step < cascade_options.max_steps:
+
+        islands = topology_cache.get_islands(branch_active)
+
+        loading = np.zeros(nbr, dtype=float)
+        energized = np.zeros(nbus, dtype=bool)
+
+        if cascade_options.store_results:
+            pf_results = PowerFlowResults()
+            pf_results.initialize(nbus, nbr)
+        else:
+            pf_results = None
+
+        for island in islands:
+
+            if len(island.ref) == 0:
+                # no slack: the island is de-energized
+                continue
+
+            b_idx = island.original_bus_idx
+            br_idx = island.original_branch_idx
+
+            # the cached island is shared with the other trees: the controls must work on a copy
+            res = single_island_pf(circuit=island.copy(),
+                                   Vbus=V[b_idx],
+                                   Sbus=island.Sbus,
+                                   Ibus=island.Ibus,
+                                   branch_rates=island.branch_rates,
+                                   options=options,
+                                   logger=logger)
+
+            if np.all(res.converged):
+                # store the solution to warm-start the next step
+                V[b_idx] = res.voltage
+                loading[br_idx] = np.abs(res.loading)
+                energized[b_idx] = True
+
+                if pf_results is not None:
+                    pf_results.apply_from_island(res, b_idx, br_idx)
+            else:
+                # voltage collapse of the island
+                logger.append('Tree ' + str(tree_idx) + ', step ' + str(step) + ': island did not converge')
+
+        overloaded = np.where((branch_active > 0) & (loading > cascade_options.loading_threshold))[0]
+
+        if cascade_options.stochastic:
+            span = max(cascade_options.max_loading - cascade_options.loading_threshold, 1e-20)
+            prob = np.clip((loading[overloaded] - cascade_options.loading_threshold) / span, 0.0, 1.0)
+            idx = overloaded[rnd.rand(len(overloaded)) < prob]
+            criteria = 'Overload probability'
+        else:
+            idx = overloaded
+            criteria = 'Loading'
+
+        if len(idx) == 0:
+            # the cascade has stopped
+            if pf_results is not None:
+                tree.events.append(CascadingReportElement(idx, pf_results, 'Stable'))
+            break
+
+        branch_active[idx] = 0
+        tree.events.append(CascadingReportElement(idx, pf_results, criteria))
+        step += 1
+
+    tree.n_steps = step
+    tree.branch_active = branch_active
+    tree.load_shed = load_per_bus[~energized].sum()
+    tree.n_islands = len(islands)
+
+    return tree
+
+
+def get_load_per_bus(numerical_circuit: NumericalCircuit):
+    """
+    Get the active load per bus
+    :param numerical_circuit: NumericalCircuit instance
+    :return: array of active load per bus in MW
+    """
+    return numerical_circuit.C_load_bus.T * (numerical_circuit.load_power.real * numerical_circuit.load_active)
+
+
+# data of each worker process: it is set once per process by the pool initializer
+_worker_data = dict()
+
+
+def _init_cascade_worker(numerical_circuit: NumericalCircuit, options: PowerFlowOptions,
+                         cascade_options: CascadingMonteCarloOptions):
+    """
+    Pool initializer: store the compiled circuit and build the process topology cache
+    """
+    _worker_data['numerical_circuit'] = numerical_circuit
+    _worker_data['options'] = options
+    _worker_data['cascade_options'] = cascade_options
+    _worker_data['load_per_bus'] = get_load_per_bus(numerical_circuit)
+    _worker_data['topology_cache'] = TopologyCache(
+        numerical_circuit,
+        branch_tolerance_mode=options.branch_impedance_tolerance_mode,
+        ignore_single_node_islands=options.ignore_single_node_islands,
+        max_size=cascade_options.topology_cache_size)
+
+
+def cascade_tree_worker(tree_idx):
+    """
+    Cascade tree worker to schedule parallel cascades
+    :param tree_idx: index of the tree
+    :return: CascadeTree instance
+    """
+    return cascade_tree(numerical_circuit=_worker_data['numerical_circuit'],
+                        topology_cache=_worker_data['topology_cache'],
+                        options=_worker_data['options'],
+                        cascade_options=_worker_data['cascade_options'],
+                        tree_idx=tree_idx,
+                        load_per_bus=_worker_data['load_per_bus'],
+                        logger=Logger())
+
+
+class CascadingMonteCarloResults:
+
+    def __init__(self, n_trees, nbr, branch_names=None):
+        """
+        Cascading Monte Carlo results constructor
+        :param n_trees: number of trees
+        :param nbr: number of branches
+        :param branch_names: array of branch names
+        """
+        self.n_trees = n_trees
+
+        self.nbr = nbr
+
+        self.branch_names = branch_names
+
+        self.trees = [None] * n_trees
+
+        # number of times that each branch failed (including the triggering failures)
+        self.branch_failures = np.zeros(nbr, dtype=int)
+
+        self.tree_steps = np.zeros(n_trees, dtype=int)
+
+        self.tree_failed_branches = np.zeros(n_trees, dtype=int)
+
+        self.tree_islands = np.zeros(n_trees, dtype=int)
+
+        self.tree_load_shed = np.zeros(n_trees, dtype=float)
+
+    def set_tree(self, tree: CascadeTree):
+        """
+        Store a tree
+        :param tree: CascadeTree instance
+        """
+        i = tree.tree_idx
+        self.trees[i] = tree
+        failed = tree.get_failed_idx()
+        self.branch_failures[failed] += 1
+        self.tree_steps[i] = tree.n_steps
+        self.tree_failed_branches[i] = len(failed)
+        self.tree_islands[i] = tree.n_islands
+        self.tree_load_shed[i] = tree.load_shed
+
+    def get_branch_failure_probability(self):
+        """
+        Get the probability of failure of each branch
+        :return: array
+        """
+        return self.branch_failures / max(self.n_trees, 1)
+
+    def get_table(self):
+        """
+        Get DataFrame of the cascade trees
+        :return: DataFrame
+        """
+        data = np.c_[self.tree_steps, self.tree_failed_branches, self.tree_islands, self.tree_load_shed]
+        return pd.DataFrame(data=data,
+                            columns=['Cascade steps', 'Elements failed', 'Islands', 'Load shed (MW)'],
+                            index=['Tree ' + str(i) for i in range(self.n_trees)])
+
+    def get_branch_table(self):
+        """
+        Get DataFrame of the branch failure statistics
+        :return: DataFrame
+        """
+        return pd.DataFrame(data=np.c_[self.branch_failures, self.get_branch_failure_probability()],
+                            columns=['Failures', 'Probability'],
+                            index=self.branch_names)
+
+
+class CascadingMonteCarlo(QThread):
+    progress_signal = Signal(float)
+    progress_text = Signal(str)
+    done_signal = Signal()
+
+    def __init__(self, grid: MultiCircuit, options: PowerFlowOptions, cascade_options: CascadingMonteCarloOptions):
+        """
+        Cascading Monte Carlo constructor: simulates many stochastic cascade trees on the compiled circuit
+        :param grid: MultiCircuit instance
+        :param options: Power flow options
+        :param cascade_options: Cascading Monte Carlo options
+        """
+        QThread.__init__(self)
+
+        self.grid = grid
+
+        self.options = options
+
+        self.cascade_options = cascade_options
+
+        self.results = None
+
+        self.logger = Logger()
+
+        self.__cancel__ = False
+
+    def run_single_thread(self, numerical_circuit: NumericalCircuit):
+        """
+        Run the trees one after the other sharing the topology cache
+        :param numerical_circuit: NumericalCircuit instance
+        :return: CascadingMonteCarloResults instance
+        """
+        n_trees = self.cascade_options.n_trees
+        results = CascadingMonteCarloResults(n_trees, numerical_circuit.nbr, numerical_circuit.branch_names)
+
+        topology_cache = TopologyCache(numerical_circuit,
+                                       branch_tolerance_mode=self.options.branch_impedance_tolerance_mode,
+                                       ignore_single_node_islands=self.options.ignore_single_node_islands,
+                                       max_size=self.cascade_options.topology_cache_size)
+        load_per_bus = get_load_per_bus(numerical_circuit)
+
+        for i in range(n_trees):
+
+            if self.__cancel__:
+                break
+
+            tree = cascade_tree(numerical_circuit=numerical_circuit,
+                                topology_cache=topology_cache,
+                                options=self.options,
+                                cascade_options=self.cascade_options,
+                                tree_idx=i,
+                                load_per_bus=load_per_bus,
+                                logger=self.logger)
+            results.set_tree(tree)
+
+            self.progress_signal.emit((i + 1) / n_trees * 100.0)
+
+        return results
+
+    def run_multi_thread(self, numerical_circuit: NumericalCircuit):
+        """
+        Run the trees in a pool of processes; each process compiles its topology cache once
+        :param numerical_circuit: NumericalCircuit instance
+        :return: CascadingMonteCarloResults instance
+        """
+        n_trees = self.cascade_options.n_trees
+        results = CascadingMonteCarloResults(n_trees, numerical_circuit.nbr, numerical_circuit.branch_names)
+
+        n_cores = multiprocessing.cpu_count()
+        self.progress_text.emit('Running cascades in parallel using ' + str(n_cores) + ' cores ...')
+
+        pool = multiprocessing.Pool(processes=n_cores,
+                                    initializer=_init_cascade_worker,
+                                    initargs=(numerical_circuit, self.options, self.cascade_options))
+
+        chunk_size = max(1, n_trees // (4 * n_cores))
+        try:
+            for k, tree in enumerate(pool.imap_unordered(cascade_tree_worker, range(n_trees), chunksize=chunk_size)):
+                results.set_tree(tree)
+                self.progress_signal.emit((k + 1) / n_trees * 100.0)
+
+                if self.__cancel__:
+                    pool.terminate()
+                    break
+        finally:
+            pool.close()
+            pool.join()
+
+        return results
+
+    def run(self):
+        """
+        Run the cascading Monte Carlo simulation
+        """
+        self.__cancel__ = False
+
+        self.progress_signal.emit(0.0)
+        self.progress_text.emit('Running cascading Monte Carlo...')
+
+        # compile only once: the cascades work on the numerical circuit arrays
+        numerical_circuit = self.grid.compile()
+
+        if self.options.multi_thread:
+            self.results = self.run_multi_thread(numerical_circuit)
+        else:
+            self.results = self.run_single_thread(numerical_circuit)
+
+        # send the finnish signal
+        self.progress_signal.emit(0.0)
+        self.progress_text.emit('Done!')
+        self.done_signal.emit()
+
+    def cancel(self):
+        """
+        Cancel the simulation
+        """
+        self.__cancel__ = True
+        self.progress_signal.emit(0.0)
+        self.progress_text.emit('Cancelled')
+        self.done_signal.emit()
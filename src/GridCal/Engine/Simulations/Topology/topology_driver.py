@@ -12,9 +12,10 @@
 #
 # You should have received a copy of the GNU General Public License
 # along with GridCal.  If not, see <http://www.gnu.org/licenses/>.
-from networkx import DiGraph, all_simple_paths
+import numpy as np
 import pandas as pd
-from scipy.sparse import lil_matrix, csc_matrix
+from scipy.sparse import csc_matrix
+from scipy.sparse.csgraph import connected_components
 from PySide2.QtCore import QThread, Signal
 from typing import List
 
@@ -73,91 +74,159 @@ def select_branches_to_reduce(circuit: MultiCircuit, rx_criteria=True, rx_thresh
     return branches_to_remove_idx
 
 
-def reduce_grid_brute(circuit: MultiCircuit, removed_br_idx):
-    """
-    Remove the first branch found to be removed.
-    this function is meant to be called until it returns false
-    Args:
-        circuit: Circuit to modify in-place
-        removed_br_idx: branch index
+class DisjointSet:
 
-    Returns: Nothing
-    """
+    def __init__(self, n):
+        """
+        Union-find structure with path halving
+        :param n: number of elements
+        """
+        self.parent = list(range(n))
 
-    # form C
-    m = len(circuit.branches)
-    n = len(circuit.buses)
-    buses_dict = {bus: i for i, bus in enumerate(circuit.buses)}
-    C = lil_matrix((m, n), dtype=int)
-    graph = DiGraph()
+    def find(self, i):
+        """
+        Find the root of an element
+        :param i: element
+        :return: root element
+        """
+        parent = self.parent
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    def union(self, i, j):
+        """
+        Join the sets of two elements
+        :param i: element
+        :param j: element
+        :return: True if they were in different sets
+        """
+        ri = self.find(i)
+        rj = self.find(j)
+        if ri == rj:
+            return False
+        self.parent[ri] = rj
+        return True
 
-    # TODO: Fix the topology reduction with the GC example, see what is going on
 
-    for i in range(len(circuit.branches)):
-        # get the from and to bus indices
-        f = buses_dict[circuit.branches[i].bus_from]
-        t = buses_dict[circuit.branches[i].bus_to]
-        graph.add_edge(f, t)
-        C[i, f] = 1
-        C[i, t] = -1
-
-    C = csc_matrix(C)
-
-    # get branch buses
-    bus_f = circuit.branches[removed_br_idx].bus_from
-    bus_t = circuit.branches[removed_br_idx].bus_to
-    f = buses_dict[bus_f]
-    t = buses_dict[bus_t]
-
-    removed_bus = None
-    removed_branch = None
-    updated_bus = None
-    updated_branches = list()
+def get_branch_buses_indices(circuit: MultiCircuit):
+    """
+    Get the from and to bus indices of every branch
+    :param circuit: MultiCircuit instance
+    :return: from bus indices array, to bus indices array
+    """
+    buses_dict = {bus: i for i, bus in enumerate(circuit.buses)}
+    F = np.array([buses_dict[elm.bus_from] for elm in circuit.branches], dtype=int)
+    T = np.array([buses_dict[elm.bus_to] for elm in circuit.branches], dtype=int)
+    return F, T
 
-    # get the number of paths
-    n_paths = len(list(all_simple_paths(graph, f, t)))
 
-    # print('Deleting: ', circuit.branches[br_idx].name)
+def classify_branches_to_reduce(n, F, T, active, removed_br_idx):
+    """
+    Decide which of the branches to reduce merge their buses and which are simply removed.
+    A branch merges its buses when it is the only path between them (a bridge) once all the branches to reduce
+    are taken out; otherwise there is a parallel path and it is removed. The branches are processed in reverse
+    order, so of two parallel branches to reduce, the last one merges the buses and the first one is removed.
+    The cost is linear: one connected components pass plus one union-find sweep over the branches to reduce.
+    :param n: number of buses
+    :param F: from bus indices of the branches
+    :param T: to bus indices of the branches
+    :param active: active state of the branches (the inactive branches are removed without merging)
+    :param removed_br_idx: indices of the branches to reduce
+    :return: indices of the branches that merge their buses, indices of the branches that are only removed
+    """
+    removed_br_idx = np.unique(np.array(removed_br_idx, dtype=int))[::-1]
+
+    # connectivity of the grid without the branches to reduce
+    keep = active.copy()
+    keep[removed_br_idx] = False
+    A = csc_matrix((np.ones(keep.sum()), (F[keep], T[keep])), shape=(n, n))
+    n_comp, labels = connected_components(A, directed=False)
+
+    # union-find sweep over the components: the branches that join two components are bridges
+    components = DisjointSet(n_comp)
+    merge_idx = list()
+    remove_idx = list()
+    for k in removed_br_idx:
+        if active[k] and components.union(labels[F[k]], labels[T[k]]):
+            merge_idx.append(k)
+        else:
+            remove_idx.append(k)
 
-    if n_paths == 1:
+    return np.array(merge_idx, dtype=int), np.array(remove_idx, dtype=int)
 
-        # get the branches that are connected to the bus f
-        adjacent_br_idx = get_branches_of_bus(C, f)
 
-        for k in adjacent_br_idx:
+def reduce_grid(circuit: MultiCircuit, removed_br_idx):
+    """
+    Reduce many branches at once (i.e. the switches of a node-breaker model).
+    The branches that are the only path between their buses (bridges) merge the buses, the rest are removed.
+    The buses merged by each connected group of bridges are kept in one bus (the first of the group in the
+    circuit), and the bus and branch lists are updated in bulk.
+    Args:
+        circuit: Circuit to modify in-place
+        removed_br_idx: indices of the branches to reduce
 
-            # get the indices of the buses
-            f2 = buses_dict[circuit.branches[k].bus_from]
-            t2 = buses_dict[circuit.branches[k].bus_to]
+    Returns: list of removed branches, list of removed buses, list of updated buses, list of updated branches
+    """
+    n = len(circuit.buses)
+    m = len(circuit.branches)
+    F, T = get_branch_buses_indices(circuit)
+    active = np.array([elm.active for elm in circuit.branches], dtype=bool)
+
+    merge_idx, remove_idx = classify_branches_to_reduce(n, F, T, active, removed_br_idx)
+
+    # groups of merged buses: the first bus of each group keeps the devices of the group
+    A = csc_matrix((np.ones(len(merge_idx)), (F[merge_idx], T[merge_idx])), shape=(n, n))
+    n_comp, labels = connected_components(A, directed=False)
+    first = np.full(n_comp, n, dtype=int)
+    np.minimum.at(first, labels, np.arange(n))
+    new_bus = first[labels]
+
+    updated_buses = list()
+    removed_buses = list()
+    for i in np.where(new_bus != np.arange(n))[0]:
+        circuit.buses[new_bus[i]].merge(circuit.buses[i])
+        removed_buses.append(circuit.buses[i])
+    for i in np.unique(new_bus[new_bus != np.arange(n)]):
+        updated_buses.append(circuit.buses[i])
+
+    # re-connect the branches to the merged buses
+    keep_br = np.ones(m, dtype=bool)
+    keep_br[merge_idx] = False
+    keep_br[remove_idx] = False
+    updated_branches = list()
+    for k in np.where(keep_br & ((new_bus[F] != F) | (new_bus[T] != T)))[0]:
+        circuit.branches[k].bus_from = circuit.buses[new_bus[F[k]]]
+        circuit.branches[k].bus_to = circuit.buses[new_bus[T[k]]]
+        updated_branches.append(circuit.branches[k])
 
-            # re-assign the right bus
-            if f2 == f:
-                circuit.branches[k].bus_from = bus_t
-            elif t2 == t2:
-                circuit.branches[k].bus_to = bus_t
+    removed_branches = [circuit.branches[k] for k in np.where(~keep_br)[0]]
 
-            # copy the state of the removed branch
-            circuit.branches[k].active = circuit.branches[removed_br_idx].active
+    # update the lists in bulk (in place, since they may be referenced elsewhere)
+    circuit.branches[:] = [circuit.branches[k] for k in np.where(keep_br)[0]]
+    circuit.buses[:] = [circuit.buses[i] for i in np.where(new_bus == np.arange(n))[0]]
 
-            # remember the updated branches
-            updated_branches.append(circuit.branches[k])
+    return removed_branches, removed_buses, updated_buses, updated_branches
 
-        # merge buses
-        bus_t.merge(bus_f)
-        updated_bus = bus_t
 
-        # delete bus
-        removed_bus = circuit.buses.pop(f)
+def reduce_grid_brute(circuit: MultiCircuit, removed_br_idx):
+    """
+    Reduce one branch: if it is the only path between its buses, the buses are merged, otherwise the branch is
+    just removed.
+    Args:
+        circuit: Circuit to modify in-place
+        removed_br_idx: branch index
 
-        # remove the branch and that's it
-        removed_branch = circuit.branches.pop(removed_br_idx)
+    Returns: removed branch, removed bus (or None), updated bus (or None), list of updated branches
+    """
+    removed_branches, removed_buses, \
+        updated_buses, updated_branches = reduce_grid(circuit=circuit, removed_br_idx=[removed_br_idx])
 
-    else:
-        # remove the branch and that's it
-        removed_branch = circuit.branches.pop(removed_br_idx)
+    removed_bus = removed_buses[0] if len(removed_buses) else None
+    updated_bus = updated_buses[0] if len(updated_buses) else None
 
-    # return the removed branch and the possible removed bus
-    return removed_branch, removed_bus, updated_bus, updated_branches
+    return removed_branches[0], removed_bus, updated_bus, updated_branches
 
 
 def reduce_buses(circuit: MultiCircuit, buses_to_reduce: List[Bus], text_func=None, prog_func=None):
@@ -283,22 +352,15 @@ class TopologyReduction(QThread):
         self.progress_signal.emit(0.0)
         self.progress_text.emit('Detecting which branches to remove...')
 
-        # sort the branches in reverse order
-        self.br_to_remove.sort(reverse=True)
-
         total = len(self.br_to_remove)
+        self.progress_text.emit('Reducing ' + str(total) + ' branches...')
 
-        # for every branch in reverse order...
-        for i, br_idx in enumerate(self.br_to_remove):
-
-            # delete branch
-            removed_branch, removed_bus, \
-            updated_bus, updated_branches = reduce_grid_brute(circuit=self.grid, removed_br_idx=br_idx)
+        # reduce all the branches at once
+        removed_branches, removed_buses, \
+            updated_buses, updated_branches = reduce_grid(circuit=self.grid, removed_br_idx=self.br_to_remove)
 
-            # display progress
-            self.progress_text.emit('Removed branch ' + str(br_idx) + ': ' + removed_branch.name)
-            progress = (i+1) / total * 100
-            self.progress_signal.emit(progress)
+        self.progress_text.emit('Removed ' + str(len(removed_branches)) + ' branches and ' +
+                                str(len(removed_buses)) + ' buses')
 
         # display progress
         self.progress_text.emit('Done')
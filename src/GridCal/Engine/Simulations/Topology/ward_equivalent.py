@@ -0,0 +1,193 @@
+# This file is part of GridCal.
+#
+# GridCal is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# GridCal is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with GridCal.  If not, see <http://www.gnu.org/licenses/>.
+import numpy as np
+from scipy.sparse import coo_matrix
+from scipy.sparse.linalg import splu
+from typing import List
+
+from GridCal.Engine.Core.multi_circuit import MultiCircuit
+from GridCal.Engine.Devices.branch import Branch, BranchType
+from GridCal.Engine.Devices.bus import Bus
+from GridCal.Engine.Devices.shunt import Shunt
+from GridCal.Engine.Devices.static_generator import StaticGenerator
+from GridCal.Engine.Simulations.PowerFlow.power_flow_driver import PowerFlowResults
+
+
+def get_grid_admittance(circuit: MultiCircuit):
+    """
+    Compile the circuit and assemble the admittance matrix and the injections of all its islands
+    :param circuit: MultiCircuit instance
+    :return: Ybus (CSR), specified Sbus, specified Sbus profiles (nbus, ntime) or None, reference bus indices
+    """
+    n = len(circuit.buses)
+    numerical_circuit = circuit.compile()
+    islands = numerical_circuit.compute()
+
+    rows = list()
+    cols = list()
+    vals = list()
+    Sbus = np.zeros(n, dtype=complex)
+    Sbus_prof = np.zeros((n, numerical_circuit.ntime), dtype=complex) if numerical_circuit.ntime > 0 else None
+    ref = list()
+
+    for island in islands:
+        idx = np.array(island.original_bus_idx, dtype=int)
+        Y = island.Ybus.tocoo()
+        rows.append(idx[Y.row])
+        cols.append(idx[Y.col])
+        vals.append(Y.data)
+        Sbus[idx] = island.Sbus
+        if Sbus_prof is not None:
+            Sbus_prof[idx, :] = island.Sbus_prof
+        ref += list(idx[island.ref])
+
+    Ybus = coo_matrix((np.concatenate(vals), (np.concatenate(rows), np.concatenate(cols))), shape=(n, n)).tocsr()
+
+    return Ybus, Sbus, Sbus_prof, np.array(ref, dtype=int)
+
+
+def ward_equivalent(circuit: MultiCircuit, internal_buses: List[Bus], pf_results: PowerFlowResults, tol=1e-9):
+    """
+    Ward equivalent of the external area of a circuit.
+    The external buses are eliminated from the admittance matrix by Kron reduction (the Schur complement
+    Ybb - Ybe·Yee^-1·Yeb, computed with a sparse factorization of Yee and solved only for the boundary buses).
+    The difference between that and the admittance of the internal network (without the branches cut at the
+    boundary) is represented with equivalent branches and shunts.
+    The external injections at the power flow solution are moved to the boundary buses as equivalent currents,
+    which are converted back to powers with the boundary voltages. The result is a new circuit with the internal
+    buses, the branches among them, equivalent branches between the boundary buses, equivalent shunts and
+    equivalent injections at the boundary buses.
+
+    The equivalent reproduces the power flow solution exactly. The external injection profiles are moved to the
+    boundary as deviations from the power flow injections, so that the equivalent follows the external area in
+    the time series; the external voltages are assumed to stay at the power flow solution.
+
+    :param circuit: MultiCircuit instance
+    :param internal_buses: list of the buses to keep (they must contain the slack buses)
+    :param pf_results: PowerFlowResults of the circuit
+    :param tol: admittances smaller than this are not represented by equivalent branches or shunts (p.u.)
+    :return: MultiCircuit instance with the equivalent
+    """
+    n = len(circuit.buses)
+    bus_dict = {bus: i for i, bus in enumerate(circuit.buses)}
+    internal = np.zeros(n, dtype=bool)
+    internal[[bus_dict[bus] for bus in internal_buses]] = True
+    ext = np.where(~internal)[0]
+    ret = np.where(internal)[0]
+
+    Ybus, Sbus, Sbus_prof, ref = get_grid_admittance(circuit)
+
+    if not np.all(internal[ref]):
+        raise Exception('The internal area must contain the slack buses')
+
+    V = pf_results.voltage
+
+    # boundary buses: the internal buses connected to the external area
+    Y_re = Ybus[ret, :][:, ext]
+    bnd_pos = np.unique(Y_re.tocoo().row)
+    bnd = ret[bnd_pos]
+    Y_be = Y_re[bnd_pos, :]
+    Y_eb = Ybus[ext, :][:, bnd]
+
+    # Kron reduction of the external buses onto the boundary buses
+    Y_ee = Ybus[ext, :][:, ext].tocsc()
+    if len(ext) > 0:
+        lu = splu(Y_ee)
+        Y_eq = Ybus[bnd, :][:, bnd].toarray() - Y_be * lu.solve(Y_eb.toarray())
+    else:
+        lu = None
+        Y_eq = np.zeros((0, 0), dtype=complex)
+
+    # external injections as currents at the power flow solution, moved to the boundary
+    def equivalent_injection(S_ext):
+        I_ext = np.conj(S_ext / (V[ext] if S_ext.ndim == 1 else V[ext, np.newaxis]))
+        I_bnd = -(Y_be * lu.solve(I_ext))
+        return (V[bnd] if S_ext.ndim == 1 else V[bnd, np.newaxis]) * np.conj(I_bnd)
+
+    if lu is not None:
+        S_eq = equivalent_injection(pf_results.Sbus[ext])
+    else:
+        S_eq = np.zeros(0, dtype=complex)
+
+    if Sbus_prof is not None and lu is not None:
+        S_eq_prof = equivalent_injection(pf_results.Sbus[ext, np.newaxis] + Sbus_prof[ext, :] - Sbus[ext, np.newaxis])
+    else:
+        S_eq_prof = None
+
+    # build the equivalent circuit
+    grid = MultiCircuit()
+    grid.name = circuit.name + ' (Ward equivalent)'
+    grid.Sbase = circuit.Sbase
+    grid.fBase = circuit.fBase
+    grid.time_profile = circuit.time_profile
+
+    bus_copy = dict()
+    for i in ret:
+        bus = circuit.buses[i].copy()
+        bus_copy[circuit.buses[i]] = bus
+        grid.buses.append(bus)
+
+    for branch in circuit.branches:
+        if branch.bus_from in bus_copy and branch.bus_to in bus_copy:
+            grid.branches.append(branch.copy(bus_copy))
+
+    if grid.time_profile is not None:
+        for elm in grid.buses + grid.branches:
+            elm.ensure_profiles_exist(grid.time_profile)
+
+    # admittance to add at the boundary: the equivalent minus the internal network (without the cut branches)
+    Y_int = get_grid_admittance(grid)[0]
+    dY = Y_eq - Y_int[bnd_pos, :][:, bnd_pos].toarray()
+
+    # equivalent branches between the boundary buses: series admittance ys and phase shift theta, so that
+    # Yij = -ys·exp(j·theta) and Yji = -ys·exp(-j·theta) (the shift captures the asymmetry of the phase shifters)
+    n_bnd = len(bnd)
+    Y_model = np.zeros((n_bnd, n_bnd), dtype=complex)
+    bnd_buses = [bus_copy[circuit.buses[i]] for i in bnd]
+    for i, j in zip(*np.where(np.triu(np.maximum(np.abs(dY), np.abs(dY.T)) > tol, k=1))):
+        theta = np.angle(dY[i, j] / dY[j, i]) / 2.0 if abs(dY[j, i]) > tol and abs(dY[i, j]) > tol else 0.0
+        ys = -0.5 * (dY[i, j] * np.exp(-1j * theta) + dY[j, i] * np.exp(1j * theta))
+        z = 1.0 / ys
+        grid.add_branch(Branch(bnd_buses[i], bnd_buses[j], name='Ward branch ' + str(i) + '-' + str(j),
+                               r=z.real, x=z.imag, g=0.0, b=0.0, shift_angle=theta, rate=9999.0,
+                               branch_type=BranchType.Branch))
+        Y_model[i, j] = -ys * np.exp(1j * theta)
+        Y_model[j, i] = -ys * np.exp(-1j * theta)
+        Y_model[i, i] += ys
+        Y_model[j, j] += ys
+
+    # equivalent shunts: the rest of the diagonal
+    Ysh = np.diag(dY) - np.diag(Y_model)
+    Y_model += np.diag(Ysh)
+
+    # what the branches can not represent is injected as a current at the power flow voltages
+    S_res = V[bnd] * np.conj((dY - Y_model).dot(V[bnd]))
+    S_eq = S_eq - S_res
+    if S_eq_prof is not None:
+        S_eq_prof = S_eq_prof - S_res[:, np.newaxis]
+
+    # equivalent shunts and injections at the boundary buses
+    for i, bus in enumerate(bnd_buses):
+
+        if abs(Ysh[i]) > tol:
+            grid.add_shunt(bus, Shunt(name='Ward shunt', G=Ysh[i].real * grid.Sbase, B=Ysh[i].imag * grid.Sbase))
+
+        gen = StaticGenerator(name='Ward injection', P=S_eq[i].real * grid.Sbase, Q=S_eq[i].imag * grid.Sbase)
+        grid.add_static_generator(bus, gen)
+        if S_eq_prof is not None:
+            gen.create_profile('P', grid.time_profile, arr=S_eq_prof[i, :].real * grid.Sbase)
+            gen.create_profile('Q', grid.time_profile, arr=S_eq_prof[i, :].imag * grid.Sbase)
+
+    return grid
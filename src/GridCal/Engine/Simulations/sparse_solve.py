@@ -153,6 +153,80 @@ def amg_linsolve(A, b):
     return ml.solve(b, tol=1e-5)
 
 
+class ReusableSuperLU:
+
+    def __init__(self, permc_spec='COLAMD'):
+        """
+        SuperLU factorization that re-uses the symbolic analysis (fill-reducing column ordering)
+        of the first matrix for all the following matrices of the same size and sparsity pattern.
+        This is the case of the Newton-like iterative methods, where only the values change.
+        :param permc_spec: column ordering computed in the symbolic analysis
+        """
+        self.permc_spec = permc_spec
+
+        # fill-reducing column ordering (A[:, perm] is factorized without any further ordering)
+        self.perm = None
+
+        # inverse ordering to restore the solution
+        self.iperm = None
+
+        self.shape = None
+
+        self.lu = None
+
+        # was the last factorization done over the permuted matrix?
+        self.permuted = False
+
+        self.symbolic_factorizations = 0
+
+        self.numeric_factorizations = 0
+
+    def analyze(self, A: csc_matrix):
+        """
+        Compute the fill-reducing ordering of A
+        :param A: CSC sparse matrix
+        """
+        lu = splu(A, permc_spec=self.permc_spec)
+
+        # SuperLU factorizes Pr A Pc = LU, with Pc[i, perm_c[i]] = 1, that is A Pc = A[:, argsort(perm_c)]
+        self.perm = np.argsort(lu.perm_c)
+        self.iperm = lu.perm_c
+        self.shape = A.shape
+        self.symbolic_factorizations += 1
+
+        return lu
+
+    def factorize(self, A):
+        """
+        Factorize A, re-using the column ordering if the size is the same as the one of the analyzed matrix
+        :param A: sparse matrix
+        :return: self (to call solve)
+        """
+        A = csc_matrix(A)
+
+        if self.perm is None or A.shape != self.shape:
+            self.lu = self.analyze(A)
+            self.permuted = False
+        else:
+            self.lu = splu(A[:, self.perm], permc_spec='NATURAL')
+            self.permuted = True
+
+        self.numeric_factorizations += 1
+
+        return self
+
+    def solve(self, b):
+        """
+        Solve A x = b with the last factorization
+        :param b: right hand side
+        :return: solution
+        """
+        if self.permuted:
+            return self.lu.solve(b)[self.iperm]
+        else:
+            return self.lu.solve(b)
+
+
 def get_linear_solver(solver_type: SparseSolver = preferred_type):
     """
     Privide the chosen linear solver function pointer to solver linear systems of the type A x = b, with x = f(A,b)
@@ -37,6 +37,16 @@ class BranchImpedanceMode(Enum):
     Lower = 2
 
 
+class FaultType(Enum):
+    ph3 = '3x'
+    LG = 'LG'
+    LL = 'LL'
+    LLG = 'LLG'
+
+    def __str__(self):
+        return self.value
+
+
 class SolverType(Enum):
     """
     Refer to the :ref:`Power Flow section<power_flow>` for details about the different
@@ -63,6 +73,7 @@ class SolverType(Enum):
     DYCORS_OPF = 'DYCORS OPF'
     GA_OPF = 'Genetic Algorithm OPF'
     NELDER_MEAD_OPF = 'Nelder Mead OPF'
+    IPM_OPF = 'Interior point AC OPF'
 
 
 class ReactivePowerControlMode(Enum):
@@ -425,6 +436,7 @@ class MIPSolvers(Enum):
     CPLEX = 'CPLEX'
     GUROBI = 'Gurobi'
     XPRESS = 'Xpress'
+    HIGHS = 'HiGHS'
 
 
 class TimeGrouping(Enum):
@@ -169,6 +169,7 @@ class MainGUI(QMainWindow):
         self.lp_solvers_dict = OrderedDict()
         self.lp_solvers_dict[SolverType.DC_OPF.value] = SolverType.DC_OPF
         self.lp_solvers_dict[SolverType.AC_OPF.value] = SolverType.AC_OPF
+        self.lp_solvers_dict[SolverType.IPM_OPF.value] = SolverType.IPM_OPF
         self.ui.lpf_solver_comboBox.setModel(get_list_model(list(self.lp_solvers_dict.keys())))
 
         self.opf_time_groups = OrderedDict()
@@ -184,6 +185,7 @@ class MainGUI(QMainWindow):
         self.mip_solvers_dict[MIPSolvers.CPLEX.value] = MIPSolvers.CPLEX
         self.mip_solvers_dict[MIPSolvers.GUROBI.value] = MIPSolvers.GUROBI
         self.mip_solvers_dict[MIPSolvers.XPRESS.value] = MIPSolvers.XPRESS
+        self.mip_solvers_dict[MIPSolvers.HIGHS.value] = MIPSolvers.HIGHS
         self.ui.mip_solver_comboBox.setModel(get_list_model(list(self.mip_solvers_dict.keys())))
 
         # voltage collapse mode (full, nose)
@@ -2826,7 +2828,8 @@ class MainGUI(QMainWindow):
                     options = OptimalPowerFlowOptions(solver=solver,
                                                       grouping=grouping,
                                                       mip_solver=mip_solver,
-                                                      power_flow_options=pf_options)
+                                                      power_flow_options=pf_options,
+                                                      multi_thread=self.ui.use_multiprocessing_checkBox.isChecked())
 
                     start = self.ui.profile_start_slider.value()
                     end = self.ui.profile_end_slider.value() + 1
@@ -1163,6 +1163,9 @@ class LpProblem(object):
         self.dummyVar = None
         self.solutionTime = 0
 
+        # columnar constraint blocks (see pulp_extra.LpConstraintBlock) pending to be turned into LpConstraints
+        self.constraint_blocks = []
+
         # locals
         self.lastUnused = 0
 
@@ -1198,6 +1201,7 @@ class LpProblem(object):
 
     def copy(self):
         """Make a copy of self. Expressions are copied by reference"""
+        self.materializeConstraintBlocks()
         lpcopy = LpProblem(name = self.name, sense = self.sense)
         lpcopy.objective = self.objective
         lpcopy.constraints = self.constraints.copy()
@@ -1207,6 +1211,7 @@ class LpProblem(object):
 
     def deepcopy(self):
         """Make a copy of self. Expressions are copied by value"""
+        self.materializeConstraintBlocks()
         lpcopy = LpProblem(name = self.name, sense = self.sense)
         if self.objective is not None:
             lpcopy.objective = self.objective.copy()
@@ -1494,6 +1499,7 @@ class LpProblem(object):
         :param mip:
         :return:
         """
+        self.materializeConstraintBlocks()
         wasNone, dummyVar = self.fixObjective()
 
         f = open(filename, "w")
@@ -1617,6 +1623,7 @@ class LpProblem(object):
         Side Effects:
             - The file is created.
         """
+        self.materializeConstraintBlocks()
         f = open(filename, "w")
         f.write("\\* "+self.name+" *\\\n")
         if self.sense == 1:
@@ -1780,6 +1787,7 @@ class LpProblem(object):
             solver = self.solver
         if not solver:
             solver = LpSolverDefault
+        self.materializeConstraintBlocks()
         wasNone, dummyVar = self.fixObjective()
         # time it
         self.solutionTime = -clock()
@@ -1855,8 +1863,27 @@ class LpProblem(object):
         return len(self._variable_ids)
 
     def numConstraints(self):
+        self.materializeConstraintBlocks()
         return len(self.constraints)
 
+    def addConstraintBlock(self, block):
+        """
+        Add a columnar block of constraints, it is turned into LpConstraint objects
+        only when the problem is solved or written
+
+        :param block: pulp_extra.LpConstraintBlock instance
+        """
+        self.constraint_blocks.append(block)
+        self.resolveOK = False
+
+    def materializeConstraintBlocks(self):
+        """
+        Create the LpConstraint objects of the constraint blocks that were not created yet
+        """
+        for block in self.constraint_blocks:
+            if not block.materialized:
+                block.materialize(self)
+
     def getSense(self):
         return self.sense
 
@@ -18,52 +18,391 @@ This file includes extensions to the PuLP library
 """
 
 import numpy as np
-from .pulp import LpProblem, LpVariable
+from .pulp import LpProblem, LpVariable, LpElement, LpAffineExpression, LpConstraint
+from .constants import LpConstraintEQ, LpConstraintLE, LpConstraintGE
 from itertools import product
-from scipy.sparse import csc_matrix
+from scipy.sparse import csc_matrix, csr_matrix, diags, kron, identity
 
 
-def lpDot(mat, arr):
+class LpExpressionArray:
     """
-    CSC matrix-vector or CSC matrix-matrix dot product (A x b)
-    :param mat: CSC sparse matrix (A)
-    :param arr: dense vector or matrix of object type (b)
-    :return: vector or matrix result of the product
+    Array of linear expressions stored in columnar form:
+
+        expression[k] = A[k, :] x variables + b[k]
+
+    where A is a CSR sparse matrix of coefficients over a list of LpVariables and k is the flat
+    (row-major) index of the array element. The arithmetic is done with sparse matrix operations,
+    and the LpAffineExpression objects are only created on demand (to_array)
     """
-    n_rows, n_cols = mat.shape
 
-    # check dimensional compatibility
-    assert (n_cols == arr.shape[0])
+    # make numpy defer the mixed operations (i.e. numeric array * LpExpressionArray) to this class
+    __array_ufunc__ = None
 
-    # check that the sparse matrix is indeed of CSC format
-    if mat.format == 'csc':
-        mat_2 = mat
-    else:
-        # convert the matrix to CSC sparse
-        mat_2 = csc_matrix(mat)
+    def __init__(self, variables, A, b, shape):
+        """
+        Constructor
+        :param variables: list of LpVariables (columns of A)
+        :param A: CSR sparse matrix of coefficients (number of elements, number of variables)
+        :param b: array of constants (number of elements)
+        :param shape: shape of the array
+        """
+        self.variables = variables
+        self.A = A
+        self.b = b
+        self.shape = tuple(shape)
 
-    if len(arr.shape) == 1:
+    @staticmethod
+    def from_array(arr):
         """
-        Uni-dimensional sparse matrix - vector product
+        Convert an array of LpVariables, LpAffineExpressions and numbers to the columnar form
+        :param arr: LpExpressionArray, numpy array or scalar
+        :return: LpExpressionArray instance
         """
-        res = np.zeros(n_rows, dtype=arr.dtype)
-        for i in range(n_cols):
-            for ii in range(mat_2.indptr[i], mat_2.indptr[i + 1]):
-                j = mat_2.indices[ii]  # row index
-                res[j] += mat_2.data[ii] * arr[i]  # C.data[ii] is equivalent to C[i, j]
-    else:
+        if isinstance(arr, LpExpressionArray):
+            return arr
+
+        arr = np.asarray(arr)
+        shape = arr.shape
+        flat = arr.ravel()
+        n = len(flat)
+
+        if arr.dtype != object:
+            return LpExpressionArray([], csr_matrix((n, 0)), flat.astype(float), shape)
+
+        variables = list()
+        col = dict()
+        rows = list()
+        cols = list()
+        vals = list()
+        b = np.zeros(n)
+
+        for k, elm in enumerate(flat):
+
+            if isinstance(elm, LpVariable):
+                terms = ((elm, 1.0),)
+            elif isinstance(elm, LpAffineExpression):
+                terms = elm.items()
+                b[k] = elm.constant
+            else:
+                if elm is not None:
+                    b[k] = elm
+                continue
+
+            for var, coef in terms:
+                j = col.get(id(var), None)
+                if j is None:
+                    j = len(variables)
+                    col[id(var)] = j
+                    variables.append(var)
+                rows.append(k)
+                cols.append(j)
+                vals.append(coef)
+
+        A = csr_matrix((vals, (rows, cols)), shape=(n, len(variables)))
+
+        return LpExpressionArray(variables, A, b, shape)
+
+    def __len__(self):
+        return self.shape[0]
+
+    @property
+    def size(self):
+        return len(self.b)
+
+    def _common_space(self, other):
+        """
+        Express self and other over the same list of variables
+        :param other: LpExpressionArray
+        :return: variables, A of self, A of other
+        """
+        if other.variables is self.variables or len(other.variables) == 0:
+            A2 = other.A if other.A.shape[1] == len(self.variables) else csr_matrix((other.A.shape[0],
+                                                                                     len(self.variables)))
+            return self.variables, self.A, A2
+
+        if len(self.variables) == 0:
+            return other.variables, csr_matrix((self.A.shape[0], len(other.variables))), other.A
+
+        variables = list(self.variables)
+        col = {id(v): j for j, v in enumerate(variables)}
+        idx = np.empty(len(other.variables), dtype=int)
+        for i, var in enumerate(other.variables):
+            j = col.get(id(var), None)
+            if j is None:
+                j = len(variables)
+                col[id(var)] = j
+                variables.append(var)
+            idx[i] = j
+
+        nv = len(variables)
+        A1 = csr_matrix((self.A.data, self.A.indices, self.A.indptr), shape=(self.A.shape[0], nv))
+        A2 = other.A.tocoo()
+        A2 = csr_matrix((A2.data, (A2.row, idx[A2.col])), shape=(A2.shape[0], nv))
+        return variables, A1, A2
+
+    def _broadcast(self, other):
+        """
+        Broadcast other (LpExpressionArray, array or scalar) to the shape of self (or the opposite)
+        :param other: LpExpressionArray, array or scalar
+        :return: (self, other) as LpExpressionArray with the same shape
+        """
+        other = LpExpressionArray.from_array(other)
+        if other.shape == self.shape:
+            return self, other
+
+        # only the broadcasting of constants is supported
+        if len(other.variables) == 0:
+            b = np.broadcast_to(other.b.reshape(other.shape), self.shape).ravel()
+            return self, LpExpressionArray([], csr_matrix((len(b), 0)), b, self.shape)
+        elif len(self.variables) == 0:
+            b = np.broadcast_to(self.b.reshape(self.shape), other.shape).ravel()
+            return LpExpressionArray([], csr_matrix((len(b), 0)), b, other.shape), other
+        else:
+            raise ValueError('Shapes not aligned: ' + str(self.shape) + ' and ' + str(other.shape))
+
+    def __add__(self, other):
+        a, o = self._broadcast(other)
+        variables, A1, A2 = a._common_space(o)
+        return LpExpressionArray(variables, (A1 + A2).tocsr(), a.b + o.b, a.shape)
+
+    def __radd__(self, other):
+        return self.__add__(other)
+
+    def __sub__(self, other):
+        a, o = self._broadcast(other)
+        variables, A1, A2 = a._common_space(o)
+        return LpExpressionArray(variables, (A1 - A2).tocsr(), a.b - o.b, a.shape)
+
+    def __rsub__(self, other):
+        return (-self).__add__(other)
+
+    def __neg__(self):
+        return LpExpressionArray(self.variables, -self.A, -self.b, self.shape)
+
+    def __mul__(self, other):
+        """
+        Element-wise multiplication by a scalar or a numeric array (broadcast to the array shape)
+        """
+        if isinstance(other, (LpExpressionArray, LpElement, LpAffineExpression)) or \
+                (isinstance(other, np.ndarray) and other.dtype == object):
+            raise TypeError('Non-linear product of expressions')
+
+        factor = np.broadcast_to(np.asarray(other, dtype=float), self.shape).ravel()
+        D = diags(factor)
+        return LpExpressionArray(self.variables, (D * self.A).tocsr(), factor * self.b, self.shape)
+
+    def __rmul__(self, other):
+        return self.__mul__(other)
+
+    def __getitem__(self, key):
+        """
+        Numpy-like indexing
+        """
+        idx = np.arange(self.size).reshape(self.shape)[key]
+        shape = np.shape(idx)
+        rows = np.atleast_1d(idx).ravel()
+        return LpExpressionArray(self.variables, self.A[rows, :], self.b[rows], shape)
+
+    def transpose(self):
+        """
+        Transpose the (2D) array
+        """
+        if len(self.shape) < 2:
+            return self
+        idx = np.arange(self.size).reshape(self.shape).transpose()
+        rows = idx.ravel()
+        return LpExpressionArray(self.variables, self.A[rows, :], self.b[rows], idx.shape)
+
+    @property
+    def T(self):
+        return self.transpose()
+
+    def dot(self, mat):
+        """
+        Left product with a matrix: mat x self
+        :param mat: sparse or dense matrix (rows, self.shape[0])
+        :return: LpExpressionArray of shape (rows,) or (rows, self.shape[1])
+        """
+        mat = csr_matrix(mat)
+        n_rows, n_cols = mat.shape
+        assert n_cols == self.shape[0]
+
+        if len(self.shape) == 1:
+            M = mat
+            shape = (n_rows,)
+        else:
+            # the elements are stored row-major, so the product by columns is kron(mat, I)
+            k = self.shape[1]
+            M = kron(mat, identity(k, format='csr'), format='csr')
+            shape = (n_rows, k)
+
+        return LpExpressionArray(self.variables, (M * self.A).tocsr(), M * self.b, shape)
+
+    def sum(self):
+        """
+        Sum of all the elements
+        :return: LpAffineExpression
+        """
+        coef = np.asarray(self.A.sum(axis=0)).ravel()
+        nz = np.where(coef != 0)[0]
+        return LpAffineExpression([(self.variables[j], coef[j]) for j in nz], constant=self.b.sum())
+
+    def value(self):
+        """
+        Values of the expressions after solving
+        :return: numpy array of the array shape
+        """
+        x = np.array([v.varValue if v.varValue is not None else np.nan for v in self.variables], dtype=float)
+        return (self.A * x + self.b).reshape(self.shape)
+
+    def get_expression(self, k):
         """
-        Multi-dimensional sparse matrix - matrix product
+        Create the LpAffineExpression of a flat index
+        :param k: flat index
+        :return: LpAffineExpression
         """
-        cols_vec = arr.shape[1]
-        res = np.zeros((n_rows, cols_vec), dtype=arr.dtype)
+        a, b = self.A.indptr[k], self.A.indptr[k + 1]
+        return LpAffineExpression(zip([self.variables[j] for j in self.A.indices[a:b]], self.A.data[a:b].tolist()),
+                                  constant=self.b[k])
+
+    def to_array(self):
+        """
+        Materialize the array of LpAffineExpressions
+        :return: numpy object array
+        """
+        arr = np.empty(self.size, dtype=object)
+        for k in range(self.size):
+            arr[k] = self.get_expression(k)
+        return arr.reshape(self.shape)
+
+
+class LpConstraintRef:
+
+    def __init__(self, block, index):
+        """
+        Reference to one constraint of a LpConstraintBlock
+        :param block: LpConstraintBlock
+        :param index: flat index of the constraint in the block
+        """
+        self.block = block
+        self.index = index
+
+    @property
+    def constraint(self):
+        """
+        LpConstraint (None if the block was not materialized)
+        """
+        if self.block.constraints is None:
+            return None
+        return self.block.constraints[self.index]
+
+    @property
+    def pi(self):
+        c = self.constraint
+        return None if c is None else c.pi
+
+    @property
+    def slack(self):
+        c = self.constraint
+        return None if c is None else c.slack
+
+    @property
+    def name(self):
+        return self.block.get_name(self.index)
+
+    def value(self):
+        return self.block.expr.value().ravel()[self.index]
+
+
+class LpConstraintBlock:
+
+    def __init__(self, expr: LpExpressionArray, sense, name):
+        """
+        Block of constraints expr (sense) 0 stored in columnar form
+        :param expr: LpExpressionArray with lhs - rhs
+        :param sense: LpConstraintEQ, LpConstraintLE or LpConstraintGE
+        :param name: base name of the constraints
+        """
+        self.expr = expr
+
+        self.sense = sense
+
+        self.name = name
+
+        self.shape = expr.shape
+
+        # LpConstraint objects (created when the problem is solved)
+        self.constraints = None
+
+        # references to the constraints in the shape of the block
+        self.refs = np.empty(expr.size, dtype=object)
+        for k in range(expr.size):
+            self.refs[k] = LpConstraintRef(self, k)
+        self.refs = self.refs.reshape(self.shape)
+
+    @property
+    def materialized(self):
+        return self.constraints is not None
+
+    def get_names(self):
+        """
+        Names of the constraints (the same convention as lpAddRestrictions)
+        :return: list of names
+        """
+        if len(self.shape) == 1:
+            return [self.name + '_' + str(i + 1) for i in range(self.shape[0])]
+        else:
+            return [self.name + '_' + str(i + 1) + '_' + str(j) for i, j in product(range(self.shape[0]),
+                                                                                   range(self.shape[1]))]
+
+    def get_name(self, k):
+        return self.get_names()[k]
+
+    def materialize(self, problem: LpProblem):
+        """
+        Create the LpConstraint objects and add them to the problem
+        :param problem: LpProblem
+        """
+        expr = self.expr
+        A = expr.A
+        self.constraints = list()
+        for k, name in enumerate(self.get_names()):
+            a, b = A.indptr[k], A.indptr[k + 1]
+            c = LpConstraint(zip([expr.variables[j] for j in A.indices[a:b]], A.data[a:b].tolist()),
+                             sense=self.sense, name=name)
+            c.constant = expr.b[k]
+            problem.addConstraint(c)
+            self.constraints.append(c)
+
+    def get_pi(self):
+        """
+        Dual values of the constraints
+        :return: numpy array of the block shape (nan if not available)
+        """
+        val = np.full(self.expr.size, np.nan)
+        if self.constraints is not None:
+            for k, c in enumerate(self.constraints):
+                if c.pi is not None:
+                    val[k] = c.pi
+        return val.reshape(self.shape)
 
-        for k in range(cols_vec):  # for each column of the matrix "vec", do the matrix vector product
-            for i in range(n_cols):
-                for ii in range(mat_2.indptr[i], mat_2.indptr[i + 1]):
-                    j = mat_2.indices[ii]  # row index
-                    res[j, k] += mat_2.data[ii] * arr[i, k]  # C.data[ii] is equivalent to C[i, j]
-    return res
+
+def lpDot(mat, arr):
+    """
+    CSC matrix-vector or CSC matrix-matrix dot product (A x b)
+    :param mat: sparse matrix (A)
+    :param arr: dense vector or matrix of object type, or LpExpressionArray (b)
+    :return: LpExpressionArray with the result of the product (or numeric array if b is numeric)
+    """
+    n_rows, n_cols = mat.shape
+
+    # check dimensional compatibility
+    assert (n_cols == arr.shape[0])
+
+    if not isinstance(arr, LpExpressionArray) and np.asarray(arr).dtype != object:
+        return mat * arr
+
+    return LpExpressionArray.from_array(arr).dot(mat)
 
 
 def lpAddRestrictions(problem: LpProblem, arr, name):
@@ -88,44 +427,33 @@ def lpAddRestrictions(problem: LpProblem, arr, name):
 def lpAddRestrictions2(problem: LpProblem, lhs, rhs, name, op='='):
     """
     Add vector or matrix of restrictions to the problem
+    The restrictions are stored as a columnar block that is converted to LpConstraints when the problem is solved
     :param problem: instance of LpProblem
-    :param lhs: 1D array (left hand side)
-    :param rhs: 1D or 2D array (right hand side)
+    :param lhs: 1D or 2D array or LpExpressionArray (left hand side)
+    :param rhs: 1D or 2D array or LpExpressionArray (right hand side)
     :param name: name of the restriction    
     :param op: type of restriction (=, <=, >=)
+    :return: array of references to the restrictions (LpConstraintRef) with the shape of lhs
     """
 
     assert(lhs.shape == rhs.shape)
 
-    arr = np.empty(lhs.shape, dtype=object)
-
-    if len(lhs.shape) == 1:
-
-        for i in range(lhs.shape[0]):
-            if op == '=':
-                arr[i] = lhs[i] == rhs[i]
-
-            elif op == '<=':
-                arr[i] = lhs[i] <= rhs[i]
-
-            elif op == '>=':
-                arr[i] = lhs[i] >= rhs[i]
-
-    elif len(lhs.shape) == 2:
-
-        for i, j in product(range(lhs.shape[0]), range(lhs.shape[1])):
-            if op == '=':
-                arr[i, j] = lhs[i, j] == rhs[i, j]
+    if op == '=':
+        sense = LpConstraintEQ
+    elif op == '<=':
+        sense = LpConstraintLE
+    elif op == '>=':
+        sense = LpConstraintGE
+    else:
+        raise Exception('Unknown restriction type ' + str(op))
 
-            elif op == '<=':
-                arr[i, j] = lhs[i, j] <= rhs[i, j]
+    expr = LpExpressionArray.from_array(lhs) - rhs
 
-            elif op == '>=':
-                arr[i, j] = lhs[i, j] >= rhs[i, j]
+    block = LpConstraintBlock(expr=expr, sense=sense, name=name)
 
-    lpAddRestrictions(problem=problem, arr=arr, name=name)
+    problem.addConstraintBlock(block)
 
-    return arr
+    return block.refs
 
 
 def lpMakeVars(name, shape, lower=None, upper=None):
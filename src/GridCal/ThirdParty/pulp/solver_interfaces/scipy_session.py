@@ -0,0 +1,439 @@
+# This file is part of GridCal.
+#
+# GridCal is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# GridCal is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with GridCal.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+In-process LP solver session for PuLP problems.
+
+The problem is converted once to sparse arrays:
+
+    min  c x
+    s.t. row_lower <= A x <= row_upper   (the sense of each row gives which side is active)
+         lb <= x <= ub
+
+and it is kept in memory, so the right hand sides, the bounds and the costs can be modified
+and the problem re-solved without writing LP/MPS files or launching a solver binary.
+The solutions are returned as numpy arrays (primal, dual, reduced costs and basis status).
+"""
+
+import hashlib
+import numpy as np
+import scipy.sparse as sp
+from scipy.optimize import linprog
+from scipy.sparse.linalg import lsqr, splu
+
+from GridCal.ThirdParty.pulp.solvers import *
+
+# basis status codes (same convention as CPLEX and HiGHS)
+BASIS_AT_LOWER = 0
+BASIS_BASIC = 1
+BASIS_AT_UPPER = 2
+
+
+def get_linprog_method():
+    """
+    Get the best LP method available in the installed scipy
+    :return: method name
+    """
+    try:
+        from scipy.optimize import _linprog_highs
+        return 'highs'
+    except ImportError:
+        return 'interior-point'
+
+
+def get_problem_structure(lp):
+    """
+    Get the structure of a PuLP problem: variables, constraints and the coefficients of the constraints matrix
+    :param lp: LpProblem instance
+    :return: list of variables, list of constraint names, row indices, column indices, coefficients,
+             constraint senses, hash of all of them (and of the problem sense)
+    """
+    lp.materializeConstraintBlocks()
+
+    variables = lp.variables()
+    col = {id(var): j for j, var in enumerate(variables)}
+    constraint_names = list(lp.constraints.keys())
+
+    rows = list()
+    cols = list()
+    vals = list()
+    for i, constraint in enumerate(lp.constraints.values()):
+        for var, coef in constraint.items():
+            rows.append(i)
+            cols.append(col[id(var)])
+            vals.append(coef)
+    rows = np.array(rows, dtype=int)
+    cols = np.array(cols, dtype=int)
+    vals = np.array(vals, dtype=float)
+    row_sense = np.array([c.sense for c in lp.constraints.values()], dtype=int)
+
+    key = hashlib.sha1()
+    key.update('\n'.join(var.name for var in variables).encode())
+    key.update('\n'.join(str(name) for name in constraint_names).encode())
+    for arr in (rows, cols, vals, row_sense, np.array([lp.sense])):
+        key.update(arr.tobytes())
+
+    return variables, constraint_names, rows, cols, vals, row_sense, key.hexdigest()
+
+
+class LpSolverSession:
+
+    def __init__(self, lp=None, method=None, tolerance=1e-7):
+        """
+        Sparse in-memory copy of a PuLP problem that can be modified and solved repeatedly
+        :param lp: LpProblem to load (it can be loaded later with load())
+        :param method: scipy linprog method, if None the best available is used
+        :param tolerance: tolerance to decide if a variable or a row is at its bound
+        """
+        self.method = get_linprog_method() if method is None else method
+
+        self.tolerance = tolerance
+
+        self.variables = list()
+        self.constraint_names = list()
+
+        # variable name -> index, constraint name -> index
+        self.var_index = dict()
+        self.row_index = dict()
+
+        self.sense = LpMinimize
+
+        self.c = None
+        self.c0 = 0.0
+        self.A = None
+        self.row_sense = None
+        self.rhs = None
+        self.lb = None
+        self.ub = None
+
+        # solution
+        self.status = LpStatusNotSolved
+        self.message = ''
+        self.objective = 0.0
+        self.x = None
+        self.activity = None
+        self.duals = None
+        self.reduced_costs = None
+        self.col_basis = None
+        self.row_basis = None
+
+        # are the dual values exact? (if not, self.duals is NaN and the estimate is in self.duals_estimate)
+        self.duals_exact = True
+        self.duals_estimate = None
+
+        # number of solves done with the loaded model
+        self.solves = 0
+
+        # hash of the loaded problem structure (see get_problem_structure)
+        self.structure_key = None
+
+        if lp is not None:
+            self.load(lp)
+
+    @property
+    def nvar(self):
+        return len(self.variables)
+
+    @property
+    def nrow(self):
+        return len(self.constraint_names)
+
+    def load(self, lp):
+        """
+        Convert the PuLP problem to sparse arrays
+        :param lp: LpProblem instance
+        """
+        lp.materializeConstraintBlocks()
+
+        if lp.isMIP():
+            raise PulpSolverError('The solver session only solves linear problems')
+
+        self.variables, self.constraint_names, rows, cols, vals, self.row_sense, self.structure_key = \
+            get_problem_structure(lp)
+        self.var_index = {var.name: j for j, var in enumerate(self.variables)}
+        self.row_index = {name: i for i, name in enumerate(self.constraint_names)}
+
+        self.A = sp.csr_matrix((vals, (rows, cols)), shape=(self.nrow, self.nvar))
+
+        self.sense = lp.sense
+        self.read_values(lp)
+
+        self.status = LpStatusNotSolved
+        self.solves = 0
+
+    def read_values(self, lp):
+        """
+        Read the right hand sides, bounds and costs from the PuLP problem without rebuilding the matrix
+        (the problem structure must be the one loaded)
+        :param lp: LpProblem instance
+        """
+        self.rhs = np.array([-c.constant for c in lp.constraints.values()], dtype=float)
+
+        self.lb = np.array([-np.inf if var.lowBound is None else var.lowBound for var in self.variables], dtype=float)
+        self.ub = np.array([np.inf if var.upBound is None else var.upBound for var in self.variables], dtype=float)
+
+        self.c = np.zeros(self.nvar)
+        self.c0 = 0.0
+        if lp.objective is not None:
+            for var, coef in lp.objective.items():
+                self.c[self.var_index[var.name]] = coef
+            self.c0 = lp.objective.constant
+
+    def get_row_indices(self, rows):
+        """
+        Get the row indices
+        :param rows: constraint names, LpConstraints or integer indices
+        :return: array of integer indices
+        """
+        rows = np.atleast_1d(rows)
+        if rows.dtype == object or rows.dtype.kind in 'US':
+            return np.array([self.row_index[r if isinstance(r, str) else r.name] for r in rows], dtype=int)
+        return rows.astype(int)
+
+    def get_col_indices(self, cols):
+        """
+        Get the column indices
+        :param cols: variable names, LpVariables or integer indices
+        :return: array of integer indices
+        """
+        cols = np.atleast_1d(cols)
+        if cols.dtype == object or cols.dtype.kind in 'US':
+            return np.array([self.var_index[v if isinstance(v, str) else v.name] for v in cols], dtype=int)
+        return cols.astype(int)
+
+    def set_rhs(self, rows, values):
+        """
+        Modify the right hand side of some rows
+        :param rows: constraint names, LpConstraints or integer indices
+        :param values: new right hand side values
+        """
+        self.rhs[self.get_row_indices(rows)] = values
+
+    def set_bounds(self, cols, lower=None, upper=None):
+        """
+        Modify the bounds of some variables
+        :param cols: variable names, LpVariables or integer indices
+        :param lower: new lower bounds (None to leave untouched, -np.inf for unbounded)
+        :param upper: new upper bounds (None to leave untouched, np.inf for unbounded)
+        """
+        idx = self.get_col_indices(cols)
+        if lower is not None:
+            self.lb[idx] = lower
+        if upper is not None:
+            self.ub[idx] = upper
+
+    def set_cost(self, cols, values):
+        """
+        Modify the objective function coefficients of some variables
+        :param cols: variable names, LpVariables or integer indices
+        :param values: new cost values
+        """
+        self.c[self.get_col_indices(cols)] = values
+
+    def solve(self):
+        """
+        Solve the loaded problem
+        :return: PuLP status code
+        """
+        # linprog minimizes
+        sign = 1.0 if self.sense == LpMinimize else -1.0
+
+        eq = np.where(self.row_sense == LpConstraintEQ)[0]
+        le = np.where(self.row_sense == LpConstraintLE)[0]
+        ge = np.where(self.row_sense == LpConstraintGE)[0]
+        ub_rows = np.r_[le, ge]
+        ub_sign = np.r_[np.ones(len(le)), -np.ones(len(ge))]
+
+        kwargs = dict()
+        if len(eq):
+            kwargs['A_eq'] = self.A[eq, :].tocsc()
+            kwargs['b_eq'] = self.rhs[eq]
+        if len(ub_rows):
+            kwargs['A_ub'] = (sp.diags(ub_sign) * self.A[ub_rows, :]).tocsc()
+            kwargs['b_ub'] = ub_sign * self.rhs[ub_rows]
+        if self.method == 'interior-point':
+            kwargs['options'] = dict(sparse=True, presolve=True)
+
+        bounds = np.c_[np.where(np.isinf(self.lb), None, self.lb),
+                       np.where(np.isinf(self.ub), None, self.ub)]
+
+        res = linprog(c=sign * self.c, bounds=bounds, method=self.method, **kwargs)
+
+        self.solves += 1
+        self.message = res.message
+        self.status = {0: LpStatusOptimal,
+                       1: LpStatusNotSolved,
+                       2: LpStatusInfeasible,
+                       3: LpStatusUnbounded}.get(res.status, LpStatusUndefined)
+
+        self.x = np.asarray(res.x, dtype=float) if res.x is not None else np.zeros(self.nvar)
+        self.activity = self.A * self.x
+        self.objective = float(np.dot(self.c, self.x)) + self.c0
+
+        self.compute_basis()
+
+        # dual values (d objective / d rhs) of the rows
+        eqlin = getattr(res, 'eqlin', None)
+        ineqlin = getattr(res, 'ineqlin', None)
+        if eqlin is not None or ineqlin is not None:
+            self.duals_estimate = np.zeros(self.nrow)
+            if len(eq):
+                self.duals_estimate[eq] = sign * np.asarray(eqlin.marginals)
+            if len(ub_rows):
+                self.duals_estimate[ub_rows] = sign * ub_sign * np.asarray(ineqlin.marginals)
+            self.duals_exact = True
+        else:
+            self.duals_estimate, self.duals_exact = self.recover_duals()
+
+        if self.duals_exact:
+            self.duals = self.duals_estimate
+        else:
+            # do not pass an estimate as the dual values
+            self.duals = np.full(self.nrow, np.nan)
+
+        self.reduced_costs = self.c - self.A.T * self.duals
+
+        return self.status
+
+    def compute_basis(self):
+        """
+        Compute the basis status of the columns and the rows from the primal solution
+        """
+        tol = self.tolerance * (1.0 + np.abs(self.x))
+        at_lower = np.abs(self.x - self.lb) <= tol
+        at_upper = np.abs(self.ub - self.x) <= tol
+        self.col_basis = np.full(self.nvar, BASIS_BASIC, dtype=int)
+        self.col_basis[at_lower] = BASIS_AT_LOWER
+        self.col_basis[at_upper & ~at_lower] = BASIS_AT_UPPER
+
+        # the row logical is at its bound when the row is active
+        tol = self.tolerance * (1.0 + np.abs(self.rhs))
+        active = np.abs(self.activity - self.rhs) <= tol
+        self.row_basis = np.full(self.nrow, BASIS_BASIC, dtype=int)
+        self.row_basis[self.row_sense == LpConstraintEQ] = BASIS_AT_LOWER
+        self.row_basis[active & (self.row_sense == LpConstraintGE)] = BASIS_AT_LOWER
+        self.row_basis[active & (self.row_sense == LpConstraintLE)] = BASIS_AT_UPPER
+
+    def recover_duals(self):
+        """
+        Compute the dual values of the rows when the LP method does not provide them.
+        They solve the stationarity conditions A_B' y = c_B over the basic columns,
+        where only the active rows have a non zero dual value.
+        When the basis is degenerate (not square or singular) the least squares solution is
+        only an estimate that may not be dual feasible
+        :return: array of dual values, are they exact?
+        """
+        y = np.zeros(self.nrow)
+
+        if self.status != LpStatusOptimal:
+            return y, False
+
+        basic = np.where(self.col_basis == BASIS_BASIC)[0]
+        active = np.where(self.row_basis != BASIS_BASIC)[0]
+
+        if len(active) == 0:
+            # no binding rows
+            return y, True
+
+        if len(basic) == 0:
+            return y, False
+
+        M = self.A[active, :][:, basic].transpose().tocsc()
+        cB = self.c[basic]
+
+        if M.shape[0] == M.shape[1]:
+            try:
+                y[active] = splu(M).solve(cB)
+                return y, True
+            except RuntimeError:
+                # singular basis (degenerate solution)
+                pass
+
+        y[active] = lsqr(M, cB, atol=1e-14, btol=1e-14, iter_lim=10 * M.shape[1] + 100)[0]
+        return y, False
+
+    def get_solution(self):
+        """
+        Get the solution arrays
+        :return: primal values, dual values (NaN if they are not exact), column basis status, row basis status
+        """
+        return self.x, self.duals, self.col_basis, self.row_basis
+
+    def update_problem(self, lp):
+        """
+        Write the solution to the PuLP problem objects
+        :param lp: LpProblem instance (the one loaded)
+        """
+        for var, val, dj in zip(self.variables, self.x, self.reduced_costs):
+            var.varValue = val
+            var.dj = dj
+
+        for constraint, pi, act in zip(lp.constraints.values(), self.duals, self.activity):
+            constraint.pi = pi
+            constraint.slack = -constraint.constant - act
+
+        lp.status = self.status
+
+
+class SCIPY_SESSION(LpSolver):
+    """
+    In-process LP solver that keeps the problem loaded in a LpSolverSession (scipy's linprog)
+
+    The session is available (after a solve) in prob.solverModel, and prob.resolve() re-solves it
+    taking the new right hand sides, bounds and costs of the PuLP objects
+    """
+
+    def __init__(self, mip=True, msg=False, method=None, **solverParams):
+        """
+        Initializes the solver
+        :param mip: not handled (only linear problems are solved)
+        :param msg: not handled
+        :param method: scipy linprog method, if None the best available is used
+        :param solverParams: not handled
+        """
+        LpSolver.__init__(self, mip, msg)
+        self.method = method
+
+    def available(self):
+        """True if the solver is available"""
+        return True
+
+    def copy(self):
+        aCopy = LpSolver.copy(self)
+        aCopy.method = self.method
+        return aCopy
+
+    def actualSolve(self, lp, **kwargs):
+        """
+        Load the problem in a new session and solve it
+        """
+        lp.solverModel = LpSolverSession(lp, method=self.method)
+        return self.actualResolve(lp)
+
+    def actualResolve(self, lp, **kwargs):
+        """
+        Re-solve the loaded session with the current right hand sides, bounds and costs of the problem
+        """
+        session = lp.solverModel
+        if session.structure_key != get_problem_structure(lp)[-1]:
+            # the variables, the constraints or their coefficients have changed
+            session.load(lp)
+        elif session.solves > 0:
+            session.read_values(lp)
+
+        status = session.solve()
+        session.update_problem(lp)
+        lp.resolveOK = True
+        return status
@@ -13,13 +13,20 @@
 # You should have received a copy of the GNU General Public License
 # along with GridCal.  If not, see <http://www.gnu.org/licenses/>.
 import os
+from pathlib import Path
 import numpy as np
+import pandas as pd
+from scipy.interpolate import pade
 
 from GridCal.Engine.IO.file_handler import FileOpen
 from GridCal.Engine.Simulations.PowerFlow.power_flow_worker import SolverType
 from GridCal.Engine.Simulations.PowerFlow.power_flow_driver import PowerFlowOptions, PowerFlowDriver
+from GridCal.Engine.Simulations.PowerFlow.time_series_driver import TimeSeries
+from GridCal.Engine.Simulations.PowerFlow.helm_power_flow import helm, pade_approximation
 from GridCal.print_power_flow_results import print_power_flow_results
 
+GRIDS = Path(__file__).parent.parent.parent / 'Grids_and_profiles' / 'grids'
+
 
 def test_api_helm():
     np.set_printoptions(precision=4)
@@ -36,5 +43,64 @@ def test_api_helm():
     print_power_flow_results(power_flow)
 
 
+def test_helm_vs_nr():
+    """
+    HELM must reach the Newton-Raphson solution, with and without the Padé approximants
+    """
+    grid = FileOpen(str(GRIDS / 'IEEE_14.xlsx')).open()
+
+    options = PowerFlowOptions(SolverType.NR, verbose=False, tolerance=1e-9, control_q=False)
+    power_flow = PowerFlowDriver(grid, options)
+    power_flow.run()
+
+    circuit = grid.compile().compute()[0]
+    for use_pade in [False, True]:
+        V, converged, normF, Scalc, it, el = helm(Vbus=circuit.Vbus, Sbus=circuit.Sbus, Ybus=circuit.Ybus,
+                                                  pq=circuit.pq, pv=circuit.pv, ref=circuit.ref, pqpv=circuit.pqpv,
+                                                  tol=1e-9, max_coefficient_count=40, use_pade=use_pade)
+        assert converged
+        assert np.allclose(V, power_flow.results.voltage, atol=1e-6)
+
+
+def test_pade_approximation():
+    """
+    The Padé approximants of many series at once must match the approximants of every series
+    """
+    np.random.seed(0)
+    an = np.random.rand(11, 4) + 1j * np.random.rand(11, 4)
+
+    val, _, _ = pade_approximation(11, an)
+
+    for k in range(an.shape[1]):
+        p, q = pade(an[:, k], 5)
+        assert np.isclose(val[k], p(1) / q(1))
+
+
+def test_helm_time_series():
+    """
+    The HELM time series solves all the steps with one factorization and must match the Newton-Raphson time series
+    """
+    grid = FileOpen(str(GRIDS / 'IEEE_14.xlsx')).open()
+    index = pd.date_range('2020-01-01', periods=10, freq='H')
+    grid.format_profiles(index)
+    for bus in grid.buses:
+        bus.ensure_profiles_exist(index)
+    for load in grid.get_loads():
+        load.P_prof *= np.linspace(0.6, 1.2, 10)
+        load.Q_prof *= np.linspace(0.6, 1.2, 10)
+
+    results = dict()
+    for solver_type in [SolverType.NR, SolverType.HELM]:
+        options = PowerFlowOptions(solver_type, verbose=False, tolerance=1e-9, max_iter=40, multi_core=False)
+        time_series = TimeSeries(grid=grid, options=options)
+        time_series.helm_block_size = 4  # force several blocks
+        time_series.run()
+        results[solver_type] = time_series.results
+
+    assert results[SolverType.HELM].converged.all()
+    assert np.allclose(results[SolverType.HELM].voltage, results[SolverType.NR].voltage, atol=1e-6)
+    assert np.allclose(results[SolverType.HELM].S, results[SolverType.NR].S, atol=1e-6)
+
+
 if __name__ == '__main__':
     test_api_helm()
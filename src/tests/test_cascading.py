@@ -0,0 +1,70 @@
+# This file is part of GridCal.
+#
+# GridCal is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# GridCal is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with GridCal.  If not, see <http://www.gnu.org/licenses/>.
+from pathlib import Path
+
+import numpy as np
+
+from GridCal.Engine.basic_structures import ReactivePowerControlMode
+from GridCal.Engine.IO.file_handler import FileOpen
+from GridCal.Engine.Core.topology_cache import TopologyCache
+from GridCal.Engine.Simulations.PowerFlow.power_flow_worker import PowerFlowOptions
+from GridCal.Engine.Simulations.Stochastic.cascading_monte_carlo_driver import CascadingMonteCarloOptions, \
+    CascadingMonteCarlo, cascade_tree
+
+
+def test_cascading_monte_carlo():
+    """
+    Run a few cascade trees on the compiled circuit and check that the results are reproducible
+    """
+    fname = Path(__file__).parent.parent.parent / 'Grids_and_profiles' / 'grids' / 'IEEE_14.xlsx'
+    main_circuit = FileOpen(fname).open()
+
+    options = PowerFlowOptions(retry_with_other_methods=False)
+    cascade_options = CascadingMonteCarloOptions(n_trees=10, n_initial_failures=2, loading_threshold=0.5, seed=1)
+
+    driver = CascadingMonteCarlo(main_circuit, options, cascade_options)
+    driver.run()
+    res = driver.results
+    print(res.get_table())
+
+    assert len(res.trees) == 10
+    assert (res.tree_failed_branches >= 2).all()
+    assert res.branch_failures.sum() == res.tree_failed_branches.sum()
+
+    # the compiled circuit must not be modified by the cascades
+    numerical_circuit = main_circuit.compile()
+    branch_active = numerical_circuit.branch_active.copy()
+    cache = TopologyCache(numerical_circuit)
+    tree = cascade_tree(numerical_circuit, cache, options, cascade_options, tree_idx=3)
+    assert (numerical_circuit.branch_active == branch_active).all()
+
+    # same seed -> same cascade
+    assert np.array_equal(tree.get_failed_idx(), res.trees[3].get_failed_idx())
+    assert tree.load_shed == res.tree_load_shed[3]
+
+    # the reactive power control must not change the bus types of the cached islands
+    options_q = PowerFlowOptions(retry_with_other_methods=False, control_q=ReactivePowerControlMode.Direct)
+    numerical_circuit.generator_qmax[:] = 0.0
+    numerical_circuit.generator_qmin[:] = 0.0
+    cache = TopologyCache(numerical_circuit)
+    cascade_tree(numerical_circuit, cache, options_q, cascade_options, tree_idx=3)
+    for key, islands in cache.data.items():
+        branch_active = np.unpackbits(np.frombuffer(key, dtype=np.uint8))[:numerical_circuit.nbr]
+        for island, fresh in zip(islands, numerical_circuit.compute(branch_active=branch_active)):
+            assert np.array_equal(island.types, fresh.types)
+
+
+if __name__ == '__main__':
+    test_cascading_monte_carlo()
@@ -0,0 +1,146 @@
+# This file is part of GridCal.
+#
+# GridCal is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# GridCal is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with GridCal.  If not, see <http://www.gnu.org/licenses/>.
+from pathlib import Path
+import numpy as np
+
+from GridCal.Engine.IO.file_handler import FileOpen
+from GridCal.Engine.Core.multi_circuit import MultiCircuit
+from GridCal.Engine.Devices.bus import Bus
+from GridCal.Engine.Devices.branch import Branch, BranchType
+from GridCal.Engine.Devices.generator import Generator
+from GridCal.Engine.Devices.shunt import Shunt
+from GridCal.Engine.Devices.wire import Wire
+from GridCal.Engine.Devices import tower as tower_module
+from GridCal.Engine.Devices.tower import Tower, WireInTower
+from GridCal.Engine.Simulations.FrequencyScan.frequency_scan_driver import FrequencyScanOptions, FrequencyScan
+
+GRIDS = Path(__file__).parent.parent.parent / 'Grids_and_profiles' / 'grids'
+
+
+def get_two_bus_grid():
+    """
+    Generator behind a branch feeding a capacitor bank
+    :return: MultiCircuit
+    """
+    grid = MultiCircuit()
+    bus1 = Bus(name='Bus 1', vnom=20, is_slack=True)
+    bus2 = Bus(name='Bus 2', vnom=20)
+    grid.add_bus(bus1)
+    grid.add_bus(bus2)
+    grid.add_generator(bus1, Generator(name='Gen', Snom=100, Xdpp=0.2))
+    grid.add_shunt(bus2, Shunt(name='Capacitor', B=5.0))
+    grid.add_branch(Branch(bus1, bus2, name='Branch', r=0.01, x=0.05, g=0.0, b=0.0,
+                           branch_type=BranchType.Branch))
+    return grid
+
+
+def test_frequency_scan_resonance():
+    """
+    The driving point impedance of the capacitor bus must be the one of the parallel LC circuit
+    """
+    grid = get_two_bus_grid()
+    frequencies = np.linspace(10, 1000, 991)
+    options = FrequencyScanOptions(frequencies=frequencies, bus_indices=[1], multi_process=False)
+    driver = FrequencyScan(grid, options)
+    driver.run()
+
+    h = frequencies / grid.fBase
+    expected = 1.0 / (0.05j * h + 1.0 / (0.01 + 1j * (0.05 + 0.2) * h))
+    assert np.allclose(driver.results.Z[:, 0], expected)
+
+    # parallel resonance at h = 1 / sqrt(X B)
+    resonances = driver.results.get_resonances()['Bus 2']
+    assert len(resonances) == 1
+    assert abs(resonances[0] - grid.fBase / np.sqrt(0.25 * 0.05)) < 1.0
+
+
+def test_frequency_scan_base_frequency():
+    """
+    At the base frequency and without loads and generators, the scan must give the diagonal of inv(Ybus),
+    and the pool of processes must give the serial results
+    """
+    grid = FileOpen(str(GRIDS / 'IEEE_14.xlsx')).open()
+    Ybus = grid.compile().compute()[0].Ybus.toarray()
+
+    frequencies = np.r_[grid.fBase, np.linspace(60, 2500, 200)]
+    options = FrequencyScanOptions(frequencies=frequencies, long_line_correction=False, include_loads=False,
+                                   include_generators=False, multi_process=False)
+    driver = FrequencyScan(grid, options)
+    driver.run()
+    assert np.allclose(driver.results.Z[0, :], np.diag(np.linalg.inv(Ybus)))
+
+    options.multi_process = True
+    options.n_processes = 2
+    driver_mp = FrequencyScan(grid, options)
+    driver_mp.run()
+    assert np.allclose(driver.results.Z, driver_mp.results.Z)
+
+
+def test_frequency_scan_tower_line():
+    """
+    At the base frequency, a line computed from its tower must be the line with the tower values
+    """
+    tower = Tower()
+    wire = Wire(name='ACSR 6/1', gmr=0.0039, r=0.5, x=0.0)
+    for phase, xpos in zip([1, 2, 3], [0.0, 4.0, 8.0]):
+        tower.wires_in_tower.append(WireInTower(wire, xpos=xpos, ypos=15.0, phase=phase))
+    tower.compute()
+
+    grid = get_two_bus_grid()
+    line = Branch(grid.buses[0], grid.buses[1], name='Line', branch_type=BranchType.Line, length=20.0)
+    grid.add_branch(line)
+    line.apply_template(tower, grid.Sbase)
+
+    options = FrequencyScanOptions(frequencies=np.array([grid.fBase, 1000.0]), multi_process=False)
+    driver = FrequencyScan(grid, options)
+    driver.run()
+
+    # without the template, the line has its base frequency values
+    line.template = None
+    options.frequencies = np.array([grid.fBase, 1000.0])
+    driver_pi = FrequencyScan(grid, options)
+    driver_pi.run()
+
+    assert np.allclose(driver.results.Z[0, :], driver_pi.results.Z[0, :], rtol=1e-4)
+    assert not np.allclose(driver.results.Z[1, :], driver_pi.results.Z[1, :], rtol=1e-4)
+
+
+def test_frequency_scan_tower_checks():
+    """
+    The lines of an invalid tower must keep their base values with the tower reported once,
+    and the frequency vectors must not be stored in the towers cache
+    """
+    wire = Wire(name='ACSR 6/1', gmr=0.0039, r=0.5, x=0.0)
+    bad_tower = Tower(name='Bad tower')
+    for phase in [1, 2, 3]:
+        bad_tower.wires_in_tower.append(WireInTower(wire, xpos=0.0, ypos=15.0, phase=phase))
+    good_tower = Tower(name='Good tower')
+    for phase, xpos in zip([1, 2, 3], [0.0, 4.0, 8.0]):
+        good_tower.wires_in_tower.append(WireInTower(wire, xpos=xpos, ypos=15.0, phase=phase))
+
+    grid = get_two_bus_grid()
+    for i, tower in enumerate([bad_tower, bad_tower, good_tower]):
+        line = Branch(grid.buses[0], grid.buses[1], name='Line ' + str(i), r=0.01, x=0.05,
+                      branch_type=BranchType.Line, length=20.0)
+        line.template = tower
+        grid.add_branch(line)
+
+    n_cached = len(tower_module._line_constants_cache)
+    options = FrequencyScanOptions(frequencies=np.linspace(50, 1000, 20), multi_process=False)
+    driver = FrequencyScan(grid, options)
+    driver.run()
+
+    assert len(driver.logger) == 2  # the invalid tower and the number of lines computed from their tower
+    assert len(tower_module._line_constants_cache) == n_cached
@@ -0,0 +1,76 @@
+# This file is part of GridCal.
+#
+# GridCal is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# GridCal is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with GridCal.  If not, see <http://www.gnu.org/licenses/>.
+from pathlib import Path
+
+import numpy as np
+
+from GridCal.Engine.IO.file_handler import FileOpen
+from GridCal.Engine.basic_structures import SolverType
+from GridCal.Engine.Simulations.OPF.ac_opf_ipm import AcOpfIpm
+from GridCal.Engine.Simulations.OPF.opf_driver import OptimalPowerFlow, OptimalPowerFlowOptions
+
+GRIDS = Path(__file__).parent.parent.parent / 'Grids_and_profiles' / 'grids'
+
+
+def test_ac_opf_ipm():
+    """
+    The interior point AC-OPF must converge to a point that balances the non linear power flow equations
+    and respects the voltage, generation and branch limits
+    """
+    main_circuit = FileOpen(GRIDS / 'IEEE_14.xlsx').open()
+
+    for i, gen in enumerate(main_circuit.get_generators()):
+        gen.Cost = 1.0 + i
+
+    numerical_circuit = main_circuit.compile()
+    problem = AcOpfIpm(numerical_circuit=numerical_circuit)
+    status = problem.solve()
+
+    assert status == 'Optimal'
+    assert problem.converged()
+
+    # AC nodal balance: V conj(Ybus V) = Sgen - Sload
+    island = numerical_circuit.compute()[0]
+    V = problem.get_voltage()
+    Sg = problem.get_generator_power() + 1j * problem.get_generator_reactive_power()
+    S = (numerical_circuit.C_gen_bus.T * Sg - numerical_circuit.C_load_bus.T * numerical_circuit.load_power)
+    S /= main_circuit.Sbase
+    assert np.allclose(V * np.conj(island.Ybus * V), S, atol=1e-6)
+
+    # limits
+    Vm = np.abs(V)
+    assert np.all(Vm <= numerical_circuit.Vmax + 1e-6)
+    assert np.all(Vm >= numerical_circuit.Vmin - 1e-6)
+    assert np.all(problem.get_loading() <= 1.0 + 1e-6)
+    assert np.all(problem.get_generator_reactive_power() <= numerical_circuit.generator_qmax + 1e-4)
+    assert np.all(problem.get_generator_reactive_power() >= numerical_circuit.generator_qmin - 1e-4)
+
+    # the cheapest generator is dispatched first and it sets the price at its bus
+    Pg = problem.get_generator_power()
+    assert Pg[0] == Pg.max()
+    slack = np.where(numerical_circuit.C_gen_bus[0, :].toarray()[0] > 0)[0][0]
+    assert np.isclose(problem.get_shadow_prices()[slack], 1.0, atol=1e-4)
+
+    # the fill-reducing ordering is computed once for all the iterations
+    solver = problem.linear_solvers[0]
+    assert solver.symbolic_factorizations == 1
+    assert solver.numeric_factorizations == problem.iterations[0] > 1
+
+    # same results through the driver
+    options = OptimalPowerFlowOptions(solver=SolverType.IPM_OPF)
+    driver = OptimalPowerFlow(grid=main_circuit, options=options)
+    driver.run()
+    assert driver.results.converged
+    assert np.allclose(driver.results.voltage, V)
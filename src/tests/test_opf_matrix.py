@@ -0,0 +1,144 @@
+# This file is part of GridCal.
+#
+# GridCal is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# GridCal is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with GridCal.  If not, see <http://www.gnu.org/licenses/>.
+import os
+import tempfile
+from pathlib import Path
+
+import numpy as np
+
+from GridCal.Engine.IO.file_handler import FileOpen
+from GridCal.Engine.basic_structures import MIPSolvers, TimeGrouping
+from GridCal.Engine.Simulations.PowerFlow.power_flow_worker import SolverType
+from GridCal.Engine.Simulations.OPF.dc_opf_matrix import DcOpfMatrix, OpfDcMatrixTimeSeries
+from GridCal.Engine.Simulations.OPF.opf_driver import OptimalPowerFlowOptions
+from GridCal.Engine.Simulations.OPF.opf_time_series_driver import OptimalPowerFlowTimeSeries
+
+GRIDS = Path(__file__).parent.parent.parent / 'Grids_and_profiles' / 'grids'
+
+
+def test_dc_opf_matrix():
+    """
+    The matrix DC-OPF must balance the grid, respect the ratings and dispatch the cheapest generators first
+    """
+    main_circuit = FileOpen(GRIDS / 'IEEE_14.xlsx').open()
+
+    for i, gen in enumerate(main_circuit.get_generators()):
+        gen.Cost = 1.0 + i
+    for load in main_circuit.get_loads():
+        load.Cost = 1000.0
+    for branch in main_circuit.branches:
+        branch.rate = 40.0
+        branch.Cost = 100.0
+
+    numerical_circuit = main_circuit.compile()
+    problem = DcOpfMatrix(numerical_circuit=numerical_circuit)
+    status = problem.solve()
+
+    assert status == 'Optimal'
+    assert problem.converged()
+
+    # nodal balance B theta = P
+    island = numerical_circuit.compute()[0]
+    theta = -np.angle(problem.get_voltage())
+    Pg = problem.get_generator_power()
+    Pl = problem.get_load_power() - problem.get_load_shedding()
+    P = numerical_circuit.C_gen_bus.T * Pg - numerical_circuit.C_load_bus.T * Pl
+    assert np.allclose(island.Ybus.imag * theta * main_circuit.Sbase, P, atol=1e-4)
+    assert np.all(problem.get_loading() <= 1.0 + 1e-6)
+    assert np.all(problem.get_overloads() <= 1e-6)
+
+    # the MPS file has all the sections
+    file_name = os.path.join(tempfile.mkdtemp(), 'dc_opf.mps')
+    problem.write_mps(file_name)
+    with open(file_name) as f:
+        lines = [line.strip() for line in f.readlines()]
+    for section in ['ROWS', 'COLUMNS', 'RHS', 'BOUNDS', 'ENDATA']:
+        assert section in lines
+
+
+def test_dc_opf_matrix_time_series():
+    """
+    The matrix DC-OPF time series must balance every time step and keep the batteries energy equations
+    """
+    main_circuit = FileOpen(GRIDS / 'IEEE39_1W.gridcal').open()
+    numerical_circuit = main_circuit.compile()
+
+    nt = 12
+    problem = OpfDcMatrixTimeSeries(numerical_circuit=numerical_circuit, start_idx=0, end_idx=nt)
+    status = problem.solve()
+
+    assert status == 'Optimal'
+
+    # nodal balance B theta = P at every time step
+    island = numerical_circuit.compute()[0]
+    theta = -np.angle(problem.get_voltage())
+    Pg = problem.get_generator_power()
+    Pb = problem.get_battery_power()
+    Pl = problem.get_load_power() - problem.get_load_shedding()
+    assert Pg.shape == (nt, numerical_circuit.n_ctrl_gen)
+    P = Pg * numerical_circuit.C_gen_bus + Pb * numerical_circuit.C_batt_bus - Pl * numerical_circuit.C_load_bus
+    assert np.allclose(theta * island.Ybus.imag * main_circuit.Sbase, P, atol=1e-3)
+
+    # the flows exceed the ratings only by the overload slacks
+    rating = numerical_circuit.br_rate_profile[:nt, :]
+    assert np.all(problem.get_branch_power() <= rating + problem.get_overloads() * main_circuit.Sbase + 1e-4)
+
+    # E[t] = E[t-1] - dt * Pb[t] / eff (hourly profiles)
+    E = problem.get_battery_energy()
+    eff = (numerical_circuit.battery_discharge_efficiency + numerical_circuit.battery_charge_efficiency) / 2.0
+    assert np.allclose(E[1:, :], E[:-1, :] - Pb[1:, :] / eff, atol=1e-4)
+
+
+def test_dc_opf_matrix_rolling_horizon():
+    """
+    Moving the time series problem to another window must re-use the structure and give the same model
+    as formulating the window from scratch; the independent windows solved in parallel must match the sequential run
+    """
+    main_circuit = FileOpen(GRIDS / 'IEEE39_1W.gridcal').open()
+    numerical_circuit = main_circuit.compile()
+
+    problem = OpfDcMatrixTimeSeries(numerical_circuit=numerical_circuit, start_idx=0, end_idx=24)
+    energy_0 = numerical_circuit.battery_Enom * 0.3
+    problem.update(start_idx=24, end_idx=48, batteries_energy_0=energy_0)
+    assert problem.n_structure_builds == 1
+
+    reference = OpfDcMatrixTimeSeries(numerical_circuit=numerical_circuit, start_idx=24, end_idx=48,
+                                      batteries_energy_0=energy_0)
+    assert (problem.model.A_eq != reference.model.A_eq).nnz == 0
+    assert (problem.model.A_ub != reference.model.A_ub).nnz == 0
+    for name in ['c', 'lb', 'ub', 'b_eq', 'b_ub']:
+        assert np.allclose(getattr(problem.model, name), getattr(reference.model, name))
+
+    # without batteries the days are independent
+    for bus in main_circuit.buses:
+        bus.batteries = list()
+
+    options = OptimalPowerFlowOptions(solver=SolverType.DC_OPF, mip_solver=MIPSolvers.HIGHS,
+                                      grouping=TimeGrouping.Daily)
+    sequential = OptimalPowerFlowTimeSeries(grid=main_circuit, options=options, start_=0, end_=48)
+    sequential.run()
+
+    options.multi_thread = True
+    parallel = OptimalPowerFlowTimeSeries(grid=main_circuit, options=options, start_=0, end_=48)
+    parallel.run()
+
+    assert np.allclose(sequential.results.controlled_generator_power, parallel.results.controlled_generator_power)
+    assert np.allclose(sequential.results.loading, parallel.results.loading)
+
+    # the windows of a solver that has no time series formulation are reported, not crashed on
+    options.solver = SolverType.NR
+    unsupported = OptimalPowerFlowTimeSeries(grid=main_circuit, options=options, start_=0, end_=48)
+    unsupported.run()
+    assert any('Solver not supported' in str(entry) for entry in unsupported.logger)
@@ -0,0 +1,103 @@
+# This file is part of GridCal.
+#
+# GridCal is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# GridCal is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with GridCal.  If not, see <http://www.gnu.org/licenses/>.
+from pathlib import Path
+
+import numpy as np
+import scipy.sparse as sp
+from scipy.sparse.linalg import spsolve
+
+from GridCal.Engine.IO.file_handler import FileOpen
+from GridCal.Engine.Simulations.OPF.dc_opf_sc import DcScOpf
+from GridCal.Engine.Simulations.OPF.dc_opf_matrix import DcOpfMatrix
+
+GRIDS = Path(__file__).parent.parent.parent / 'Grids_and_profiles' / 'grids'
+
+
+def get_worst_contingency_overload(numerical_circuit, Bseries, rating, P, contingencies):
+    """
+    Compute the worst post-contingency overload by solving the DC power flow of every outage
+    """
+    A = (numerical_circuit.C_branch_bus_f - numerical_circuit.C_branch_bus_t).tocsc()
+    ref = numerical_circuit.compute()[0].ref[0]
+    no_slack = np.delete(np.arange(numerical_circuit.nbus), ref)
+    worst = -np.inf
+    for k in contingencies:
+        b = Bseries.copy()
+        b[k] = 0.0
+        B = (A.transpose() * sp.diags(b) * A).tocsc()
+        theta = np.zeros(numerical_circuit.nbus)
+        theta[no_slack] = spsolve(B[no_slack, :][:, no_slack], P[no_slack])
+        F = b * (A * theta)
+        worst = max(worst, (np.abs(F) - rating).max())
+    return worst
+
+
+def test_dc_sc_opf():
+    """
+    The security constrained DC-OPF must give a dispatch that holds every N-1 outage
+    adding only a few of the post-contingency constraints
+    """
+    main_circuit = FileOpen(GRIDS / 'IEEE_14.xlsx').open()
+
+    for i, gen in enumerate(main_circuit.get_generators()):
+        gen.Cost = 1.0 + i
+    for load in main_circuit.get_loads():
+        load.Cost = 1000.0
+    for branch in main_circuit.branches:
+        branch.rate = 60.0
+        branch.Cost = 100.0
+
+    numerical_circuit = main_circuit.compile()
+    problem = DcScOpf(numerical_circuit=numerical_circuit, block_size=7)
+    status = problem.solve()
+
+    assert status == 'Optimal'
+    assert problem.converged()
+    assert np.all(problem.get_overloads() <= 1e-6)
+    assert np.all(problem.get_load_shedding() <= 1e-6)
+
+    # the lazy constraints are a small fraction of the m x m post-contingency constraints
+    m = numerical_circuit.nbr
+    assert 0 < len(problem.cuts) < m * m / 10
+
+    # verify the N-1 security with the DC power flow of every outage
+    contingencies = np.where(problem.is_contingency)[0]
+    P = problem.get_injections()
+    worst = get_worst_contingency_overload(numerical_circuit, problem.Bseries, problem.rating, P, contingencies)
+    assert worst <= 1e-5
+    assert np.all(problem.get_contingency_loading() <= 1.0 + 1e-5)
+
+    # the plain DC-OPF dispatch is not N-1 secure
+    base = DcOpfMatrix(numerical_circuit=numerical_circuit)
+    base.solve()
+    P_base = (numerical_circuit.C_gen_bus.T * base.get_generator_power()
+              - numerical_circuit.C_load_bus.T * base.get_load_power()) / main_circuit.Sbase
+    assert get_worst_contingency_overload(numerical_circuit, problem.Bseries, problem.rating,
+                                          P_base, contingencies) > 1e-3
+
+    # the security costs money
+    assert problem.model.objective >= base.model.objective - 1e-6
+
+    # a grid that cannot be N-1 secure gives the least overloaded dispatch instead of an infeasible problem
+    for branch in main_circuit.branches:
+        branch.rate = 20.0
+    numerical_circuit = main_circuit.compile()
+    problem = DcScOpf(numerical_circuit=numerical_circuit, cuts_per_iteration=10)
+    status = problem.solve()
+
+    assert status == 'Optimal'
+    assert len(problem.get_contingency_overloads()) == len(problem.cuts)
+    assert problem.get_contingency_overloads().max() > 1e-3
+    assert any('post-contingency overloads' in str(entry) for entry in problem.logger)
@@ -0,0 +1,99 @@
+# This file is part of GridCal.
+#
+# GridCal is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# GridCal is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with GridCal.  If not, see <http://www.gnu.org/licenses/>.
+from pathlib import Path
+
+import numpy as np
+
+from GridCal.Engine.basic_structures import ReactivePowerControlMode
+from GridCal.Engine.IO.file_handler import FileOpen
+from GridCal.Engine.Core.topology_cache import TopologyCache
+from GridCal.Engine.Simulations.OPF.dc_opf import DcOpf
+from GridCal.Engine.Simulations.OPF.ac_opf import AcOpf
+from GridCal.Engine.Simulations.OPF.dc_opf_ts import OpfDcTimeSeries
+from GridCal.Engine.Simulations.OPF.ac_opf_ts import OpfAcTimeSeries
+from GridCal.Engine.Simulations.PowerFlow.power_flow_driver import PowerFlowDriver, PowerFlowOptions
+
+GRIDS = Path(__file__).parent.parent.parent / 'Grids_and_profiles' / 'grids'
+
+
+def test_opf_with_topology_cache():
+    """
+    The OPF formulations must take the islands from the shared topology cache instead of computing them
+    """
+    main_circuit = FileOpen(GRIDS / 'IEEE39_1W.gridcal').open()
+    numerical_circuit = main_circuit.compile()
+    topology_cache = TopologyCache(numerical_circuit)
+
+    # count the topological computations
+    calls = {'compute': 0, 'compute_ts': 0}
+    compute = numerical_circuit.compute
+    compute_ts = numerical_circuit.compute_ts
+
+    def counted_compute(*args, **kwargs):
+        calls['compute'] += 1
+        return compute(*args, **kwargs)
+
+    def counted_compute_ts(*args, **kwargs):
+        calls['compute_ts'] += 1
+        return compute_ts(*args, **kwargs)
+
+    numerical_circuit.compute = counted_compute
+    numerical_circuit.compute_ts = counted_compute_ts
+
+    for i in range(2):
+        DcOpf(numerical_circuit=numerical_circuit, calculation_inputs=topology_cache.get_islands())
+        AcOpf(numerical_circuit=numerical_circuit, calculation_inputs=topology_cache.get_islands())
+        OpfDcTimeSeries(numerical_circuit=numerical_circuit, start_idx=0, end_idx=4,
+                        calc_inputs_dict=topology_cache.get_islands_ts())
+        OpfAcTimeSeries(numerical_circuit=numerical_circuit, start_idx=0, end_idx=4,
+                        calc_inputs_dict=topology_cache.get_islands_ts())
+
+    assert calls['compute'] == 1
+    assert calls['compute_ts'] == 1
+
+    # without islands every formulation computes its own, only once
+    DcOpf(numerical_circuit=numerical_circuit)
+    assert calls['compute'] == 2
+
+    # the power flow gives the same results with the shared cache
+    options = PowerFlowOptions()
+    power_flow = PowerFlowDriver(main_circuit, options)
+    power_flow.run()
+
+    power_flow_cached = PowerFlowDriver(main_circuit, options, topology_cache=topology_cache)
+    power_flow_cached.run()
+
+    assert calls['compute'] == 2
+    assert np.allclose(power_flow.results.voltage, power_flow_cached.results.voltage)
+
+    # the reactive power control changes the bus types of the islands it solves, but not the cached ones
+    island = topology_cache.get_islands()[0]
+    types = island.types.copy()
+    Ybus = island.Ybus
+    options_q = PowerFlowOptions(control_q=ReactivePowerControlMode.Direct)
+    for gen in main_circuit.get_generators():
+        gen.Qmax = 0.0
+        gen.Qmin = 0.0
+    PowerFlowDriver(main_circuit, options_q, topology_cache=topology_cache).run()
+    assert np.all(island.types == types)
+    assert island.Ybus is Ybus
+
+    # the cache is not used when it was computed with other settings than the options
+    options_ignore = PowerFlowOptions(ignore_single_node_islands=True)
+    power_flow_other = PowerFlowDriver(main_circuit, options_ignore, topology_cache=topology_cache)
+    power_flow_other.run()
+    assert calls['compute'] == 2
+    assert any('other settings' in str(entry) for entry in power_flow_other.logger)
+    assert np.allclose(power_flow.results.voltage, power_flow_other.results.voltage)
@@ -0,0 +1,65 @@
+# This file is part of GridCal.
+#
+# GridCal is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# GridCal is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with GridCal.  If not, see <http://www.gnu.org/licenses/>.
+from pathlib import Path
+import numpy as np
+
+from GridCal.Engine.IO.file_handler import FileOpen
+from GridCal.Engine.basic_structures import ReactivePowerControlMode
+from GridCal.Engine.Simulations.PowerFlow.power_flow_driver import PowerFlowOptions
+from GridCal.Engine.Simulations.Optimization.parallel_evaluation import ProcessEvaluator
+from GridCal.Engine.Simulations.Optimization.optimization_driver import Optimize
+from GridCal.Engine.Simulations.Optimization.voltage_set_points import SetPointsOptimizationProblem, \
+    set_points_objective
+
+GRIDS = Path(__file__).parent.parent.parent / 'Grids_and_profiles' / 'grids'
+
+
+def test_set_points_parallel_gradient():
+    """
+    The gradient evaluated as a batch in a pool of processes must be the one evaluated serially
+    """
+    grid = FileOpen(str(GRIDS / 'IEEE_14.xlsx')).open()
+    options = PowerFlowOptions(control_q=ReactivePowerControlMode.NoControl)
+    problem = SetPointsOptimizationProblem(grid, options)
+
+    grad_serial = problem.gradient(problem.x0)
+
+    problem.evaluator = ProcessEvaluator(function=set_points_objective,
+                                         kwargs=problem.get_objective_data(),
+                                         n_processes=2)
+    try:
+        grad_parallel = problem.gradient(problem.x0)
+    finally:
+        problem.evaluator.close()
+
+    assert np.allclose(grad_serial, grad_parallel)
+    assert np.abs(grad_serial).max() > 0
+    assert problem.it == 2 * (problem.dim + 1)
+
+
+def test_optimize_workers():
+    """
+    The surrogate optimization must complete its evaluations with process workers and with socket workers
+    """
+    grid = FileOpen(str(GRIDS / 'IEEE 30 Bus with storage.xlsx')).open()
+    for elm in grid.buses + grid.branches:
+        elm.ensure_profiles_exist(grid.time_profile)
+
+    for use_sockets in [False, True]:
+        driver = Optimize(grid, PowerFlowOptions(), max_iter=70, n_processes=2, use_sockets=use_sockets)
+        driver.run()
+
+        assert len(driver.optimization_values) == 70
+        assert len(driver.solution) == len(grid.buses)
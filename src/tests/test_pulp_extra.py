@@ -0,0 +1,123 @@
+# This file is part of GridCal.
+#
+# GridCal is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# GridCal is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with GridCal.  If not, see <http://www.gnu.org/licenses/>.
+from pathlib import Path
+
+import numpy as np
+import scipy.sparse as sp
+
+from GridCal.Engine.IO.file_handler import FileOpen
+from GridCal.Engine.Simulations.OPF.dc_opf import DcOpf
+from GridCal.ThirdParty.pulp import LpProblem, LpExpressionArray, lpDot, lpAddRestrictions2, lpMakeVars
+
+GRIDS = Path(__file__).parent.parent.parent / 'Grids_and_profiles' / 'grids'
+
+
+def naive_dot(mat, arr):
+    """
+    Element by element matrix product of LpVars
+    """
+    mat = sp.csc_matrix(mat)
+    res = np.zeros((mat.shape[0],) + arr.shape[1:], dtype=object)
+    for i in range(mat.shape[0]):
+        for j in range(mat.shape[1]):
+            if mat[i, j] != 0:
+                res[i] += mat[i, j] * arr[j]
+    return res
+
+
+def coefficients(expr):
+    """
+    Dictionary of coefficients of an LpAffineExpression (by variable name) plus the constant
+    """
+    d = {var.name: coef for var, coef in expr.items() if coef != 0}
+    return d, expr.constant
+
+
+def test_lp_dot():
+    """
+    The columnar product must give the same expressions as the element by element product
+    """
+    np.random.seed(0)
+    mat = sp.random(7, 5, density=0.4, format='csc')
+    x = lpMakeVars('x', shape=5, lower=-1, upper=1)
+    y = lpMakeVars('y', shape=(5, 3), lower=-1, upper=1)
+    c = np.random.rand(7)
+
+    for arr in [x, y]:
+        res = lpDot(mat, arr)
+        assert isinstance(res, LpExpressionArray)
+        assert res.shape == (7,) + arr.shape[1:]
+        expected = naive_dot(mat, arr).ravel()
+        for a, b in zip(res.to_array().ravel(), expected):
+            da, ca = coefficients(a)
+            db, cb = coefficients(b)
+            assert da.keys() == db.keys()
+            assert np.allclose([da[k] for k in da], [db[k] for k in da])
+
+    # arithmetic with numbers and arrays of LpVars
+    res = lpDot(mat, x) * 2.0 - c + lpDot(mat, x)
+    expected = naive_dot(mat, x) * 3.0 - c
+    for a, b in zip(res.to_array(), expected):
+        da, ca = coefficients(a)
+        db, cb = coefficients(b)
+        assert da.keys() == db.keys()
+        assert np.allclose([da[k] for k in da], [db[k] for k in da])
+        assert np.isclose(ca, cb)
+
+    # numeric arrays are multiplied as usual
+    assert np.allclose(lpDot(mat, c[:5]), mat * c[:5])
+
+
+def test_lp_add_restrictions():
+    """
+    The constraint blocks must be created as LpConstraints only when the problem is written or solved
+    """
+    mat = sp.csc_matrix(np.array([[1.0, 2.0, 0.0], [0.0, -1.0, 3.0]]))
+    x = lpMakeVars('x', shape=3, lower=0, upper=10)
+    problem = LpProblem('test')
+    problem += x.sum()
+
+    refs = lpAddRestrictions2(problem=problem, lhs=lpDot(mat, x), rhs=np.array([1.0, 2.0]), name='r', op='<=')
+    assert len(problem.constraints) == 0
+    assert refs.shape == (2,)
+    assert refs[0].pi is None
+
+    assert problem.numConstraints() == 2
+    c = problem.constraints['r_1']
+    assert coefficients(c) == ({'x_0': 1.0, 'x_1': 2.0}, -1.0)
+    assert str(refs[1].constraint) == str(x[1] * -1.0 + 3.0 * x[2] <= 2.0)
+
+    # the values are computed with the columnar form
+    for i, var in enumerate(x):
+        var.varValue = float(i)
+    assert np.allclose([r.value() for r in refs], mat * np.arange(3) - np.array([1.0, 2.0]))
+
+
+def test_dc_opf_formulation():
+    """
+    The DC-OPF written with the constraint blocks must have one constraint per restriction
+    """
+    main_circuit = FileOpen(GRIDS / 'IEEE_14.xlsx').open()
+    numerical_circuit = main_circuit.compile()
+    opf = DcOpf(numerical_circuit=numerical_circuit)
+    problem = opf.problem
+
+    n = numerical_circuit.nbus
+    m = numerical_circuit.nbr
+    assert problem.numConstraints() == n + 1 + 2 * m
+
+    # the nodal balance of the slack contains the power of the slack generator
+    slack = problem.constraints['Nodal_power_balance_vd_is0_1']
+    assert 'Pg_0' in [var.name for var in slack.keys()]
@@ -0,0 +1,130 @@
+# This file is part of GridCal.
+#
+# GridCal is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# GridCal is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with GridCal.  If not, see <http://www.gnu.org/licenses/>.
+from pathlib import Path
+
+import numpy as np
+
+from GridCal.Engine.IO.file_handler import FileOpen
+from GridCal.Engine.basic_structures import MIPSolvers
+from GridCal.Engine.Simulations.OPF.dc_opf import DcOpf
+from GridCal.Engine.Simulations.OPF.dc_opf_matrix import DcOpfMatrix
+from GridCal.ThirdParty.pulp import *
+
+GRIDS = Path(__file__).parent.parent.parent / 'Grids_and_profiles' / 'grids'
+
+
+def test_solver_session():
+    """
+    The session must keep the problem loaded and re-solve it after modifying the right hand sides and bounds
+    """
+    x = LpVariable('x', 0, 4)
+    y = LpVariable('y', 0, None)
+    problem = LpProblem('session', LpMinimize)
+    problem += 2 * x + 3 * y
+    problem += x + y >= 5, 'demand'
+    problem += x - y <= 1, 'difference'
+
+    status = problem.solve(SCIPY_SESSION())
+    assert LpStatus[status] == 'Optimal'
+    assert np.isclose(x.value(), 3.0)
+    assert np.isclose(y.value(), 2.0)
+    assert np.isclose(problem.constraints['demand'].pi, 2.5)
+    assert np.isclose(problem.constraints['difference'].pi, -0.5)
+
+    session = problem.solverModel
+    primal, dual, col_basis, row_basis = session.get_solution()
+    assert np.allclose(primal, [3.0, 2.0])
+    assert np.allclose(dual, [2.5, -0.5])
+    assert np.all(col_basis == BASIS_BASIC)
+    assert np.all(row_basis == [BASIS_AT_LOWER, BASIS_AT_UPPER])
+
+    # modify the PuLP objects and re-solve the loaded session
+    problem.constraints['demand'].constant = -7
+    problem.resolve()
+    assert problem.solverModel is session
+    assert session.solves == 2
+    assert np.isclose(x.value(), 4.0)
+    assert np.isclose(y.value(), 3.0)
+
+    # a coefficient change keeps the shape of the problem, but it must be loaded again
+    problem.constraints['demand'][y] = 2
+    problem.resolve()
+    assert session.solves == 1
+    assert np.isclose(x.value(), 0.0, atol=1e-6)
+    assert np.isclose(y.value(), 3.5)
+    problem.constraints['demand'][y] = 1
+    problem.resolve()
+
+    # modify the session directly
+    session.set_rhs(['demand'], [3.0])
+    session.set_bounds([x], upper=[1.0])
+    session.solve()
+    assert np.allclose(session.x, [1.0, 2.0])
+    assert np.allclose(session.duals, [3.0, 0.0])
+    assert np.all(session.col_basis == [BASIS_AT_UPPER, BASIS_BASIC])
+    assert np.isclose(session.objective, 8.0)
+
+
+def test_solver_session_degenerate_duals():
+    """
+    The dual values that can not be determined exactly must be flagged instead of returned as shadow prices
+    """
+    x = LpVariable('x', 0, 1)
+    y = LpVariable('y', 0, 1)
+    problem = LpProblem('degenerate', LpMinimize)
+    problem += x + y
+    problem += x + y >= 1, 'demand'
+
+    problem.solve(SCIPY_SESSION())
+    session = problem.solverModel
+    assert np.isclose(session.objective, 1.0)
+
+    if session.method != 'highs':
+        # the optimal point is in the middle of a face, so the basis is not square
+        assert not session.duals_exact
+        assert np.isnan(session.duals).all()
+        assert np.isnan(problem.constraints['demand'].pi)
+        assert np.isclose(session.duals_estimate[0], 1.0)
+
+
+def test_dc_opf_session():
+    """
+    The PuLP DC-OPF solved in-process must match the matrix DC-OPF
+    """
+    main_circuit = FileOpen(GRIDS / 'IEEE_14.xlsx').open()
+
+    for i, gen in enumerate(main_circuit.get_generators()):
+        gen.Cost = 1.0 + i
+    for load in main_circuit.get_loads():
+        load.Cost = 1000.0
+    for branch in main_circuit.branches:
+        branch.rate = 60.0
+        branch.Cost = 100.0
+
+    numerical_circuit = main_circuit.compile()
+    problem = DcOpf(numerical_circuit=numerical_circuit, solver=MIPSolvers.HIGHS)
+    status = problem.solve()
+    assert status == 'Optimal'
+
+    reference = DcOpfMatrix(numerical_circuit=numerical_circuit)
+    reference.solve()
+
+    assert np.isclose(value(problem.problem.objective), reference.model.objective, atol=1e-6)
+    assert np.allclose(problem.get_generator_power(), reference.get_generator_power(), atol=1e-4)
+
+    # the price at the slack bus is the cost of the cheapest generator and the congestion rises the rest
+    prices = problem.get_shadow_prices()
+    assert np.isclose(prices[0], 1.0, atol=1e-6)
+    assert np.all(prices >= 1.0 - 1e-6)
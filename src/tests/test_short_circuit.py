@@ -0,0 +1,251 @@
+# This file is part of GridCal.
+#
+# GridCal is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# GridCal is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with GridCal.  If not, see <http://www.gnu.org/licenses/>.
+from pathlib import Path
+
+import numpy as np
+from scipy.sparse.linalg import inv
+
+from GridCal.Engine.IO.file_handler import FileOpen
+from GridCal.Engine.Simulations.PowerFlow.power_flow_driver import PowerFlowDriver, PowerFlowOptions
+from GridCal.Engine.basic_structures import FaultType
+from GridCal.Engine.Devices.branch import BranchType
+from GridCal.Engine.Devices.types import WindingsConnection
+from GridCal.Engine.Simulations.ShortCircuit.short_circuit import short_circuit_3p, factorize_ybus, \
+    get_zbus_diagonal, short_circuit_unbalanced
+from GridCal.Engine.Simulations.ShortCircuit.short_circuit_driver import ShortCircuitOptions, ShortCircuit
+
+FNAME = Path(__file__).parent.parent.parent / 'Grids_and_profiles' / 'grids' / 'IEEE_14.xlsx'
+
+
+def test_short_circuit_factorized():
+    """
+    The short circuit computed with the Ybus factorization must match the one computed with the dense Zbus
+    """
+    main_circuit = FileOpen(FNAME).open()
+
+    pf_options = PowerFlowOptions()
+    power_flow = PowerFlowDriver(main_circuit, pf_options)
+    power_flow.run()
+
+    bus_index = [3, 8]
+    sc_options = ShortCircuitOptions(bus_index=bus_index)
+    sc = ShortCircuit(grid=main_circuit, options=sc_options, pf_options=pf_options, pf_results=power_flow.results)
+    sc.run()
+
+    # dense reference
+    calculation_inputs = main_circuit.compile().compute()[0]
+    Zbus = inv(calculation_inputs.Ybus.tocsc()).toarray()
+    Zf = ShortCircuit.compile_zf(main_circuit)
+    V, SCpower = short_circuit_3p(bus_idx=bus_index, Zbus=Zbus, Vbus=power_flow.results.voltage, Zf=Zf,
+                                  baseMVA=calculation_inputs.Sbase)
+
+    assert np.allclose(sc.results.voltage, V)
+    assert np.allclose(sc.results.short_circuit_power, SCpower)
+
+    # diagonal of Zbus by blocks
+    Ybus_lu = factorize_ybus(calculation_inputs.Ybus)
+    assert np.allclose(get_zbus_diagonal(Ybus_lu, block_size=4), np.diag(Zbus))
+
+
+def test_short_circuit_sweep():
+    """
+    The bus faults of the sweep must match the Zbus diagonal, and the analytic mid-line fault must match
+    the Thevenin impedance of the grid where the line is split at the fault location
+    """
+    main_circuit = FileOpen(FNAME).open()
+
+    # without charging the line ends are the only shunt elements of the faulted line, so the split is exact
+    br_idx = 0
+    x = 0.3
+    branch = main_circuit.branches[br_idx]
+    branch.B = 0.0
+    branch.G = 0.0
+
+    pf_options = PowerFlowOptions()
+    power_flow = PowerFlowDriver(main_circuit, pf_options)
+    power_flow.run()
+
+    sc_options = ShortCircuitOptions(branch_index=[br_idx], branch_fault_locations=[x],
+                                     branch_fault_impedance=[0j], sweep=True, sweep_block_size=5)
+    sc = ShortCircuit(grid=main_circuit, options=sc_options, pf_options=pf_options, pf_results=power_flow.results)
+    sc.run()
+
+    n = len(main_circuit.buses)
+    assert sc.results.n_faults == n + 1
+    assert sc.results.converged.all()
+
+    # bus faults
+    calculation_inputs = main_circuit.compile().compute()[0]
+    Zbus = inv(calculation_inputs.Ybus.tocsc()).toarray()
+    Zf = ShortCircuit.compile_zf(main_circuit)
+    V = power_flow.results.voltage
+    assert np.allclose(sc.results.Zth[:n], np.diag(Zbus))
+    assert np.allclose(sc.results.Ik[:n], V / (np.diag(Zbus) + Zf))
+
+    # mid-line fault against the split grid
+    grid2 = FileOpen(FNAME).open()
+    grid2.branches[br_idx].B = 0.0
+    grid2.branches[br_idx].G = 0.0
+    br1, br2, middle_bus = ShortCircuit.split_branch(branch=grid2.branches[br_idx], fault_position=x,
+                                                     r_fault=0.0, x_fault=0.0)
+    grid2.add_bus(middle_bus)
+    grid2.add_branch(br1)
+    grid2.add_branch(br2)
+    Ybus2 = grid2.compile().compute()[0].Ybus
+    Zth2 = inv(Ybus2.tocsc()).toarray()[n, n]
+    f = main_circuit.buses.index(branch.bus_from)
+    t = main_circuit.buses.index(branch.bus_to)
+
+    assert np.isclose(sc.results.Zth[n], Zth2)
+    assert np.isclose(sc.results.Vpre[n], (1 - x) * V[f] + x * V[t])
+    assert sc.results.get_table().shape == (n + 1, 14)
+
+
+def test_short_circuit_sweep_tapped_branch():
+    """
+    The mid-branch faults of branches with a tap ratio are not computed (the ratio has no mid-point), and are logged
+    """
+    main_circuit = FileOpen(FNAME).open()
+    k = [i for i, br in enumerate(main_circuit.branches) if br.tap_module != 1.0][0]
+
+    pf_options = PowerFlowOptions()
+    power_flow = PowerFlowDriver(main_circuit, pf_options)
+    power_flow.run()
+
+    sc_options = ShortCircuitOptions(bus_index=[0], branch_index=[0, k], branch_fault_locations=[0.5, 0.5],
+                                     branch_fault_impedance=[0j, 0j], sweep=True)
+    sc = ShortCircuit(grid=main_circuit, options=sc_options, pf_options=pf_options, pf_results=power_flow.results)
+    sc.run()
+
+    assert list(sc.results.converged) == [True, True, False]
+    assert len(sc.logger) == 1 + len(main_circuit.branches)
+
+
+def test_short_circuit_unbalanced():
+    """
+    Check the phase conditions of the unbalanced faults and the fault levels of the sweep
+    """
+    main_circuit = FileOpen(FNAME).open()
+    for branch in main_circuit.branches:
+        branch.R0 = 3 * branch.R
+        branch.X0 = 3 * branch.X
+        branch.B0 = 0.6 * branch.B
+
+    pf_options = PowerFlowOptions()
+    power_flow = PowerFlowDriver(main_circuit, pf_options)
+    power_flow.run()
+    V = power_flow.results.voltage
+
+    calculation_inputs = main_circuit.compile().compute()[0]
+    Ybus_lu = factorize_ybus(calculation_inputs.Ybus)
+    Ybus0_lu = factorize_ybus(calculation_inputs.Ybus0)
+    k = 4
+
+    # bolted line to ground fault: no voltage at the faulted phase and no current in the others
+    Vabc, Iabc = short_circuit_unbalanced(k, Ybus_lu, Ybus0_lu, V, 0j, FaultType.LG)
+    assert np.isclose(Vabc[k, 0], 0)
+    assert np.allclose(Iabc[1:], 0)
+
+    # bolted line to line fault: same voltage at the faulted phases and opposite currents
+    Vabc, Iabc = short_circuit_unbalanced(k, Ybus_lu, Ybus0_lu, V, 0j, FaultType.LL)
+    assert np.isclose(Vabc[k, 1], Vabc[k, 2])
+    assert np.isclose(Iabc[0], 0)
+    assert np.isclose(Iabc[1], -Iabc[2])
+
+    # bolted double line to ground fault: no voltage at the faulted phases
+    Vabc, Iabc = short_circuit_unbalanced(k, Ybus_lu, Ybus0_lu, V, 0j, FaultType.LLG)
+    assert np.allclose(Vabc[k, 1:], 0)
+    assert np.isclose(Iabc[0], 0)
+
+    # sweep of all the buses and fault types
+    sc_options = ShortCircuitOptions(sweep=True)
+    sc = ShortCircuit(grid=main_circuit, options=sc_options, pf_options=pf_options, pf_results=power_flow.results)
+    sc.run()
+    Zf = ShortCircuit.compile_zf(main_circuit)
+    Z1 = sc.results.Zth
+    Z0 = get_zbus_diagonal(Ybus0_lu)
+    assert np.allclose(sc.results.Z0, Z0)
+    assert np.allclose(sc.results.Imax[FaultType.LG], np.abs(3 * V / (Z0 + 2 * Z1 + 3 * Zf)))
+    assert np.allclose(sc.results.Imax[FaultType.ph3], np.abs(sc.results.Ik))
+
+
+
+def test_short_circuit_unbalanced_driver():
+    """
+    The simultaneous fault mode must dispatch on the fault type and log the branches without zero-sequence data
+    """
+    main_circuit = FileOpen(FNAME).open()
+
+    pf_options = PowerFlowOptions()
+    power_flow = PowerFlowDriver(main_circuit, pf_options)
+    power_flow.run()
+    V = power_flow.results.voltage
+    k = 4
+
+    sc_options = ShortCircuitOptions(bus_index=[k], fault_type=FaultType.LG)
+    sc = ShortCircuit(grid=main_circuit, options=sc_options, pf_options=pf_options, pf_results=power_flow.results)
+    sc.run()
+
+    calculation_inputs = main_circuit.compile().compute()[0]
+    Ybus_lu = factorize_ybus(calculation_inputs.Ybus)
+    Ybus0_lu = factorize_ybus(calculation_inputs.Ybus0)
+    Zf = ShortCircuit.compile_zf(main_circuit)
+    Vabc, Iabc = short_circuit_unbalanced(k, Ybus_lu, Ybus0_lu, V, Zf[k], FaultType.LG)
+
+    assert np.allclose(sc.results.voltage_abc, Vabc)
+    assert np.allclose(sc.results.fault_current_abc, Iabc)
+    assert np.isclose(abs(sc.results.short_circuit_power[k]), abs(V[k]) * abs(Iabc[0]) * main_circuit.Sbase)
+    assert len(sc.logger) == len(main_circuit.branches)
+
+
+def test_zero_sequence_transformer_connection():
+    """
+    Only the grounded star windings carry zero-sequence currents: a delta winding opens the series path, and
+    a grounded star facing a delta grounds its bus through the transformer impedance
+    """
+    ybus0 = dict()
+    for conn in [WindingsConnection.GG, WindingsConnection.DD, WindingsConnection.DG]:
+        main_circuit = FileOpen(FNAME).open()
+        k = [i for i, br in enumerate(main_circuit.branches) if br.branch_type == BranchType.Transformer][0]
+        branch = main_circuit.branches[k]
+        branch.R0 = 0.01
+        branch.X0 = 0.2
+        branch.conn = conn
+        f = main_circuit.buses.index(branch.bus_from)
+        t = main_circuit.buses.index(branch.bus_to)
+        numerical_circuit = main_circuit.compile()
+        calculation_inputs = numerical_circuit.compute()[0]
+        ybus0[conn] = calculation_inputs.Ybus0.toarray()
+        Yf0 = calculation_inputs.Yf0.toarray()
+        tap_t = numerical_circuit.tap_t[k]
+
+    assert ybus0[WindingsConnection.GG][f, t] != 0
+
+    assert ybus0[WindingsConnection.DD][f, t] == 0
+    assert np.isclose(ybus0[WindingsConnection.DD][t, t] - ybus0[WindingsConnection.DG][t, t],
+                      -1.0 / (0.01 + 0.2j) / (tap_t * tap_t))
+
+    assert ybus0[WindingsConnection.DG][f, t] == 0
+    assert ybus0[WindingsConnection.DG][f, f] == ybus0[WindingsConnection.DD][f, f]
+    assert np.allclose(Yf0[k, :], 0)
+
+
+if __name__ == '__main__':
+    test_short_circuit_factorized()
+    test_short_circuit_sweep()
+    test_short_circuit_sweep_tapped_branch()
+    test_short_circuit_unbalanced()
+    test_short_circuit_unbalanced_driver()
+    test_zero_sequence_transformer_connection()
@@ -0,0 +1,79 @@
+# This file is part of GridCal.
+#
+# GridCal is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# GridCal is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with GridCal.  If not, see <http://www.gnu.org/licenses/>.
+import os
+import time
+import multiprocessing
+import numpy as np
+from poap.strategy import FixedSampleStrategy
+
+from GridCal.Engine.Replacements.tcpserve import ThreadedTCPServer, SimpleSocketWorker, LocalSocketWorkers, \
+    marshall_message, unmarshall_message
+
+
+def _crash_once_worker(sockname, crashed):
+    """
+    Socket worker whose first evaluation (among all the workers) kills its process
+    """
+    def objective(x):
+        with crashed.get_lock():
+            first = crashed.value == 0
+            crashed.value = 1
+        if first:
+            os._exit(1)
+        time.sleep(0.05)
+        return float(np.sum(x ** 2))
+
+    SimpleSocketWorker(objective, sockname, retries=5).run()
+
+
+def test_binary_messages():
+    """
+    The parameter vectors and the values must go through the wire format unchanged
+    """
+    x = np.random.rand(5000)
+    msg = marshall_message('eval', 2 ** 63 + 5, (x,))
+    assert len(msg) < x.nbytes + 32
+
+    name, record_id, params = unmarshall_message(msg)
+    assert name == 'eval' and record_id == 2 ** 63 + 5
+    assert np.array_equal(params[0], x)
+
+    assert unmarshall_message(marshall_message('complete', 7, 0.25)) == ('complete', 7, 0.25)
+    assert unmarshall_message(marshall_message('kill', 7)) == ('kill', 7)
+
+
+def test_local_socket_workers_restart():
+    """
+    A worker that dies must be restarted and its evaluation retried, so that all the points are evaluated
+    """
+    points = [np.random.rand(2000) for _ in range(20)]
+    server = ThreadedTCPServer(strategy=FixedSampleStrategy(points), max_retries=2)
+
+    crashed = multiprocessing.Value('i', 0)
+    workers = LocalSocketWorkers(server, target=_crash_once_worker, args=(crashed,), n_workers=2,
+                                 check_interval=0.1)
+    workers.start()
+    try:
+        server.run()
+    finally:
+        server.server_close()
+        workers.stop()
+
+    records = server.controller.fevals
+    assert workers.restarts == 1
+    assert len(records) == len(points)
+    assert all(r.status == 'completed' for r in records)
+    for r in records:
+        assert np.isclose(r.value, np.sum(r.params[0] ** 2))
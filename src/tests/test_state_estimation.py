@@ -0,0 +1,139 @@
+# This file is part of GridCal.
+#
+# GridCal is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# GridCal is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with GridCal.  If not, see <http://www.gnu.org/licenses/>.
+from pathlib import Path
+
+import numpy as np
+
+from GridCal.Engine.Core.multi_circuit import MultiCircuit
+from GridCal.Engine.Devices import Bus, Branch
+from GridCal.Engine.Devices.measurement import Measurement, MeasurementType
+from GridCal.Engine.IO.file_handler import FileOpen
+from GridCal.Engine.Simulations.PowerFlow.power_flow_driver import PowerFlowDriver, PowerFlowOptions
+from GridCal.Engine.Simulations.StateEstimation.state_stimation_driver import StateEstimation
+
+FNAME = Path(__file__).parent.parent.parent / 'Grids_and_profiles' / 'grids' / 'IEEE_14.xlsx'
+
+
+def test_state_estimation_3_bus():
+    """
+    Three bus example with a validated solution
+    """
+    m_circuit = MultiCircuit()
+
+    b1 = Bus('B1', is_slack=True)
+    b2 = Bus('B2')
+    b3 = Bus('B3')
+
+    br1 = Branch(b1, b2, 'Br1', 0.01, 0.03)
+    br2 = Branch(b1, b3, 'Br2', 0.02, 0.05)
+    br3 = Branch(b2, b3, 'Br3', 0.03, 0.08)
+
+    br1.measurements.append(Measurement(0.888, 0.008, MeasurementType.Pflow))
+    br2.measurements.append(Measurement(1.173, 0.008, MeasurementType.Pflow))
+    b2.measurements.append(Measurement(-0.501, 0.01, MeasurementType.Pinj))
+    br1.measurements.append(Measurement(0.568, 0.008, MeasurementType.Qflow))
+    br2.measurements.append(Measurement(0.663, 0.008, MeasurementType.Qflow))
+    b2.measurements.append(Measurement(-0.286, 0.01, MeasurementType.Qinj))
+    b1.measurements.append(Measurement(1.006, 0.004, MeasurementType.Vmag))
+    b2.measurements.append(Measurement(0.968, 0.004, MeasurementType.Vmag))
+
+    for bus in [b1, b2, b3]:
+        m_circuit.add_bus(bus)
+    for br in [br1, br2, br3]:
+        m_circuit.add_branch(br)
+
+    se = StateEstimation(circuit=m_circuit)
+    se.run()
+
+    V = np.array([0.99962926 + 0.j, 0.97392515 - 0.02120941j, 0.94280676 - 0.04521561j])
+    assert np.allclose(se.se_results.voltage, V, atol=1e-7)
+
+
+def set_measurements(grid, V, measurements):
+    """
+    Set the measurement values from a voltage solution
+    """
+    island = grid.compile().compute()[0]
+    S = V * np.conj(island.Ybus * V)
+    Sf = (island.C_branch_bus_f * V) * np.conj(island.Yf * V)
+
+    for i, bus in enumerate(grid.buses):
+        measurements['P', i].val = S[i].real
+        measurements['Q', i].val = S[i].imag
+        measurements['V', i].val = np.abs(V[i])
+
+    for k, branch in enumerate(grid.branches):
+        measurements['Pf', k].val = Sf[k].real
+        measurements['Qf', k].val = Sf[k].imag
+
+
+def test_state_estimation_snapshots():
+    """
+    Repeated snapshots of the same measurement configuration re-use the estimator structure
+    """
+    grid = FileOpen(FNAME).open()
+
+    measurements = dict()
+    for i, bus in enumerate(grid.buses):
+        for key, tpe in [('P', MeasurementType.Pinj), ('Q', MeasurementType.Qinj), ('V', MeasurementType.Vmag)]:
+            measurements[key, i] = Measurement(0.0, 0.01, tpe)
+            bus.measurements.append(measurements[key, i])
+
+    for k, branch in enumerate(grid.branches):
+        for key, tpe in [('Pf', MeasurementType.Pflow), ('Qf', MeasurementType.Qflow)]:
+            measurements[key, k] = Measurement(0.0, 0.01, tpe)
+            branch.measurements.append(measurements[key, k])
+
+    se = StateEstimation(circuit=grid)
+
+    for scale in [1.0, 1.05, 0.95]:
+        for load in grid.get_loads():
+            load.P *= scale
+
+        power_flow = PowerFlowDriver(grid, PowerFlowOptions())
+        power_flow.run()
+
+        set_measurements(grid, power_flow.results.voltage, measurements)
+        se.run()
+
+        assert np.allclose(se.se_results.voltage, power_flow.results.voltage, atol=1e-6)
+
+    # the ordering of the gain matrix is computed once for all the snapshots
+    solver = se.estimators[0].linear_solver
+    assert len(se.estimators) == 1
+    assert solver.n_analysis <= 2
+    assert solver.n_factorizations > solver.n_analysis
+
+    # changing the branch impedances rebuilds the estimators with the new admittances
+    grid.branches[0].X *= 1.5
+    power_flow = PowerFlowDriver(grid, PowerFlowOptions())
+    power_flow.run()
+    set_measurements(grid, power_flow.results.voltage, measurements)
+    se.run()
+    assert se.estimators[0].linear_solver is not solver
+    assert np.allclose(se.se_results.voltage, power_flow.results.voltage, atol=1e-6)
+
+    # switching off a generator changes the bus types, which rebuilds the estimators
+    solver = se.estimators[0].linear_solver
+    gen = [elm for elm in grid.get_generators() if not elm.bus.is_slack][0]
+    gen.active = False
+    se.run()
+    assert se.estimators[0].linear_solver is not solver
+    assert se.se_results.bus_types[grid.buses.index(gen.bus)] == 1  # PQ
+
+
+if __name__ == '__main__':
+    test_state_estimation_3_bus()
+    test_state_estimation_snapshots()
@@ -0,0 +1,111 @@
+# This file is part of GridCal.
+#
+# GridCal is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# GridCal is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with GridCal.  If not, see <http://www.gnu.org/licenses/>.
+import numpy as np
+
+from GridCal.Engine.Core.multi_circuit import MultiCircuit
+from GridCal.Engine.Devices.branch import Branch, BranchType
+from GridCal.Engine.Devices.bus import Bus
+from GridCal.Engine.Devices.generator import Generator
+from GridCal.Engine.Devices.load import Load
+from GridCal.Engine.Simulations.PowerFlow.power_flow_driver import PowerFlowOptions, PowerFlowDriver
+from GridCal.Engine.Simulations.Topology.topology_driver import reduce_grid, reduce_grid_brute
+
+
+def get_node_breaker_grid():
+    """
+    Three substations joined by lines; each substation has two bus bars joined by a coupler switch and a feeder
+    bus connected through two parallel breakers
+    :return: MultiCircuit, list of switch indices
+    """
+    grid = MultiCircuit()
+
+    switches = list()
+    feeders = list()
+    for s in range(3):
+        bar1 = Bus('S{} bar 1'.format(s), vnom=20)
+        bar2 = Bus('S{} bar 2'.format(s), vnom=20)
+        feeder = Bus('S{} feeder'.format(s), vnom=20)
+        for bus in [bar1, bar2, feeder]:
+            grid.add_bus(bus)
+
+        switches.append(len(grid.branches))
+        grid.add_branch(Branch(bar1, bar2, 'S{} coupler'.format(s), r=0, x=1e-6, branch_type=BranchType.Switch))
+        for k in range(2):
+            switches.append(len(grid.branches))
+            grid.add_branch(Branch(bar2, feeder, 'S{} breaker {}'.format(s, k), r=0, x=1e-6,
+                                   branch_type=BranchType.Switch))
+
+        if s == 0:
+            grid.add_generator(bar1, Generator('Gen', voltage_module=1.0))
+        else:
+            grid.add_load(bar1, Load('Load {}'.format(s), P=30, Q=10))
+        feeders.append(feeder)
+
+    grid.add_branch(Branch(feeders[0], feeders[1], 'line 0-1', r=0.05, x=0.11, b=0.02))
+    grid.add_branch(Branch(feeders[1], feeders[2], 'line 1-2', r=0.05, x=0.11, b=0.02))
+    grid.add_branch(Branch(feeders[0], feeders[2], 'line 0-2', r=0.03, x=0.08, b=0.02))
+
+    return grid, switches
+
+
+def test_reduce_grid():
+    """
+    Reducing all the switches must leave one bus per substation and the lines between them,
+    with the same power flow
+    """
+    grid, switches = get_node_breaker_grid()
+    power_flow = PowerFlowDriver(grid, PowerFlowOptions())
+    power_flow.run()
+    v_bars = np.abs(power_flow.results.voltage[[0, 3, 6]])
+
+    removed_branches, removed_buses, updated_buses, updated_branches = reduce_grid(grid, switches)
+
+    assert len(removed_branches) == len(switches)
+    assert len(removed_buses) == 6
+    assert [bus.name for bus in grid.buses] == ['S0 bar 1', 'S1 bar 1', 'S2 bar 1']
+    assert [elm.name for elm in grid.branches] == ['line 0-1', 'line 1-2', 'line 0-2']
+    assert len(grid.buses[1].loads) == 1
+    assert set(updated_branches) == set(grid.branches)
+
+    power_flow = PowerFlowDriver(grid, PowerFlowOptions())
+    power_flow.run()
+    assert np.allclose(np.abs(power_flow.results.voltage), v_bars, atol=1e-4)
+
+
+def test_reduce_grid_parallel_path():
+    """
+    A branch with a parallel path is removed without merging buses, and an open switch is never merged
+    """
+    grid, switches = get_node_breaker_grid()
+
+    # one breaker of a parallel pair: just removed
+    removed_branch, removed_bus, updated_bus, updated_branches = reduce_grid_brute(grid, switches[1])
+    assert removed_branch.name == 'S0 breaker 0'
+    assert removed_bus is None
+    assert len(grid.buses) == 9
+
+    # the other breaker is now the only path: the feeder merges with the bar
+    removed_branch, removed_bus, updated_bus, updated_branches = reduce_grid_brute(grid, switches[1])
+    assert removed_branch.name == 'S0 breaker 1'
+    assert removed_bus.name == 'S0 feeder'
+    assert updated_bus.name == 'S0 bar 2'
+    assert len(grid.buses) == 8
+
+    # an open coupler
+    grid.branches[0].active = False
+    removed_branch, removed_bus, updated_bus, updated_branches = reduce_grid_brute(grid, 0)
+    assert removed_branch.name == 'S0 coupler'
+    assert removed_bus is None
+    assert len(grid.buses) == 8
@@ -0,0 +1,119 @@
+# This file is part of GridCal.
+#
+# GridCal is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# GridCal is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with GridCal.  If not, see <http://www.gnu.org/licenses/>.
+import numpy as np
+
+from GridCal.Engine.Devices.bus import Bus
+from GridCal.Engine.Devices.branch import Branch, BranchType
+from GridCal.Engine.Devices.wire import Wire
+from GridCal.Engine.Devices.tower import Tower, WireInTower, z_ii, z_ij, get_d_ij, calc_z_matrix, calc_y_matrix, \
+    compute_towers
+
+
+def get_tower(shift=0.0):
+    """
+    Tower with two wires per phase and a neutral
+    :param shift: vertical displacement of the wires (m)
+    :return: Tower
+    """
+    tower = Tower()
+    wire = Wire(name='ACSR 6/1', gmr=0.0039, r=0.5, x=0.0)
+    neutral = Wire(name='Neutral', gmr=0.0025, r=1.1, x=0.0)
+    for phase, xpos in zip([1, 2, 3], [0.0, 4.0, 8.0]):
+        tower.wires_in_tower.append(WireInTower(wire, xpos=xpos, ypos=15.0 + shift, phase=phase))
+        tower.wires_in_tower.append(WireInTower(wire, xpos=xpos + 0.4, ypos=15.0 + shift, phase=phase))
+    tower.wires_in_tower.append(WireInTower(neutral, xpos=4.0, ypos=20.0 + shift, phase=0))
+    return tower
+
+
+def test_z_primitive_matches_carson():
+    """
+    The vectorised primitive matrix must have the self and mutual impedances of Carson's formulas
+    """
+    tower = Tower()
+    wire = Wire(name='ACSR 6/1', gmr=0.0039, r=0.5, x=0.0)
+    positions = [(0.0, 15.0, 1), (4.0, 15.5, 2), (8.0, 15.0, 3), (4.0, 20.0, 0)]
+    for xpos, ypos, phase in positions:
+        tower.wires_in_tower.append(WireInTower(wire, xpos=xpos, ypos=ypos, phase=phase))
+
+    z_abcn, phases_abcn, z_abc, phases_abc, z_seq = calc_z_matrix(tower.wires_in_tower, f=50, rho=100)
+
+    # without bundles, z_abcn is the primitive matrix (in the order of the phases)
+    for i, (xi, yi, pi) in enumerate(positions):
+        for j, (xj, yj, pj) in enumerate(positions):
+            ii = np.where(phases_abcn == pi)[0][0]
+            jj = np.where(phases_abcn == pj)[0][0]
+            if i == j:
+                expected = z_ii(r_i=wire.r, x_i=wire.x, h_i=yi, gmr_i=wire.gmr, f=50, rho=100)
+            else:
+                expected = z_ij(x_i=xi, x_j=xj, h_i=yi + 1e-12, h_j=yj + 1e-12,
+                                d_ij=get_d_ij(xi, yi, xj, yj), f=50, rho=100)
+            assert np.isclose(z_abcn[ii, jj], expected)
+
+
+def test_line_constants_frequency_batch():
+    """
+    The matrices of a vector of frequencies must be those of every frequency
+    """
+    tower = get_tower()
+    frequencies = np.array([50.0, 150.0, 2500.0])
+
+    z_batch = calc_z_matrix(tower.wires_in_tower, f=frequencies, rho=100)
+    y_batch = calc_y_matrix(tower.wires_in_tower, f=frequencies)
+
+    assert z_batch[4].shape == (3, 3, 3)
+    for k, f in enumerate(frequencies):
+        z = calc_z_matrix(tower.wires_in_tower, f=f, rho=100)
+        y = calc_y_matrix(tower.wires_in_tower, f=f)
+        assert np.allclose(z_batch[2][k], z[2])
+        assert np.allclose(z_batch[4][k], z[4])
+        assert np.allclose(y_batch[4][k], y[4])
+
+
+def test_compute_towers():
+    """
+    The batched computation of many towers must give the values of every tower
+    """
+    towers = [get_tower(shift=0.5 * (k % 4)) for k in range(10)]
+    compute_towers(towers)
+
+    for tower in towers:
+        z = calc_z_matrix(tower.wires_in_tower, f=tower.frequency, rho=tower.earth_resistivity)
+        y = calc_y_matrix(tower.wires_in_tower, f=tower.frequency)
+        assert np.allclose(tower.z_seq, z[4])
+        assert np.allclose(tower.y_seq, y[4])
+        assert np.isclose(tower.R1, z[4][1, 1].real)
+        assert tower.X1 > 0 and tower.Bsh1 > 0
+
+    # the towers with the same geometry share their values, but not the arrays
+    assert np.allclose(towers[0].z_abc, towers[4].z_abc)
+    towers[0].z_abc[0, 0] = 0.0
+    assert towers[4].z_abc[0, 0] != 0.0
+
+
+def test_tower_template_zero_sequence():
+    """
+    Applying a tower to a line must set its zero-sequence values from the tower matrices
+    """
+    tower = get_tower()
+    tower.compute()
+
+    line = Branch(Bus(vnom=20), Bus(vnom=20), branch_type=BranchType.Line, length=10.0)
+    line.apply_template(tower, Sbase=100)
+
+    Zbase = 20.0 * 20.0 / 100
+    assert np.isclose(line.R0, tower.z_seq[0, 0].real * 10.0 / Zbase, atol=1e-6)
+    assert np.isclose(line.X0, tower.z_seq[0, 0].imag * 10.0 / Zbase, atol=1e-6)
+    assert np.isclose(line.B0, tower.y_seq[0, 0].imag * 10.0 * Zbase, atol=1e-6)
+    assert line.X0 > line.X
@@ -0,0 +1,211 @@
+# This file is part of GridCal.
+#
+# GridCal is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# GridCal is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with GridCal.  If not, see <http://www.gnu.org/licenses/>.
+from pathlib import Path
+import numpy as np
+
+from GridCal.Engine.basic_structures import Logger
+from GridCal.Engine.Core.multi_circuit import MultiCircuit
+from GridCal.Engine.Devices import Bus, Branch, Generator, Load
+from GridCal.Engine.IO.file_handler import FileOpen, FileSave
+from GridCal.Engine.Simulations.PowerFlow.power_flow_driver import PowerFlowOptions, PowerFlowDriver
+from GridCal.Engine.Simulations.Dynamics.dynamic_modules import DynamicModels, TransientStabilityEvents
+from GridCal.Engine.Simulations.Dynamics.transient_stability_driver import TransientStability, \
+    TransientStabilityOptions, get_dynamic_generators
+from GridCal.Engine.Simulations.Dynamics.transient_stability_batch_driver import TransientStabilityBatch, \
+    TransientStabilityBatchOptions
+
+GRIDS = Path(__file__).parent.parent.parent / 'Grids_and_profiles' / 'grids'
+
+
+def get_dynamic_grid():
+    """
+    IEEE 14 with a 4th order machine model in every generator
+    :return: MultiCircuit, PowerFlowResults
+    """
+    grid = FileOpen(str(GRIDS / 'IEEE_14.xlsx')).open()
+
+    for gen in grid.get_generators():
+        gen.machine_model = DynamicModels.SynchronousGeneratorOrder4
+        gen.H = 4.0
+        gen.Ra = 0.0
+        gen.Xd = 1.68
+        gen.Xdp = 0.32
+        gen.Xdpp = 0.2
+        gen.Xq = 1.61
+        gen.Xqp = 0.32
+        gen.Xqpp = 0.2
+        gen.Td0p = 5.5
+        gen.Tq0p = 4.6
+        gen.speed_volt = False
+        gen.Snom = 500.0
+
+    power_flow = PowerFlowDriver(grid, PowerFlowOptions(tolerance=1e-10))
+    power_flow.run()
+
+    return grid, power_flow.results
+
+
+def test_transient_stability_steady_state():
+    """
+    Without events the simulation must stay at the power flow solution
+    """
+    grid, pf_res = get_dynamic_grid()
+
+    options = TransientStabilityOptions(h=0.001, t_sim=2.0, decimation=10)
+    driver = TransientStability(grid, options, pf_res)
+    driver.run()
+
+    assert driver.results.voltage.shape == (201, len(grid.buses))
+    assert driver.results.omega.shape == (201, len(grid.get_generators()))
+    assert np.allclose(np.abs(driver.results.voltage), np.abs(pf_res.voltage), atol=1e-6)
+    assert np.allclose(driver.results.omega, 1.0, atol=1e-6)
+
+
+def test_transient_stability_events():
+    """
+    A cleared short circuit and a line trip disturb the machines, which must remain in synchronism
+    """
+    grid, pf_res = get_dynamic_grid()
+
+    events = TransientStabilityEvents()
+    events.add(0.5, 'Bus short circuit', grid.buses[3], 0.05)
+    events.add(0.55, 'Bus recovery', grid.buses[3], None)
+    events.add(1.0, 'Line failure', grid.branches[5], None)
+    events.add(1.2, 'Line recovery', grid.branches[5], None)
+
+    options = TransientStabilityOptions(h=0.001, t_sim=3.0, decimation=10, events=events)
+    driver = TransientStability(grid, options, pf_res)
+    driver.run()
+
+    deviation = np.abs(driver.results.omega - 1.0)
+    assert np.allclose(deviation[:50, :], 0.0, atol=1e-6)  # nothing happens before the fault
+    assert deviation.max() > 1e-4
+    assert deviation.max() < 1e-2
+
+    # the grid returns to the pre-fault topology: the voltages stay close to the initial ones
+    assert np.allclose(np.abs(driver.results.voltage[-1, :]), np.abs(pf_res.voltage), atol=0.05)
+
+
+def test_transient_stability_batch():
+    """
+    The scenarios screening must stop the unstable scenarios and the settled ones early,
+    with the same indices in one process and in a pool of processes
+    """
+    grid, pf_res = get_dynamic_grid()
+
+    scenarios = list()
+    for bus, branch, t_clear in [(3, 5, 0.05), (3, 5, 0.8), (0, 0, 0.3)]:
+        events = TransientStabilityEvents()
+        events.add(0.2, 'Bus short circuit', grid.buses[bus], 1e-3)
+        events.add(0.2 + t_clear, 'Bus recovery', grid.buses[bus], None)
+        events.add(0.2 + t_clear, 'Line failure', grid.branches[branch], None)
+        scenarios.append(events)
+
+    tables = list()
+    for multi_thread in [False, True]:
+        options = TransientStabilityBatchOptions(TransientStabilityOptions(h=0.002, t_sim=3.0),
+                                                 multi_thread=multi_thread, n_processes=2)
+        driver = TransientStabilityBatch(grid, options, pf_res, scenarios)
+        driver.run()
+        tables.append(driver.results.get_table())
+
+        assert np.array_equal(driver.results.stable, [True, False, False])
+        assert driver.results.angle_margin[0] > 0
+        assert np.all(driver.results.angle_margin[1:] < 0)
+        assert np.all(driver.results.stop_time < 3.0)
+        assert driver.results.results == [None] * 3
+
+    assert np.allclose(tables[0].values.astype(float), tables[1].values.astype(float))
+
+
+def test_generator_dynamic_model_file(tmp_path):
+    """
+    The dynamic model of the generators must be saved and loaded, and the models that the generators cannot use
+    must be reported and not simulated
+    """
+    grid, pf_res = get_dynamic_grid()
+    grid.get_generators()[0].Xdpp = 0.25
+    grid.get_generators()[0].speed_volt = True
+    grid.get_generators()[1].machine_model = DynamicModels.AsynchronousSingleCageMotor
+
+    file_name = str(tmp_path / 'dynamic_grid.gridcal')
+    FileSave(grid, file_name).save()
+    grid2 = FileOpen(file_name).open()
+
+    for gen, gen2 in zip(grid.get_generators(), grid2.get_generators()):
+        assert gen2.machine_model == gen.machine_model
+        for prop in ['H', 'Ra', 'Xd', 'Xdp', 'Xdpp', 'Xq', 'Xqp', 'Xqpp', 'Td0p', 'Tq0p', 'speed_volt']:
+            assert getattr(gen2, prop) == getattr(gen, prop)
+
+    logger = Logger()
+    generators = get_dynamic_generators(grid2, logger)
+    assert len(generators) == len(grid2.get_generators()) - 1
+    assert grid2.get_generators()[1] not in generators
+    assert len(logger) == 1
+
+
+def test_transient_stability_large_step():
+    """
+    With a step too large for the fixed point iteration the steps must be solved with Newton-Raphson,
+    and the steps that do not converge must be reported
+    """
+    grid, pf_res = get_dynamic_grid()
+
+    events = TransientStabilityEvents()
+    events.add(0.5, 'Bus short circuit', grid.buses[3], 0.05)
+    events.add(0.6, 'Bus recovery', grid.buses[3], None)
+
+    options = TransientStabilityOptions(h=0.1, t_sim=3.0, events=events)
+    driver = TransientStability(grid, options, pf_res)
+    driver.run()
+    assert len(driver.logger) == 0
+    assert np.all(np.abs(driver.results.omega[-1, :] - 1.0) < 0.01)
+
+    options = TransientStabilityOptions(h=0.1, t_sim=3.0, max_err=1e-15, max_iter=1, events=events)
+    driver = TransientStability(grid, options, pf_res)
+    driver.run()
+    assert len(driver.logger) == 1
+
+
+def test_transient_stability_batch_single_machine():
+    """
+    A single machine has no speed spread: it must not be considered settled while its speed is away from the
+    synchronous speed
+    """
+    grid = MultiCircuit()
+    bus1 = Bus('Bus 1', vnom=20, is_slack=True)
+    bus2 = Bus('Bus 2', vnom=20)
+    grid.add_bus(bus1)
+    grid.add_bus(bus2)
+    grid.add_generator(bus1, Generator('Gen', active_power=50, Snom=100,
+                                       machine_model=DynamicModels.SynchronousGeneratorOrder4))
+    grid.add_load(bus2, Load('Load', P=50, Q=10))
+    grid.add_branch(Branch(bus1, bus2, 'Line', r=0.01, x=0.05))
+
+    power_flow = PowerFlowDriver(grid, PowerFlowOptions(tolerance=1e-10))
+    power_flow.run()
+
+    # the fault accelerates the machine, and without governor its speed does not come back
+    events = TransientStabilityEvents()
+    events.add(0.2, 'Bus short circuit', bus2, 1e-3)
+    events.add(0.3, 'Bus recovery', bus2, None)
+
+    options = TransientStabilityBatchOptions(TransientStabilityOptions(h=0.002, t_sim=3.0), multi_thread=False)
+    driver = TransientStabilityBatch(grid, options, power_flow.results, [events])
+    driver.run()
+
+    assert driver.results.stable[0]
+    assert driver.results.max_speed_deviation[0] > options.settle_tol
+    assert np.isclose(driver.results.stop_time[0], 3.0)
@@ -1,12 +1,22 @@
 import os
+from pathlib import Path
 
 import numpy as np
 
 from GridCal.Engine.IO.file_handler import FileOpen
 from GridCal.Engine.Simulations.ContinuationPowerFlow.voltage_collapse_driver import \
     VoltageCollapseOptions, VoltageCollapseInput, VoltageCollapse
+from GridCal.Engine.Simulations.ContinuationPowerFlow.continuation_power_flow import continuation_nr, \
+    VCParametrization, VCStopAt
+from GridCal.Engine.Simulations.ContinuationPowerFlow.voltage_collapse_batch_driver import \
+    VoltageCollapseBatchOptions, VoltageCollapseBatchInput, VoltageCollapseBatch
+from GridCal.Engine.Simulations.PowerFlow.power_flow_driver import PowerFlowDriver, PowerFlowOptions
+from GridCal.Engine.Simulations.PowerFlow.jacobian_based_power_flow import Jacobian
+from GridCal.Engine.Simulations.sparse_solve import ReusableSuperLU
 from tests.conftest import ROOT_PATH
 
+GRIDS = Path(__file__).parent.parent.parent / 'Grids_and_profiles' / 'grids'
+
 
 def test_voltage_collapse(root_path=ROOT_PATH):
     """
@@ -45,5 +55,114 @@ def test_voltage_collapse(root_path=ROOT_PATH):
     # plt.savefig(fname=fname)
 
 
+def test_continuation_factorization_reuse():
+    """
+    The continuation power flow must compute the ordering of the augmented Jacobian once and
+    reuse the last corrector factorization for the tangent predictor, tracing the same curve
+    """
+    main_circuit = FileOpen(GRIDS / 'IEEE 118.xlsx').open()
+    power_flow = PowerFlowDriver(main_circuit, PowerFlowOptions())
+    power_flow.run()
+
+    island = main_circuit.compile().compute()[0]
+    V = power_flow.results.voltage[island.original_bus_idx]
+
+    args = dict(Ybus=island.Ybus, Ibus_base=island.Ibus, Ibus_target=island.Ibus,
+                Sbus_base=island.Sbus, Sbus_target=island.Sbus * 2, V=V, pv=island.pv, pq=island.pq,
+                step=0.01, approximation_order=VCParametrization.PseudoArcLength, adapt_step=True,
+                step_min=1e-4, step_max=0.2, error_tol=1e-3, tol=1e-6, max_it=20, stop_at=VCStopAt.Nose)
+
+    solver = ReusableSuperLU()
+    voltages, lambdas, normF, success = continuation_nr(linear_solver=solver, **args)
+
+    solver_ref = ReusableSuperLU()
+    voltages_ref, lambdas_ref, normF_ref, success_ref = continuation_nr(linear_solver=solver_ref,
+                                                                        reuse_predictor_factorization=False, **args)
+
+    assert success and success_ref
+    assert np.isclose(max(lambdas), max(lambdas_ref), atol=1e-5)
+    assert np.allclose(np.abs(voltages[-1]), np.abs(voltages_ref[-1]), atol=1e-3)
+
+    assert solver.symbolic_factorizations == 1
+    assert solver.numeric_factorizations < solver_ref.numeric_factorizations - len(lambdas_ref) / 2
+
+
+def test_point_of_collapse():
+    """
+    The point of collapse method must find the nose of the traced curve, with a singular Jacobian
+    """
+    main_circuit = FileOpen(GRIDS / 'IEEE 118.xlsx').open()
+    power_flow = PowerFlowDriver(main_circuit, PowerFlowOptions())
+    power_flow.run()
+
+    island = main_circuit.compile().compute()[0]
+    inputs = VoltageCollapseInput(Sbase=island.Sbus, Vbase=power_flow.results.voltage, Starget=island.Sbus * 2)
+
+    options = VoltageCollapseOptions(approximation_order=VCParametrization.PseudoArcLength)
+    traced = VoltageCollapse(main_circuit, options, inputs)
+    traced.run()
+
+    options.point_of_collapse = True
+    direct = VoltageCollapse(main_circuit, options, inputs)
+    direct.run()
+
+    # the traced curve only samples the nose: the exact maximum is slightly above
+    assert direct.results.converged
+    assert traced.results.margin - 1e-6 <= direct.results.margin <= traced.results.margin + 1e-3
+    assert len(direct.results.lambdas) < len(traced.results.lambdas)
+    assert traced.results.critical_vm is None
+
+    # the critical eigenvector is the null vector of the Jacobian at the nose
+    V = direct.results.voltages[-1]
+    pvpq = np.r_[island.pv, island.pq]
+    J = Jacobian(island.Ybus, V, island.Ibus, island.pq, pvpq)
+    v = np.r_[direct.results.critical_va[pvpq], direct.results.critical_vm[island.pq]]
+    assert np.abs(v).max() == 1.0
+    assert np.abs(J * v).max() < 1e-6
+
+
+def test_voltage_collapse_batch():
+    """
+    The batch of stress directions must give the same margins as the voltage collapse of each direction,
+    both sequentially and in parallel processes
+    """
+    main_circuit = FileOpen(GRIDS / 'IEEE_14.xlsx').open()
+    power_flow = PowerFlowDriver(main_circuit, PowerFlowOptions())
+    power_flow.run()
+
+    island = main_circuit.compile().compute()[0]
+    Sbase = island.Sbus
+    Vbase = power_flow.results.voltage
+
+    # uniform load increase and the load increase of single buses
+    loaded = np.where(Sbase.real < 0)[0][:3]
+    Starget = np.tile(Sbase, (1 + len(loaded), 1))
+    Starget[0, :] *= 2.0
+    for i, k in enumerate(loaded):
+        Starget[i + 1, k] *= 3.0
+
+    vc_options = VoltageCollapseOptions(approximation_order=VCParametrization.PseudoArcLength)
+    inputs = VoltageCollapseBatchInput(Sbase=Sbase, Vbase=Vbase, Starget=Starget)
+
+    batch = VoltageCollapseBatch(main_circuit, VoltageCollapseBatchOptions(vc_options, multi_thread=False), inputs)
+    batch.run()
+    assert np.all(batch.results.converged)
+    assert np.all(batch.results.margins > 0)
+    assert batch.results.curves[0].voltages is None
+
+    for i in [0, 1]:
+        vc = VoltageCollapse(circuit=main_circuit, options=vc_options,
+                             inputs=VoltageCollapseInput(Sbase=Sbase, Vbase=Vbase, Starget=Starget[i, :]))
+        vc.run()
+        assert np.isclose(vc.results.margin, batch.results.margins[i], atol=1e-4)
+
+    options = VoltageCollapseBatchOptions(vc_options, store_curves=True, multi_thread=True, n_processes=2)
+    parallel = VoltageCollapseBatch(main_circuit, options, inputs)
+    parallel.run()
+    assert np.allclose(parallel.results.margins, batch.results.margins, atol=1e-4)
+    assert np.isclose(max(parallel.results.curves[0].lambdas), batch.results.margins[0])
+    print(parallel.results.get_table())
+
+
 if __name__ == '__main__':
     test_voltage_collapse(root_path=ROOT_PATH)
@@ -0,0 +1,87 @@
+# This file is part of GridCal.
+#
+# GridCal is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# GridCal is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with GridCal.  If not, see <http://www.gnu.org/licenses/>.
+from pathlib import Path
+import numpy as np
+import pytest
+
+from GridCal.Engine.IO.file_handler import FileOpen
+from GridCal.Engine.basic_structures import ReactivePowerControlMode
+from GridCal.Engine.Simulations.PowerFlow.power_flow_driver import PowerFlowOptions, PowerFlowDriver
+from GridCal.Engine.Simulations.Topology.ward_equivalent import ward_equivalent
+
+GRIDS = Path(__file__).parent.parent.parent / 'Grids_and_profiles' / 'grids'
+
+
+def run_power_flow(grid):
+    """
+    Exact power flow without reactive power limits
+    :param grid: MultiCircuit
+    :return: PowerFlowResults
+    """
+    options = PowerFlowOptions(tolerance=1e-10, control_q=ReactivePowerControlMode.NoControl)
+    power_flow = PowerFlowDriver(grid, options)
+    power_flow.run()
+    return power_flow.results
+
+
+def test_ward_equivalent_base_case():
+    """
+    The equivalent must reproduce the voltages of the internal area at the base case
+    """
+    grid = FileOpen(str(GRIDS / 'IEEE_14.xlsx')).open()
+    pf_res = run_power_flow(grid)
+
+    internal = grid.buses[:7]
+    equivalent = ward_equivalent(grid, internal, pf_res)
+
+    assert len(equivalent.buses) == 7
+    assert any(branch.name.startswith('Ward branch') for branch in equivalent.branches)
+    assert len([elm for elm in equivalent.get_static_generators() if elm.name == 'Ward injection']) > 0
+
+    eq_res = run_power_flow(equivalent)
+    assert np.allclose(eq_res.voltage, pf_res.voltage[:7], atol=1e-6)
+
+
+def test_ward_equivalent_contingency():
+    """
+    An outage inside the internal area must give approximately the same voltages as in the full grid
+    """
+    grid = FileOpen(str(GRIDS / 'IEEE_14.xlsx')).open()
+    pf_res = run_power_flow(grid)
+
+    internal = grid.buses[:7]
+    equivalent = ward_equivalent(grid, internal, pf_res)
+
+    # trip the first branch between internal buses in both grids
+    k = [i for i, br in enumerate(grid.branches) if br.bus_from in internal and br.bus_to in internal][0]
+    grid.branches[k].active = False
+    equivalent.branches[0].active = False
+    assert equivalent.branches[0].name == grid.branches[k].name
+
+    full_res = run_power_flow(grid)
+    eq_res = run_power_flow(equivalent)
+
+    assert np.allclose(np.abs(eq_res.voltage), np.abs(full_res.voltage[:7]), atol=1e-2)
+
+
+def test_ward_equivalent_external_slack():
+    """
+    The slack buses can not be eliminated
+    """
+    grid = FileOpen(str(GRIDS / 'IEEE_14.xlsx')).open()
+    pf_res = run_power_flow(grid)
+
+    with pytest.raises(Exception):
+        ward_equivalent(grid, grid.buses[1:], pf_res)